@@ -0,0 +1,90 @@
+"""Benchmark CPU cost versus bytes saved for response compression.
+
+Serializes service listings of increasing size and reports, for each content
+coding and level, the compression ratio and the time needed to compress the
+listing, both uncached and served from the compression cache.
+
+Requires the package to be installed (e.g., `pip install -e .`).
+
+Usage:
+    python benchmarks/compression.py [--sizes 10 100 1000 10000]
+"""
+
+import argparse
+import json
+import time
+from typing import Callable, Dict, List
+
+from cloud_registry.compression import (
+    CompressionCache,
+    compress,
+    supported_encodings,
+)
+
+LEVELS: Dict[str, List[int]] = {"gzip": [1, 6, 9], "br": [1, 4, 11]}
+
+
+def _services(count: int) -> bytes:
+    """Return serialized listing of `count` services."""
+    return json.dumps(
+        [
+            {
+                "id": f"{i:06d}",
+                "name": f"Service {i}",
+                "type": {
+                    "group": "org.ga4gh",
+                    "artifact": ["tes", "wes", "drs", "trs"][i % 4],
+                    "version": f"1.{i % 3}.0",
+                },
+                "organization": {
+                    "name": f"Organization {i % 20}",
+                    "url": f"https://org{i % 20}.example.org",
+                },
+                "version": "1.0.0",
+                "environment": ["prod", "test", "dev"][i % 3],
+                "url": f"https://service{i}.example.org/ga4gh/v1",
+            }
+            for i in range(count)
+        ]
+    ).encode()
+
+
+def _time(fn: Callable[[], object], repeat: int) -> float:
+    """Return mean run time of `fn` in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(
+        f"{'services':>8} {'encoding':>8} {'level':>5} {'bytes':>10} "
+        f"{'compressed':>10} {'saved':>6} {'cpu_ms':>8} {'cached_ms':>9}"
+    )
+    for size in args.sizes:
+        data = _services(size)
+        for encoding in supported_encodings():
+            for level in LEVELS[encoding]:
+                compressed = compress(data, encoding, level)
+                cpu_ms = _time(lambda: compress(data, encoding, level), args.repeat)
+                cache = CompressionCache()
+                cache.compress(data, encoding, level)
+                cached_ms = _time(
+                    lambda: cache.compress(data, encoding, level), args.repeat
+                )
+                saved = 1 - len(compressed) / len(data)
+                print(
+                    f"{size:>8} {encoding:>8} {level:>5} {len(data):>10} "
+                    f"{len(compressed):>10} {saved:>6.1%} {cpu_ms:>8.3f} "
+                    f"{cached_ms:>9.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark storage saved and read cost of normalized services.
+
+Encodes services as BSON with their organizations and types embedded and
+normalized, and reports the bytes per service and the bytes extrapolated to
+`--count` services, including the dictionary collections. Also reports the
+time needed to reassemble batches of normalized services from cached
+dictionary entries, and, given `--mongo-uri`, the storage statistics of the
+configured collections.
+
+Requires the package to be installed (e.g., `pip install -e .`).
+
+Usage:
+    python benchmarks/normalization.py [--count 1000000] [--mongo-uri URI]
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+import bson
+from pymongo import MongoClient
+
+from cloud_registry.ga4gh.registry.normalization import (
+    NORMALIZED_FIELDS,
+    ServiceDictionary,
+    dictionary_key,
+)
+
+ORGANIZATIONS = 200
+TYPES = 40
+
+
+def _services(count: int) -> List[Dict]:
+    """Return `count` services sharing organizations and types."""
+    return [
+        {
+            "id": f"{i:08d}",
+            "name": f"Service {i}",
+            "type": {
+                "group": "org.ga4gh",
+                "artifact": ["tes", "wes", "drs", "trs"][i % 4],
+                "version": f"1.{i % (TYPES // 4)}.0",
+            },
+            "organization": {
+                "name": f"Organization {i % ORGANIZATIONS}",
+                "url": f"https://org{i % ORGANIZATIONS}.example.org",
+            },
+            "version": "1.0.0",
+            "environment": ["prod", "test", "dev"][i % 3],
+            "url": f"https://service{i}.example.org/ga4gh/v1",
+            "_deleted_at": None,
+        }
+        for i in range(count)
+    ]
+
+
+def _normalize(service: Dict) -> Dict:
+    """Return service referencing its organization and type by their keys."""
+    normalized = dict(service)
+    for field, (key_field, _) in NORMALIZED_FIELDS.items():
+        normalized[key_field] = dictionary_key(normalized.pop(field))
+    return normalized
+
+
+def _size(docs: List[Dict]) -> int:
+    """Return total BSON size of `docs`."""
+    return sum(len(bson.BSON.encode(doc)) for doc in docs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000000)
+    parser.add_argument("--sample", type=int, default=10000)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--mongo-uri")
+    parser.add_argument("--database", default="serviceStore")
+    args = parser.parse_args()
+
+    services = _services(args.sample)
+    normalized = [_normalize(service) for service in services]
+    entries = {
+        (field, dictionary_key(service[field])): service[field]
+        for service in services
+        for field in NORMALIZED_FIELDS
+    }
+    raw_bytes = _size(services) / len(services)
+    normalized_bytes = _size(normalized) / len(normalized)
+    dictionary_bytes = _size(
+        [{"_id": key, "value": value} for (_, key), value in entries.items()]
+    )
+    raw_total = raw_bytes * args.count
+    normalized_total = normalized_bytes * args.count + dictionary_bytes
+    print(f"{'layout':>10} {'bytes/service':>13} {'total_mb':>10}")
+    print(f"{'embedded':>10} {raw_bytes:>13.1f} {raw_total / 2**20:>10.1f}")
+    print(
+        f"{'normalized':>10} {normalized_bytes:>13.1f} "
+        f"{normalized_total / 2**20:>10.1f}"
+    )
+    print(f"saved: {1 - normalized_total / raw_total:.1%} at {args.count} services")
+
+    dictionary = ServiceDictionary()
+    for (field, key), value in entries.items():
+        dictionary._set(field, key, value)
+    print(f"\n{'batch':>6} {'join_ms':>8} {'us/service':>10}")
+    for size in args.batch:
+        batch = normalized[:size]
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            dictionary.denormalize(dict(doc) for doc in batch)
+        join_ms = (time.perf_counter() - start) / args.repeat * 1000
+        print(f"{size:>6} {join_ms:>8.3f} {join_ms * 1000 / size:>10.2f}")
+
+    if args.mongo_uri:
+        database = MongoClient(args.mongo_uri)[args.database]
+        print(f"\n{'collection':>22} {'count':>10} {'size_mb':>8} {'storage_mb':>10}")
+        collections = ["services"] + [name for _, name in NORMALIZED_FIELDS.values()]
+        for name in collections:
+            stats = database.command("collStats", name)
+            print(
+                f"{name:>22} {stats['count']:>10} {stats['size'] / 2**20:>8.1f} "
+                f"{stats['storageSize'] / 2**20:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
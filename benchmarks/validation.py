@@ -0,0 +1,88 @@
+"""Benchmark validation cost per service document.
+
+Validates typical and large service documents against the
+`ExternalServiceRegister` schema, both with connexion's generic JSON schema
+validator and with validation code compiled from the schema, and reports the
+mean time per document.
+
+Requires the package to be installed (e.g., `pip install -e .`).
+
+Usage:
+    python benchmarks/validation.py [--repeat 2000]
+"""
+
+import argparse
+from pathlib import Path
+import time
+from typing import Any, Callable, Dict
+
+from connexion.json_schema import Draft4RequestValidator, resolve_refs
+from jsonschema import Draft4Validator
+import yaml
+
+from cloud_registry.validation import compile_schema
+
+SPEC = Path(__file__).parents[1] / "cloud_registry" / "api" / "additions.openapi.yaml"
+
+
+def _schema() -> Dict:
+    """Return `ExternalServiceRegister` schema with references resolved."""
+    schemas = yaml.safe_load(SPEC.read_text())["components"]["schemas"]
+    schemas = {
+        k: schemas[k] for k in ["ExternalServiceRegister", "ServiceTypeRegister"]
+    }
+    spec = resolve_refs({"components": {"schemas": schemas}})
+    return spec["components"]["schemas"]["ExternalServiceRegister"]
+
+
+def _service(size: int) -> Dict:
+    """Return service document with descriptions of `size` characters."""
+    return {
+        "name": "Service",
+        "type": {"group": "org.ga4gh", "artifact": "tes", "version": "1.0.0"},
+        "description": "x" * size,
+        "organization": {"name": "Organization", "url": "https://example.org"},
+        "contactUrl": "mailto:support@example.org",
+        "documentationUrl": "https://docs.example.org",
+        "createdAt": "2019-06-04T12:58:19Z",
+        "updatedAt": "2019-06-04T12:58:19Z",
+        "environment": "prod",
+        "version": "1.0.0",
+        "url": "https://service.example.org/ga4gh/v1",
+    }
+
+
+def _time(fn: Callable[[Any], Any], data: Any, repeat: int) -> float:
+    """Return mean run time of `fn(data)` in microseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(data)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    schema = _schema()
+    generic = Draft4RequestValidator(
+        schema, format_checker=Draft4Validator.FORMAT_CHECKER
+    )
+    compiled = compile_schema(schema)
+    if compiled is None:
+        raise SystemExit("Package 'fastjsonschema' is required.")
+
+    print(f"{'payload':>8} {'generic_us':>10} {'compiled_us':>11} {'speedup':>7}")
+    for label, size in [("typical", 100), ("large", 100000)]:
+        data = _service(size)
+        generic_us = _time(generic.validate, data, args.repeat)
+        compiled_us = _time(compiled, data, args.repeat)
+        print(
+            f"{label:>8} {generic_us:>10.1f} {compiled_us:>11.1f} "
+            f"{generic_us / compiled_us:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,153 @@
+import logging
+import os
+
 from foca import Foca
-from foca.security.auth import validate_token  # noqa: F401
 
-from cloud_registry.ga4gh.registry.service_info import RegisterServiceInfo
+from cloud_registry.auth import register_auth_cache, validate_token  # noqa: F401
+from cloud_registry.compression import register_compression
+from cloud_registry.config_reload import register_config_reload
+from cloud_registry.ga4gh.registry.dedup import DuplicateCompaction
+from cloud_registry.ga4gh.registry.ids import register_id_generator
+from cloud_registry.ga4gh.registry.indexes import (
+    deferred_index_builds,
+    register_index_manager,
+)
+from cloud_registry.ga4gh.registry.normalization import register_normalization
+from cloud_registry.ga4gh.registry.read_preference import register_read_preference
+from cloud_registry.ga4gh.registry.selection import register_service_ranking
+from cloud_registry.ga4gh.registry.service_info import reconcile_service_info
+from cloud_registry.ga4gh.registry.tenancy import register_tenancy
+from cloud_registry.ga4gh.registry.tombstones import TombstoneCompaction
+from cloud_registry.ga4gh.registry.versions import backfill_version_keys
+from cloud_registry.ga4gh.registry.write_behind import register_write_behind
+from cloud_registry.startup import StartupPhases, StartupTask
+from cloud_registry.storage import register_sqlite
+from cloud_registry.timing import register_command_timing, register_request_timing
+from cloud_registry.tracing import register_command_tracing, register_tracing
+from cloud_registry.validation import register_compiled_validation
+
+logger = logging.getLogger(__name__)
 
 
 def main():
+    phases = StartupPhases()
+
     # create app object
-    foca = Foca(
-        config_file="config.yaml",
-        custom_config_model="service_models.custom_config.CustomConfig",
-    )
-    app = foca.create_app()
+    with phases.phase("load config"):
+        foca = Foca(
+            config_file=os.environ.get("CLOUD_REGISTRY_CONFIG", "config.yaml"),
+            custom_config_model="service_models.custom_config.CustomConfig",
+        )
+
+    # validate request bodies with compiled schemas
+    with phases.phase("compile validation"):
+        register_compiled_validation(foca.conf)
+
+    # keep FOCA from connecting to MongoDB if data is stored in SQLite
+    storage_conf = foca.conf.custom.storage
+    db_conf = foca.conf.db
+    if storage_conf.backend == "sqlite":
+        foca.conf.db = None
+    elif storage_conf.backend != "mongodb":
+        raise ValueError(f"Unknown storage backend: {storage_conf.backend}")
+
+    # time and trace commands of MongoDB clients, which are created with the app
+    register_command_timing(foca.conf)
+    register_command_tracing(foca.conf)
+
+    # build indexes in the background instead of having FOCA drop and recreate
+    # them while creating the app; unique indexes are created right after
+    with phases.phase("create app"), deferred_index_builds(foca.conf.db):
+        app = foca.create_app()
+
+    # store databases and collections in SQLite files if configured
+    if storage_conf.backend == "sqlite":
+        with phases.phase("open storage"):
+            app.app.config.foca.db = register_sqlite(
+                conf=db_conf,
+                path=storage_conf.path,
+                mmap_size=storage_conf.mmap_size,
+                busy_timeout=storage_conf.busy_timeout,
+            )
+
+    with phases.phase("register extensions"):
+        # time and trace requests if enabled
+        register_request_timing(app.app)
+        register_tracing(app.app)
+
+        # resolve tenant of requests if enabled
+        register_tenancy(app.app)
+
+        # read from the primary after writing if reads go to secondaries
+        register_read_preference(app.app)
+
+        # store organizations and types of services once if enabled
+        register_normalization(app.app)
+
+        # generate service identifiers with the configured strategy
+        register_id_generator(app.app)
 
-    # register service info
-    with app.app.app_context():
-        service_info = RegisterServiceInfo()
-        service_info.set_service_info_from_config()
+        # cache token validation results
+        register_auth_cache(app.app)
+
+        # compress responses
+        register_compression(app.app)
+
+    # register service info in the background; until then, configured service
+    # info is served
+    reconcile_service_info(app.app, phases=phases)
+
+    # store version keys missing from services registered earlier
+    StartupTask(
+        app=app.app,
+        name="backfill version keys",
+        func=lambda: backfill_version_keys(
+            app.app.config.foca.db.dbs["serviceStore"].collections["services"].client
+        ),
+        phases=phases,
+    ).start()
+
+    with phases.phase("start background jobs"):
+        # build missing indexes and check indexes for drift
+        register_index_manager(app.app)
+
+        # queue registrations of services if enabled
+        register_write_behind(app.app)
+
+        # rank services for selection
+        register_service_ranking(app.app)
+
+        # purge deleted services periodically
+        with app.app.app_context():
+            TombstoneCompaction().start()
+
+        # hash and collapse services registered more than once if enabled
+        with app.app.app_context():
+            DuplicateCompaction().start()
+
+        # reload custom configuration when the configuration file changes
+        register_config_reload(app.app, path=foca.config_file)
+
+    app.app.extensions["startup_phases"] = phases
+    phases.report()
 
     # start app
-    app.run(port=app.port)
+    server = foca.conf.custom.wsgi.server
+    if server == "gevent" and not _gevent_patched():
+        raise RuntimeError(
+            "Serving with gevent requires monkey-patching; start the app with "
+            "`python -m gevent.monkey app.py`."
+        )
+    app.run(port=app.port, server=server)
+
+
+def _gevent_patched() -> bool:
+    """Whether the standard library was monkey-patched by gevent."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
 
 
 if __name__ == "__main__":
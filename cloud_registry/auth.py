@@ -0,0 +1,311 @@
+"""Cached validation of JSON Web Token (JWT) Bearer tokens."""
+
+from collections import OrderedDict
+import hashlib
+import logging
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from flask import Flask, current_app, request
+from foca.security import auth as foca_auth
+from werkzeug.datastructures import ImmutableMultiDict
+
+from cloud_registry.exceptions import Forbidden
+from cloud_registry.timing import timed
+from cloud_registry.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# original JWK set fetcher; replaced by a cached lookup in `register_auth_cache`
+_fetch_public_keys: Callable[..., Dict] = foca_auth._get_public_keys
+
+
+class TokenCache:
+    """Cache of token validation results.
+
+    Entries are keyed by the SHA-256 digest of the token and expire after the
+    configured time to live or when the token itself expires, whichever comes
+    first. The least recently used entries are evicted once the cache is full.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300,
+        max_size: int = 10000,
+    ) -> None:
+        """Initialize cache.
+
+        Args:
+            ttl: Maximum time (in seconds) for which a validation result is
+                cached.
+            max_size: Maximum number of cached validation results.
+
+        Attributes:
+            ttl: Maximum time (in seconds) for which a validation result is
+                cached.
+            max_size: Maximum number of cached validation results.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> str:
+        """Compute cache key for token.
+
+        Args:
+            token: JSON Web Token (JWT).
+
+        Returns:
+            Hex digest of the token's SHA-256 hash.
+        """
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict]:
+        """Return cached validation result for token.
+
+        Args:
+            token: JSON Web Token (JWT).
+
+        Returns:
+            Token info as returned by the validation function, or `None` if the
+            token is not cached or the cached entry has expired.
+        """
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, token_info = entry
+            if expires <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return token_info
+
+    def set(self, token: str, token_info: Dict) -> None:
+        """Cache validation result for token.
+
+        Args:
+            token: JSON Web Token (JWT).
+            token_info: Token info as returned by the validation function.
+        """
+        now = time.time()
+        expires = now + self.ttl
+        exp = token_info.get("claims", {}).get("exp")
+        if isinstance(exp, (int, float)):
+            expires = min(expires, float(exp))
+        if expires <= now:
+            return
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (expires, token_info)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+class JwksCache:
+    """Cache of identity provider JSON Web Key (JWK) sets.
+
+    Key sets older than the refresh interval are still served, but trigger a
+    refresh in a background thread. Key sets older than the maximum age are
+    refetched before being served.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[..., Dict],
+        refresh_interval: float = 300,
+        max_age: float = 3600,
+    ) -> None:
+        """Initialize cache.
+
+        Args:
+            fetch: Function fetching the key set; called with the key set URL
+                and any additional keyword arguments passed to `get()`.
+            refresh_interval: Age (in seconds) after which a key set is
+                refreshed in the background.
+            max_age: Age (in seconds) after which a key set is refetched
+                synchronously.
+
+        Attributes:
+            fetch: Function fetching the key set.
+            refresh_interval: Age (in seconds) after which a key set is
+                refreshed in the background.
+            max_age: Age (in seconds) after which a key set is refetched
+                synchronously.
+        """
+        self.fetch = fetch
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self._entries: Dict[Hashable, Tuple[float, Dict]] = {}
+        self._refreshing: Set[Hashable] = set()
+        self._lock = threading.Lock()
+
+    def get(self, url: str, **kwargs) -> Dict:
+        """Return key set.
+
+        Args:
+            url: Endpoint providing the identity provider's key set.
+            **kwargs: Additional keyword arguments passed to `fetch`.
+
+        Returns:
+            Public keys mapped to their identifiers.
+        """
+        key = (url, tuple(sorted(kwargs.items())))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] >= self.max_age:
+            return self._refresh(key, url, kwargs)
+        if time.monotonic() - entry[0] >= self.refresh_interval:
+            self._refresh_in_background(key, url, kwargs)
+        return entry[1]
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def _refresh(self, key: Hashable, url: str, kwargs: Dict) -> Dict:
+        """Fetch key set and update cache entry."""
+        keys = self.fetch(url, **kwargs)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), keys)
+        logger.debug(f"Cached JWK set from: {url}")
+        return keys
+
+    def _refresh_in_background(
+        self,
+        key: Hashable,
+        url: str,
+        kwargs: Dict,
+    ) -> None:
+        """Refresh key set in a daemon thread, unless already refreshing."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def _run() -> None:
+            try:
+                self._refresh(key, url, kwargs)
+            except Exception as e:
+                logger.warning(
+                    f"Could not refresh JWK set from '{url}': "
+                    f"{type(e).__name__}: {e}"
+                )
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=_run, daemon=True).start()
+
+
+def register_auth_cache(app: Flask) -> None:
+    """Register token validation and key set caches with app.
+
+    Args:
+        app: Flask application instance.
+    """
+    conf = app.config.foca.custom.auth_cache  # type: ignore[attr-defined]
+    if not conf.enabled:
+        logger.info("Token validation cache disabled.")
+        return
+    app.extensions["token_cache"] = TokenCache(
+        ttl=conf.ttl,
+        max_size=conf.max_size,
+    )
+    app.extensions["jwks_cache"] = JwksCache(
+        fetch=_fetch_public_keys,
+        refresh_interval=conf.jwks_refresh_interval,
+        max_age=conf.jwks_max_age,
+    )
+    foca_auth._get_public_keys = _get_public_keys  # type: ignore[assignment]
+    logger.info("Token validation cache registered.")
+
+
+@traced
+@timed("auth")
+def validate_token(token: str) -> Dict:
+    """Validate JSON Web Token (JWT) Bearer token.
+
+    Serves repeated tokens from the token cache, if registered, and delegates
+    to `foca.security.auth.validate_token()` otherwise.
+
+    Args:
+        token: JSON Web Token (JWT).
+
+    Returns:
+        Token info.
+
+    Raises:
+        connexion.exceptions.Unauthorized: Raised if JWT could not be
+            successfully validated.
+    """
+    cache: Optional[TokenCache] = current_app.extensions.get("token_cache")
+    if cache is None:
+        return foca_auth.validate_token(token)
+    token_info = cache.get(token)
+    if token_info is None:
+        token_info = foca_auth.validate_token(token)
+        cache.set(token, token_info)
+        return token_info
+    logger.debug(f"Access granted to cached user: {token_info['user_id']}")
+    _add_claims_to_headers(token_info)
+    return token_info
+
+
+def check_admin(admins: List[str]) -> None:
+    """Check whether the requester is an admin.
+
+    Admins are identified by the `user_id` of their validated bearer token;
+    if authorization is disabled, any requester is treated as an admin.
+
+    Args:
+        admins: Identifiers of the admins.
+
+    Raises:
+        cloud_registry.exceptions.Forbidden: The requester is not an admin.
+    """
+    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+    if all(spec.disable_auth for spec in foca_conf.api.specs):
+        return
+    user_id = request.headers.get("user_id")
+    if user_id not in admins:
+        logger.warning(
+            f"Admin endpoint '{request.path}' requested by user who is not an "
+            f"admin: {user_id}"
+        )
+        raise Forbidden
+
+
+def _add_claims_to_headers(token_info: Dict) -> None:
+    """Add token claims to request headers.
+
+    Mirrors what `foca.security.auth.validate_token()` does for freshly
+    validated tokens.
+
+    Args:
+        token_info: Token info.
+    """
+    req_headers = request.headers.__dict__
+    for key, val in token_info["claims"].items():
+        req_headers[key] = val
+    req_headers["user_id"] = token_info["user_id"]
+    request.headers = ImmutableMultiDict(req_headers)  # type: ignore[assignment]
+
+
+def _get_public_keys(url: str, **kwargs) -> Dict:
+    """Obtain identity provider's JWK set, served from the app's cache."""
+    cache: Optional[JwksCache] = current_app.extensions.get("jwks_cache")
+    if cache is None:
+        return _fetch_public_keys(url, **kwargs)
+    return cache.get(url, **kwargs)
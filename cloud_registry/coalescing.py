@@ -0,0 +1,166 @@
+"""Coalescing of concurrent identical reads."""
+
+from functools import wraps
+import inspect
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from flask import current_app, json as flask_json
+
+from cloud_registry.ga4gh.registry.read_preference import is_pinned
+from cloud_registry.ga4gh.registry.tenancy import get_tenant
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """In-flight call whose result is shared with concurrent callers."""
+
+    def __init__(self) -> None:
+        """Initialize call."""
+        self.done = threading.Event()
+        self.result: Any = None
+        self.encoded: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Class for sharing the result of a call among concurrent callers.
+
+    The first caller for a key runs the call; callers arriving with the same
+    key while it is in flight wait for and share its result, or its exception.
+    If an encoder is given, the result is encoded once if callers are waiting
+    for it, and each waiting caller decodes its own copy, so that callers do
+    not see each other's changes to the result. Nothing is cached once the
+    call completes.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 30.0,
+        encode: Optional[Callable[[Any], Any]] = None,
+        decode: Optional[Callable[[Any], Any]] = None,
+    ) -> None:
+        """Initialize class requirements.
+
+        Args:
+            timeout: Maximum time (in seconds) to wait for an in-flight call.
+            encode: Function encoding results shared with waiting callers, or
+                `None` to share results as they are.
+            decode: Function decoding encoded results for waiting callers.
+
+        Attributes:
+            timeout: Maximum time (in seconds) to wait for an in-flight call.
+                Callers waiting longer run the call themselves.
+            encode: Function encoding results shared with waiting callers, or
+                `None` to share results as they are.
+            decode: Function decoding encoded results for waiting callers.
+        """
+        self.timeout = timeout
+        self.encode = encode
+        self.decode = decode
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """Run call, or share the result of an identical call in flight.
+
+        Args:
+            key: Key identifying identical calls.
+            func: Function making the call.
+
+        Returns:
+            Result of the call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1  # type: ignore[union-attr]
+        assert call is not None
+        if not leader:
+            if not call.done.wait(timeout=self.timeout):
+                logger.warning(f"Timed out waiting for in-flight call: {key}")
+                return func()
+            if call.error is not None:
+                raise call.error
+            if self.encode is not None and self.decode is not None:
+                return self.decode(call.encoded)
+            return call.result
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.error is None and call.waiters:
+                self._encode(call)
+            call.done.set()
+            if call.waiters:
+                logger.debug(f"Shared result of call with {call.waiters} callers.")
+        return call.result
+
+    def _encode(self, call: _Call) -> None:
+        """Encode result of call for waiting callers, if so configured.
+
+        Waiting callers get the exception if the result cannot be encoded.
+        """
+        if self.encode is None or self.decode is None:
+            return
+        try:
+            call.encoded = self.encode(call.result)
+        except Exception as e:
+            call.error = e
+
+
+def coalesce(func: Callable) -> Callable:
+    """Share results of concurrent identical calls of a read controller.
+
+    Calls are identical if they are made for the same tenant with the same
+    named arguments. Results are serialized to JSON once for all waiting
+    callers, each of which gets its own decoded copy. Clients whose reads are
+    pinned to the primary after a write do not share results, so that they
+    observe their own writes.
+
+    Args:
+        func: Controller function.
+
+    Returns:
+        Wrapped controller function.
+    """
+    params = [
+        name
+        for name, param in inspect.signature(func).parameters.items()
+        if param.kind not in [param.VAR_KEYWORD, param.VAR_POSITIONAL]
+    ]
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+        coalescing_conf = foca_conf.custom.coalescing
+        if not coalescing_conf.enabled or is_pinned():
+            return func(*args, **kwargs)
+        named = {**dict(zip(params, args)), **kwargs}
+        key = (
+            func.__name__,
+            get_tenant(),
+            tuple(sorted((name, named.get(name)) for name in params)),
+        )
+        single_flight: SingleFlight = current_app.extensions.setdefault(
+            "single_flight",
+            SingleFlight(
+                timeout=coalescing_conf.timeout,
+                encode=flask_json.dumps,
+                decode=json.loads,
+            ),
+        )
+        return single_flight.do(key, lambda: func(*args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,177 @@
+"""Negotiated compression of response bodies."""
+
+from collections import OrderedDict
+import gzip
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, Response, current_app, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+class CompressionCache:
+    """Cache of compressed response bodies.
+
+    Entries are keyed by encoding, compression level and the SHA-1 digest of
+    the uncompressed body, so that identical serialized responses (e.g., hot
+    listings) are compressed only once. The least recently used entries are
+    evicted once the cache is full.
+    """
+
+    def __init__(self, max_size: int = 64) -> None:
+        """Initialize cache.
+
+        Args:
+            max_size: Maximum number of cached compressed bodies.
+
+        Attributes:
+            max_size: Maximum number of cached compressed bodies.
+            hits: Number of cache hits.
+            misses: Number of cache misses.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, int, bytes], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compress(self, data: bytes, encoding: str, level: int) -> bytes:
+        """Return compressed body, compressing it only if not cached.
+
+        Args:
+            data: Uncompressed body.
+            encoding: Content coding, either `br` or `gzip`.
+            level: Compression level.
+
+        Returns:
+            Compressed body.
+        """
+        key = (encoding, level, hashlib.sha1(data).digest())
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compressed
+            self.misses += 1
+        compressed = compress(data=data, encoding=encoding, level=level)
+        if self.max_size > 0:
+            with self._lock:
+                self._entries[key] = compressed
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return compressed
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    """Compress data.
+
+    Args:
+        data: Uncompressed data.
+        encoding: Content coding, either `br` or `gzip`.
+        level: Compression level.
+
+    Returns:
+        Compressed data.
+
+    Raises:
+        ValueError: Unsupported content coding.
+    """
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=level)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(data, quality=level)
+    raise ValueError(f"Unsupported content coding: {encoding}")
+
+
+def supported_encodings() -> List[str]:
+    """Return supported content codings, in order of preference."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def register_compression(app: Flask) -> None:
+    """Register response compression with app.
+
+    Args:
+        app: Flask application instance.
+    """
+    conf = app.config.foca.custom.compression  # type: ignore[attr-defined]
+    if not conf.enabled:
+        logger.info("Response compression disabled.")
+        return
+    app.extensions["compression_cache"] = CompressionCache(
+        max_size=conf.cache_size,
+    )
+    app.after_request(compress_response)
+    logger.info(
+        f"Response compression registered for encodings: {supported_encodings()}"
+    )
+
+
+def compress_response(response: Response) -> Response:
+    """Compress response body according to the request's `Accept-Encoding`.
+
+    Streamed, already encoded, unsuccessful or small responses, as well as
+    responses of non-configured media types, are returned unaltered.
+
+    Args:
+        response: Response to compress.
+
+    Returns:
+        Compressed response.
+    """
+    conf = current_app.config.foca.custom.compression  # type: ignore[attr-defined]
+    response.vary.add("Accept-Encoding")
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or not 200 <= response.status_code < 300
+        or response.mimetype not in conf.mimetypes
+    ):
+        return response
+    encoding = _negotiate_encoding()
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < conf.min_size:
+        return response
+    levels: Dict[str, int] = {"br": conf.brotli_level, "gzip": conf.gzip_level}
+    cache: Optional[CompressionCache] = current_app.extensions.get("compression_cache")
+    if cache is None:
+        compressed = compress(data=data, encoding=encoding, level=levels[encoding])
+    else:
+        compressed = cache.compress(
+            data=data,
+            encoding=encoding,
+            level=levels[encoding],
+        )
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def _negotiate_encoding() -> Optional[str]:
+    """Return preferred supported content coding accepted by the client."""
+    accepted = request.accept_encodings
+    best = None
+    best_quality: float = 0
+    for encoding in supported_encodings():
+        quality = accepted[encoding]
+        if quality > best_quality:
+            best = encoding
+            best_quality = quality
+    return best
@@ -0,0 +1,284 @@
+"""Hot reload of the custom configuration when the configuration file changes."""
+
+from copy import deepcopy
+import hashlib
+import logging
+from pathlib import Path
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import Flask
+import yaml
+
+from cloud_registry.auth import register_auth_cache
+from cloud_registry.compression import CompressionCache
+from cloud_registry.ga4gh.registry.service_info import reconcile_service_info
+
+logger = logging.getLogger(__name__)
+
+ConfigPath = Tuple[str, ...]
+
+# parts of the custom configuration that are read when the app is created;
+# changes to them are kept from the running app until it is restarted
+RESTART_REQUIRED: List[ConfigPath] = [
+    ("storage",),
+    ("tenancy",),
+    ("read_preference",),
+    ("tracing",),
+    ("timing",),
+    ("reload",),
+    ("compression", "enabled"),
+    ("endpoints", "services", "tombstones"),
+    ("endpoints", "services", "deduplication", "enabled"),
+    ("endpoints", "services", "deduplication", "batch_size"),
+    ("endpoints", "services", "deduplication", "interval"),
+    ("endpoints", "services", "write_behind"),
+    ("endpoints", "services", "selection"),
+    ("endpoints", "services", "normalization"),
+]
+
+
+def _reconcile_service_info(app: Flask) -> None:
+    """Register configured service info in the background."""
+    app.extensions.get("service_info_cache", {}).pop(None, None)
+    reconcile_service_info(app)
+
+
+def _reset_auth_caches(app: Flask) -> None:
+    """Replace token validation and key set caches."""
+    app.extensions.pop("token_cache", None)
+    app.extensions.pop("jwks_cache", None)
+    register_auth_cache(app)
+
+
+def _reset_compression_cache(app: Flask) -> None:
+    """Replace cache of compressed responses."""
+    if "compression_cache" in app.extensions:
+        conf = app.config.foca.custom.compression  # type: ignore[attr-defined]
+        app.extensions["compression_cache"] = CompressionCache(
+            max_size=conf.cache_size,
+        )
+
+
+def _update_index_manager(app: Flask) -> None:
+    """Apply index management settings to the running index manager."""
+    manager = app.extensions.get("index_manager")
+    if manager is not None:
+        conf = app.config.foca.custom.indexes  # type: ignore[attr-defined]
+        manager.build_missing = conf.build_missing
+        manager.drop_unexpected = conf.drop_unexpected
+        manager.check_interval = conf.check_interval
+
+
+# actions applying changes to parts of the custom configuration that the app
+# does not read on every request
+HANDLERS: List[Tuple[ConfigPath, Callable[[Flask], None]]] = [
+    (("endpoints", "service"), _reconcile_service_info),
+    (("endpoints", "service_info"), _reconcile_service_info),
+    (("auth_cache",), _reset_auth_caches),
+    (("compression",), _reset_compression_cache),
+    (("indexes",), _update_index_manager),
+]
+
+
+def changed_paths(old: Dict, new: Dict, prefix: ConfigPath = ()) -> List[ConfigPath]:
+    """Find values that differ between two configurations.
+
+    Args:
+        old: Previous configuration.
+        new: Current configuration.
+        prefix: Path of the configurations within the custom configuration.
+
+    Returns:
+        Paths of changed values, recursing into nested sections.
+    """
+    changed: List[ConfigPath] = []
+    for key in sorted(set(old) | set(new)):
+        old_value = old.get(key)
+        new_value = new.get(key)
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            changed.extend(changed_paths(old_value, new_value, prefix + (key,)))
+        elif old_value != new_value:
+            changed.append(prefix + (key,))
+    return changed
+
+
+def _within(path: ConfigPath, section: ConfigPath) -> bool:
+    """Check whether a path lies within a section."""
+    return path[: len(section)] == section
+
+
+def _dotted(path: ConfigPath) -> str:
+    """Format path as in the configuration file."""
+    return ".".join(("custom",) + path)
+
+
+class ConfigWatcher:
+    """Class for reloading the custom configuration when its file changes.
+
+    The configuration file is polled and reloaded once its content changes,
+    which also detects the symlink swaps by which Kubernetes updates mounted
+    ConfigMaps. The validated configuration replaces the app's custom
+    configuration in a single assignment; invalid configurations are logged
+    and ignored. Caches and background jobs depending on changed parts of the
+    configuration are reset or updated, while changes to parts that are only
+    read when the app is created are kept until the app is restarted.
+    """
+
+    def __init__(self, app: Flask, path: Path, interval: float = 10.0) -> None:
+        """Initialize class requirements.
+
+        Args:
+            app: Flask application instance.
+            path: Path to the configuration file.
+            interval: Interval (in seconds) between checks of the file.
+
+        Attributes:
+            app: Flask application instance.
+            path: Absolute path to the configuration file.
+            interval: Interval (in seconds) between checks of the file.
+            reloads: Number of times the configuration was reloaded.
+        """
+        self.app = app
+        self.path = Path(path).resolve()
+        self.interval = interval
+        self.reloads = 0
+        self._digest = self._read()[1]
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> bool:
+        """Reload configuration if the configuration file changed.
+
+        Returns:
+            Whether the configuration was reloaded.
+        """
+        content, digest = self._read()
+        if content is None or digest == self._digest:
+            return False
+        self._digest = digest
+        return self.reload(content)
+
+    def reload(self, content: bytes) -> bool:
+        """Replace custom configuration with the one in the given content.
+
+        Args:
+            content: Content of the configuration file.
+
+        Returns:
+            Whether the configuration was replaced.
+        """
+        foca_conf = self.app.config.foca  # type: ignore[attr-defined]
+        model = type(foca_conf.custom)
+        try:
+            data = yaml.safe_load(content) or {}
+            new = model(**(data.get("custom") or {}))
+        except Exception as e:
+            logger.error(
+                f"Configuration file '{self.path}' not reloaded: "
+                f"{type(e).__name__}: {e}"
+            )
+            return False
+        old_data = foca_conf.custom.dict()
+        new_data = new.dict()
+        changed = changed_paths(old_data, new_data)
+        kept = [
+            section
+            for section in RESTART_REQUIRED
+            if any(_within(path, section) for path in changed)
+        ]
+        for section in kept:
+            *parents, key = section
+            old_parent, new_parent = old_data, new_data
+            for parent in parents:
+                old_parent, new_parent = old_parent[parent], new_parent[parent]
+            new_parent[key] = deepcopy(old_parent[key])
+        if kept:
+            new = model(**new_data)
+            logger.warning(
+                "Changes to "
+                + ", ".join(_dotted(section) for section in kept)
+                + " take effect after restart."
+            )
+        applied = [
+            path
+            for path in changed
+            if not any(_within(path, section) for section in kept)
+        ]
+        if not applied:
+            return False
+        foca_conf.custom = new
+        self.reloads += 1
+        logger.info(
+            "Custom configuration reloaded; changed: "
+            + ", ".join(_dotted(path) for path in applied)
+        )
+        handlers: List[Callable[[Flask], None]] = []
+        for section, handler in HANDLERS:
+            if handler not in handlers and any(
+                _within(path, section) for path in applied
+            ):
+                handlers.append(handler)
+        for handler in handlers:
+            try:
+                handler(self.app)
+            except Exception as e:
+                logger.error(
+                    f"Could not apply reloaded configuration with "
+                    f"'{handler.__name__}': {type(e).__name__}: {e}"
+                )
+        return True
+
+    def start(self) -> None:
+        """Check configuration file periodically in a daemon thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="config-watcher",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info(f"Watching configuration file '{self.path}' for changes.")
+
+    def stop(self) -> None:
+        """Stop checking configuration file."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """Check configuration file until stopped."""
+        while not self._stop.wait(timeout=self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning(
+                    f"Could not check configuration file: {type(e).__name__}: {e}"
+                )
+
+    def _read(self) -> Tuple[Optional[bytes], Optional[str]]:
+        """Read configuration file and compute the digest of its content."""
+        try:
+            content = self.path.read_bytes()
+        except OSError as e:
+            logger.warning(f"Could not read configuration file '{self.path}': {e}")
+            return None, None
+        return content, hashlib.sha256(content).hexdigest()
+
+
+def register_config_reload(app: Flask, path: Optional[Path]) -> None:
+    """Reload custom configuration when the configuration file changes.
+
+    Args:
+        app: Flask application instance.
+        path: Path to the configuration file, or `None` if the app is not
+            configured from a file.
+    """
+    reload_conf = app.config.foca.custom.reload  # type: ignore[attr-defined]
+    if not reload_conf.enabled or path is None:
+        logger.info("Configuration reload disabled.")
+        return
+    watcher = ConfigWatcher(app=app, path=path, interval=reload_conf.interval)
+    app.extensions["config_watcher"] = watcher
+    watcher.start()
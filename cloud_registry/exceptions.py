@@ -7,10 +7,14 @@ from connexion.exceptions import (
     Unauthorized,
     OAuthProblem,
 )
+from pymongo.errors import ExecutionTimeout
 from werkzeug.exceptions import (
     BadRequest,
+    Conflict,
     InternalServerError,
     NotFound,
+    ServiceUnavailable,
+    UnprocessableEntity,
 )
 
 # exceptions raised in app context
@@ -55,11 +59,31 @@ exceptions = {
         "detail": "The requested resource wasn't found.",
         "status": 404,
     },
+    Conflict: {
+        "title": "Conflict",
+        "detail": "The request conflicts with the state of the resource.",
+        "status": 409,
+    },
+    UnprocessableEntity: {
+        "title": "Unprocessable entity",
+        "detail": "The idempotency key was used for a different request.",
+        "status": 422,
+    },
     InternalServerError: {
         "title": "Internal server error",
         "detail": "An unexpected error occurred.",
         "status": 500,
     },
+    ServiceUnavailable: {
+        "title": "Service unavailable",
+        "detail": "The service is temporarily unable to handle the request.",
+        "status": 503,
+    },
+    ExecutionTimeout: {
+        "title": "Service unavailable",
+        "detail": "The query exceeded its time limit.",
+        "status": 503,
+    },
 }
 
 
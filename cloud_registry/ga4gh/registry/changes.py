@@ -0,0 +1,382 @@
+"""Controller for the log of changes to registered services."""
+
+from datetime import datetime, timedelta
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from flask import current_app
+from pymongo import ReturnDocument
+
+from cloud_registry.exceptions import BadRequest
+from cloud_registry.ga4gh.registry.tenancy import get_collection, get_tenant
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeNotifier:
+    """Class for notifying waiting threads of changes to registered services.
+
+    Serves as an in-process event bus between the write controllers and
+    clients waiting for changes. Changes recorded by other processes are
+    picked up by a single poller thread, which checks the database while any
+    client is waiting, so that the database is polled once per process rather
+    than once per waiting client. Each waiting client still blocks a thread
+    of the server; serve the app with an asynchronous worker (see the
+    `wsgi.server` setting) to keep many clients waiting.
+    """
+
+    def __init__(
+        self,
+        poll: Optional[Callable[[], int]] = None,
+        poll_interval: float = 1.0,
+    ) -> None:
+        """Initialize notifier.
+
+        Args:
+            poll: Function returning the latest revision recorded by any
+                process, or `None` if the database is not polled.
+            poll_interval: Interval (in seconds) at which the database is
+                polled while clients are waiting.
+
+        Attributes:
+            revision: Latest revision known to the notifier.
+            poll: Function returning the latest revision recorded by any
+                process, or `None` if the database is not polled.
+            poll_interval: Interval (in seconds) at which the database is
+                polled while clients are waiting.
+        """
+        self.revision = 0
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._waiters = 0
+        self._poller: Optional[threading.Thread] = None
+
+    def notify(self, revision: int) -> None:
+        """Wake up waiting threads.
+
+        Args:
+            revision: Revision of the recorded change.
+        """
+        with self._condition:
+            if revision > self.revision:
+                self.revision = revision
+                self._condition.notify_all()
+
+    def wait(self, revision: int, timeout: float) -> bool:
+        """Block until a change later than a given revision is known.
+
+        Args:
+            revision: Revision the caller is up to date with.
+            timeout: Maximum time (in seconds) to wait.
+
+        Returns:
+            Whether a later revision is known.
+        """
+        with self._condition:
+            self._waiters += 1
+            self._start_poller()
+            try:
+                return self._condition.wait_for(
+                    lambda: self.revision > revision,
+                    timeout=timeout,
+                )
+            finally:
+                self._waiters -= 1
+
+    def _start_poller(self) -> None:
+        """Start polling the database unless a poller is running already.
+
+        Must be called while holding the condition's lock.
+        """
+        if self.poll is None or self._poller is not None:
+            return
+        self._poller = threading.Thread(
+            target=self._run_poller,
+            name="change-poller",
+            daemon=True,
+        )
+        self._poller.start()
+
+    def _run_poller(self) -> None:
+        """Poll the database for changes while clients are waiting."""
+        while True:
+            with self._condition:
+                if not self._waiters:
+                    self._poller = None
+                    return
+            try:
+                self.notify(self.poll())  # type: ignore[misc]
+            except Exception as e:
+                logger.warning(f"Could not poll changes: {type(e).__name__}: {e}")
+            time.sleep(self.poll_interval)
+
+
+class ChangeLog:
+    """Class for recording and listing changes to registered services.
+
+    Every write to the `services` collection is recorded with a monotonically
+    increasing revision. Clients hold on to the latest revision they have seen
+    and use it as a token to fetch only subsequent changes. Entries are expired
+    by the database (e.g., via a TTL index); clients holding a token that
+    predates the oldest retained entry are asked to resynchronize.
+
+    Revisions are allocated before their entries are inserted, so entries of
+    concurrent writes may become visible out of order. Changes are therefore
+    only listed up to the first missing revision, so that clients do not skip
+    changes that are still being recorded. Revisions missing for longer than
+    the configured gap timeout, e.g., because the recording process exited,
+    are skipped.
+
+    Changes are not recorded if no `service_changes` collection is configured.
+
+    Clients may wait for changes, either by long-polling or by subscribing to
+    a stream of server-sent events. Waiting clients are woken up by the app's
+    `ChangeNotifier` when this process records a change, or when its poller
+    finds changes recorded by other processes.
+    """
+
+    sequence_id = "sequence"
+
+    def __init__(self) -> None:
+        """Initialize class requirements.
+
+        Attributes:
+            limit: Maximum number of changes returned per request.
+            max_wait: Maximum time (in seconds) a client may wait for changes.
+            poll_interval: Interval (in seconds) at which the database is
+                checked for changes recorded by other processes while clients
+                are waiting.
+            heartbeat: Interval (in seconds) at which comments are sent to
+                subscribers of the event stream while no changes occur.
+            gap_timeout: Time (in seconds) after which missing revisions are
+                skipped.
+            notifier: The app's notifier of changes of the current tenant.
+            collection: Database collection storing change entries of the
+                current tenant, or `None` if change tracking is not configured.
+        """
+        foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+        changes_conf = foca_conf.custom.endpoints.services.changes
+        self.limit = changes_conf.limit
+        self.max_wait = changes_conf.max_wait
+        self.poll_interval = changes_conf.poll_interval
+        self.heartbeat = changes_conf.heartbeat
+        self.gap_timeout = changes_conf.gap_timeout
+        self.collection = get_collection("service_changes")
+        notifiers: Dict[
+            Optional[str], ChangeNotifier
+        ] = current_app.extensions.setdefault("change_notifiers", {})
+        tenant = get_tenant()
+        if tenant not in notifiers:
+            notifiers[tenant] = ChangeNotifier(
+                poll=None if self.collection is None else self._current_revision,
+                poll_interval=self.poll_interval,
+            )
+        self.notifier = notifiers[tenant]
+
+    def record(self, operation: str, id: str) -> Optional[int]:
+        """Record change to a service.
+
+        Args:
+            operation: One of `insert`, `replace` or `delete`.
+            id: Identifier of changed service.
+
+        Returns:
+            Revision of the change, or `None` if changes are not tracked.
+        """
+        if self.collection is None:
+            return None
+        revision = self._next_revision()
+        self.collection.insert_one(
+            document={
+                "revision": revision,
+                "operation": operation,
+                "id": id,
+                "timestamp": datetime.utcnow(),
+            }
+        )
+        logger.debug(f"Recorded change {revision}: {operation} '{id}'.")
+        self.notifier.notify(revision)
+        return revision
+
+    def get_changes(
+        self,
+        since: Optional[str] = None,
+        limit: Optional[int] = None,
+        wait: Optional[int] = None,
+    ) -> Dict:
+        """List changes recorded after a given revision.
+
+        Args:
+            since: Token holding the revision after which changes are listed.
+                If not provided, or if changes are not tracked, no changes are
+                listed and the client is asked to resynchronize.
+            limit: Maximum number of changes to list. Capped at the configured
+                limit.
+            wait: Maximum time (in seconds) to wait for changes if there are
+                none yet. Capped at the configured maximum.
+
+        Returns:
+            Changes, the token to pass in the next request and whether the
+            client needs to resynchronize its full copy of the registry.
+
+        Raises:
+            cloud_registry.exceptions.BadRequest: Token is malformed.
+        """
+        head = self._current_revision()
+        if since is None or self.collection is None:
+            return self._response(changes=[], next=head, resync_required=True)
+        try:
+            revision = int(since)
+        except ValueError:
+            logger.error(f"Invalid change token: {since}")
+            raise BadRequest
+        if revision > head or revision < 0 or self._expired(revision, head):
+            return self._response(changes=[], next=head, resync_required=True)
+        max_changes = self.limit if limit is None else min(limit, self.limit)
+        changes = self._find_changes(revision=revision, limit=max_changes)
+        if not changes and wait:
+            if self.wait_for_changes(revision, min(wait, self.max_wait)):
+                changes = self._find_changes(revision=revision, limit=max_changes)
+        return self._response(
+            changes=changes,
+            next=changes[-1]["revision"] if changes else revision,
+            resync_required=False,
+        )
+
+    def stream(self, since: Optional[str] = None) -> Iterator[str]:
+        """Stream changes as server-sent events.
+
+        Emits one event per change, with the change's revision as the event
+        identifier and its operation as the event type. If changes were missed,
+        a `resync` event carrying the current token is emitted instead and
+        streaming continues from there; if changes are not tracked, the stream
+        ends after the `resync` event. Comments are sent as heartbeats while no
+        changes occur.
+
+        Args:
+            since: Token holding the revision after which changes are streamed.
+
+        Returns:
+            Iterator over server-sent events.
+
+        Raises:
+            cloud_registry.exceptions.BadRequest: Token is malformed.
+        """
+        res = self.get_changes(since=since)
+
+        def _events(res: Dict) -> Iterator[str]:
+            while True:
+                if res["resync_required"]:
+                    yield self._event(
+                        id=res["next"],
+                        event="resync",
+                        data={"next": res["next"]},
+                    )
+                    if self.collection is None:
+                        return
+                for change in res["changes"]:
+                    yield self._event(
+                        id=str(change["revision"]),
+                        event=change["operation"],
+                        data=change,
+                    )
+                if len(res["changes"]) < self.limit and not self.wait_for_changes(
+                    int(res["next"]), self.heartbeat
+                ):
+                    yield ": heartbeat\n\n"
+                res = self.get_changes(since=res["next"])
+
+        return _events(res)
+
+    def wait_for_changes(self, revision: int, timeout: float) -> bool:
+        """Block until the change following a given revision was recorded.
+
+        Args:
+            revision: Revision the caller is up to date with.
+            timeout: Maximum time (in seconds) to wait.
+
+        Returns:
+            Whether the following change can be listed.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if not self.notifier.wait(revision, remaining):
+                return False
+            if self._find_changes(revision=revision, limit=1):
+                return True
+            # a later change was recorded, but a preceding one is missing
+            time.sleep(min(remaining, self.poll_interval))
+
+    def _find_changes(self, revision: int, limit: int) -> List[Dict]:
+        """List changes recorded after a given revision, up to the first
+        missing revision.
+        """
+        entries = self.collection.find(  # type: ignore[union-attr]
+            filter={"revision": {"$gt": revision}},
+            projection={"_id": False},
+            sort=[("revision", 1)],
+            limit=limit,
+        )
+        stale = datetime.utcnow() - timedelta(seconds=self.gap_timeout)
+        changes: List[Dict] = []
+        for change in entries:
+            expected = changes[-1]["revision"] + 1 if changes else revision + 1
+            if change["revision"] != expected:
+                if change["timestamp"] > stale:
+                    break
+                logger.warning(
+                    f"Skipping missing revisions {expected} to "
+                    f"{change['revision'] - 1} of change log."
+                )
+            changes.append(change)
+        for change in changes:
+            change["timestamp"] = change["timestamp"].isoformat() + "Z"
+        return changes
+
+    def _expired(self, revision: int, head: int) -> bool:
+        """Whether changes after a revision may have been removed already."""
+        if revision == head:
+            return False
+        oldest = self.collection.find_one(  # type: ignore[union-attr]
+            filter={"revision": {"$exists": True}},
+            sort=[("revision", 1)],
+        )
+        return oldest is None or oldest["revision"] > revision + 1
+
+    def _current_revision(self) -> int:
+        """Return revision of latest change."""
+        if self.collection is None:
+            return 0
+        sequence = self.collection.find_one({"_id": self.sequence_id})
+        return 0 if sequence is None else sequence["value"]
+
+    def _next_revision(self) -> int:
+        """Atomically increment and return revision counter."""
+        sequence = self.collection.find_one_and_update(  # type: ignore[union-attr]
+            filter={"_id": self.sequence_id},
+            update={"$inc": {"value": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return sequence["value"]
+
+    @staticmethod
+    def _event(id: str, event: str, data: Dict) -> str:
+        """Format server-sent event."""
+        return f"id: {id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+    @staticmethod
+    def _response(changes: List[Dict], next: int, resync_required: bool) -> Dict:
+        """Build response object."""
+        return {
+            "changes": changes,
+            "next": str(next),
+            "resync_required": resync_required,
+        }
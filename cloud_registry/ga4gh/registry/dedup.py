@@ -0,0 +1,256 @@
+"""Detection and collapsing of services registered more than once."""
+
+from datetime import datetime
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from flask import current_app
+from pymongo.collection import Collection
+
+from cloud_registry.ga4gh.registry.changes import ChangeLog
+from cloud_registry.ga4gh.registry.normalization import denormalize
+from cloud_registry.ga4gh.registry.quota import ServiceQuota
+from cloud_registry.ga4gh.registry.tenancy import list_tenant_collections, set_tenant
+
+logger = logging.getLogger(__name__)
+
+# field storing the content hash of services
+CONTENT_HASH_FIELD = "_content_hash"
+
+# field storing the content hash of services that must not be duplicated;
+# unique among services that are not deleted
+UNIQUE_HASH_FIELD = "_unique_content_hash"
+
+# field marking services registered with an auto-generated identifier
+GENERATED_ID_FIELD = "_generated_id"
+
+# handling of services registered with the content of an existing service
+DUPLICATE_POLICIES = ["allow", "return_existing", "reject"]
+
+# ports implied by URL schemes
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """Normalize URL, so that equivalent URLs are equal.
+
+    Scheme and host are lowercased, default ports, trailing slashes of the
+    path and fragments are removed, and query parameters are sorted.
+
+    Args:
+        url: URL of a service.
+
+    Returns:
+        Normalized URL.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    if ":" in host:
+        host = f"[{host}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path.rstrip("/"), query, ""))
+
+
+def content_hash(data: Dict) -> str:
+    """Compute content hash identifying a service independently of its id.
+
+    Services are considered the same if their normalized URLs and their
+    types are equal.
+
+    Args:
+        data: Service metadata.
+
+    Returns:
+        Hex digest of the SHA-256 hash of the normalized URL and type.
+    """
+    canonical = json.dumps(
+        {"url": normalize_url(data.get("url") or ""), "type": data.get("type")},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class DuplicateCompaction:
+    """Class for collapsing services registered more than once.
+
+    Services registered with the content of an existing service, e.g., before
+    duplicates were detected or while the policy allowed them, are collapsed
+    into the earliest registration: the other registrations are deleted,
+    i.e., turned into tombstones that are recorded in the change log and
+    purged by the tombstone compaction job. Only services registered with an
+    auto-generated identifier are deleted, as clients chose the identifiers
+    of the others. Services stored without a content hash are hashed first.
+    Both steps run in batches, either on demand or periodically by a
+    background thread, over the collections of all tenants.
+    """
+
+    def __init__(self) -> None:
+        """Initialize class requirements.
+
+        Attributes:
+            enabled: Whether duplicates are collapsed periodically.
+            batch_size: Maximum number of services hashed or scanned for
+                duplicates per batch.
+            interval: Interval (in seconds) between periodic runs.
+            collection: Database collection storing service objects of the
+                default tenant.
+        """
+        foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+        dedup_conf = foca_conf.custom.endpoints.services.deduplication
+        self.enabled = dedup_conf.enabled
+        self.batch_size = dedup_conf.batch_size
+        self.interval = dedup_conf.interval
+        self.collection = (
+            foca_conf.db.dbs["serviceStore"].collections["services"].client
+        )
+        self._app = current_app._get_current_object()  # type: ignore[attr-defined]
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def collapse(self) -> int:
+        """Collapse services with the same content into the earliest one.
+
+        Returns:
+            Number of deleted duplicates.
+        """
+        collapsed = 0
+        for collection in list_tenant_collections(self.collection):
+            tenant = collection.name[len(self.collection.name) + 1 :] or None
+            with self._app.app_context():
+                set_tenant(tenant)
+                self.backfill(collection)
+                collapsed += self._collapse(collection)
+        if collapsed:
+            logger.info(f"Collapsed {collapsed} duplicate services.")
+        return collapsed
+
+    def backfill(self, collection: Collection) -> int:
+        """Store content hashes for services registered without one.
+
+        Args:
+            collection: Database collection storing service objects.
+
+        Returns:
+            Number of updated services.
+        """
+        missing = {CONTENT_HASH_FIELD: {"$exists": False}}
+        count = 0
+        while not self._stop.is_set():
+            docs = denormalize(
+                collection.find(
+                    filter=missing,
+                    projection={"_id": True, "url": True, "type": True, "_type": True},
+                    limit=self.batch_size,
+                )
+            )
+            if not docs:
+                break
+            for doc in docs:
+                collection.update_one(
+                    filter={"_id": doc["_id"]},
+                    update={"$set": {CONTENT_HASH_FIELD: content_hash(doc)}},
+                )
+            count += len(docs)
+        if count:
+            logger.info(f"Stored content hashes for {count} services.")
+        return count
+
+    def _collapse(self, collection: Collection) -> int:
+        """Delete services with auto-generated identifiers duplicating the
+        earliest service of their content hash.
+        """
+        changes = ChangeLog()
+        quota = ServiceQuota()
+        collapsed = 0
+        last: Optional[str] = None
+        while not self._stop.is_set():
+            hashed: Dict[str, Any] = (
+                {"$exists": True} if last is None else {"$gt": last}
+            )
+            docs = list(
+                collection.find(
+                    filter={CONTENT_HASH_FIELD: hashed, "_deleted_at": None},
+                    projection={"_id": True, "id": True, CONTENT_HASH_FIELD: True},
+                    sort=[(CONTENT_HASH_FIELD, 1), ("_id", 1)],
+                    limit=self.batch_size,
+                )
+            )
+            if not docs:
+                break
+            groups: Dict[str, List[Dict]] = {}
+            for doc in docs:
+                groups.setdefault(doc[CONTENT_HASH_FIELD], []).append(doc)
+            for digest, group in groups.items():
+                # the earliest service of a group spanning batches is in this
+                # batch, but later ones may not be
+                if len(group) == 1 and digest != docs[-1][CONTENT_HASH_FIELD]:
+                    continue
+                for doc in collection.find(
+                    filter={
+                        CONTENT_HASH_FIELD: digest,
+                        "_id": {"$ne": group[0]["_id"]},
+                        "_deleted_at": None,
+                        GENERATED_ID_FIELD: True,
+                    },
+                    projection={"_id": True, "id": True},
+                ):
+                    res = collection.update_one(
+                        filter={"_id": doc["_id"], "_deleted_at": None},
+                        update={
+                            "$set": {"_deleted_at": datetime.utcnow()},
+                            "$unset": {UNIQUE_HASH_FIELD: ""},
+                        },
+                    )
+                    if res.modified_count:
+                        quota.release()
+                        changes.record(operation="delete", id=doc["id"])
+                        collapsed += 1
+                        logger.info(
+                            f"Deleted service '{doc['id']}' duplicating "
+                            f"'{group[0]['id']}'."
+                        )
+            last = docs[-1][CONTENT_HASH_FIELD]
+        return collapsed
+
+    def start(self) -> None:
+        """Start collapsing duplicates periodically in a daemon thread."""
+        if not self.enabled:
+            logger.info("Duplicate compaction disabled.")
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="duplicate-compaction",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info(f"Duplicate compaction scheduled every {self.interval}s.")
+
+    def stop(self) -> None:
+        """Stop collapsing duplicates periodically."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """Collapse duplicates until stopped."""
+        while not self._stop.wait(timeout=self.interval):
+            try:
+                self.collapse()
+            except Exception as e:
+                logger.warning(
+                    f"Could not collapse duplicates: {type(e).__name__}: {e}"
+                )
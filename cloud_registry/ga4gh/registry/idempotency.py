@@ -0,0 +1,194 @@
+"""Idempotency keys for safely retrying the registration of services."""
+
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, Optional
+from uuid import uuid4
+
+from flask import current_app
+from pymongo.errors import DuplicateKeyError
+
+from cloud_registry.exceptions import Conflict, UnprocessableEntity
+from cloud_registry.ga4gh.registry.tenancy import get_collection
+
+logger = logging.getLogger(__name__)
+
+# request header holding the idempotency key
+HEADER = "Idempotency-Key"
+
+# response header marking responses replayed from the store
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def fingerprint(payload: Dict) -> str:
+    """Compute fingerprint of a request payload.
+
+    Args:
+        payload: Request payload.
+
+    Returns:
+        SHA-256 digest of the payload in canonical JSON form, so that the
+        order of keys does not matter.
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class IdempotencyKeys:
+    """Class for storing responses to requests under idempotency keys.
+
+    Clients retrying a request after a timeout send the same key with every
+    attempt. The first request claims the key by inserting a pending entry,
+    which is atomic thanks to a unique index on the key, and stores its
+    response once it completes. Retries are answered with the stored response
+    without registering the service again. Retries arriving while the first
+    request is still being processed wait for its response; claims abandoned
+    by crashed processes are taken over after a timeout. Claims record their
+    owner, so that a slow request whose claim was taken over neither stores
+    its response under nor releases the new claim. Keys are scoped to
+    the tenant and expire after the configured time via a TTL index on
+    `expires_at`.
+
+    Keys are ignored if no `service_idempotency_keys` collection is
+    configured.
+    """
+
+    def __init__(self) -> None:
+        """Initialize class requirements.
+
+        Attributes:
+            ttl: Time (in seconds) for which responses are stored.
+            wait: Maximum time (in seconds) a retry waits for the response to a
+                request with the same key that is still being processed.
+            poll_interval: Interval (in seconds) at which waiting retries check
+                for the response.
+            lock_timeout: Time (in seconds) after which a claim on a key that
+                has no response yet is considered abandoned.
+            collection: Database collection storing idempotency keys of the
+                current tenant, or `None` if keys are not supported.
+            owner: Random token identifying the claims of this instance.
+        """
+        foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+        idempotency_conf = foca_conf.custom.endpoints.services.idempotency
+        self.ttl = idempotency_conf.ttl
+        self.wait = idempotency_conf.wait
+        self.poll_interval = idempotency_conf.poll_interval
+        self.lock_timeout = idempotency_conf.lock_timeout
+        self.collection = get_collection("service_idempotency_keys")
+        self.owner = uuid4().hex
+
+    def claim(self, key: str, payload: Dict) -> Optional[Dict]:
+        """Claim idempotency key for a request, or get the stored response.
+
+        Args:
+            key: Idempotency key sent by the client.
+            payload: Request payload.
+
+        Returns:
+            Response stored for a previous request with the same key, or
+            `None` if the key was claimed for this request (or keys are not
+            supported) and the request is to be processed.
+
+        Raises:
+            cloud_registry.exceptions.Conflict: A request with the same key is
+                still being processed.
+            cloud_registry.exceptions.UnprocessableEntity: The key was used
+                for a request with a different payload.
+        """
+        if self.collection is None:
+            return None
+        digest = fingerprint(payload)
+        deadline = time.monotonic() + self.wait
+        while True:
+            now = datetime.utcnow()
+            try:
+                self.collection.insert_one(
+                    document={
+                        "key": key,
+                        "owner": self.owner,
+                        "fingerprint": digest,
+                        "response": None,
+                        "created_at": now,
+                        "expires_at": now + timedelta(seconds=self.ttl),
+                    }
+                )
+            except DuplicateKeyError:
+                pass
+            else:
+                return None
+            entry = self.collection.find_one(filter={"key": key})
+            if entry is None:
+                # removed in the meantime, e.g., released after a failure
+                continue
+            if entry["expires_at"] <= now:
+                # not purged by the TTL monitor yet
+                if self._take_over(entry, digest, now):
+                    return None
+                continue
+            if entry["fingerprint"] != digest:
+                logger.warning(f"Idempotency key '{key}' reused for other payload.")
+                raise UnprocessableEntity
+            if entry["response"] is not None:
+                logger.info(f"Replaying response for idempotency key '{key}'.")
+                return entry["response"]
+            if entry["created_at"] + timedelta(seconds=self.lock_timeout) <= now:
+                logger.warning(f"Taking over abandoned idempotency key '{key}'.")
+                if self._take_over(entry, digest, now):
+                    return None
+                continue
+            if time.monotonic() >= deadline:
+                logger.warning(f"Request with idempotency key '{key}' in progress.")
+                raise Conflict
+            time.sleep(self.poll_interval)
+
+    def store(self, key: str, response: Dict) -> None:
+        """Store response to the request holding the claim on a key.
+
+        The response is not stored if the claim was taken over by another
+        request in the meantime.
+
+        Args:
+            key: Idempotency key sent by the client.
+            response: Response body, status code and headers.
+        """
+        if self.collection is None:
+            return
+        result = self.collection.update_one(
+            filter={"key": key, "owner": self.owner},
+            update={"$set": {"response": response}},
+        )
+        if not result.matched_count:
+            logger.warning(f"Claim on idempotency key '{key}' was taken over.")
+
+    def release(self, key: str) -> None:
+        """Release claim on a key after the request failed.
+
+        The request may then be retried with the same key. Claims taken over
+        by another request are not released.
+
+        Args:
+            key: Idempotency key sent by the client.
+        """
+        if self.collection is None:
+            return
+        self.collection.delete_many(
+            filter={"key": key, "owner": self.owner, "response": None}
+        )
+
+    def _take_over(self, entry: Dict, digest: str, now: datetime) -> bool:
+        """Claim key of an expired or abandoned entry, unless raced."""
+        result = self.collection.replace_one(  # type: ignore[union-attr]
+            filter={"key": entry["key"], "created_at": entry["created_at"]},
+            replacement={
+                "key": entry["key"],
+                "owner": self.owner,
+                "fingerprint": digest,
+                "response": None,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=self.ttl),
+            },
+        )
+        return bool(result.modified_count)
@@ -0,0 +1,382 @@
+"""Generation of service identifiers."""
+
+from abc import ABC, abstractmethod
+import ast
+import logging
+import random
+import string
+import threading
+import time
+from typing import Callable, List, Optional
+
+from flask import Flask, current_app
+from pymongo import ReturnDocument
+from pymongo.collection import Collection
+
+from cloud_registry.exceptions import InternalServerError
+
+logger = logging.getLogger(__name__)
+
+# constants of the `string` module that charset expressions may refer to
+CHARSET_CONSTANTS = {
+    name: getattr(string, name)
+    for name in [
+        "ascii_letters",
+        "ascii_lowercase",
+        "ascii_uppercase",
+        "digits",
+        "hexdigits",
+        "octdigits",
+        "punctuation",
+    ]
+}
+
+# bits of the millisecond timestamps of time-ordered identifiers, as in ULIDs
+TIMESTAMP_BITS = 48
+
+# minimum number of random characters following the timestamp of time-ordered
+# identifiers
+MIN_RANDOM_LENGTH = 4
+
+# available generation strategies
+STRATEGIES = ["random", "time_ordered", "sequential_block"]
+
+_lock = threading.Lock()
+
+
+def parse_charset(charset: str) -> str:
+    """Resolve character set of service identifiers.
+
+    Expressions concatenating constants of the `string` module and string
+    literals with `+`, such as `string.ascii_uppercase + string.digits`, are
+    resolved without evaluating them; any other value is taken literally.
+
+    Args:
+        charset: A string of allowed characters or an expression resolving to
+            a string of allowed characters.
+
+    Returns:
+        Allowed characters, without duplicates and sorted, so that the order
+        of identifiers follows the order of the values they encode.
+
+    Raises:
+        ValueError: The expression refers to an unknown constant, or the
+            character set is empty.
+    """
+    try:
+        node: Optional[ast.AST] = ast.parse(charset.strip(), mode="eval").body
+    except SyntaxError:
+        node = None
+    resolved = None if node is None else _resolve(node)
+    if resolved is None and node is not None and _refers_to_string(node):
+        raise ValueError(f"Unsupported charset expression: {charset}")
+    chars = "".join(sorted(set(charset if resolved is None else resolved)))
+    if not chars:
+        raise ValueError("Charset of service identifiers is empty.")
+    return chars
+
+
+def _resolve(node: ast.AST) -> Optional[str]:
+    """Resolve charset expression, or return `None` if not supported."""
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left = _resolve(node.left)
+        right = _resolve(node.right)
+        return None if left is None or right is None else left + right
+    if (
+        isinstance(node, ast.Attribute)
+        and isinstance(node.value, ast.Name)
+        and node.value.id == "string"
+    ):
+        return CHARSET_CONSTANTS.get(node.attr)
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def _refers_to_string(node: ast.AST) -> bool:
+    """Check whether an expression refers to the `string` module."""
+    return any(
+        isinstance(child, ast.Name) and child.id == "string" for child in ast.walk(node)
+    )
+
+
+def encode(value: int, charset: str, length: int) -> str:
+    """Encode number with a character set, padded to a fixed length.
+
+    Args:
+        value: Non-negative number.
+        charset: Characters representing the digits, in ascending order.
+        length: Number of characters.
+
+    Returns:
+        Encoded number.
+
+    Raises:
+        ValueError: The number cannot be encoded in `length` characters.
+    """
+    base = len(charset)
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, base)
+        chars.append(charset[digit])
+    if value:
+        raise ValueError(f"Value exceeds {length} characters.")
+    return "".join(reversed(chars))
+
+
+class IdGenerator(ABC):
+    """Base class of service identifier generators."""
+
+    def __init__(self, charset: str, length: int) -> None:
+        """Initialize class requirements.
+
+        Args:
+            charset: Allowed characters, in ascending order.
+            length: Length of identifiers.
+
+        Attributes:
+            charset: Allowed characters, in ascending order.
+            length: Length of identifiers.
+        """
+        self.charset = charset
+        self.length = length
+
+    @abstractmethod
+    def generate(self) -> str:
+        """Generate service identifier.
+
+        Returns:
+            Service identifier.
+        """
+
+
+class RandomIdGenerator(IdGenerator):
+    """Generator of random identifiers.
+
+    Identifiers may collide with existing ones, in which case registration is
+    retried with a new identifier.
+    """
+
+    def generate(self) -> str:
+        """Generate random service identifier.
+
+        Returns:
+            Service identifier.
+        """
+        return "".join(random.choices(self.charset, k=self.length))
+
+
+class TimeOrderedIdGenerator(IdGenerator):
+    """Generator of identifiers sorted by their time of creation.
+
+    Like ULIDs, identifiers start with the time of creation in milliseconds,
+    followed by random characters. Identifiers created in the same millisecond
+    increment the random characters of the previous one, so that identifiers
+    of a process are strictly increasing. New identifiers are appended to the
+    end of the `id` index instead of being scattered across it.
+    """
+
+    def __init__(
+        self,
+        charset: str,
+        length: int,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Initialize class requirements.
+
+        Args:
+            charset: Allowed characters, in ascending order.
+            length: Length of identifiers.
+            clock: Function returning the current time (in seconds).
+
+        Attributes:
+            charset: Allowed characters, in ascending order.
+            length: Length of identifiers.
+            clock: Function returning the current time (in seconds).
+            timestamp_length: Number of characters encoding the timestamp.
+
+        Raises:
+            ValueError: The charset has less than two characters, or the
+                length leaves too few random characters.
+        """
+        super().__init__(charset=charset, length=length)
+        self.clock = clock
+        if len(charset) < 2:
+            raise ValueError("Time-ordered identifiers need at least two characters.")
+        self.timestamp_length = 1
+        while len(charset) ** self.timestamp_length < 2**TIMESTAMP_BITS:
+            self.timestamp_length += 1
+        if length - self.timestamp_length < MIN_RANDOM_LENGTH:
+            raise ValueError(
+                "Time-ordered identifiers need a length of at least "
+                f"{self.timestamp_length + MIN_RANDOM_LENGTH} for charset "
+                f"'{charset}'."
+            )
+        self._last_ms = -1
+        self._random: List[int] = []
+        self._lock = threading.Lock()
+
+    def generate(self) -> str:
+        """Generate time-ordered service identifier.
+
+        Returns:
+            Service identifier.
+        """
+        base = len(self.charset)
+        random_length = self.length - self.timestamp_length
+        with self._lock:
+            ms = int(self.clock() * 1000)
+            if ms > self._last_ms:
+                self._last_ms = ms
+                self._random = [random.randrange(base) for _ in range(random_length)]
+            else:
+                # same millisecond, or the clock went backwards
+                for i in reversed(range(random_length)):
+                    self._random[i] = (self._random[i] + 1) % base
+                    if self._random[i]:
+                        break
+                else:
+                    self._last_ms += 1
+            timestamp = encode(self._last_ms, self.charset, self.timestamp_length)
+            return timestamp + "".join(self.charset[i] for i in self._random)
+
+
+class SequentialBlockIdGenerator(IdGenerator):
+    """Generator of sequential identifiers, reserved in blocks.
+
+    Blocks of sequence numbers are reserved atomically from a counter in the
+    database, so that processes never hand out the same identifier, and the
+    database is only written to once per block. Identifiers are the sequence
+    numbers encoded with the charset; they are short and never collide with
+    each other, but reveal how many services were registered.
+    """
+
+    def __init__(
+        self,
+        charset: str,
+        length: int,
+        collection: Collection,
+        block_size: int = 1000,
+    ) -> None:
+        """Initialize class requirements.
+
+        Args:
+            charset: Allowed characters, in ascending order.
+            length: Length of identifiers.
+            collection: Database collection storing the counter.
+            block_size: Number of identifiers reserved at once.
+
+        Attributes:
+            charset: Allowed characters, in ascending order.
+            length: Length of identifiers.
+            collection: Database collection storing the counter.
+            block_size: Number of identifiers reserved at once.
+        """
+        super().__init__(charset=charset, length=length)
+        self.collection = collection
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def generate(self) -> str:
+        """Generate next service identifier of the reserved block.
+
+        Returns:
+            Service identifier.
+
+        Raises:
+            cloud_registry.exceptions.InternalServerError: All identifiers of
+                the configured length were handed out.
+        """
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve()
+            value = self._next
+            self._next += 1
+        try:
+            return encode(value, self.charset, self.length)
+        except ValueError:
+            logger.error(f"All identifiers of length {self.length} handed out.")
+            raise InternalServerError
+
+    def _reserve(self) -> None:
+        """Reserve next block of sequence numbers."""
+        counter = self.collection.find_one_and_update(
+            filter={"_id": "services"},
+            update={"$inc": {"next": self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._end = counter["next"]
+        self._next = self._end - self.block_size
+        logger.debug(f"Reserved identifiers {self._next} to {self._end - 1}.")
+
+
+def create_id_generator(app: Flask) -> IdGenerator:
+    """Create service identifier generator as configured.
+
+    Args:
+        app: Flask application instance.
+
+    Returns:
+        Service identifier generator.
+
+    Raises:
+        ValueError: The strategy is unknown, or the configuration is not
+            supported by the strategy.
+    """
+    foca_conf = app.config.foca  # type: ignore[attr-defined]
+    id_conf = foca_conf.custom.endpoints.services.id
+    if id_conf.strategy == "random":
+        return RandomIdGenerator(charset=id_conf.charset, length=id_conf.length)
+    if id_conf.strategy == "time_ordered":
+        return TimeOrderedIdGenerator(charset=id_conf.charset, length=id_conf.length)
+    if id_conf.strategy == "sequential_block":
+        coll_conf = foca_conf.db.dbs["serviceStore"].collections.get("service_ids")
+        if coll_conf is None:
+            raise ValueError("Collection 'service_ids' not configured.")
+        return SequentialBlockIdGenerator(
+            charset=id_conf.charset,
+            length=id_conf.length,
+            collection=coll_conf.client,
+            block_size=id_conf.block_size,
+        )
+    raise ValueError(
+        f"Unknown identifier strategy '{id_conf.strategy}'; expected one of: "
+        f"{STRATEGIES}"
+    )
+
+
+def get_id_generator() -> IdGenerator:
+    """Get service identifier generator of the app.
+
+    The generator is created on first use and recreated if the configuration
+    of identifiers was reloaded.
+
+    Returns:
+        Service identifier generator.
+    """
+    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+    id_conf = foca_conf.custom.endpoints.services.id
+    with _lock:
+        conf, generator = current_app.extensions.get("id_generator", (None, None))
+        if generator is None or conf != id_conf:
+            generator = create_id_generator(current_app)
+            current_app.extensions["id_generator"] = (id_conf.copy(), generator)
+    return generator
+
+
+def register_id_generator(app: Flask) -> None:
+    """Create service identifier generator, validating its configuration.
+
+    Args:
+        app: Flask application instance.
+
+    Raises:
+        ValueError: The strategy is unknown, or the configuration is not
+            supported by the strategy.
+    """
+    with app.app_context():
+        generator = get_id_generator()
+    logger.info(f"Service identifiers generated by '{type(generator).__name__}'.")
@@ -0,0 +1,381 @@
+"""Background builds of service store indexes and detection of index drift."""
+
+from contextlib import contextmanager
+from datetime import datetime
+import logging
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from flask import Flask, current_app
+from foca.models.config import MongoConfig
+from pymongo import helpers
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from cloud_registry.ga4gh.registry.tenancy import list_tenant_collections
+
+logger = logging.getLogger(__name__)
+
+# index options compared with the configuration to detect changed indexes
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+# states of indexes that differ from the configuration
+DRIFT = {"missing", "mismatched", "unexpected", "failed"}
+
+IndexSpec = Tuple[List[Tuple], Dict]
+
+
+def index_name(keys: List[Tuple], options: Dict) -> str:
+    """Get name of an index.
+
+    Args:
+        keys: Fields and directions of the index.
+        options: Options of the index.
+
+    Returns:
+        Configured name of the index, or the name MongoDB derives from its
+        keys.
+    """
+    return options.get("name") or helpers._gen_index_name(keys)
+
+
+def build_progress(ops: List[Dict]) -> Dict[Tuple[str, str], Dict]:
+    """Get progress of index builds from in-progress operations.
+
+    Args:
+        ops: Operations reported by the `currentOp` command.
+
+    Returns:
+        Number of documents processed (`done`) out of all documents
+        (`total`), keyed by collection and index name.
+    """
+    progress: Dict[Tuple[str, str], Dict] = {}
+    for op in ops:
+        command = op.get("command") or {}
+        collection = command.get("createIndexes")
+        if collection is None or not op.get("progress"):
+            continue
+        for index in command.get("indexes", []):
+            progress[(collection, index.get("name"))] = {
+                "done": op["progress"].get("done"),
+                "total": op["progress"].get("total"),
+            }
+    return progress
+
+
+@contextmanager
+def deferred_index_builds(conf: Optional[MongoConfig]) -> Iterator[None]:
+    """Keep FOCA from dropping and recreating indexes while creating the app.
+
+    Indexes are removed from the configuration while the app is created and
+    restored afterwards. Unique indexes are then created right away, if they
+    do not exist, as registrations rely on them to reject duplicates; other
+    indexes are built by the index manager.
+
+    Args:
+        conf: Database configuration, or `None` if MongoDB is not used.
+    """
+    detached: Dict[Tuple[str, str], Optional[List]] = {}
+    dbs = {} if conf is None else conf.dbs or {}
+    for db_name, db_conf in dbs.items():
+        for coll_name, coll_conf in (db_conf.collections or {}).items():
+            detached[(db_name, coll_name)] = coll_conf.indexes
+            coll_conf.indexes = None
+    try:
+        yield
+    finally:
+        for (db_name, coll_name), indexes in detached.items():
+            dbs[db_name].collections[coll_name].indexes = indexes
+    for (db_name, coll_name), indexes in detached.items():
+        client = dbs[db_name].collections[coll_name].client
+        for index in indexes or []:
+            if client is None or not (index.options or {}).get("unique"):
+                continue
+            client.create_index(index.keys, **index.options)
+            logger.info(
+                f"Created unique index "
+                f"'{index_name(index.keys, index.options)}' of collection "
+                f"'{coll_name}'."
+            )
+
+
+class IndexManager:
+    """Class for building indexes in the background and detecting drift.
+
+    Indexes of the service store collections of all tenants are compared with
+    the configured indexes, periodically and on demand. Missing indexes are
+    built one at a time, while the app serves requests; MongoDB only locks a
+    collection exclusively at the start and the end of a build. Indexes that
+    are not configured, or differ from their configuration, are reported and
+    optionally dropped, with differing indexes being rebuilt.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        """Initialize class requirements.
+
+        Args:
+            app: Flask application instance.
+
+        Attributes:
+            app: Flask application instance.
+            build_missing: Whether missing indexes are built.
+            drop_unexpected: Whether indexes that are not configured, or
+                differ from their configuration, are dropped.
+            check_interval: Interval (in seconds) between checks for drift.
+            indexes: State of configured and unexpected indexes as of the last
+                check.
+            checked_at: Time of the last check.
+        """
+        foca_conf = app.config.foca  # type: ignore[attr-defined]
+        indexes_conf = foca_conf.custom.indexes
+        self.app = app
+        self.build_missing = indexes_conf.build_missing
+        self.drop_unexpected = indexes_conf.drop_unexpected
+        self.check_interval = indexes_conf.check_interval
+        self.indexes: List[Dict] = []
+        self.checked_at: Optional[datetime] = None
+        self._building: Dict[Tuple[str, str], float] = {}
+        self._failed: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> List[Dict]:
+        """Compare indexes of all collections with the configuration.
+
+        Returns:
+            State of configured and unexpected indexes.
+        """
+        return [entry for _, _, entry in self._compare()]
+
+    def sync(self) -> None:
+        """Build missing indexes and drop unexpected ones, if enabled."""
+        for collection, spec, entry in self._compare():
+            if self._stop.is_set():
+                return
+            status = entry["status"]
+            if self.drop_unexpected and status in ("unexpected", "mismatched"):
+                self._drop(collection, entry)
+                status = "missing" if status == "mismatched" else status
+            if self.build_missing and status == "missing" and spec is not None:
+                self._build(collection, spec, entry)
+        self.check()
+
+    def status(self) -> Dict:
+        """Get state of indexes as of the last check.
+
+        Returns:
+            Time of the last check, whether any index differs from the
+            configuration, and the state of every index, including the
+            progress of builds reported by MongoDB.
+        """
+        with self._lock:
+            indexes = [dict(entry) for entry in self.indexes]
+            checked_at = self.checked_at
+        if any(entry["status"] == "building" for entry in indexes):
+            progress = self._progress()
+            for entry in indexes:
+                key = (entry["collection"], entry["name"])
+                if entry["status"] == "building" and key in progress:
+                    entry["progress"] = progress[key]
+        return {
+            "checked_at": None if checked_at is None else checked_at.isoformat() + "Z",
+            "drift": any(entry["status"] in DRIFT for entry in indexes),
+            "indexes": indexes,
+        }
+
+    def start(self) -> None:
+        """Build indexes and check for drift periodically in a daemon thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="index-manager",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info(f"Indexes checked for drift every {self.check_interval}s.")
+
+    def stop(self) -> None:
+        """Stop building indexes and checking for drift."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """Sync indexes until stopped."""
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                logger.warning(f"Could not sync indexes: {type(e).__name__}: {e}")
+            self._stop.wait(timeout=self.check_interval)
+
+    def _configured(self) -> Iterator[Tuple[Collection, List[IndexSpec]]]:
+        """Get configured indexes of the collections of all tenants."""
+        foca_conf = self.app.config.foca  # type: ignore[attr-defined]
+        collections = foca_conf.db.dbs["serviceStore"].collections
+        for coll_conf in collections.values():
+            if coll_conf.client is None:
+                continue
+            specs = [
+                (index.keys, index.options)
+                for index in coll_conf.indexes or []
+                if index.keys is not None
+            ]
+            for collection in list_tenant_collections(coll_conf.client):
+                yield collection, specs
+
+    def _compare(self) -> List[Tuple[Collection, Optional[IndexSpec], Dict]]:
+        """Compare indexes with the configuration and store their state."""
+        compared: List[Tuple[Collection, Optional[IndexSpec], Dict]] = []
+        for collection, specs in self._configured():
+            actual = collection.index_information()
+            configured = set()
+            for keys, options in specs:
+                name = index_name(keys, options)
+                configured.add(name)
+                entry = _entry(collection.name, name, keys, options)
+                entry["status"] = self._status(collection.name, actual, entry)
+                if (collection.name, name) in self._failed:
+                    entry["error"] = self._failed[(collection.name, name)]
+                compared.append((collection, (keys, options), entry))
+            for name, info in actual.items():
+                if name == "_id_" or name in configured:
+                    continue
+                entry = _entry(collection.name, name, info["key"], _options(info))
+                entry["status"] = "unexpected"
+                compared.append((collection, None, entry))
+        with self._lock:
+            self.indexes = [entry for _, _, entry in compared]
+            self.checked_at = datetime.utcnow()
+        return compared
+
+    def _status(self, collection: str, actual: Dict, entry: Dict) -> str:
+        """Get state of a configured index."""
+        key = (collection, entry["name"])
+        if key in self._building:
+            return "building"
+        info = actual.get(entry["name"])
+        if info is None:
+            return "failed" if key in self._failed else "missing"
+        keys = [(field, direction) for field, direction in info["key"]]
+        if keys != list(entry["keys"].items()) or any(
+            _option(info, option) != _option(entry["options"], option)
+            for option in COMPARED_OPTIONS
+        ):
+            return "mismatched"
+        return "ready"
+
+    def _build(self, collection: Collection, spec: IndexSpec, entry: Dict) -> None:
+        """Build an index, recording its progress and failure."""
+        keys, options = spec
+        key = (collection.name, entry["name"])
+        started = time.monotonic()
+        with self._lock:
+            self._building[key] = started
+            self._failed.pop(key, None)
+            entry["status"] = "building"
+        logger.info(f"Building index '{entry['name']}' of '{collection.name}'.")
+        try:
+            # builds on MongoDB < 4.2 block the database unless run in the
+            # background; the option is ignored by later versions
+            collection.create_index(keys, **{"background": True, **options})
+        except PyMongoError as e:
+            with self._lock:
+                self._failed[key] = f"{type(e).__name__}: {e}"
+            logger.error(
+                f"Could not build index '{entry['name']}' of '{collection.name}': "
+                f"{type(e).__name__}: {e}"
+            )
+        else:
+            logger.info(
+                f"Built index '{entry['name']}' of '{collection.name}' in "
+                f"{time.monotonic() - started:.1f}s."
+            )
+        finally:
+            with self._lock:
+                del self._building[key]
+
+    def _drop(self, collection: Collection, entry: Dict) -> None:
+        """Drop an index that is not configured or differs from it."""
+        try:
+            collection.drop_index(entry["name"])
+        except PyMongoError as e:
+            logger.error(
+                f"Could not drop index '{entry['name']}' of '{collection.name}': "
+                f"{type(e).__name__}: {e}"
+            )
+            return
+        logger.warning(f"Dropped index '{entry['name']}' of '{collection.name}'.")
+
+    def _progress(self) -> Dict[Tuple[str, str], Dict]:
+        """Get progress of index builds reported by MongoDB."""
+        foca_conf = self.app.config.foca  # type: ignore[attr-defined]
+        database = foca_conf.db.dbs["serviceStore"].client
+        try:
+            res = database.client.admin.command(
+                "currentOp", **{"command.createIndexes": {"$exists": True}}
+            )
+        except PyMongoError as e:
+            logger.debug(f"Could not get progress of index builds: {e}")
+            return {}
+        return build_progress(res.get("inprog", []))
+
+
+def _entry(collection: str, name: str, keys: List[Tuple], options: Dict) -> Dict:
+    """Describe an index."""
+    return {
+        "collection": collection,
+        "name": name,
+        "keys": {field: direction for field, direction in keys},
+        "options": {
+            option: value
+            for option, value in options.items()
+            if option not in ("name", "background")
+        },
+    }
+
+
+def _options(info: Dict) -> Dict:
+    """Get options of an existing index."""
+    return {
+        option: value
+        for option, value in info.items()
+        if option not in ("key", "v", "ns")
+    }
+
+
+def _option(options: Dict, option: str):
+    """Get value of an index option, treating `False` as unset."""
+    value = options.get(option)
+    return None if value is False else value
+
+
+def get_index_manager() -> Optional[IndexManager]:
+    """Get index manager of the app.
+
+    Returns:
+        Index manager, or `None` if indexes are not managed.
+    """
+    return current_app.extensions.get("index_manager")
+
+
+def register_index_manager(app: Flask) -> None:
+    """Build indexes in the background and check them for drift.
+
+    Indexes of SQLite storage are created when the storage is opened and are
+    not managed.
+
+    Args:
+        app: Flask application instance.
+    """
+    foca_conf = app.config.foca  # type: ignore[attr-defined]
+    backend = foca_conf.custom.storage.backend
+    if backend != "mongodb":
+        logger.info(f"Indexes not managed for storage backend '{backend}'.")
+        return
+    manager = IndexManager(app=app)
+    app.extensions["index_manager"] = manager
+    manager.start()
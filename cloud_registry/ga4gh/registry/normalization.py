@@ -0,0 +1,235 @@
+"""Normalized storage of services, with organizations and types stored once."""
+
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask, current_app
+
+from cloud_registry.exceptions import InternalServerError
+from cloud_registry.ga4gh.registry.read_preference import for_reads
+from cloud_registry.ga4gh.registry.tenancy import get_tenant, require_collection
+
+logger = logging.getLogger(__name__)
+
+# normalized fields of services, with the fields storing their keys and the
+# dictionary collections storing their values
+NORMALIZED_FIELDS: Dict[str, Tuple[str, str]] = {
+    "organization": ("_org", "service_organizations"),
+    "type": ("_type", "service_types"),
+}
+
+
+def dictionary_key(value: Dict) -> str:
+    """Compute compact key of an organization or type.
+
+    Keys are derived from the content, so that equal values share an entry
+    and entries never change.
+
+    Args:
+        value: Organization or type.
+
+    Returns:
+        Hex digest of the 64-bit BLAKE2 hash of the value.
+    """
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class ServiceDictionary:
+    """Class for normalizing services and reassembling them.
+
+    Organizations and types of services are stored once in dictionary
+    collections and referenced from services by their keys. Entries are cached
+    per tenant once read or written; as keys are derived from the content,
+    cached entries never become stale.
+    """
+
+    def __init__(self, cache_size: int = 10000) -> None:
+        """Initialize class requirements.
+
+        Args:
+            cache_size: Maximum number of cached organizations and types.
+
+        Attributes:
+            cache_size: Maximum number of cached organizations and types.
+        """
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[Optional[str], str, str], Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def normalize(self, data: Dict) -> Dict:
+        """Store organization and type of a service in the dictionaries.
+
+        Args:
+            data: Service as registered.
+
+        Returns:
+            Service referencing its organization and type by their keys.
+        """
+        normalized = dict(data)
+        tenant = get_tenant()
+        for field, (key_field, collection_name) in NORMALIZED_FIELDS.items():
+            value = normalized.get(field)
+            if not isinstance(value, dict):
+                continue
+            key = dictionary_key(value)
+            if self._get(tenant, field, key) is None:
+                require_collection(collection_name).update_one(
+                    filter={"_id": key},
+                    update={"$setOnInsert": {"value": value}},
+                    upsert=True,
+                )
+                self._set(tenant, field, key, value)
+            del normalized[field]
+            normalized[key_field] = key
+        return normalized
+
+    def denormalize(self, docs: Iterable[Dict]) -> List[Dict]:
+        """Reassemble services from their references.
+
+        Services stored before normalization was enabled are returned as is.
+
+        Args:
+            docs: Services as stored.
+
+        Returns:
+            Services with their organizations and types.
+
+        Raises:
+            cloud_registry.exceptions.InternalServerError: A referenced
+                organization or type does not exist.
+        """
+        docs = list(docs)
+        tenant = get_tenant()
+        for field, (key_field, collection_name) in NORMALIZED_FIELDS.items():
+            values: Dict[str, Dict] = {}
+            missing = set()
+            for doc in docs:
+                key = doc.get(key_field)
+                if key is None or key in values:
+                    continue
+                value = self._get(tenant, field, key)
+                if value is None:
+                    missing.add(key)
+                else:
+                    values[key] = value
+            if missing:
+                collection = for_reads(require_collection(collection_name))
+                for entry in collection.find({"_id": {"$in": list(missing)}}):
+                    values[entry["_id"]] = entry["value"]
+                    self._set(tenant, field, entry["_id"], entry["value"])
+            for doc in docs:
+                key = doc.pop(key_field, None)
+                if key is None:
+                    continue
+                if key not in values:
+                    logger.error(f"No {field} with key '{key}' in dictionary.")
+                    raise InternalServerError
+                doc[field] = dict(values[key])
+        return docs
+
+    def type_filter(self, group: str, artifact: str) -> Dict:
+        """Build filter matching services of a type.
+
+        Args:
+            group: Namespace of the service type.
+            artifact: Name of the service type.
+
+        Returns:
+            Filter matching normalized services referencing any version of the
+            type, and services stored before normalization was enabled.
+        """
+        collection = for_reads(require_collection("service_types"))
+        keys = [
+            entry["_id"]
+            for entry in collection.find(
+                filter={"value.group": group, "value.artifact": artifact},
+                projection={"_id": True},
+            )
+        ]
+        return {
+            "$or": [
+                {"_type": {"$in": keys}},
+                {"type.group": group, "type.artifact": artifact},
+            ]
+        }
+
+    def _get(self, tenant: Optional[str], field: str, key: str) -> Optional[Dict]:
+        """Get cached organization or type of a tenant."""
+        with self._lock:
+            value = self._cache.get((tenant, field, key))
+            if value is not None:
+                self._cache.move_to_end((tenant, field, key))
+            return value
+
+    def _set(self, tenant: Optional[str], field: str, key: str, value: Dict) -> None:
+        """Cache organization or type of a tenant, evicting the least recently
+        used.
+        """
+        with self._lock:
+            self._cache[(tenant, field, key)] = value
+            self._cache.move_to_end((tenant, field, key))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+def get_service_dictionary() -> Optional[ServiceDictionary]:
+    """Get service dictionary of the app.
+
+    Returns:
+        Service dictionary, or `None` if services are not normalized.
+    """
+    return current_app.extensions.get("service_dictionary")
+
+
+def normalize(data: Dict) -> Dict:
+    """Normalize service for storage if normalization is enabled.
+
+    Args:
+        data: Service as registered.
+
+    Returns:
+        Service as stored.
+    """
+    dictionary = get_service_dictionary()
+    return data if dictionary is None else dictionary.normalize(data)
+
+
+def denormalize(docs: Iterable[Dict]) -> List[Dict]:
+    """Reassemble stored services if normalization is enabled.
+
+    Args:
+        docs: Services as stored.
+
+    Returns:
+        Services as registered.
+    """
+    dictionary = get_service_dictionary()
+    return list(docs) if dictionary is None else dictionary.denormalize(docs)
+
+
+def register_normalization(app: Flask) -> None:
+    """Store services normalized if enabled.
+
+    Args:
+        app: Flask application instance.
+
+    Raises:
+        ValueError: A dictionary collection is not configured.
+    """
+    foca_conf = app.config.foca  # type: ignore[attr-defined]
+    normalization_conf = foca_conf.custom.endpoints.services.normalization
+    if not normalization_conf.enabled:
+        return
+    collections = foca_conf.db.dbs["serviceStore"].collections
+    for _, collection_name in NORMALIZED_FIELDS.values():
+        if collection_name not in collections:
+            raise ValueError(f"Collection '{collection_name}' not configured.")
+    app.extensions["service_dictionary"] = ServiceDictionary(
+        cache_size=normalization_conf.cache_size
+    )
+    logger.info("Services are stored normalized.")
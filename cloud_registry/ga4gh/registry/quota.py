@@ -0,0 +1,114 @@
+"""Atomic quota on the number of services registered by each tenant."""
+
+import logging
+from typing import Dict
+
+from flask import current_app
+from pymongo.errors import DuplicateKeyError
+
+from cloud_registry.exceptions import Forbidden
+from cloud_registry.ga4gh.registry.tenancy import get_collection, require_collection
+
+logger = logging.getLogger(__name__)
+
+# identifier of the document counting the services of a tenant
+COUNTER_ID = "services"
+
+
+class ServiceQuota:
+    """Class for limiting the number of services registered by a tenant.
+
+    Registrations reserve a slot by atomically incrementing a counter of the
+    tenant's services, unless it has reached the quota, and release the slot
+    if the service is not stored after all; deleted services release their
+    slot. The counter is initialized from the number of services on first
+    use, so that neither concurrent registrations can exceed the quota nor
+    registrations count all services.
+
+    Services are counted on every registration instead, without guarding
+    against concurrent registrations, if no `service_quotas` collection is
+    configured.
+    """
+
+    def __init__(self) -> None:
+        """Initialize class requirements.
+
+        Attributes:
+            max_services: Maximum number of services per tenant, or `None` if
+                not limited.
+            collection: Database collection storing the counter of the
+                current tenant, or `None` if services are counted instead.
+        """
+        foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+        self.max_services = foca_conf.custom.tenancy.max_services
+        self.collection = get_collection("service_quotas")
+
+    def reserve(self) -> None:
+        """Reserve slot for registering a service.
+
+        Slots are counted even if the number of services is not limited, so
+        that the counter is accurate once a quota is set.
+
+        Raises:
+            cloud_registry.exceptions.Forbidden: The tenant has registered the
+                maximum number of services already.
+        """
+        if self.collection is None:
+            if self.max_services is not None and self._count() >= self.max_services:
+                self._exceeded()
+            return
+        filter: Dict = {"_id": COUNTER_ID}
+        if self.max_services is not None:
+            filter["count"] = {"$lt": self.max_services}
+        for _ in range(2):
+            if (
+                self.collection.find_one_and_update(
+                    filter=filter,
+                    update={"$inc": {"count": 1}},
+                )
+                is not None
+            ):
+                return
+            if not self._initialize():
+                break
+        self._exceeded()
+
+    def release(self, count: int = 1) -> None:
+        """Release slots of services that were not stored or were deleted.
+
+        Args:
+            count: Number of slots to release.
+        """
+        if self.collection is None or not count:
+            return
+        self.collection.update_one(
+            filter={"_id": COUNTER_ID},
+            update={"$inc": {"count": -count}},
+        )
+
+    def _initialize(self) -> bool:
+        """Initialize counter from the number of services unless it exists.
+
+        Returns:
+            Whether the counter did not exist.
+        """
+        if self.collection.find_one(  # type: ignore[union-attr]
+            filter={"_id": COUNTER_ID}
+        ):
+            return False
+        try:
+            self.collection.insert_one(  # type: ignore[union-attr]
+                document={"_id": COUNTER_ID, "count": self._count()}
+            )
+        except DuplicateKeyError:
+            pass
+        return True
+
+    def _count(self) -> int:
+        """Count services of the tenant that are not deleted."""
+        return require_collection("services").count_documents({"_deleted_at": None})
+
+    def _exceeded(self) -> None:
+        """Reject registration exceeding the quota."""
+        logger.error(f"Quota of {self.max_services} services exceeded.")
+        raise Forbidden
@@ -0,0 +1,121 @@
+"""Read preference of collections used by read endpoints."""
+
+import logging
+import time
+from typing import Dict
+
+from flask import Flask, Response, current_app, has_request_context, request
+from pymongo.collection import Collection
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import (
+    Nearest,
+    PrimaryPreferred,
+    Secondary,
+    SecondaryPreferred,
+)
+
+logger = logging.getLogger(__name__)
+
+# cookie holding the time until which reads of a client go to the primary
+PIN_COOKIE = "registry_read_primary_until"
+
+# read preference modes of read endpoints
+READ_PREFERENCE_MODES = [
+    "primary",
+    "primaryPreferred",
+    "secondary",
+    "secondaryPreferred",
+    "nearest",
+]
+
+_MODES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+_WRITE_METHODS = ["POST", "PUT", "DELETE"]
+
+
+def for_reads(collection: Collection) -> Collection:
+    """Get handle of a collection with the configured read preference.
+
+    Reads of clients that have written recently stay on the primary, so that
+    they observe their own writes, if session consistency is enabled.
+
+    Args:
+        collection: Database collection.
+
+    Returns:
+        Handle of the collection for reads.
+    """
+    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+    read_conf = foca_conf.custom.read_preference
+    if read_conf.mode == "primary" and read_conf.read_concern is None:
+        return collection
+    if read_conf.session_consistency and is_pinned():
+        return collection
+    handles: Dict[str, Collection] = current_app.extensions.setdefault(
+        "read_handles", {}
+    )
+    handle = handles.get(collection.full_name)
+    if handle is None:
+        options: Dict = {}
+        if read_conf.mode != "primary":
+            options["read_preference"] = _MODES[read_conf.mode](
+                max_staleness=read_conf.max_staleness_seconds
+            )
+        if read_conf.read_concern is not None:
+            options["read_concern"] = ReadConcern(read_conf.read_concern)
+        handle = handles.setdefault(
+            collection.full_name, collection.with_options(**options)
+        )
+    return handle
+
+
+def register_read_preference(app: Flask) -> None:
+    """Pin reads of clients to the primary after their writes if enabled.
+
+    Args:
+        app: Flask application instance.
+
+    Raises:
+        ValueError: The configured read preference mode is unknown.
+    """
+    foca_conf = app.config.foca  # type: ignore[attr-defined]
+    read_conf = foca_conf.custom.read_preference
+    if read_conf.mode != "primary" and read_conf.mode not in _MODES:
+        raise ValueError(f"Unknown read preference mode: {read_conf.mode}")
+    if read_conf.mode == "primary" or not read_conf.session_consistency:
+        return
+
+    @app.after_request
+    def pin_to_primary(response: Response) -> Response:
+        """Set cookie pinning reads of the client after a successful write."""
+        if request.method in _WRITE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE,
+                value=str(time.time() + read_conf.pin_seconds),
+                max_age=int(read_conf.pin_seconds) + 1,
+                httponly=True,
+            )
+        return response
+
+    logger.info(
+        f"Reads use read preference '{read_conf.mode}'; clients read from the "
+        f"primary for {read_conf.pin_seconds}s after writing."
+    )
+
+
+def is_pinned() -> bool:
+    """Check whether reads of the current client are pinned to the primary.
+
+    Returns:
+        Whether the client wrote within the pin window.
+    """
+    if not has_request_context():
+        return False
+    try:
+        return float(request.cookies.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
@@ -0,0 +1,508 @@
+"""Controller for selecting services by precomputed rankings."""
+
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future
+from datetime import datetime
+import heapq
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from flask import Flask, current_app
+
+from cloud_registry.ga4gh.registry.changes import ChangeLog
+from cloud_registry.ga4gh.registry.normalization import get_service_dictionary
+from cloud_registry.ga4gh.registry.service import NOT_DELETED, PUBLIC_PROJECTION
+from cloud_registry.ga4gh.registry.tenancy import (
+    get_collection,
+    get_tenant,
+    require_collection,
+    set_tenant,
+)
+
+logger = logging.getLogger(__name__)
+
+TypeKey = Tuple[str, str]
+
+
+class TypeRanking:
+    """Ranking of the services of a single type.
+
+    Services are held in lists sorted by their base score, i.e., the blend of
+    probe latency and availability, both across all services and grouped by
+    organization, environment and both. The bonus for a matching organization
+    or environment is constant within each list, so that the top services for
+    any preference are found by merging the heads of at most four lists.
+    """
+
+    def __init__(self, entries: List[Dict]) -> None:
+        """Build ranking.
+
+        Args:
+            entries: Ranking entries holding the service object, its
+                organization, environment and base score.
+
+        Attributes:
+            all: Entries sorted by descending base score.
+            by_organization: Sorted entries grouped by organization.
+            by_environment: Sorted entries grouped by environment.
+            by_both: Sorted entries grouped by organization and environment.
+        """
+        self.all = sorted(entries, key=lambda e: e["base"], reverse=True)
+        self.by_organization: Dict[Optional[str], List[Dict]] = defaultdict(list)
+        self.by_environment: Dict[Optional[str], List[Dict]] = defaultdict(list)
+        self.by_both: Dict[Tuple, List[Dict]] = defaultdict(list)
+        for entry in self.all:
+            org, env = entry["organization"], entry["environment"]
+            self.by_organization[org].append(entry)
+            self.by_environment[env].append(entry)
+            self.by_both[(org, env)].append(entry)
+
+    def top(
+        self,
+        k: int,
+        organization: Optional[str],
+        environment: Optional[str],
+        organization_weight: float,
+        environment_weight: float,
+    ) -> List[Dict]:
+        """Select top-ranked services.
+
+        Args:
+            k: Maximum number of services to select.
+            organization: Preferred organization name.
+            environment: Preferred environment.
+            organization_weight: Bonus for services of the preferred
+                organization.
+            environment_weight: Bonus for services in the preferred
+                environment.
+
+        Returns:
+            Selected services and their scores, by descending score.
+        """
+        lists = [(self.all, 0.0)]
+        if organization is not None:
+            lists.append(
+                (self.by_organization.get(organization, []), organization_weight)
+            )
+        if environment is not None:
+            lists.append((self.by_environment.get(environment, []), environment_weight))
+        if organization is not None and environment is not None:
+            lists.append(
+                (
+                    self.by_both.get((organization, environment), []),
+                    organization_weight + environment_weight,
+                )
+            )
+        # an entry's first occurrence carries its highest, i.e., correct, score
+        merged = heapq.merge(
+            *[self._scored(entries, bonus) for entries, bonus in lists],
+            key=lambda scored: -scored[0],
+        )
+        selected: List[Dict] = []
+        seen: Set[str] = set()
+        for score, entry in merged:
+            if len(selected) >= k:
+                break
+            if entry["service"]["id"] in seen:
+                continue
+            seen.add(entry["service"]["id"])
+            selected.append({"score": round(score, 6), "service": entry["service"]})
+        return selected
+
+    @staticmethod
+    def _scored(entries: List[Dict], bonus: float) -> Iterator[Tuple[float, Dict]]:
+        """Yield entries with their scores, including a bonus."""
+        for entry in entries:
+            yield entry["base"] + bonus, entry
+
+
+class ServiceRanking:
+    """Precomputed rankings of services for selection.
+
+    Rankings are held in memory per service type and rebuilt for a type
+    whenever one of its services changes or a probe is reported for one of
+    them. Changes recorded by any process are picked up from the change log by
+    a background thread; if the change log is not configured or changes were
+    missed, all rankings are rebuilt from the database.
+    """
+
+    def __init__(self, app: Flask, tenant: Optional[str] = None) -> None:
+        """Initialize class requirements.
+
+        Args:
+            app: Flask application instance.
+            tenant: Tenant whose services are ranked, or `None` for the default
+                tenant.
+
+        Attributes:
+            app: Flask application instance.
+            tenant: Tenant whose services are ranked.
+            organization_weight: Bonus for services of the preferred
+                organization.
+            environment_weight: Bonus for services in the preferred environment.
+            latency_weight: Weight of the probe latency score.
+            availability_weight: Weight of the probe availability.
+            latency_scale: Probe latency (in milliseconds) at which the latency
+                score is halved.
+            availability_smoothing: Weight of the latest probe in the moving
+                average of availability.
+            max_k: Maximum number of services selected per request.
+            refresh_interval: Interval (in seconds) at which rankings are
+                rebuilt if the change log is not configured.
+            collection: Database collection storing service objects.
+            probes_collection: Database collection storing probe results, or
+                `None` if probe results are kept in memory only.
+            dictionary: Dictionary of organizations and types of services, or
+                `None` if services are not stored normalized.
+        """
+        foca_conf = app.config.foca  # type: ignore[attr-defined]
+        selection_conf = foca_conf.custom.endpoints.services.selection
+        self.app = app
+        self.tenant = tenant
+        self.organization_weight = selection_conf.organization_weight
+        self.environment_weight = selection_conf.environment_weight
+        self.latency_weight = selection_conf.latency_weight
+        self.availability_weight = selection_conf.availability_weight
+        self.latency_scale = selection_conf.latency_scale
+        self.availability_smoothing = selection_conf.availability_smoothing
+        self.max_k = selection_conf.max_k
+        self.refresh_interval = selection_conf.refresh_interval
+        with app.app_context():
+            set_tenant(tenant)
+            self.collection = require_collection("services")
+            self.probes_collection = get_collection("service_probes")
+            self.dictionary = get_service_dictionary()
+        self._rankings: Dict[TypeKey, TypeRanking] = {}
+        self._entries: Dict[TypeKey, Dict[str, Dict]] = defaultdict(dict)
+        self._types: Dict[str, TypeKey] = {}
+        self._probes: Dict[str, Dict] = {}
+        self._built = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def select(
+        self,
+        group: str,
+        artifact: str,
+        organization: Optional[str] = None,
+        environment: Optional[str] = None,
+        k: Optional[int] = None,
+    ) -> List[Dict]:
+        """Select top-ranked services of a type.
+
+        Args:
+            group: Namespace of the service type.
+            artifact: Name of the service type.
+            organization: Preferred organization name.
+            environment: Preferred environment.
+            k: Maximum number of services to select. Capped at the configured
+                maximum.
+
+        Returns:
+            Selected services and their scores, by descending score.
+        """
+        ranking = self._rankings.get((group, artifact))
+        if ranking is None:
+            return []
+        return ranking.top(
+            k=self.max_k if k is None else min(k, self.max_k),
+            organization=organization,
+            environment=environment,
+            organization_weight=self.organization_weight,
+            environment_weight=self.environment_weight,
+        )
+
+    def report_probe(self, id: str, latency: float, available: bool) -> None:
+        """Record result of probing a service.
+
+        Args:
+            id: Service identifier.
+            latency: Response time (in milliseconds).
+            available: Whether the service responded successfully.
+        """
+        with self._lock:
+            # services without probes are assumed to be available
+            previous = self._probes.get(id, {}).get("availability", 1.0)
+            availability = (
+                1 - self.availability_smoothing
+            ) * previous + self.availability_smoothing * float(available)
+            probe = {"id": id, "latency": latency, "availability": availability}
+            self._probes[id] = probe
+            if self.probes_collection is not None:
+                self.probes_collection.replace_one(
+                    filter={"id": id},
+                    replacement={**probe, "timestamp": datetime.utcnow()},
+                    upsert=True,
+                )
+            type_key = self._types.get(id)
+            if type_key is not None:
+                entry = self._entries[type_key][id]
+                self._entries[type_key][id] = self._entry(entry["service"])
+                self._rebuild(type_key)
+
+    def build(self) -> None:
+        """Build rankings of all services from the database."""
+        probes = {}
+        if self.probes_collection is not None:
+            probes = {
+                probe["id"]: probe
+                for probe in self.probes_collection.find(projection={"_id": False})
+            }
+        services = self._find(filter=NOT_DELETED)
+        with self._lock:
+            self._probes.update(probes)
+            self._entries = defaultdict(dict)
+            self._types = {}
+            for service in services:
+                self._add(service)
+            self._rankings = {
+                type_key: TypeRanking(list(entries.values()))
+                for type_key, entries in self._entries.items()
+            }
+            self._built = True
+        logger.info(f"Built rankings of {len(services)} services.")
+
+    def refresh(self, ids: List[str]) -> None:
+        """Rebuild rankings of types of changed services.
+
+        Args:
+            ids: Identifiers of changed services.
+        """
+        services = {
+            service["id"]: service
+            for service in self._find(filter={"id": {"$in": ids}, **NOT_DELETED})
+        }
+        with self._lock:
+            changed: Set[TypeKey] = set()
+            for id in ids:
+                type_key = self._types.pop(id, None)
+                if type_key is not None:
+                    self._entries[type_key].pop(id, None)
+                    changed.add(type_key)
+                if id in services:
+                    changed.add(self._add(services[id]))
+            for type_key in changed:
+                self._rebuild(type_key)
+
+    def start(self) -> None:
+        """Keep rankings up to date in a daemon thread.
+
+        Rankings are built by the thread first if they have not been built
+        yet, so that starting does not block while the database is
+        unavailable.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"service-ranking-{self.tenant or 'default'}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        """Stop keeping rankings up to date.
+
+        Args:
+            wait: Whether to wait for the background thread to finish.
+        """
+        self._stop.set()
+        if self._thread is not None and wait:
+            self._thread.join()
+            self._thread = None
+
+    def _find(self, filter: Dict) -> List[Dict]:
+        """Find services, reassembled if they are stored normalized."""
+        services = self.collection.find(filter=filter, projection=PUBLIC_PROJECTION)
+        if self.dictionary is None:
+            return list(services)
+        with self.app.app_context():
+            set_tenant(self.tenant)
+            return self.dictionary.denormalize(services)
+
+    def _run(self) -> None:
+        """Apply changes to services until stopped."""
+        with self.app.app_context():
+            set_tenant(self.tenant)
+            change_log = ChangeLog()
+            since: Optional[str] = None
+            while not self._stop.is_set():
+                try:
+                    if since is None:
+                        revision = change_log._current_revision()
+                        if not self._built:
+                            self.build()
+                        since = str(revision)
+                        continue
+                    if change_log.collection is None:
+                        self._stop.wait(timeout=self.refresh_interval)
+                        self.build()
+                        continue
+                    res = change_log.get_changes(since=since, wait=1)
+                    if res["resync_required"]:
+                        self.build()
+                    elif res["changes"]:
+                        self.refresh(ids=[c["id"] for c in res["changes"]])
+                    since = res["next"]
+                except Exception as e:
+                    logger.warning(
+                        f"Could not refresh rankings: {type(e).__name__}: {e}"
+                    )
+                    self._stop.wait(timeout=self.refresh_interval)
+
+    def _add(self, service: Dict) -> TypeKey:
+        """Add service to ranking entries and return its type."""
+        type_key = (
+            service.get("type", {}).get("group"),
+            service.get("type", {}).get("artifact"),
+        )
+        self._entries[type_key][service["id"]] = self._entry(service)
+        self._types[service["id"]] = type_key
+        return type_key
+
+    def _entry(self, service: Dict) -> Dict:
+        """Build ranking entry of service."""
+        organization = service.get("organization")
+        probe = self._probes.get(service["id"], {})
+        latency = probe.get("latency")
+        latency_score = (
+            0.0 if latency is None else 1 / (1 + latency / self.latency_scale)
+        )
+        return {
+            "service": service,
+            "organization": (
+                organization.get("name") if isinstance(organization, dict) else None
+            ),
+            "environment": service.get("environment"),
+            "base": self.latency_weight * latency_score
+            + self.availability_weight * probe.get("availability", 1.0),
+        }
+
+    def _rebuild(self, type_key: TypeKey) -> None:
+        """Rebuild ranking of a type."""
+        entries = self._entries.get(type_key)
+        if entries:
+            self._rankings[type_key] = TypeRanking(list(entries.values()))
+        else:
+            self._rankings.pop(type_key, None)
+            self._entries.pop(type_key, None)
+
+
+class ServiceRankings:
+    """Service rankings of all tenants.
+
+    Rankings are built when first requested for a tenant, without blocking
+    requests for other tenants; concurrent requests for the same tenant wait
+    for the same build. Only the rankings of the most recently used tenants
+    are held in memory.
+    """
+
+    def __init__(self, app: Flask, refresh: bool = False) -> None:
+        """Initialize class requirements.
+
+        Args:
+            app: Flask application instance.
+            refresh: Whether rankings are kept up to date by background
+                threads. If not, rankings are built once.
+
+        Attributes:
+            app: Flask application instance.
+            refresh: Whether rankings are kept up to date by background
+                threads.
+            max_tenants: Maximum number of tenants whose rankings are held in
+                memory.
+        """
+        foca_conf = app.config.foca  # type: ignore[attr-defined]
+        self.app = app
+        self.refresh = refresh
+        self.max_tenants = foca_conf.custom.tenancy.max_cached_tenants
+        self._rankings: "OrderedDict[Optional[str], ServiceRanking]" = OrderedDict()
+        self._pending: "Dict[Optional[str], Future[ServiceRanking]]" = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant: Optional[str] = None, build: bool = True) -> ServiceRanking:
+        """Get service rankings of a tenant, building them if not held.
+
+        Args:
+            tenant: Tenant identifier, or `None` for the default tenant.
+            build: Whether rankings not held are built before returning them.
+                If not, they are built by their background thread.
+
+        Returns:
+            Service rankings of the tenant.
+        """
+        with self._lock:
+            ranking = self._rankings.get(tenant)
+            if ranking is not None:
+                self._rankings.move_to_end(tenant)
+                return ranking
+            # wait for the rankings if another request is building them
+            future = self._pending.get(tenant)
+            building = future is None
+            if future is None:
+                future = self._pending[tenant] = Future()
+        if not building:
+            return future.result()
+        try:
+            ranking = ServiceRanking(app=self.app, tenant=tenant)
+            if build:
+                ranking.build()
+        except Exception as e:
+            with self._lock:
+                del self._pending[tenant]
+            future.set_exception(e)
+            raise
+        if self.refresh:
+            ranking.start()
+        with self._lock:
+            del self._pending[tenant]
+            self._rankings[tenant] = ranking
+            evicted = []
+            while len(self._rankings) > max(self.max_tenants, 1):
+                evicted.append(self._rankings.popitem(last=False)[1])
+        future.set_result(ranking)
+        for ranking_evicted in evicted:
+            ranking_evicted.stop(wait=False)
+            logger.info(f"Evicted rankings of tenant '{ranking_evicted.tenant}'.")
+        return ranking
+
+    def stop(self) -> None:
+        """Stop keeping rankings of all tenants up to date."""
+        with self._lock:
+            rankings = list(self._rankings.values())
+            self._rankings.clear()
+        for ranking in rankings:
+            ranking.stop()
+
+
+def get_service_ranking() -> ServiceRanking:
+    """Get service rankings of the current tenant.
+
+    Rankings are built once if not registered with the app.
+
+    Returns:
+        Service rankings.
+    """
+    rankings = current_app.extensions.get("service_rankings")
+    if rankings is None:
+        rankings = current_app.extensions.setdefault(
+            "service_rankings",
+            ServiceRankings(
+                app=current_app._get_current_object()  # type: ignore[attr-defined]
+            ),
+        )
+    return rankings.get(get_tenant())
+
+
+def register_service_ranking(app: Flask) -> None:
+    """Register service rankings and keep them up to date.
+
+    Rankings of the default tenant are built in the background.
+
+    Args:
+        app: Flask application instance.
+    """
+    rankings = ServiceRankings(app=app, refresh=True)
+    app.extensions["service_rankings"] = rankings
+    rankings.get(None, build=False)
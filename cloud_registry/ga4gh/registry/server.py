@@ -1,38 +1,76 @@
 """Controllers for service endpoints."""
 
+from datetime import datetime
 import logging
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
-from flask import current_app, request
+from flask import Response, current_app, request, stream_with_context
 from foca.utils.logging import log_traffic
+from pymongo.errors import PyMongoError
+from cloud_registry.auth import check_admin
+from cloud_registry.coalescing import coalesce
 from cloud_registry.exceptions import NotFound, BadRequest
+from cloud_registry.ga4gh.registry.changes import ChangeLog
+from cloud_registry.ga4gh.registry.dedup import UNIQUE_HASH_FIELD
+from cloud_registry.ga4gh.registry.idempotency import (
+    HEADER as IDEMPOTENCY_HEADER,
+    REPLAYED_HEADER,
+    IdempotencyKeys,
+)
+from cloud_registry.ga4gh.registry.indexes import get_index_manager
+from cloud_registry.ga4gh.registry.normalization import (
+    denormalize,
+    get_service_dictionary,
+)
+from cloud_registry.ga4gh.registry.quota import ServiceQuota
+from cloud_registry.ga4gh.registry.read_preference import for_reads
+from cloud_registry.ga4gh.registry.selection import get_service_ranking
 from cloud_registry.ga4gh.registry.service_info import RegisterServiceInfo
-from cloud_registry.ga4gh.registry.service import RegisterService
+from cloud_registry.ga4gh.registry.service import (
+    NOT_DELETED,
+    PUBLIC_PROJECTION,
+    RegisterService,
+)
+from cloud_registry.ga4gh.registry.tenancy import (
+    get_tenant,
+    query_options,
+    require_collection,
+)
+from cloud_registry.ga4gh.registry.versions import VERSION_KEY_FIELD, version_filter
+from cloud_registry.profiling import (
+    check_profiling_access,
+    sample_allocations,
+    sample_cpu,
+    to_folded,
+)
+from cloud_registry.tracing import traced
 
 logger = logging.getLogger(__name__)
 
 
 # GET /services
 @log_traffic
+@traced
+@coalesce
 def getServices(**kwargs) -> List:
     """List all services.
 
     Returns:
         List of services.
     """
-    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
-    db_collection_service = (
-        foca_conf.db.dbs["serviceStore"].collections["services"].client
-    )
+    db_collection_service = for_reads(require_collection("services"))
     records = db_collection_service.find(
-        filter={},
-        projection={"_id": False},
+        filter=NOT_DELETED,
+        projection=PUBLIC_PROJECTION,
+        **query_options(),
     )
-    return list(records)
+    return denormalize(records)
 
 
 # GET /services/{serviceId}
 @log_traffic
+@traced
+@coalesce
 def getServiceById(serviceId: str, **kwargs) -> Dict:
     """Retrieve service by its identifier.
 
@@ -42,19 +80,83 @@ def getServiceById(serviceId: str, **kwargs) -> Dict:
     Returns:
         Service object.
     """
-    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
-    db_collection_service = (
-        foca_conf.db.dbs["serviceStore"].collections["services"].client
+    db_collection_service = for_reads(require_collection("services"))
+    obj = db_collection_service.find_one(
+        filter={"id": serviceId, **NOT_DELETED},
+        projection=PUBLIC_PROJECTION,
     )
-    obj = db_collection_service.find_one({"id": serviceId})
     if not obj:
         raise NotFound
-    del obj["_id"]
-    return obj
+    return denormalize([obj])[0]
+
+
+# POST /services/lookup
+@log_traffic
+@traced
+def lookupServices(**kwargs) -> Dict:
+    """Retrieve services by their identifiers in a single query.
+
+    Returns:
+        Services found, in the order of the requested identifiers, and
+        identifiers of services that were not found.
+    """
+    request_json = request.json
+    if not isinstance(request_json, dict) or not isinstance(
+        request_json.get("ids"), list
+    ):
+        logger.error("Invalid request payload.")
+        raise BadRequest
+    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+    max_ids = foca_conf.custom.endpoints.services.lookup.max_ids
+    ids = list(dict.fromkeys(request_json["ids"]))
+    if len(ids) > max_ids:
+        logger.error(f"Too many service identifiers; maximum is {max_ids}.")
+        raise BadRequest
+    db_collection_service = for_reads(require_collection("services"))
+    records = {
+        obj["id"]: obj
+        for obj in denormalize(
+            db_collection_service.find(
+                filter={"id": {"$in": ids}, **NOT_DELETED},
+                projection=PUBLIC_PROJECTION,
+                **query_options(),
+            )
+        )
+    }
+    return {
+        "found": [records[id] for id in ids if id in records],
+        "missing": [id for id in ids if id not in records],
+    }
+
+
+# GET /services/{serviceId}/status
+@log_traffic
+@traced
+def getServiceStatus(serviceId: str, **kwargs) -> Dict:
+    """Show registration status of a service.
+
+    Args:
+        serviceId: Identifier of service.
+
+    Returns:
+        Registration status of service.
+    """
+    write_behind = current_app.extensions.get("write_behind")
+    status = (
+        None
+        if write_behind is None
+        else write_behind.get_status(serviceId, tenant=get_tenant())
+    )
+    if status is None:
+        getServiceById.__wrapped__(serviceId)
+        status = "persisted"
+    return {"id": serviceId, "status": status}
 
 
 # GET /services/types
 @log_traffic
+@traced
+@coalesce
 def getServiceTypes(**kwargs) -> List:
     """List types of services.
 
@@ -68,59 +170,279 @@ def getServiceTypes(**kwargs) -> List:
     return uniq_types
 
 
+# GET /services/types/{group}/{artifact}
+@log_traffic
+@traced
+@coalesce
+def getServicesByType(
+    group: str,
+    artifact: str,
+    version: Optional[str] = None,
+    **kwargs,
+) -> List:
+    """List services of a given type.
+
+    Args:
+        group: Namespace of the service type.
+        artifact: Name of the service type.
+        version: Semantic version range of the service type, e.g., `^1.0`.
+
+    Returns:
+        List of services, ordered by the version of their type.
+    """
+    db_collection_service = for_reads(require_collection("services"))
+    dictionary = get_service_dictionary()
+    filter = (
+        {"type.group": group, "type.artifact": artifact, **NOT_DELETED}
+        if dictionary is None
+        else {**dictionary.type_filter(group=group, artifact=artifact), **NOT_DELETED}
+    )
+    if version is not None:
+        filter.update(version_filter(version) or {})
+    records = db_collection_service.find(
+        filter=filter,
+        projection=PUBLIC_PROJECTION,
+        sort=[(VERSION_KEY_FIELD, 1)],
+        **query_options(),
+    )
+    return denormalize(records)
+
+
+# GET /services/types/{group}/{artifact}/select
+@log_traffic
+@traced
+def selectServices(
+    group: str,
+    artifact: str,
+    organization: Optional[str] = None,
+    environment: Optional[str] = None,
+    k: Optional[int] = None,
+    **kwargs,
+) -> List:
+    """Select top-ranked services of a given type.
+
+    Args:
+        group: Namespace of the service type.
+        artifact: Name of the service type.
+        organization: Preferred organization name.
+        environment: Preferred environment.
+        k: Maximum number of services to select.
+
+    Returns:
+        Selected services and their scores, by descending score.
+    """
+    return get_service_ranking().select(
+        group=group,
+        artifact=artifact,
+        organization=organization,
+        environment=environment,
+        k=k,
+    )
+
+
+# GET /services/changes
+@log_traffic
+@traced
+def getServiceChanges(
+    since: Optional[str] = None,
+    limit: Optional[int] = None,
+    wait: Optional[int] = None,
+    **kwargs,
+) -> Dict:
+    """List changes to services since the revision encoded in a token.
+
+    Args:
+        since: Token returned by a previous request.
+        limit: Maximum number of changes to list.
+        wait: Maximum time (in seconds) to wait for changes if there are none
+            yet.
+
+    Returns:
+        Changes, the token for the next request and whether the client needs
+        to resynchronize its full copy of the registry.
+    """
+    return ChangeLog().get_changes(since=since, limit=limit, wait=wait)
+
+
+# GET /services/watch
+@log_traffic
+@traced
+def watchServices(since: Optional[str] = None, **kwargs) -> Response:
+    """Stream changes to services as server-sent events.
+
+    Args:
+        since: Token returned by a previous request. Superseded by the
+            `Last-Event-ID` header sent by reconnecting clients.
+
+    Returns:
+        Streamed response of server-sent events.
+    """
+    since = request.headers.get("Last-Event-ID", since)
+    events = ChangeLog().stream(since=since)
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        direct_passthrough=True,
+    )
+
+
 # GET /service-info
 @log_traffic
+@traced
+@coalesce
 def getServiceInfo(**kwargs) -> Dict:
     """Show information about this service.
 
+    Falls back to cached or configured service info if the database is
+    unavailable or the service info has not been registered yet, without
+    querying the database until the configured service info was registered.
+
     Returns:
         Service info object.
     """
     service_info = RegisterServiceInfo()
-    return service_info.get_service_info()
+    if not service_info.is_reconciled():
+        return service_info.get_fallback_service_info()
+    try:
+        return service_info.get_service_info()
+    except (NotFound, PyMongoError) as e:
+        logger.warning(
+            f"Could not read service info: {type(e).__name__}: {e}; using "
+            "cached or configured service info."
+        )
+        return service_info.get_fallback_service_info()
 
 
 # POST /services
 @log_traffic
-def postService(**kwargs) -> str:
+@traced
+def postService(**kwargs) -> Union[str, Tuple[str, str, Dict]]:
     """Add service with an auto-generated identifier.
 
+    If write-behind registration is enabled, the service is queued and a 202
+    response pointing to the registration status is returned.
+
+    If a service with the same URL and type is registered already, its
+    identifier is returned, or the request is rejected, if so configured.
+
+    If the request carries an idempotency key, the response is stored under
+    the key, and retries with the same key are answered with the stored
+    response instead of registering the service again.
+
     Returns:
-        Identifier of registered service.
+        Identifier of registered service, with status code and headers if the
+        service was queued or the response was replayed.
     """
     request_json = request.json
     if isinstance(request_json, dict):
-        service = RegisterService(data=request_json)
-        service.register_metadata()
-        return service.data["id"]
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return _register_service(data=request_json)
+        keys = IdempotencyKeys()
+        stored = keys.claim(key=key, payload=request_json)
+        if stored is not None:
+            return (
+                stored["body"],
+                stored["status"],
+                {**stored["headers"], REPLAYED_HEADER: "true"},
+            )
+        try:
+            res = _register_service(data=request_json)
+        except Exception:
+            keys.release(key=key)
+            raise
+        body, status, headers = (res, "200", {}) if isinstance(res, str) else res
+        keys.store(
+            key=key,
+            response={"body": body, "status": status, "headers": headers},
+        )
+        return body, status, headers
     else:
         logger.error("Invalid request payload.")
         raise BadRequest
 
 
+def _register_service(data: Dict) -> Union[str, Tuple[str, str, Dict]]:
+    """Register or queue service with an auto-generated identifier."""
+    service = RegisterService(data=data)
+    write_behind = current_app.extensions.get("write_behind")
+    if write_behind is not None:
+        service.duplicate_of = service.find_duplicate()
+        if service.duplicate_of is not None:
+            return service.duplicate_of
+        reserved = service.check_quota()
+        service.data["id"] = service.generate_id()
+        try:
+            headers = write_behind.put(data=service.data, tenant=get_tenant())
+        except Exception:
+            if reserved:
+                service.quota.release()
+            raise
+        return service.data["id"], "202", headers
+    service.register_metadata()
+    return service.data["id"]
+
+
 # DELETE /services/{serviceId}
 @log_traffic
+@traced
 def deleteService(serviceId: str, **kwargs) -> str:
     """Delete service.
 
+    The service is marked as deleted and hidden from all read endpoints; the
+    tombstone is purged later by the tombstone compaction job.
+
     Args:
         id: Identifier of service to be deleted.
 
     Returns:
         Identifier of deleted service.
     """
-    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
-    db_collection_service = (
-        foca_conf.db.dbs["serviceStore"].collections["services"].client
+    db_collection_service = require_collection("services")
+    res = db_collection_service.update_one(
+        filter={"id": serviceId, **NOT_DELETED},
+        update={
+            "$set": {"_deleted_at": datetime.utcnow()},
+            "$unset": {UNIQUE_HASH_FIELD: ""},
+        },
     )
-    res = db_collection_service.delete_one({"id": serviceId})
-    if not res.deleted_count:
+    if not res.modified_count:
         raise NotFound
+    ServiceQuota().release()
+    ChangeLog().record(operation="delete", id=serviceId)
     return serviceId
 
 
+# POST /services/{serviceId}/probes
+@log_traffic
+@traced
+def postServiceProbe(serviceId: str, **kwargs) -> str:
+    """Report result of probing a service.
+
+    Args:
+        serviceId: Identifier of probed service.
+
+    Returns:
+        Identifier of probed service.
+    """
+    request_json = request.json
+    if isinstance(request_json, dict):
+        getServiceById.__wrapped__(serviceId)
+        get_service_ranking().report_probe(
+            id=serviceId,
+            latency=request_json["latency"],
+            available=request_json["available"],
+        )
+        return serviceId
+    else:
+        logger.error("Invalid request payload.")
+        raise BadRequest
+
+
 # PUT /services/{serviceId}
 @log_traffic
+@traced
 def putService(serviceId: str, **kwargs) -> str:
     """Add/replace service with a user-supplied ID.
 
@@ -145,6 +467,7 @@ def putService(serviceId: str, **kwargs) -> str:
 
 # POST /service-info
 @log_traffic
+@traced
 def postServiceInfo(**kwargs) -> Tuple[None, str, Dict]:
     """Set information about this service.
 
@@ -159,3 +482,62 @@ def postServiceInfo(**kwargs) -> Tuple[None, str, Dict]:
     else:
         logger.error("Invalid request payload.")
         raise BadRequest
+
+
+# GET /admin/profiles/cpu
+@log_traffic
+def getCpuProfile(seconds: float = 10.0, **kwargs) -> Response:
+    """Capture sampling CPU profile of the running app.
+
+    Args:
+        seconds: Duration (in seconds) of sampling.
+
+    Returns:
+        Number of samples of each stack in folded format.
+    """
+    check_profiling_access(seconds=seconds)
+    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+    profiling_conf = foca_conf.custom.profiling
+    stacks = sample_cpu(seconds=seconds, interval=profiling_conf.interval)
+    return Response(to_folded(stacks), mimetype="text/plain")
+
+
+# GET /admin/profiles/allocations
+@log_traffic
+def getAllocationProfile(seconds: float = 10.0, **kwargs) -> Response:
+    """Capture allocation profile of the running app.
+
+    Args:
+        seconds: Duration (in seconds) of tracing allocations.
+
+    Returns:
+        Size (in bytes) of memory allocated and not yet freed by each stack in
+        folded format.
+    """
+    check_profiling_access(seconds=seconds)
+    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+    profiling_conf = foca_conf.custom.profiling
+    stacks = sample_allocations(
+        seconds=seconds,
+        traceback_limit=profiling_conf.traceback_limit,
+    )
+    return Response(to_folded(stacks), mimetype="text/plain")
+
+
+# GET /admin/indexes
+@log_traffic
+def getIndexes(**kwargs) -> Dict:
+    """Get state of the indexes of the service store.
+
+    Returns:
+        Time of the comparison with the configured indexes, whether any index
+        differs from its configuration, and the state of every index.
+    """
+    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+    check_admin(foca_conf.custom.indexes.admins)
+    manager = get_index_manager()
+    if manager is None:
+        logger.error("Indexes are not managed.")
+        raise NotFound
+    manager.check()
+    return manager.status()
@@ -1,17 +1,42 @@
 """Controller for registering services."""
 
 import logging
-import string  # noqa: F401
 from typing import Dict, Optional
 
 from flask import current_app
+from pymongo.collection import Collection
 from pymongo.errors import DuplicateKeyError
 
-from cloud_registry.exceptions import InternalServerError
-from foca.utils.misc import generate_id
+from cloud_registry.exceptions import Conflict, InternalServerError
+from cloud_registry.ga4gh.registry.changes import ChangeLog
+from cloud_registry.ga4gh.registry.dedup import (
+    CONTENT_HASH_FIELD,
+    GENERATED_ID_FIELD,
+    UNIQUE_HASH_FIELD,
+    content_hash,
+)
+from cloud_registry.ga4gh.registry.ids import get_id_generator
+from cloud_registry.ga4gh.registry.normalization import normalize
+from cloud_registry.ga4gh.registry.quota import ServiceQuota
+from cloud_registry.ga4gh.registry.tenancy import require_collection
+from cloud_registry.ga4gh.registry.versions import VERSION_KEY_FIELD, version_key
+from cloud_registry.tracing import traced
 
 logger = logging.getLogger(__name__)
 
+# filter matching services that have not been deleted
+NOT_DELETED: Dict = {"_deleted_at": None}
+
+# projection hiding fields used internally by the registry
+PUBLIC_PROJECTION: Dict = {
+    "_id": False,
+    "_deleted_at": False,
+    VERSION_KEY_FIELD: False,
+    CONTENT_HASH_FIELD: False,
+    UNIQUE_HASH_FIELD: False,
+    GENERATED_ID_FIELD: False,
+}
+
 
 class RegisterService:
     """Class for registering services with the registry."""
@@ -29,67 +54,197 @@ class RegisterService:
             id: Service identifier. Auto-generated if not provided.
 
         Attributes:
-            data: Service metadata.
+            data: Service metadata, including a sortable key of the version of
+                the service's type for range queries and a hash of the
+                service's URL and type for detecting duplicates. Services
+                with auto-generated identifiers are marked as such and, unless
+                duplicates are allowed, store the hash in a field indexed as
+                unique.
             replace: Whether an existing service with the provided identifier
                 should be replaced. Set to `True` if an `id` is provided,
                 otherwise set to `False`.
             was_replaced: Whether an existing service with the provided
                 identifier was replaced.
-            id_charset: A set of allowed characters or an expression evaluating
-                to an allowed character set for generating service identifiers.
-            id_length: Length of generated service identifiers.
-            db_coll: Database collection for storing service objects.
+            duplicate_of: Identifier of the existing service with the same
+                content that was returned instead of registering the service,
+                if any.
+            duplicate_policy: Handling of services registered with an
+                auto-generated identifier and the content of an existing
+                service; one of `allow`, `return_existing` or `reject`.
+            id_generator: Generator of service identifiers.
+            quota: Quota on the number of services of the current tenant.
         """
         foca_conf = current_app.config.foca  # type: ignore[attr-defined]
-        endpoint_conf = foca_conf.custom.endpoints
         self.data = data
         self.data["id"] = None if id is None else id
+        self.data[VERSION_KEY_FIELD] = version_key(
+            self.data.get("type", {}).get("version")
+        )
+        self.data[CONTENT_HASH_FIELD] = content_hash(self.data)
         self.replace = True
         self.was_replaced = False
-        self.id_charset: str = endpoint_conf.services.id.charset
-        self.id_length = int(endpoint_conf.services.id.length)
-        self.db_coll = foca_conf.db.dbs["serviceStore"].collections["services"].client
+        self.duplicate_of: Optional[str] = None
+        self.duplicate_policy = foca_conf.custom.endpoints.services.deduplication.policy
+        if id is None:
+            self.data[GENERATED_ID_FIELD] = True
+            if self.duplicate_policy != "allow":
+                self.data[UNIQUE_HASH_FIELD] = self.data[CONTENT_HASH_FIELD]
+        self.id_generator = get_id_generator()
+        self.quota = ServiceQuota()
+
+    @property
+    def db_coll(self) -> Collection:
+        """Database collection for storing service objects of the current
+        tenant.
 
+        Raises:
+            cloud_registry.exceptions.InternalServerError: The collection is
+                not configured.
+        """
+        return require_collection("services")
+
+    @traced
     def register_metadata(self, retries: int = 9) -> None:
         """Register service.
 
         Args:
-            retries: How many times should the generation of a random
-                identifier and insertion into the database be retried when
-                encountering `DuplicateKeyError`s if a service identifier was
-                not provided.
+            retries: How many times should the generation of an identifier
+                and insertion into the database be retried when encountering
+                `DuplicateKeyError`s if a service identifier was not provided.
+
+        If no identifier was provided and a service with the same content is
+        registered already, the existing service's identifier is returned
+        instead, or the registration is rejected, depending on the policy.
+        Concurrent registrations of the same content are caught by the unique
+        index of the content hash.
+
+        Raises:
+            cloud_registry.exceptions.Conflict: A service with the same
+                content is registered already and duplicates are rejected.
+            cloud_registry.exceptions.Forbidden: Registering a new service
+                would exceed the tenant's quota.
         """
-        # keep trying to generate unique ID
-        for i in range(retries + 1):
-            # set random ID unless ID is provided
-            if self.data["id"] is None:
-                self.replace = False
-                self.data["id"] = generate_id(
-                    charset=self.id_charset, length=self.id_length
-                )
-
-            # replace or insert service, then return (PUT)
-            if self.replace:
-                result_object = self.db_coll.replace_one(
-                    filter={"id": self.data["id"]},
-                    replacement=self.data,
-                    upsert=True,
-                )
-                if result_object.modified_count:
-                    self.was_replaced = True
-                break
+        if self.data.get("id") is None:
+            self.duplicate_of = self.find_duplicate()
+            if self.duplicate_of is not None:
+                self.data["id"] = self.duplicate_of
+                return
+
+        reserved = self.check_quota()
+        try:
+            # keep trying to generate unique ID
+            for i in range(retries + 1):
+                # set random ID unless ID is provided
+                if self.data.get("id") is None:
+                    self.replace = False
+                    self.data["id"] = self.generate_id()
 
-            # insert service (POST); continue with next iteration if key exists
-            try:
-                self.db_coll.insert_one(document=self.data)
-            except DuplicateKeyError:
-                continue
+                # store organization and type in dictionaries if normalized
+                stored = normalize(self.data)
 
-            logger.info(f"Added service with id '{self.data['id']}'.")
-            break
-        else:
-            raise InternalServerError
+                # replace or insert service, then return (PUT); the tombstone
+                # of a deleted service is overwritten, clearing `_deleted_at`,
+                # and recorded as an insert
+                if self.replace:
+                    result_object = self.db_coll.replace_one(
+                        filter={"id": self.data["id"], **NOT_DELETED},
+                        replacement=stored,
+                    )
+                    operation = "replace"
+                    if not result_object.matched_count:
+                        self.db_coll.replace_one(
+                            filter={"id": self.data["id"]},
+                            replacement={**stored, "_deleted_at": None},
+                            upsert=True,
+                        )
+                        operation = "insert"
+                    if result_object.modified_count:
+                        self.was_replaced = True
+                    break
+
+                # insert service (POST); continue with next iteration if key
+                # exists, unless the content was registered concurrently
+                try:
+                    self.db_coll.insert_one(document=stored)
+                except DuplicateKeyError:
+                    if UNIQUE_HASH_FIELD in self.data:
+                        self.duplicate_of = self.find_duplicate()
+                    if self.duplicate_of is None:
+                        continue
+                    self.data["id"] = self.duplicate_of
+                    break
+
+                logger.info(f"Added service with id '{self.data['id']}'.")
+                operation = "insert"
+                break
+            else:
+                raise InternalServerError
+        except Exception:
+            if reserved:
+                self.quota.release()
+            raise
+        if self.duplicate_of is not None:
+            if reserved:
+                self.quota.release()
+            return
+        ChangeLog().record(operation=operation, id=self.data["id"])
         logger.debug(
             "Entry in 'services' collection: "
             f"{self.db_coll.find_one({'id': self.data['id']})}"
         )
+
+    @traced
+    def find_duplicate(self) -> Optional[str]:
+        """Find existing service with the same content, as per the policy.
+
+        Returns:
+            Identifier of the existing service with the same URL and type if
+            the policy is to return it, otherwise `None`.
+
+        Raises:
+            cloud_registry.exceptions.Conflict: A service with the same
+                content is registered already and duplicates are rejected.
+        """
+        if self.duplicate_policy == "allow":
+            return None
+        existing = self.db_coll.find_one(
+            filter={CONTENT_HASH_FIELD: self.data[CONTENT_HASH_FIELD], **NOT_DELETED},
+            projection={"_id": False, "id": True},
+        )
+        if existing is None:
+            return None
+        if self.duplicate_policy == "reject":
+            logger.error(f"Service duplicates service '{existing['id']}'.")
+            raise Conflict
+        logger.info(f"Service duplicates service '{existing['id']}'; not added.")
+        return existing["id"]
+
+    @traced
+    def check_quota(self) -> bool:
+        """Reserve slot for the service in the tenant's quota.
+
+        Replacing an existing service is always allowed and does not need a
+        slot. Reserved slots are released via `quota.release()` if the
+        service is not stored after all.
+
+        Returns:
+            Whether a slot was reserved.
+
+        Raises:
+            cloud_registry.exceptions.Forbidden: The tenant has registered the
+                maximum number of services already.
+        """
+        if self.data.get("id") is not None and self.db_coll.count_documents(
+            {"id": self.data["id"], **NOT_DELETED}, limit=1
+        ):
+            return False
+        self.quota.reserve()
+        return True
+
+    def generate_id(self) -> str:
+        """Generate service identifier with the configured strategy.
+
+        Returns:
+            Service identifier.
+        """
+        return self.id_generator.generate()
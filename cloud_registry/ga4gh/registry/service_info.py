@@ -1,19 +1,58 @@
 """Controller for service info endpoint."""
 
+from copy import deepcopy
 import logging
-from typing import Dict
+import threading
+from typing import Dict, Optional
 
-from flask import current_app
+from flask import current_app, Flask
+from pymongo.collection import Collection
 
 from cloud_registry.exceptions import NotFound
+from cloud_registry.ga4gh.registry.read_preference import for_reads
+from cloud_registry.ga4gh.registry.tenancy import get_tenant, require_collection
+from cloud_registry.startup import StartupPhases, StartupTask
+from cloud_registry.tracing import traced
 
 logger = logging.getLogger(__name__)
 
 
+def reconcile_service_info(
+    app: Flask,
+    phases: Optional[StartupPhases] = None,
+) -> StartupTask:
+    """Register configured service info in the background.
+
+    Until the configured service info was registered, e.g., while the
+    database is unavailable, cached or configured service info is served
+    without querying the database, so that requests do not wait for the
+    database to time out. Service info set for the default tenant in the
+    meantime is not overwritten by the configured service info.
+
+    Args:
+        app: Flask application instance.
+        phases: Startup phase timings the task's duration is recorded in.
+
+    Returns:
+        Started startup task.
+    """
+    task = StartupTask(
+        app=app,
+        name="reconcile service info",
+        func=lambda: RegisterServiceInfo().set_service_info_from_config(),
+        phases=phases,
+    )
+    app.extensions["service_info_reconciled"] = task.done
+    task.start()
+    return task
+
+
 class RegisterServiceInfo:
     """Class for registering the service info.
 
-    Creates service info upon first request, if it does not exist.
+    Creates service info upon first request, if it does not exist. The latest
+    service info read from the database is cached, so that it can still be
+    served while the database is unavailable.
     """
 
     def __init__(self) -> None:
@@ -26,7 +65,9 @@ class RegisterServiceInfo:
             api_path: Base path at which API endpoints can be reached for this
                 application instance.
             conf_info: Service info details as per endpoints config.
-            collection: Database collection storing service info objects.
+            default_collection: Database collection storing service info
+                objects of the default tenant, used for tenants that have not
+                set their own service info.
         """
         foca_conf = current_app.config.foca  # type: ignore[attr-defined]
         endpoint_conf = foca_conf.custom.endpoints
@@ -35,63 +76,119 @@ class RegisterServiceInfo:
         self.external_port = endpoint_conf.service.external_port
         self.api_path = endpoint_conf.service.api_path
         self.conf_info = endpoint_conf.service_info.dict()
-        self.collection = (
+        self.default_collection = (
             foca_conf.db.dbs["serviceStore"].collections["service_info"].client
         )
 
+    @property
+    def collection(self) -> Collection:
+        """Database collection storing service info objects of the current
+        tenant.
+
+        Raises:
+            cloud_registry.exceptions.InternalServerError: The collection is
+                not configured.
+        """
+        return require_collection("service_info")
+
+    @traced
     def get_service_info(self) -> Dict:
         """Get latest service info from database.
 
+        Falls back to the service info of the default tenant if the current
+        tenant has not set its own.
+
         Returns:
             Latest service info details.
         """
-        try:
-            return (
-                self.collection.find({}, {"_id": False})
-                .sort([("_id", -1)])
-                .limit(1)
-                .next()
-            )
-        except StopIteration:
-            raise NotFound
+        for collection in [self.collection, self.default_collection]:
+            try:
+                info = (
+                    for_reads(collection)
+                    .find({}, {"_id": False})
+                    .sort([("_id", -1)])
+                    .limit(1)
+                    .next()
+                )
+            except StopIteration:
+                continue
+            self._cache()[get_tenant()] = info
+            return info
+        raise NotFound
+
+    @staticmethod
+    def is_reconciled() -> bool:
+        """Whether the configured service info was registered, or is not
+        registered in the background.
+        """
+        reconciled = current_app.extensions.get("service_info_reconciled")
+        return reconciled is None or reconciled.is_set()
+
+    def get_fallback_service_info(self) -> Dict:
+        """Get service info without querying the database.
+
+        Returns:
+            Service info last read from the database for the current tenant,
+            or as per the service configuration if none was read yet.
+        """
+        info = self._cache().get(get_tenant())
+        return deepcopy(self.conf_info if info is None else info)
 
+    @traced
     def set_service_info_from_config(
         self,
     ) -> None:
         """Create or update service info from service configuration.
 
         Will create service info if it does not exist or current
-        configuration differs from available one.
+        configuration differs from available one, unless service info was set
+        via the API while it was registered in the background.
 
         Raises:
             cloud_registry.exceptions.ValidationError: Service info
                 configuration does not conform to API specification.
         """
-        add = False
-        try:
-            db_info = self.get_service_info()
-        except NotFound:
-            db_info = {}
-        add = False if db_info == self.conf_info else True
-        if add:
-            self._upsert_service_info(data=self.conf_info)
-            logger.info("Service info registered.")
-        else:
-            logger.info("Using available service info.")
-
+        with self._lock():
+            reconciled = current_app.extensions.get("service_info_reconciled")
+            if reconciled is not None and reconciled.is_set():
+                logger.info("Using service info set since startup.")
+                return
+            add = False
+            try:
+                db_info = self.get_service_info()
+            except NotFound:
+                db_info = {}
+            add = False if db_info == self.conf_info else True
+            if add:
+                self._upsert_service_info(data=self.conf_info)
+                logger.info("Service info registered.")
+            else:
+                logger.info("Using available service info.")
+
+    @traced
     def set_service_info_from_app_context(
         self,
         data: Dict,
     ) -> Dict:
         """Return service info.
 
+        The service info is cached, so that it is served while the configured
+        service info is registered in the background. Service info set for the
+        default tenant marks the configured service info as registered, so
+        that it does not overwrite the service info set.
+
         Arguments:
             data: Service info according to API specification.
 
         Returns:
             Response headers.
         """
-        self._upsert_service_info(data=data)
+        with self._lock():
+            self._upsert_service_info(data=data)
+            self._cache()[get_tenant()] = deepcopy(data)
+            reconciled = current_app.extensions.get("service_info_reconciled")
+            if get_tenant() is None and reconciled is not None:
+                reconciled.set()
         return self._get_headers()
 
     def _upsert_service_info(
@@ -105,6 +202,16 @@ class RegisterServiceInfo:
             upsert=True,
         )
 
+    @staticmethod
+    def _cache() -> Dict:
+        """Return the app's cache of service info by tenant."""
+        return current_app.extensions.setdefault("service_info_cache", {})
+
+    @staticmethod
+    def _lock() -> threading.Lock:
+        """Return the app's lock serializing writes of service info."""
+        return current_app.extensions.setdefault("service_info_lock", threading.Lock())
+
     def _get_headers(self) -> Dict:
         """Build dictionary of response headers.
 
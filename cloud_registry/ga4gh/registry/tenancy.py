@@ -0,0 +1,221 @@
+"""Resolution of tenant-specific database collections."""
+
+import logging
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, current_app, g, request
+from pymongo.collection import Collection
+
+from cloud_registry.exceptions import BadRequest, Forbidden, InternalServerError
+
+logger = logging.getLogger(__name__)
+
+_TENANT = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def get_tenant() -> Optional[str]:
+    """Get tenant of the current request or background job.
+
+    The tenant requested via the tenant header is checked on first use, i.e.,
+    once the bearer token of the request was validated.
+
+    Returns:
+        Tenant identifier, or `None` for the default tenant.
+
+    Raises:
+        cloud_registry.exceptions.Forbidden: The requester may not access the
+            requested tenant.
+    """
+    if "requested_tenant" in g:
+        tenant = g.pop("requested_tenant")
+        check_tenant_access(tenant)
+        g.tenant = tenant
+    return g.get("tenant")
+
+
+def set_tenant(tenant: Optional[str]) -> None:
+    """Set tenant for the current app context, e.g., in background jobs.
+
+    Args:
+        tenant: Tenant identifier, or `None` for the default tenant.
+    """
+    g.tenant = tenant
+
+
+def get_collection(name: str, tenant: Optional[str] = None) -> Optional[Collection]:
+    """Resolve database collection of the current tenant.
+
+    The default tenant uses the collections configured for the `serviceStore`
+    database. Every other tenant uses a collection named after the configured
+    collection and the tenant, separated by a dot (e.g., `services.tenant1`),
+    with the same indexes, which are created on first use.
+
+    Args:
+        name: Name of a collection configured for the `serviceStore` database.
+        tenant: Tenant identifier. Defaults to the tenant of the current
+            request or background job.
+
+    Returns:
+        Database collection, or `None` if the collection is not configured.
+    """
+    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+    coll_conf = foca_conf.db.dbs["serviceStore"].collections.get(name)
+    if coll_conf is None or coll_conf.client is None:
+        return None
+    tenant = get_tenant() if tenant is None else tenant
+    if tenant is None:
+        return coll_conf.client
+    tenant_collections: TenantCollections = current_app.extensions.setdefault(
+        "tenant_collections", TenantCollections()
+    )
+    return tenant_collections.get(
+        base=coll_conf.client,
+        indexes=[(index.keys, index.options) for index in coll_conf.indexes or []],
+        tenant=tenant,
+    )
+
+
+def check_tenant_access(tenant: str) -> None:
+    """Check whether the requester may access a tenant.
+
+    Requesters may access the tenants listed in the configured claim of their
+    validated bearer token, as well as the tenants the configured allow-list
+    grants their `user_id`; if authorization is disabled, any requester may
+    access any tenant.
+
+    Args:
+        tenant: Tenant identifier.
+
+    Raises:
+        cloud_registry.exceptions.Forbidden: The requester may not access the
+            tenant.
+    """
+    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+    if all(spec.disable_auth for spec in foca_conf.api.specs):
+        return
+    tenancy_conf = foca_conf.custom.tenancy
+    user_id = request.headers.get("user_id")
+    allowed = set((tenancy_conf.users or {}).get(user_id, []))
+    if tenancy_conf.claim is not None:
+        allowed.update(request.headers.getlist(tenancy_conf.claim))
+    if tenant not in allowed:
+        logger.warning(f"Tenant '{tenant}' requested by user without access: {user_id}")
+        raise Forbidden
+
+
+def require_collection(name: str, tenant: Optional[str] = None) -> Collection:
+    """Resolve database collection of the current tenant that is required.
+
+    Args:
+        name: Name of a collection configured for the `serviceStore` database.
+        tenant: Tenant identifier. Defaults to the tenant of the current
+            request or background job.
+
+    Returns:
+        Database collection.
+
+    Raises:
+        cloud_registry.exceptions.InternalServerError: The collection is not
+            configured.
+    """
+    collection = get_collection(name, tenant=tenant)
+    if collection is None:
+        logger.error(f"Collection '{name}' is not configured.")
+        raise InternalServerError
+    return collection
+
+
+def list_tenant_collections(base: Collection) -> List[Collection]:
+    """List collections of all tenants in the database.
+
+    Args:
+        base: Collection of the default tenant.
+
+    Returns:
+        Collection of the default tenant, followed by the corresponding
+        collections of all other tenants.
+    """
+    prefix = f"{base.name}."
+    return [base] + [
+        base.database[name]
+        for name in sorted(base.database.list_collection_names())
+        if name.startswith(prefix)
+    ]
+
+
+def query_options() -> Dict:
+    """Get options limiting the cost of queries listing services.
+
+    Returns:
+        Keyword arguments to pass to `find()`.
+    """
+    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+    max_time_ms = foca_conf.custom.tenancy.max_time_ms
+    return {} if max_time_ms is None else {"max_time_ms": max_time_ms}
+
+
+class TenantCollections:
+    """Cache of tenant-specific collections whose indexes were created."""
+
+    def __init__(self) -> None:
+        """Initialize cache."""
+        self._collections: Dict[Tuple[str, str], Collection] = {}
+        self._lock = threading.Lock()
+
+    def get(self, base: Collection, indexes: List[Tuple], tenant: str) -> Collection:
+        """Get tenant-specific collection, creating its indexes on first use.
+
+        Args:
+            base: Collection of the default tenant.
+            indexes: Keys and options of indexes to create.
+            tenant: Tenant identifier.
+
+        Returns:
+            Tenant-specific collection.
+        """
+        key = (base.name, tenant)
+        collection = self._collections.get(key)
+        if collection is not None:
+            return collection
+        with self._lock:
+            if key not in self._collections:
+                collection = base.database[f"{base.name}.{tenant}"]
+                for keys, options in indexes:
+                    collection.create_index(keys, **(options or {}))
+                logger.info(f"Created indexes of collection '{collection.name}'.")
+                self._collections[key] = collection
+            return self._collections[key]
+
+
+def register_tenancy(app: Flask) -> None:
+    """Resolve tenant of every request from a request header if enabled.
+
+    Access to the tenant is checked once the tenant is first used, see
+    `get_tenant()`.
+
+    Args:
+        app: Flask application instance.
+    """
+    foca_conf = app.config.foca  # type: ignore[attr-defined]
+    tenancy_conf = foca_conf.custom.tenancy
+    if not tenancy_conf.enabled:
+        return
+
+    @app.before_request
+    def resolve_tenant() -> None:
+        """Set tenant of the request."""
+        tenant = request.headers.get(tenancy_conf.header)
+        if tenant is None:
+            if tenancy_conf.required:
+                logger.error(f"Missing tenant header '{tenancy_conf.header}'.")
+                raise BadRequest
+        elif not _TENANT.match(tenant):
+            logger.error(f"Invalid tenant: {tenant}")
+            raise BadRequest
+        elif tenancy_conf.tenants is not None and tenant not in tenancy_conf.tenants:
+            logger.error(f"Unknown tenant: {tenant}")
+            raise Forbidden
+        if tenant is not None:
+            g.requested_tenant = tenant
@@ -0,0 +1,102 @@
+"""Controller for purging deleted services."""
+
+from datetime import datetime, timedelta
+import logging
+import threading
+from typing import Dict, Optional
+
+from flask import current_app
+
+from cloud_registry.ga4gh.registry.tenancy import list_tenant_collections
+
+logger = logging.getLogger(__name__)
+
+
+class TombstoneCompaction:
+    """Class for purging tombstones of deleted services.
+
+    Deleted services are kept as tombstones, i.e., marked as deleted but not
+    removed, so that deletions are cheap and can be observed downstream.
+    Tombstones older than the configured retention period are purged in
+    batches, either on demand or periodically by a background thread, from the
+    collections of all tenants.
+    """
+
+    def __init__(self) -> None:
+        """Initialize class requirements.
+
+        Attributes:
+            enabled: Whether tombstones are purged periodically.
+            retention: Time (in seconds) for which tombstones are kept.
+            batch_size: Maximum number of tombstones purged per batch.
+            interval: Interval (in seconds) between periodic purges.
+            collection: Database collection storing service objects of the
+                default tenant.
+        """
+        foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+        tombstones_conf = foca_conf.custom.endpoints.services.tombstones
+        self.enabled = tombstones_conf.enabled
+        self.retention = tombstones_conf.retention
+        self.batch_size = tombstones_conf.batch_size
+        self.interval = tombstones_conf.interval
+        self.collection = (
+            foca_conf.db.dbs["serviceStore"].collections["services"].client
+        )
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def purge(self) -> int:
+        """Purge tombstones older than the retention period.
+
+        Returns:
+            Number of purged tombstones.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        expired: Dict = {"_deleted_at": {"$lt": cutoff}}
+        purged = 0
+        for collection in list_tenant_collections(self.collection):
+            while not self._stop.is_set():
+                ids = [
+                    doc["_id"]
+                    for doc in collection.find(
+                        filter=expired,
+                        projection={"_id": True},
+                        limit=self.batch_size,
+                    )
+                ]
+                if not ids:
+                    break
+                res = collection.delete_many({"_id": {"$in": ids}, **expired})
+                purged += res.deleted_count
+        if purged:
+            logger.info(f"Purged {purged} tombstones of deleted services.")
+        return purged
+
+    def start(self) -> None:
+        """Start purging tombstones periodically in a daemon thread."""
+        if not self.enabled:
+            logger.info("Tombstone compaction disabled.")
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="tombstone-compaction",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info(f"Tombstone compaction scheduled every {self.interval}s.")
+
+    def stop(self) -> None:
+        """Stop purging tombstones periodically."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """Purge tombstones until stopped."""
+        while not self._stop.wait(timeout=self.interval):
+            try:
+                self.purge()
+            except Exception as e:
+                logger.warning(f"Could not purge tombstones: {type(e).__name__}: {e}")
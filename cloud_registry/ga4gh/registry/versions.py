@@ -0,0 +1,186 @@
+"""Sortable version keys and semantic version range filters."""
+
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+from pymongo.collection import Collection
+
+from cloud_registry.exceptions import BadRequest
+
+logger = logging.getLogger(__name__)
+
+# field storing the sortable version key of a service's type
+VERSION_KEY_FIELD = "_version_key"
+
+_VERSION = re.compile(
+    r"^v?(?P<major>\d+)(?:\.(?P<minor>\d+|[xX*]))?(?:\.(?P<patch>\d+|[xX*]))?"
+    r"(?:-(?P<pre>[0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$"
+)
+_COMPARATOR = re.compile(r"^(?P<op>\^|~|>=|<=|>|<|=)?(?P<version>.+)$")
+_DIGITS = 8
+_RELEASE = "~"
+
+
+def version_key(version: Optional[str]) -> Optional[str]:
+    """Build lexicographically sortable key from a semantic version.
+
+    Major, minor and patch versions are zero-padded, so that keys sort in the
+    order of versions. Releases sort after their pre-releases; pre-releases
+    are ordered lexicographically by their identifiers.
+
+    Args:
+        version: Semantic version, e.g., `1.2.3` or `1.2.3-beta`. Missing minor
+            and patch versions default to zero.
+
+    Returns:
+        Version key, or `None` if the version is not a semantic version.
+    """
+    version = version or ""
+    parsed = _parse(version)
+    if parsed is None:
+        return None
+    numbers, given, pre = parsed
+    # reject wildcards, e.g., `1.x`
+    if given < re.split(r"[-+]", version, 1)[0].count(".") + 1:
+        return None
+    return _key(numbers, pre)
+
+
+def version_filter(spec: str) -> Optional[Dict]:
+    """Build database filter on version keys from a version range.
+
+    Supports space-separated comparators, all of which need to match:
+    caret (`^1.2`) and tilde (`~1.2.3`) ranges, partial versions (`1`, `1.x`),
+    exact versions (`1.2.3`, `=1.2.3`) and comparisons (`>=1.0`, `<2.0.0`).
+    Pre-releases of the lower bound of a range do not match the range.
+
+    Args:
+        spec: Version range, e.g., `^1.0`.
+
+    Returns:
+        Filter on the version key field, or `None` if any version matches.
+
+    Raises:
+        cloud_registry.exceptions.BadRequest: Version range is malformed.
+    """
+    conditions: List[Dict] = []
+    for comparator in spec.split():
+        if comparator in ["*", "x", "X"]:
+            continue
+        conditions.append({VERSION_KEY_FIELD: _condition(comparator)})
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+def backfill_version_keys(collection: Collection) -> int:
+    """Store version keys for services registered without one.
+
+    Args:
+        collection: Database collection storing service objects.
+
+    Returns:
+        Number of updated services.
+    """
+    count = 0
+    for obj in collection.find(
+        filter={VERSION_KEY_FIELD: {"$exists": False}},
+        projection={"_id": True, "type.version": True},
+    ):
+        collection.update_one(
+            filter={"_id": obj["_id"]},
+            update={
+                "$set": {
+                    VERSION_KEY_FIELD: version_key(obj.get("type", {}).get("version"))
+                }
+            },
+        )
+        count += 1
+    if count:
+        logger.info(f"Stored version keys for {count} services.")
+    return count
+
+
+def _condition(comparator: str) -> Dict:
+    """Build condition on version keys from a single comparator."""
+    match = _COMPARATOR.match(comparator)
+    parsed = None if match is None else _parse(match.group("version"))
+    if match is None or parsed is None:
+        logger.error(f"Invalid version range: {comparator}")
+        raise BadRequest
+    op = match.group("op") or "="
+    numbers, given, pre = parsed
+    key = _key(numbers, pre)
+    if op in ["^", "~"] or op == "=" and given < 3:
+        if op == "^":
+            upper = _caret_upper(numbers, given)
+        elif op == "~" and given >= 2:
+            upper = (numbers[0], numbers[1] + 1, 0)
+        else:
+            upper = _bump(numbers, given)
+        return {"$gte": key, "$lt": _base(upper)}
+    if op == "=":
+        return {"$eq": key}
+    if op == ">=":
+        return {"$gte": key}
+    if op == ">":
+        if given < 3:
+            return {"$gte": _key(_bump(numbers, given), None)}
+        return {"$gt": key}
+    if op == "<":
+        return {"$lt": _base(numbers) if pre is None else key}
+    return {"$lt": _base(_bump(numbers, given))} if given < 3 else {"$lte": key}
+
+
+def _parse(version: str) -> Optional[Tuple[Tuple[int, int, int], int, Optional[str]]]:
+    """Parse version into numbers, number of numbers given and pre-release."""
+    match = _VERSION.match(version)
+    if match is None:
+        return None
+    parts = [match.group("major"), match.group("minor"), match.group("patch")]
+    given = 0
+    for part in parts:
+        if part is None or not part.isdigit():
+            break
+        given += 1
+    if any(part is not None and part.isdigit() for part in parts[given:]):
+        return None
+    numbers = tuple(int(p) if i < given else 0 for i, p in enumerate(parts))
+    if any(len(str(n)) > _DIGITS for n in numbers):
+        return None
+    pre = match.group("pre")
+    if pre is not None and given < 3:
+        return None
+    return numbers, given, pre  # type: ignore[return-value]
+
+
+def _base(numbers: Tuple[int, int, int]) -> str:
+    """Format zero-padded major, minor and patch versions."""
+    return ".".join(f"{n:0{_DIGITS}d}" for n in numbers)
+
+
+def _key(numbers: Tuple[int, int, int], pre: Optional[str]) -> str:
+    """Format version key."""
+    return _base(numbers) + (_RELEASE if pre is None else f"-{pre}")
+
+
+def _bump(numbers: Tuple[int, int, int], given: int) -> Tuple[int, int, int]:
+    """Return lowest version above all versions matching a partial version."""
+    if given <= 1:
+        return (numbers[0] + 1, 0, 0)
+    if given == 2:
+        return (numbers[0], numbers[1] + 1, 0)
+    return (numbers[0], numbers[1], numbers[2] + 1)
+
+
+def _caret_upper(numbers: Tuple[int, int, int], given: int) -> Tuple[int, int, int]:
+    """Return exclusive upper bound of caret range."""
+    major, minor, _ = numbers
+    if major > 0 or given == 1:
+        return (major + 1, 0, 0)
+    if minor > 0 or given == 2:
+        return (0, minor + 1, 0)
+    return _bump(numbers, given)
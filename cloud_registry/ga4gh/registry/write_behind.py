@@ -0,0 +1,462 @@
+"""Controller for registering services asynchronously."""
+
+from collections import OrderedDict, defaultdict
+from itertools import count
+import json
+import logging
+import os
+from queue import Empty, Queue
+import threading
+from typing import Dict, IO, Iterator, List, Optional, Set, Tuple
+
+from flask import Flask
+from pymongo import UpdateOne
+from pymongo.errors import (
+    BulkWriteError,
+    ConnectionFailure,
+    ExecutionTimeout,
+    PyMongoError,
+    WTimeoutError,
+)
+
+from cloud_registry.exceptions import ServiceUnavailable
+from cloud_registry.ga4gh.registry.changes import ChangeLog
+from cloud_registry.ga4gh.registry.normalization import normalize
+from cloud_registry.ga4gh.registry.quota import ServiceQuota
+from cloud_registry.ga4gh.registry.tenancy import require_collection, set_tenant
+
+logger = logging.getLogger(__name__)
+
+# sequence number, queued service, whether it was replayed from the spill
+# file, and its tenant
+Item = Tuple[int, Dict, bool, Optional[str]]
+
+# errors after which writes are retried
+TRANSIENT_ERRORS = (ConnectionFailure, ExecutionTimeout, WTimeoutError)
+
+# code of write errors caused by duplicate keys
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindQueue:
+    """Queue of services awaiting registration.
+
+    In write-behind mode, services registered with an auto-generated
+    identifier are acknowledged as soon as they are queued and persisted by a
+    background worker in batches. Requests are rejected while the queue is
+    full. Queued services are appended to a spill file before they are
+    acknowledged and persisted by the worker on startup, so that acknowledged
+    services are not lost if the process exits before persisting them. After
+    every persisted batch, the spill file is rotated and services awaiting
+    registration are written to a compacted file next to it; only the rotation
+    holds the lock that registrations take, so that writing the compacted file
+    does not block them. Services are persisted to the collection
+    of the tenant that registered them. Batches are retried while the database
+    is unavailable, while services rejected by the database fail to register.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        """Initialize class requirements.
+
+        Args:
+            app: Flask application instance.
+
+        Attributes:
+            app: Flask application instance.
+            batch_size: Maximum number of services persisted per batch.
+            flush_interval: Maximum time (in seconds) the worker waits for
+                queued services before checking whether it was stopped.
+            status_size: Maximum number of registration statuses kept.
+            spill_file: Path to the spill file.
+            url_prefix: URL scheme of application instance.
+            host_name: Host name of application instance.
+            external_port: Port at which application instance is served.
+            api_path: Base path at which API endpoints can be reached for this
+                application instance.
+
+        Raises:
+            ValueError: No spill file is configured.
+        """
+        foca_conf = app.config.foca  # type: ignore[attr-defined]
+        endpoint_conf = foca_conf.custom.endpoints
+        write_behind_conf = endpoint_conf.services.write_behind
+        self.app = app
+        self.batch_size = write_behind_conf.batch_size
+        self.flush_interval = write_behind_conf.flush_interval
+        self.status_size = write_behind_conf.status_size
+        if write_behind_conf.spill_file is None:
+            raise ValueError("Write-behind mode requires a spill file.")
+        self.spill_file: str = write_behind_conf.spill_file
+        self._compacted_file = f"{self.spill_file}.compacted"
+        self._rotated_file = f"{self.spill_file}.rotated"
+        self.url_prefix = endpoint_conf.service.url_prefix
+        self.host_name = endpoint_conf.service.external_host
+        self.external_port = endpoint_conf.service.external_port
+        self.api_path = endpoint_conf.service.api_path
+        self._queue: "Queue[Item]" = Queue(maxsize=write_behind_conf.queue_size)
+        self._status: "OrderedDict[Tuple[Optional[str], str], str]" = OrderedDict()
+        self._status_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._spill: Optional[IO[str]] = None
+        self._pending: "OrderedDict[int, Tuple[Dict, Optional[str]]]" = OrderedDict()
+        self._seq = count()
+        self._thread: Optional[threading.Thread] = None
+
+    def put(self, data: Dict, tenant: Optional[str] = None) -> Dict:
+        """Queue service for registration.
+
+        Args:
+            data: Service metadata, including the service identifier.
+            tenant: Tenant registering the service, or `None` for the default
+                tenant.
+
+        Returns:
+            Response headers pointing to the registration status.
+
+        Raises:
+            cloud_registry.exceptions.ServiceUnavailable: Queue is full.
+        """
+        with self._lock:
+            if self._queue.full():
+                logger.warning("Write-behind queue full; rejecting service.")
+                raise ServiceUnavailable
+            seq = next(self._seq)
+            self._write_spill(data, tenant)
+            self._pending[seq] = (data, tenant)
+            self._queue.put_nowait((seq, data, False, tenant))
+            self._set_status(tenant, data["id"], "queued")
+        logger.info(f"Queued service with id '{data['id']}'.")
+        return self._get_headers(data["id"])
+
+    def get_status(self, id: str, tenant: Optional[str] = None) -> Optional[str]:
+        """Get registration status of a queued service.
+
+        Args:
+            id: Service identifier.
+            tenant: Tenant that registered the service, or `None` for the
+                default tenant.
+
+        Returns:
+            One of `queued`, `persisted` or `failed`, or `None` if the service
+            was not queued or its status was evicted.
+        """
+        with self._status_lock:
+            return self._status.get((tenant, id))
+
+    def flush(self, timeout: float = 0) -> int:
+        """Persist a batch of queued services.
+
+        Args:
+            timeout: Maximum time (in seconds) to wait for queued services.
+
+        Returns:
+            Number of services taken from the queue.
+        """
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except Empty:
+            return 0
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except Empty:
+                break
+        if not self._persist(batch):
+            return 0
+        for _ in batch:
+            self._queue.task_done()
+        return len(batch)
+
+    def start(self) -> None:
+        """Start persisting queued services in a daemon thread.
+
+        Services left in the spill file by a previous run are loaded before
+        the worker starts, so that they are not mistaken for services queued
+        since, and persisted first.
+        """
+        self._stop.clear()
+        replayed = self._load_spill()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(replayed,),
+            name="write-behind",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info("Write-behind registration of services enabled.")
+
+    def stop(self) -> None:
+        """Persist remaining queued services and stop worker."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+
+    def _persist(self, batch: List[Item]) -> bool:
+        """Persist batch of services and remove them from the spill file.
+
+        Returns:
+            Whether the batch was persisted before the worker was stopped.
+        """
+        if not self._write(batch):
+            return False
+        with self._lock:
+            for seq, _, _, _ in batch:
+                self._pending.pop(seq, None)
+        self._compact_spill()
+        return True
+
+    def _run(self, replayed: List[Item]) -> None:
+        """Persist replayed and queued services until stopped, then drain the
+        queue.
+        """
+        self._replay(replayed)
+        while not self._stop.is_set():
+            self.flush(timeout=self.flush_interval)
+        while self.flush():
+            pass
+
+    def _write(self, batch: List[Item]) -> bool:
+        """Persist batch of services, retrying while the database is
+        unavailable.
+
+        Services are inserted unless a service with the same identifier
+        exists. Existing services are considered persisted if they were
+        replayed from the spill file, otherwise their identifier collided with
+        that of another service and registration failed. Registration also
+        fails for services rejected by the database.
+
+        Returns:
+            Whether the batch was persisted before the worker was stopped.
+        """
+        by_tenant: Dict[Optional[str], List[Tuple[Dict, bool]]] = defaultdict(list)
+        for _, data, replayed, tenant in batch:
+            by_tenant[tenant].append((data, replayed))
+        with self.app.app_context():
+            for tenant, items in by_tenant.items():
+                set_tenant(tenant)
+                if not self._write_tenant(items, tenant):
+                    return False
+        logger.info(f"Persisted batch of {len(batch)} queued services.")
+        return True
+
+    def _write_tenant(
+        self,
+        items: List[Tuple[Dict, bool]],
+        tenant: Optional[str],
+    ) -> bool:
+        """Persist services of a single tenant, retrying transient errors."""
+        collection = require_collection("services")
+        requests = [
+            UpdateOne(
+                filter={"id": data["id"]},
+                update={
+                    "$setOnInsert": {
+                        k: v for k, v in normalize(data).items() if k != "id"
+                    }
+                },
+                upsert=True,
+            )
+            for data, _ in items
+        ]
+        errors: Dict[int, Dict] = {}
+        while True:
+            try:
+                upserted = collection.bulk_write(requests, ordered=False).upserted_ids
+                break
+            except BulkWriteError as e:
+                upserted = {
+                    upsert["index"]: upsert["_id"]
+                    for upsert in e.details.get("upserted", [])
+                }
+                errors = {
+                    error["index"]: error for error in e.details.get("writeErrors", [])
+                }
+                for error in e.details.get("writeConcernErrors", []):
+                    logger.warning(f"Write concern error: {error.get('errmsg')}")
+                break
+            except TRANSIENT_ERRORS as e:
+                logger.warning(
+                    f"Could not persist {len(items)} queued services: "
+                    f"{type(e).__name__}: {e}"
+                )
+                if self._stop.wait(timeout=self.flush_interval):
+                    return False
+            except PyMongoError as e:
+                upserted = {}
+                errors = {
+                    index: {"errmsg": f"{type(e).__name__}: {e}"}
+                    for index in range(len(items))
+                }
+                break
+        change_log = ChangeLog()
+        failed = 0
+        for index, (data, replayed) in enumerate(items):
+            error = errors.get(index)
+            if index in upserted:
+                change_log.record(operation="insert", id=data["id"])
+                status = "persisted"
+            elif error is not None and error.get("code") != DUPLICATE_KEY:
+                logger.error(
+                    f"Could not persist service with id '{data['id']}': "
+                    f"{error.get('errmsg')}"
+                )
+                status = "failed"
+            elif replayed:
+                status = "persisted"
+            else:
+                logger.error(f"Service id '{data['id']}' already exists.")
+                status = "failed"
+            if status == "failed":
+                failed += 1
+            self._set_status(tenant, data["id"], status)
+        ServiceQuota().release(count=failed)
+        return True
+
+    def _load_spill(self) -> List[Item]:
+        """Load services left in the compacted, rotated and spill files by a
+        previous run.
+
+        Services found in more than one file, because the previous run exited
+        while compacting the spill file, are loaded once.
+
+        Returns:
+            Services awaiting registration.
+        """
+        batch: List[Item] = []
+        loaded: Set[Tuple[Optional[str], str]] = set()
+        with self._lock:
+            for path in (self._compacted_file, self._rotated_file, self.spill_file):
+                for data, tenant in self._read_spill(path):
+                    if (tenant, data["id"]) in loaded:
+                        continue
+                    loaded.add((tenant, data["id"]))
+                    seq = next(self._seq)
+                    self._pending[seq] = (data, tenant)
+                    batch.append((seq, data, True, tenant))
+                    self._set_status(tenant, data["id"], "queued")
+        if batch:
+            logger.info(f"Replaying {len(batch)} queued services from spill file.")
+        return batch
+
+    def _replay(self, batch: List[Item]) -> int:
+        """Persist services left in the spill file by a previous run.
+
+        Replayed services are persisted in batches without passing through
+        the queue, so that spill files holding more services than the queue
+        fit do not block the worker.
+
+        Args:
+            batch: Services loaded from the spill file.
+
+        Returns:
+            Number of persisted services.
+        """
+        persisted = 0
+        for start in range(0, len(batch), self.batch_size):
+            chunk = batch[start : start + self.batch_size]
+            if not self._persist(chunk):
+                break
+            persisted += len(chunk)
+        return persisted
+
+    def _write_spill(self, data: Dict, tenant: Optional[str]) -> None:
+        """Durably append service and its tenant to spill file."""
+        if self._spill is None:
+            self._spill = open(self.spill_file, "a")
+        self._spill.write(json.dumps({"tenant": tenant, "service": data}) + "\n")
+        self._spill.flush()
+        os.fsync(self._spill.fileno())
+
+    def _read_spill(self, path: str) -> Iterator[Tuple[Dict, Optional[str]]]:
+        """Read services and their tenants from a spill file, if it exists."""
+        if not os.path.exists(path):
+            return
+        with open(path) as spill:
+            for line in spill:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping truncated entry of spill file.")
+                    continue
+                yield entry["service"], entry["tenant"]
+
+    def _compact_spill(self) -> None:
+        """Replace spilled services with those awaiting registration.
+
+        Services awaiting registration are taken and the spill file is
+        rotated while holding the lock, so that services queued since are
+        appended to a new spill file. The compacted file is then atomically
+        rewritten without holding the lock, after which the rotated file is
+        removed. If a rotated file is left by a previous run, the spill file
+        is not rotated, as the compacted file only supersedes the rotated file
+        once written.
+        """
+        with self._lock:
+            pending = list(self._pending.values())
+            if not os.path.exists(self._rotated_file):
+                if self._spill is not None:
+                    self._spill.close()
+                    self._spill = None
+                if os.path.exists(self.spill_file):
+                    os.replace(self.spill_file, self._rotated_file)
+        self._write_compacted(pending)
+        if os.path.exists(self._rotated_file):
+            os.remove(self._rotated_file)
+
+    def _write_compacted(self, pending: List[Tuple[Dict, Optional[str]]]) -> None:
+        """Atomically rewrite compacted file with services and their tenants."""
+        tmp_file = f"{self._compacted_file}.tmp"
+        with open(tmp_file, "w") as spill:
+            for data, tenant in pending:
+                spill.write(json.dumps({"tenant": tenant, "service": data}) + "\n")
+            spill.flush()
+            os.fsync(spill.fileno())
+        os.replace(tmp_file, self._compacted_file)
+
+    def _set_status(self, tenant: Optional[str], id: str, status: str) -> None:
+        """Set registration status, evicting the oldest if too many."""
+        with self._status_lock:
+            self._status[(tenant, id)] = status
+            self._status.move_to_end((tenant, id))
+            while len(self._status) > self.status_size:
+                self._status.popitem(last=False)
+
+    def _get_headers(self, id: str) -> Dict:
+        """Build dictionary of response headers.
+
+        Args:
+            id: Service identifier.
+
+        Returns:
+            Response headers.
+        """
+        headers: Dict = {
+            "Content-type": "application/json",
+        }
+        headers["Location"] = (
+            f"{self.url_prefix}://{self.host_name}:{self.external_port}/"
+            f"{self.api_path}/services/{id}/status"
+        )
+        return headers
+
+
+def register_write_behind(app: Flask) -> None:
+    """Register and start write-behind queue if enabled.
+
+    Args:
+        app: Flask application instance.
+    """
+    foca_conf = app.config.foca  # type: ignore[attr-defined]
+    if not foca_conf.custom.endpoints.services.write_behind.enabled:
+        return
+    write_behind = WriteBehindQueue(app=app)
+    app.extensions["write_behind"] = write_behind
+    write_behind.start()
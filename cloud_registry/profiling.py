@@ -0,0 +1,231 @@
+"""Sampling CPU and allocation profiles of the running app."""
+
+from collections import Counter
+from contextlib import contextmanager
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from types import FrameType
+from typing import Dict, Iterator, List, Optional
+
+from flask import current_app
+
+from cloud_registry.auth import check_admin
+from cloud_registry.exceptions import BadRequest, Forbidden, ServiceUnavailable
+
+logger = logging.getLogger(__name__)
+
+# innermost frames of threads that are blocked rather than running, for
+# platforms that do not report the CPU time of threads
+IDLE_FRAMES = {
+    ("threading", "wait"),
+    ("threading", "_wait_for_tstate_lock"),
+    ("selectors", "select"),
+    ("queue", "get"),
+}
+
+# profiles are captured one at a time, as allocation tracing is process-wide
+_lock = threading.Lock()
+
+
+def check_profiling_access(seconds: float) -> None:
+    """Check whether the requester may capture a profile.
+
+    Profiles may be captured by the configured admins if profiling is enabled.
+    Admins are identified by the `user_id` of their validated bearer token;
+    if authorization is disabled, any requester may capture profiles.
+
+    Args:
+        seconds: Requested duration (in seconds) of the profile.
+
+    Raises:
+        cloud_registry.exceptions.Forbidden: Profiling is disabled or the
+            requester is not an admin.
+        cloud_registry.exceptions.BadRequest: The requested duration exceeds
+            the configured maximum.
+    """
+    foca_conf = current_app.config.foca  # type: ignore[attr-defined]
+    profiling_conf = foca_conf.custom.profiling
+    if not profiling_conf.enabled:
+        logger.warning("Profile requested, but profiling is disabled.")
+        raise Forbidden
+    check_admin(profiling_conf.admins)
+    if seconds > profiling_conf.max_seconds:
+        logger.error(
+            f"Requested profile duration exceeds {profiling_conf.max_seconds}s."
+        )
+        raise BadRequest
+
+
+def sample_cpu(seconds: float, interval: float = 0.01) -> Dict[str, int]:
+    """Sample stacks of all threads of the process.
+
+    Only threads that used CPU time since the previous sample are sampled, so
+    that waiting request handlers and background jobs do not drown out running
+    code. On platforms that do not report the CPU time of threads, threads
+    blocked in one of `IDLE_FRAMES` are skipped instead.
+
+    Args:
+        seconds: Duration (in seconds) of sampling.
+        interval: Interval (in seconds) between samples.
+
+    Returns:
+        Number of samples of each stack, keyed by its frames from the
+        outermost to the innermost, separated by semicolons.
+
+    Raises:
+        cloud_registry.exceptions.ServiceUnavailable: Another profile is being
+            captured.
+    """
+    samples: Counter = Counter()
+    cpu_times: Dict[int, float] = {}
+    own_thread = threading.get_ident()
+    with _acquire():
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                cpu_time = _cpu_time(thread_id)
+                if cpu_time is not None:
+                    previous = cpu_times.get(thread_id)
+                    cpu_times[thread_id] = cpu_time
+                    if previous is None or cpu_time <= previous:
+                        continue
+                stack = _stack(frame, skip_idle=cpu_time is None)
+                if stack:
+                    samples[";".join(stack)] += 1
+            time.sleep(interval)
+    return dict(samples)
+
+
+def sample_allocations(seconds: float, traceback_limit: int = 25) -> Dict[str, int]:
+    """Trace memory allocations of the process.
+
+    Args:
+        seconds: Duration (in seconds) of tracing.
+        traceback_limit: Maximum number of frames stored per allocation.
+
+    Returns:
+        Size (in bytes) of memory allocated during tracing and not yet freed
+        at its end by each stack, keyed by its frames from the outermost to
+        the innermost, separated by semicolons.
+
+    Raises:
+        cloud_registry.exceptions.ServiceUnavailable: Another profile is being
+            captured.
+    """
+    with _acquire():
+        # keep tracing started by others, e.g., via `PYTHONTRACEMALLOC`
+        was_tracing = tracemalloc.is_tracing()
+        before: Optional[tracemalloc.Snapshot] = None
+        if was_tracing:
+            before = tracemalloc.take_snapshot()
+        else:
+            tracemalloc.start(traceback_limit)
+        try:
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+    exclude = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    after = after.filter_traces(exclude)
+    prefixes = _import_prefixes()
+    sizes: Counter = Counter()
+    if before is None:
+        for stat in after.statistics("traceback"):
+            stack = ";".join(_location(frame, prefixes) for frame in stat.traceback)
+            sizes[stack] += stat.size
+    else:
+        before = before.filter_traces(exclude)
+        for diff in after.compare_to(before, "traceback"):
+            if diff.size_diff > 0:
+                stack = ";".join(_location(frame, prefixes) for frame in diff.traceback)
+                sizes[stack] += diff.size_diff
+    return dict(sizes)
+
+
+def to_folded(stacks: Dict[str, int]) -> str:
+    """Format stacks in the folded format read by flame graph tools.
+
+    Args:
+        stacks: Weight of each stack, keyed by its frames from the outermost to
+            the innermost, separated by semicolons.
+
+    Returns:
+        One line per stack, heaviest first, with the stack and its weight
+        separated by a space.
+    """
+    lines = sorted(stacks.items(), key=lambda item: item[1], reverse=True)
+    return "".join(f"{stack} {weight}\n" for stack, weight in lines)
+
+
+@contextmanager
+def _acquire() -> Iterator[None]:
+    """Hold the profiling lock without waiting for it."""
+    if not _lock.acquire(blocking=False):
+        logger.warning("Profile requested while another is being captured.")
+        raise ServiceUnavailable
+    try:
+        yield
+    finally:
+        _lock.release()
+
+
+def _cpu_time(thread_id: int) -> Optional[float]:
+    """Get CPU time (in seconds) used by a thread so far.
+
+    Returns:
+        CPU time, or `None` if the platform does not report it.
+    """
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+    except (AttributeError, OSError):
+        return None
+
+
+def _stack(frame: Optional[FrameType], skip_idle: bool = False) -> List[str]:
+    """Get frames of a thread from the outermost to the innermost.
+
+    Returns:
+        Frames, or an empty list if idle threads are skipped and the thread is
+        blocked in one of `IDLE_FRAMES`.
+    """
+    stack: List[str] = []
+    innermost = True
+    while frame is not None:
+        module = frame.f_globals.get("__name__", frame.f_code.co_filename)
+        if skip_idle and innermost and (module, frame.f_code.co_name) in IDLE_FRAMES:
+            return []
+        innermost = False
+        stack.append(f"{module}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _import_prefixes() -> List[str]:
+    """Get directories of the import path as file name prefixes, longest
+    first.
+    """
+    return [path + os.sep for path in sorted(sys.path, key=len, reverse=True) if path]
+
+
+def _location(frame: tracemalloc.Frame, prefixes: List[str]) -> str:
+    """Get location of a traced frame relative to the import path.
+
+    Args:
+        frame: Traced frame.
+        prefixes: Directories of the import path, longest first, as returned
+            by `_import_prefixes()`.
+    """
+    filename = frame.filename
+    for prefix in prefixes:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix) :]
+            break
+    return f"{filename}:{frame.lineno}"
@@ -1,6 +1,19 @@
 """Cloud Registry custom config models."""
 
+from typing import Dict, List, Optional
+
 from foca.models.config import FOCABaseConfig
+from pydantic import validator
+
+from cloud_registry.ga4gh.registry.dedup import DUPLICATE_POLICIES
+from cloud_registry.ga4gh.registry.ids import STRATEGIES, parse_charset
+from cloud_registry.ga4gh.registry.read_preference import READ_PREFERENCE_MODES
+
+# servers the app can be served with
+WSGI_SERVERS = ["flask", "gevent"]
+
+# backends services can be stored in
+STORAGE_BACKENDS = ["mongodb", "sqlite"]
 
 
 class ServiceConfig(FOCABaseConfig):
@@ -201,29 +214,60 @@ class IdConfig(FOCABaseConfig):
     """Model for defining unique identifier for services on cloud registry.
 
     Args:
-        charset: A string of allowed characters or an expression evaluating to
-            a string of allowed characters.
+        charset: A string of allowed characters or an expression concatenating
+            constants of the `string` module and string literals, resolved to
+            the sorted set of allowed characters when the configuration is
+            loaded.
         length: Length of returned string.
+        strategy: Strategy of generating identifiers; one of `random`,
+            `time_ordered` (timestamp followed by random characters) and
+            `sequential_block` (sequence numbers reserved in blocks).
+        block_size: Number of identifiers reserved at once by the
+            `sequential_block` strategy.
 
     Attributes:
-        charset: A string of allowed characters or an expression evaluating to
-            a string of allowed characters.
+        charset: A string of allowed characters or an expression concatenating
+            constants of the `string` module and string literals, resolved to
+            the sorted set of allowed characters when the configuration is
+            loaded.
         length: Length of returned string.
+        strategy: Strategy of generating identifiers; one of `random`,
+            `time_ordered` (timestamp followed by random characters) and
+            `sequential_block` (sequence numbers reserved in blocks).
+        block_size: Number of identifiers reserved at once by the
+            `sequential_block` strategy.
 
     Raises:
         pydantic.ValidationError: The class was instantianted with an illegal
-            data type.
+            data type or an unknown strategy.
 
     Example:
         >>> IdConfig(
-        ...     charset='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
-        ...     length=6
+        ...     charset='string.ascii_uppercase + string.digits',
+        ...     length=6,
+        ...     strategy='random',
+        ...     block_size=1000
         ... )
-        IdConfig(charset='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', length=6)
+        IdConfig(charset='0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ', length=6, str\
+ategy='random', block_size=1000)
     """
 
     charset: str
     length: int
+    strategy: str = "random"
+    block_size: int = 1000
+
+    @validator("charset")
+    def resolve_charset(cls, v):  # pylint: disable=E0213
+        """Resolve charset expression without evaluating it."""
+        return parse_charset(v)
+
+    @validator("strategy")
+    def check_strategy(cls, v):  # pylint: disable=E0213
+        """Check that the strategy is known."""
+        if v not in STRATEGIES:
+            raise ValueError(f"Unknown strategy; expected one of: {STRATEGIES}")
+        return v
 
 
 class MetaVersionConfig(FOCABaseConfig):
@@ -254,6 +298,381 @@ class MetaVersionConfig(FOCABaseConfig):
     increment: int
 
 
+class ChangesConfig(FOCABaseConfig):
+    """Model for configuring the log of changes to registered services.
+
+    Args:
+        limit: Maximum number of changes returned per request.
+        max_wait: Maximum time (in seconds) a client may wait for changes when
+            long-polling.
+        poll_interval: Interval (in seconds) at which the database is checked
+            for changes recorded by other processes while clients are waiting.
+        heartbeat: Interval (in seconds) at which comments are sent to
+            subscribers of the change event stream while no changes occur.
+        gap_timeout: Time (in seconds) after which revisions that were
+            allocated but not recorded are skipped when listing changes.
+
+    Attributes:
+        limit: Maximum number of changes returned per request.
+        max_wait: Maximum time (in seconds) a client may wait for changes when
+            long-polling.
+        poll_interval: Interval (in seconds) at which the database is checked
+            for changes recorded by other processes while clients are waiting.
+        heartbeat: Interval (in seconds) at which comments are sent to
+            subscribers of the change event stream while no changes occur.
+        gap_timeout: Time (in seconds) after which revisions that were
+            allocated but not recorded are skipped when listing changes.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> ChangesConfig(
+        ...     limit=1000,
+        ...     max_wait=60,
+        ...     poll_interval=1.0,
+        ...     heartbeat=15,
+        ...     gap_timeout=10.0
+        ... )
+        ChangesConfig(limit=1000, max_wait=60, poll_interval=1.0, heartbeat=15\
+, gap_timeout=10.0)
+    """
+
+    limit: int = 1000
+    max_wait: int = 60
+    poll_interval: float = 1.0
+    heartbeat: int = 15
+    gap_timeout: float = 10.0
+
+
+class TombstonesConfig(FOCABaseConfig):
+    """Model for configuring the purging of deleted services.
+
+    Args:
+        enabled: Whether tombstones of deleted services are purged
+            periodically.
+        retention: Time (in seconds) for which tombstones are kept.
+        batch_size: Maximum number of tombstones purged per batch.
+        interval: Interval (in seconds) between periodic purges.
+
+    Attributes:
+        enabled: Whether tombstones of deleted services are purged
+            periodically.
+        retention: Time (in seconds) for which tombstones are kept.
+        batch_size: Maximum number of tombstones purged per batch.
+        interval: Interval (in seconds) between periodic purges.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> TombstonesConfig(
+        ...     enabled=True,
+        ...     retention=604800,
+        ...     batch_size=1000,
+        ...     interval=3600
+        ... )
+        TombstonesConfig(enabled=True, retention=604800, batch_size=1000, inte\
+rval=3600.0)
+    """
+
+    enabled: bool = True
+    retention: int = 604800
+    batch_size: int = 1000
+    interval: float = 3600
+
+
+class LookupConfig(FOCABaseConfig):
+    """Model for configuring batch lookups of services.
+
+    Args:
+        max_ids: Maximum number of service identifiers per lookup.
+
+    Attributes:
+        max_ids: Maximum number of service identifiers per lookup.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> LookupConfig(
+        ...     max_ids=1000
+        ... )
+        LookupConfig(max_ids=1000)
+    """
+
+    max_ids: int = 1000
+
+
+class WriteBehindConfig(FOCABaseConfig):
+    """Model for configuring asynchronous registration of services.
+
+    Args:
+        enabled: Whether services registered with an auto-generated identifier
+            are queued and persisted asynchronously.
+        queue_size: Maximum number of queued services; further registrations
+            are rejected while the queue is full.
+        batch_size: Maximum number of services persisted per batch.
+        flush_interval: Maximum time (in seconds) the worker waits for queued
+            services before checking whether it was stopped.
+        spill_file: Path to the file queued services are appended to before
+            they are acknowledged; required if write-behind mode is enabled.
+            Relative paths are resolved against the working directory. The
+            spill file is compacted into files with the suffixes `.compacted`
+            and `.rotated` in the same directory.
+        status_size: Maximum number of registration statuses kept.
+
+    Attributes:
+        enabled: Whether services registered with an auto-generated identifier
+            are queued and persisted asynchronously.
+        queue_size: Maximum number of queued services; further registrations
+            are rejected while the queue is full.
+        batch_size: Maximum number of services persisted per batch.
+        flush_interval: Maximum time (in seconds) the worker waits for queued
+            services before checking whether it was stopped.
+        spill_file: Path to the file queued services are appended to before
+            they are acknowledged; required if write-behind mode is enabled.
+            Relative paths are resolved against the working directory. The
+            spill file is compacted into files with the suffixes `.compacted`
+            and `.rotated` in the same directory.
+        status_size: Maximum number of registration statuses kept.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type, or write-behind mode was enabled without a spill
+            file.
+
+    Example:
+        >>> WriteBehindConfig(
+        ...     enabled=True,
+        ...     queue_size=10000,
+        ...     batch_size=500,
+        ...     flush_interval=0.1,
+        ...     spill_file='/data/write_behind.jsonl',
+        ...     status_size=100000
+        ... )
+        WriteBehindConfig(enabled=True, queue_size=10000, batch_size=500, flus\
+h_interval=0.1, spill_file='/data/write_behind.jsonl', status_size=100000)
+    """
+
+    enabled: bool = False
+    queue_size: int = 10000
+    batch_size: int = 500
+    flush_interval: float = 0.1
+    spill_file: Optional[str] = None
+    status_size: int = 100000
+
+    @validator("spill_file", always=True)
+    def check_spill_file(cls, v, values):  # pylint: disable=E0213
+        """Check that a spill file is configured if write-behind mode is
+        enabled.
+        """
+        if v is None and values.get("enabled"):
+            raise ValueError("Write-behind mode requires a spill file")
+        return v
+
+
+class SelectionConfig(FOCABaseConfig):
+    """Model for configuring the selection of services by ranking.
+
+    Services are scored by a weighted blend of whether they belong to the
+    preferred organization and environment, their latency score and their
+    availability as reported by probes. Services without probe results are
+    assumed to be available and have a latency score of zero.
+
+    Args:
+        organization_weight: Bonus for services of the preferred organization.
+        environment_weight: Bonus for services in the preferred environment.
+        latency_weight: Weight of the latency score, which decreases from one
+            towards zero with increasing probe latency.
+        availability_weight: Weight of the availability, i.e., the moving
+            average of probe successes.
+        latency_scale: Probe latency (in milliseconds) at which the latency
+            score is halved.
+        availability_smoothing: Weight of the latest probe in the moving
+            average of availability.
+        max_k: Maximum number of services selected per request.
+        refresh_interval: Interval (in seconds) at which rankings are rebuilt
+            if the change log is not configured.
+
+    Attributes:
+        organization_weight: Bonus for services of the preferred organization.
+        environment_weight: Bonus for services in the preferred environment.
+        latency_weight: Weight of the latency score, which decreases from one
+            towards zero with increasing probe latency.
+        availability_weight: Weight of the availability, i.e., the moving
+            average of probe successes.
+        latency_scale: Probe latency (in milliseconds) at which the latency
+            score is halved.
+        availability_smoothing: Weight of the latest probe in the moving
+            average of availability.
+        max_k: Maximum number of services selected per request.
+        refresh_interval: Interval (in seconds) at which rankings are rebuilt
+            if the change log is not configured.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> SelectionConfig(
+        ...     organization_weight=1.0,
+        ...     environment_weight=0.5,
+        ...     latency_weight=1.0,
+        ...     availability_weight=2.0,
+        ...     latency_scale=100.0,
+        ...     availability_smoothing=0.2,
+        ...     max_k=100,
+        ...     refresh_interval=60.0
+        ... )
+        SelectionConfig(organization_weight=1.0, environment_weight=0.5, late\
+ncy_weight=1.0, availability_weight=2.0, latency_scale=100.0, availability_smo\
+othing=0.2, max_k=100, refresh_interval=60.0)
+    """
+
+    organization_weight: float = 1.0
+    environment_weight: float = 0.5
+    latency_weight: float = 1.0
+    availability_weight: float = 2.0
+    latency_scale: float = 100.0
+    availability_smoothing: float = 0.2
+    max_k: int = 100
+    refresh_interval: float = 60.0
+
+
+class NormalizationConfig(FOCABaseConfig):
+    """Model for configuring the normalized storage of services.
+
+    Args:
+        enabled: Whether the organizations and types of services are stored
+            once in dictionary collections and referenced from services by
+            compact keys.
+        cache_size: Maximum number of organizations and types cached for
+            reassembling services.
+
+    Attributes:
+        enabled: Whether the organizations and types of services are stored
+            once in dictionary collections and referenced from services by
+            compact keys.
+        cache_size: Maximum number of organizations and types cached for
+            reassembling services.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> NormalizationConfig(
+        ...     enabled=True,
+        ...     cache_size=10000
+        ... )
+        NormalizationConfig(enabled=True, cache_size=10000)
+    """
+
+    enabled: bool = False
+    cache_size: int = 10000
+
+
+class IdempotencyConfig(FOCABaseConfig):
+    """Model for configuring idempotency keys of service registrations.
+
+    Args:
+        ttl: Time (in seconds) for which responses are stored under their
+            idempotency keys.
+        wait: Maximum time (in seconds) a retry waits for the response to a
+            request with the same key that is still being processed.
+        poll_interval: Interval (in seconds) at which waiting retries check
+            for the response.
+        lock_timeout: Time (in seconds) after which a claim on a key that has
+            no response yet is considered abandoned.
+
+    Attributes:
+        ttl: Time (in seconds) for which responses are stored under their
+            idempotency keys.
+        wait: Maximum time (in seconds) a retry waits for the response to a
+            request with the same key that is still being processed.
+        poll_interval: Interval (in seconds) at which waiting retries check
+            for the response.
+        lock_timeout: Time (in seconds) after which a claim on a key that has
+            no response yet is considered abandoned.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> IdempotencyConfig(
+        ...     ttl=86400,
+        ...     wait=10.0,
+        ...     poll_interval=0.1,
+        ...     lock_timeout=60.0
+        ... )
+        IdempotencyConfig(ttl=86400, wait=10.0, poll_interval=0.1, lock_timeou\
+t=60.0)
+    """
+
+    ttl: int = 86400
+    wait: float = 10.0
+    poll_interval: float = 0.1
+    lock_timeout: float = 60.0
+
+
+class DeduplicationConfig(FOCABaseConfig):
+    """Model for configuring the detection of duplicate services.
+
+    Args:
+        policy: Handling of services registered with an auto-generated
+            identifier and the same URL and type as an existing service; one
+            of `allow`, `return_existing` (the existing service's identifier
+            is returned) or `reject`.
+        enabled: Whether services registered more than once are collapsed
+            into the earliest registration periodically.
+        batch_size: Maximum number of services hashed or scanned for
+            duplicates per batch.
+        interval: Interval (in seconds) between periodic runs.
+
+    Attributes:
+        policy: Handling of services registered with an auto-generated
+            identifier and the same URL and type as an existing service; one
+            of `allow`, `return_existing` (the existing service's identifier
+            is returned) or `reject`.
+        enabled: Whether services registered more than once are collapsed
+            into the earliest registration periodically.
+        batch_size: Maximum number of services hashed or scanned for
+            duplicates per batch.
+        interval: Interval (in seconds) between periodic runs.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type or an unknown policy.
+
+    Example:
+        >>> DeduplicationConfig(
+        ...     policy='return_existing',
+        ...     enabled=False,
+        ...     batch_size=1000,
+        ...     interval=86400
+        ... )
+        DeduplicationConfig(policy='return_existing', enabled=False, batch_si\
+ze=1000, interval=86400.0)
+    """
+
+    policy: str = "allow"
+    enabled: bool = False
+    batch_size: int = 1000
+    interval: float = 86400
+
+    @validator("policy")
+    def check_policy(cls, v):  # pylint: disable=E0213
+        """Check that the policy is known."""
+        if v not in DUPLICATE_POLICIES:
+            raise ValueError(f"Unknown policy; expected one of: {DUPLICATE_POLICIES}")
+        return v
+
+
 class ServicesConfig(FOCABaseConfig):
     """Model for defining the service database store for cloud registry. This
     defines the configurations for service identifiers stored on cloud
@@ -262,10 +681,26 @@ class ServicesConfig(FOCABaseConfig):
     Args:
         id: Unique identifier for a service in cloud registry.
         meta_version: Version increment configuration for service upgrades.
+        changes: Log of changes to registered services.
+        tombstones: Purging of deleted services.
+        lookup: Batch lookups of services.
+        write_behind: Asynchronous registration of services.
+        selection: Selection of services by ranking.
+        normalization: Normalized storage of services.
+        idempotency: Idempotency keys of service registrations.
+        deduplication: Detection of duplicate services.
 
     Attributes:
         id: Unique identifier for a service in cloud registry.
         meta_version: Version increment configuration for service upgrades.
+        changes: Log of changes to registered services.
+        tombstones: Purging of deleted services.
+        lookup: Batch lookups of services.
+        write_behind: Asynchronous registration of services.
+        selection: Selection of services by ranking.
+        normalization: Normalized storage of services.
+        idempotency: Idempotency keys of service registrations.
+        deduplication: Detection of duplicate services.
 
     Raises:
         pydantic.ValidationError: The class was instantianted with an illegal
@@ -288,6 +723,14 @@ class ServicesConfig(FOCABaseConfig):
 
     id: IdConfig
     meta_version: MetaVersionConfig
+    changes: ChangesConfig = ChangesConfig()
+    tombstones: TombstonesConfig = TombstonesConfig()
+    lookup: LookupConfig = LookupConfig()
+    write_behind: WriteBehindConfig = WriteBehindConfig()
+    selection: SelectionConfig = SelectionConfig()
+    normalization: NormalizationConfig = NormalizationConfig()
+    idempotency: IdempotencyConfig = IdempotencyConfig()
+    deduplication: DeduplicationConfig = DeduplicationConfig()
 
 
 class EndpointsConfig(FOCABaseConfig):
@@ -363,14 +806,663 @@ RSTUVWXYZ0123456789',length=6),meta_version=MetaVersionConfig(init=1,increment\
     services: ServicesConfig
 
 
+class AuthCacheConfig(FOCABaseConfig):
+    """Model for configuring the caching of bearer token validation results.
+
+    Args:
+        enabled: Whether token validation results and identity provider key
+            sets are cached.
+        ttl: Maximum time (in seconds) for which a validated token is cached.
+            Entries never outlive the token's own `exp` claim.
+        max_size: Maximum number of cached token validation results.
+        jwks_refresh_interval: Age (in seconds) after which a cached JSON Web
+            Key (JWK) set is refreshed in the background.
+        jwks_max_age: Age (in seconds) after which a cached JSON Web Key (JWK)
+            set is no longer used and is refetched synchronously.
+
+    Attributes:
+        enabled: Whether token validation results and identity provider key
+            sets are cached.
+        ttl: Maximum time (in seconds) for which a validated token is cached.
+            Entries never outlive the token's own `exp` claim.
+        max_size: Maximum number of cached token validation results.
+        jwks_refresh_interval: Age (in seconds) after which a cached JSON Web
+            Key (JWK) set is refreshed in the background.
+        jwks_max_age: Age (in seconds) after which a cached JSON Web Key (JWK)
+            set is no longer used and is refetched synchronously.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> AuthCacheConfig(
+        ...     enabled=True,
+        ...     ttl=300,
+        ...     max_size=10000,
+        ...     jwks_refresh_interval=300,
+        ...     jwks_max_age=3600
+        ... )
+        AuthCacheConfig(enabled=True, ttl=300, max_size=10000, jwks_refresh_in\
+terval=300, jwks_max_age=3600)
+    """
+
+    enabled: bool = True
+    ttl: int = 300
+    max_size: int = 10000
+    jwks_refresh_interval: int = 300
+    jwks_max_age: int = 3600
+
+
+class CompressionConfig(FOCABaseConfig):
+    """Model for configuring the compression of response bodies.
+
+    Args:
+        enabled: Whether responses are compressed if the client accepts it.
+        min_size: Minimum size (in bytes) of response bodies to compress.
+        gzip_level: Compression level for `gzip` encoding (1-9).
+        brotli_level: Compression quality for `br` encoding (0-11).
+        mimetypes: Media types of responses to compress.
+        cache_size: Maximum number of compressed response bodies to cache.
+
+    Attributes:
+        enabled: Whether responses are compressed if the client accepts it.
+        min_size: Minimum size (in bytes) of response bodies to compress.
+        gzip_level: Compression level for `gzip` encoding (1-9).
+        brotli_level: Compression quality for `br` encoding (0-11).
+        mimetypes: Media types of responses to compress.
+        cache_size: Maximum number of compressed response bodies to cache.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> CompressionConfig(
+        ...     enabled=True,
+        ...     min_size=1024,
+        ...     gzip_level=6,
+        ...     brotli_level=4,
+        ...     mimetypes=['application/json'],
+        ...     cache_size=64
+        ... )
+        CompressionConfig(enabled=True, min_size=1024, gzip_level=6, brotli_le\
+vel=4, mimetypes=['application/json'], cache_size=64)
+    """
+
+    enabled: bool = True
+    min_size: int = 1024
+    gzip_level: int = 6
+    brotli_level: int = 4
+    mimetypes: List[str] = ["application/json"]
+    cache_size: int = 64
+
+
+class TenancyConfig(FOCABaseConfig):
+    """Model for configuring the isolation of tenants in the service store.
+
+    Args:
+        enabled: Whether the tenant of each request is read from a request
+            header. Requests without the header use the default collections.
+        header: Name of the request header holding the tenant identifier.
+        required: Whether requests without the tenant header are rejected.
+        tenants: Identifiers of known tenants. Requests of other tenants are
+            rejected. If not set, any tenant is accepted.
+        max_services: Maximum number of services a tenant may register. If not
+            set, the number of services is not limited.
+        max_time_ms: Maximum time (in milliseconds) a query listing services
+            may run. If not set, the run time of queries is not limited.
+        max_cached_tenants: Maximum number of tenants whose service rankings
+            are held in memory.
+        claim: Name of the bearer token claim listing the tenants the
+            requester may access.
+        users: Tenants each user, identified by the `user_id` of their bearer
+            token, may access. Requests of users for other tenants are
+            rejected, unless granted by the token claim. Not checked if
+            authorization is disabled.
+
+    Attributes:
+        enabled: Whether the tenant of each request is read from a request
+            header. Requests without the header use the default collections.
+        header: Name of the request header holding the tenant identifier.
+        required: Whether requests without the tenant header are rejected.
+        tenants: Identifiers of known tenants. Requests of other tenants are
+            rejected. If not set, any tenant is accepted.
+        max_services: Maximum number of services a tenant may register. If not
+            set, the number of services is not limited.
+        max_time_ms: Maximum time (in milliseconds) a query listing services
+            may run. If not set, the run time of queries is not limited.
+        max_cached_tenants: Maximum number of tenants whose service rankings
+            are held in memory.
+        claim: Name of the bearer token claim listing the tenants the
+            requester may access.
+        users: Tenants each user, identified by the `user_id` of their bearer
+            token, may access. Requests of users for other tenants are
+            rejected, unless granted by the token claim. Not checked if
+            authorization is disabled.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> TenancyConfig(
+        ...     enabled=True,
+        ...     header='X-Tenant',
+        ...     required=False,
+        ...     tenants=['tenant1', 'tenant2'],
+        ...     max_services=10000,
+        ...     max_time_ms=5000,
+        ...     max_cached_tenants=100,
+        ...     claim='tenants',
+        ...     users={'user1': ['tenant1']}
+        ... )
+        TenancyConfig(enabled=True, header='X-Tenant', required=False, tenants\
+=['tenant1', 'tenant2'], max_services=10000, max_time_ms=5000, max_cached_tena\
+nts=100, claim='tenants', users={'user1': ['tenant1']})
+    """
+
+    enabled: bool = False
+    header: str = "X-Tenant"
+    required: bool = False
+    tenants: Optional[List[str]] = None
+    max_services: Optional[int] = None
+    max_time_ms: Optional[int] = None
+    max_cached_tenants: int = 100
+    claim: Optional[str] = None
+    users: Optional[Dict[str, List[str]]] = None
+
+
+class ReadPreferenceConfig(FOCABaseConfig):
+    """Model for configuring reads of the service store by read endpoints.
+
+    Args:
+        mode: Read preference of read endpoints; one of `primary`,
+            `primaryPreferred`, `secondary`, `secondaryPreferred` or `nearest`.
+            Writes always go to the primary.
+        max_staleness_seconds: Maximum replication lag (in seconds) of
+            secondaries that are read from. At least 90 if set; `-1` for no
+            limit.
+        read_concern: Read concern level of read endpoints, e.g., `local` or
+            `majority`. If not set, the server default is used.
+        session_consistency: Whether clients read from the primary for a while
+            after writing, so that they observe their own writes.
+        pin_seconds: Time (in seconds) for which reads of a client are pinned
+            to the primary after it wrote.
+
+    Attributes:
+        mode: Read preference of read endpoints; one of `primary`,
+            `primaryPreferred`, `secondary`, `secondaryPreferred` or `nearest`.
+            Writes always go to the primary.
+        max_staleness_seconds: Maximum replication lag (in seconds) of
+            secondaries that are read from. At least 90 if set; `-1` for no
+            limit.
+        read_concern: Read concern level of read endpoints, e.g., `local` or
+            `majority`. If not set, the server default is used.
+        session_consistency: Whether clients read from the primary for a while
+            after writing, so that they observe their own writes.
+        pin_seconds: Time (in seconds) for which reads of a client are pinned
+            to the primary after it wrote.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type or an unknown mode.
+
+    Example:
+        >>> ReadPreferenceConfig(
+        ...     mode='secondaryPreferred',
+        ...     max_staleness_seconds=90,
+        ...     read_concern='local',
+        ...     session_consistency=True,
+        ...     pin_seconds=10.0
+        ... )
+        ReadPreferenceConfig(mode='secondaryPreferred', max_staleness_seconds=\
+90, read_concern='local', session_consistency=True, pin_seconds=10.0)
+    """
+
+    mode: str = "primary"
+    max_staleness_seconds: int = -1
+    read_concern: Optional[str] = None
+    session_consistency: bool = True
+    pin_seconds: float = 10.0
+
+    @validator("mode")
+    def check_mode(cls, v):  # pylint: disable=E0213
+        """Check that the mode is known."""
+        if v not in READ_PREFERENCE_MODES:
+            raise ValueError(f"Unknown mode; expected one of: {READ_PREFERENCE_MODES}")
+        return v
+
+
+class StorageConfig(FOCABaseConfig):
+    """Model for configuring the storage backend.
+
+    Args:
+        backend: Storage backend; either `mongodb`, using the database
+            configured in the `db` section, or `sqlite`, storing the
+            databases and collections configured there in embedded SQLite
+            files.
+        path: Directory holding one SQLite file per database.
+        mmap_size: Maximum number of bytes of each SQLite file mapped into
+            memory.
+        busy_timeout: Maximum time (in seconds) to wait for a lock held by
+            another SQLite connection.
+
+    Attributes:
+        backend: Storage backend; either `mongodb`, using the database
+            configured in the `db` section, or `sqlite`, storing the
+            databases and collections configured there in embedded SQLite
+            files.
+        path: Directory holding one SQLite file per database.
+        mmap_size: Maximum number of bytes of each SQLite file mapped into
+            memory.
+        busy_timeout: Maximum time (in seconds) to wait for a lock held by
+            another SQLite connection.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type or an unknown backend.
+
+    Example:
+        >>> StorageConfig(
+        ...     backend='sqlite',
+        ...     path='data',
+        ...     mmap_size=268435456,
+        ...     busy_timeout=5.0
+        ... )
+        StorageConfig(backend='sqlite', path='data', mmap_size=268435456, busy\
+_timeout=5.0)
+    """
+
+    backend: str = "mongodb"
+    path: str = "data"
+    mmap_size: int = 268435456
+    busy_timeout: float = 5.0
+
+    @validator("backend")
+    def check_backend(cls, v):  # pylint: disable=E0213
+        """Check that the backend is known."""
+        if v not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown backend; expected one of: {STORAGE_BACKENDS}")
+        return v
+
+
+class StartupConfig(FOCABaseConfig):
+    """Model for configuring startup tasks run in the background.
+
+    Args:
+        initial_backoff: Delay (in seconds) before retrying a failed startup
+            task for the first time.
+        max_backoff: Maximum delay (in seconds) between retries of a failed
+            startup task.
+        backoff_factor: Factor by which the delay between retries grows with
+            every retry.
+
+    Attributes:
+        initial_backoff: Delay (in seconds) before retrying a failed startup
+            task for the first time.
+        max_backoff: Maximum delay (in seconds) between retries of a failed
+            startup task.
+        backoff_factor: Factor by which the delay between retries grows with
+            every retry.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> StartupConfig(
+        ...     initial_backoff=1.0,
+        ...     max_backoff=60.0,
+        ...     backoff_factor=2.0
+        ... )
+        StartupConfig(initial_backoff=1.0, max_backoff=60.0, backoff_factor=2.0)
+    """
+
+    initial_backoff: float = 1.0
+    max_backoff: float = 60.0
+    backoff_factor: float = 2.0
+
+
+class CoalescingConfig(FOCABaseConfig):
+    """Model for configuring the coalescing of concurrent identical reads.
+
+    Args:
+        enabled: Whether concurrent identical requests to read endpoints share
+            a single database query.
+        timeout: Maximum time (in seconds) a request waits for the result of
+            an identical request in flight before querying the database
+            itself.
+
+    Attributes:
+        enabled: Whether concurrent identical requests to read endpoints share
+            a single database query.
+        timeout: Maximum time (in seconds) a request waits for the result of
+            an identical request in flight before querying the database
+            itself.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> CoalescingConfig(
+        ...     enabled=True,
+        ...     timeout=30.0
+        ... )
+        CoalescingConfig(enabled=True, timeout=30.0)
+    """
+
+    enabled: bool = True
+    timeout: float = 30.0
+
+
+class TracingConfig(FOCABaseConfig):
+    """Model for configuring the tracing of requests with OpenTelemetry.
+
+    Args:
+        enabled: Whether spans are recorded for requests, controllers, service
+            registrations and database commands.
+        service_name: Name of the service reported with spans.
+        sampler: Sampler deciding which traces are recorded; one of
+            `always_on`, `always_off`, `traceidratio` and
+            `parentbased_traceidratio`. Parent-based samplers follow the
+            sampling decision propagated with incoming requests.
+        sample_ratio: Ratio of traces recorded by ratio-based samplers.
+        exporter_endpoint: URL of the OTLP/HTTP endpoint spans are exported
+            to, e.g., of a local OpenTelemetry collector.
+        exporter_timeout: Timeout (in seconds) for exporting spans.
+
+    Attributes:
+        enabled: Whether spans are recorded for requests, controllers, service
+            registrations and database commands.
+        service_name: Name of the service reported with spans.
+        sampler: Sampler deciding which traces are recorded; one of
+            `always_on`, `always_off`, `traceidratio` and
+            `parentbased_traceidratio`. Parent-based samplers follow the
+            sampling decision propagated with incoming requests.
+        sample_ratio: Ratio of traces recorded by ratio-based samplers.
+        exporter_endpoint: URL of the OTLP/HTTP endpoint spans are exported
+            to, e.g., of a local OpenTelemetry collector.
+        exporter_timeout: Timeout (in seconds) for exporting spans.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> TracingConfig(
+        ...     enabled=True,
+        ...     service_name='cloud-registry',
+        ...     sampler='parentbased_traceidratio',
+        ...     sample_ratio=0.1,
+        ...     exporter_endpoint='http://localhost:4318/v1/traces',
+        ...     exporter_timeout=10.0
+        ... )
+        TracingConfig(enabled=True, service_name='cloud-registry', sampler='pa\
+rentbased_traceidratio', sample_ratio=0.1, exporter_endpoint='http://localhost\
+:4318/v1/traces', exporter_timeout=10.0)
+    """
+
+    enabled: bool = False
+    service_name: str = "cloud-registry"
+    sampler: str = "parentbased_traceidratio"
+    sample_ratio: float = 1.0
+    exporter_endpoint: str = "http://localhost:4318/v1/traces"
+    exporter_timeout: float = 10.0
+
+
+class ProfilingConfig(FOCABaseConfig):
+    """Model for configuring the capturing of profiles of the running app.
+
+    Args:
+        enabled: Whether admins may capture CPU and allocation profiles.
+        admins: Identifiers of the users (`user_id` of their bearer tokens)
+            allowed to capture profiles. Ignored if authorization is disabled.
+        max_seconds: Maximum duration (in seconds) of a profile.
+        interval: Interval (in seconds) between samples of CPU profiles.
+        traceback_limit: Maximum number of frames stored per allocation in
+            allocation profiles.
+
+    Attributes:
+        enabled: Whether admins may capture CPU and allocation profiles.
+        admins: Identifiers of the users (`user_id` of their bearer tokens)
+            allowed to capture profiles. Ignored if authorization is disabled.
+        max_seconds: Maximum duration (in seconds) of a profile.
+        interval: Interval (in seconds) between samples of CPU profiles.
+        traceback_limit: Maximum number of frames stored per allocation in
+            allocation profiles.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> ProfilingConfig(
+        ...     enabled=True,
+        ...     admins=['admin'],
+        ...     max_seconds=60.0,
+        ...     interval=0.01,
+        ...     traceback_limit=25
+        ... )
+        ProfilingConfig(enabled=True, admins=['admin'], max_seconds=60.0, inte\
+rval=0.01, traceback_limit=25)
+    """
+
+    enabled: bool = False
+    admins: List[str] = []
+    max_seconds: float = 60.0
+    interval: float = 0.01
+    traceback_limit: int = 25
+
+
+class TimingConfig(FOCABaseConfig):
+    """Model for configuring the timing of requests and database commands.
+
+    Args:
+        enabled: Whether requests and database commands are timed.
+        slow_command_ms: Duration (in milliseconds) above which database
+            commands are logged with their filter shape and query plan, or
+            `None` if commands are not logged.
+        explain: Whether the query plans of slow commands are obtained with
+            the `explain` command.
+        explain_interval: Time (in seconds) for which the query plan of a
+            filter shape is reused before it is explained again.
+        request_db_budget_ms: Time (in milliseconds) a request may spend on
+            database commands before it is logged, or `None` if requests are
+            not logged.
+        server_timing: Whether the time spent on database commands,
+            validation, authorization and serialization is reported in the
+            `Server-Timing` header of responses.
+
+    Attributes:
+        enabled: Whether requests and database commands are timed.
+        slow_command_ms: Duration (in milliseconds) above which database
+            commands are logged with their filter shape and query plan, or
+            `None` if commands are not logged.
+        explain: Whether the query plans of slow commands are obtained with
+            the `explain` command.
+        explain_interval: Time (in seconds) for which the query plan of a
+            filter shape is reused before it is explained again.
+        request_db_budget_ms: Time (in milliseconds) a request may spend on
+            database commands before it is logged, or `None` if requests are
+            not logged.
+        server_timing: Whether the time spent on database commands,
+            validation, authorization and serialization is reported in the
+            `Server-Timing` header of responses.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> TimingConfig(
+        ...     enabled=True,
+        ...     slow_command_ms=100.0,
+        ...     explain=True,
+        ...     explain_interval=60.0,
+        ...     request_db_budget_ms=500.0,
+        ...     server_timing=True
+        ... )
+        TimingConfig(enabled=True, slow_command_ms=100.0, explain=True, explai\
+n_interval=60.0, request_db_budget_ms=500.0, server_timing=True)
+    """
+
+    enabled: bool = True
+    slow_command_ms: Optional[float] = 100.0
+    explain: bool = True
+    explain_interval: float = 60.0
+    request_db_budget_ms: Optional[float] = None
+    server_timing: bool = False
+
+
+class IndexesConfig(FOCABaseConfig):
+    """Model for configuring the management of service store indexes.
+
+    Args:
+        admins: Identifiers of the users (`user_id` of their bearer tokens)
+            allowed to inspect indexes. Ignored if authorization is disabled.
+        build_missing: Whether configured indexes missing from a collection
+            are built in the background; otherwise they are only reported.
+        drop_unexpected: Whether indexes that are not configured are dropped;
+            otherwise they are only reported.
+        check_interval: Interval (in seconds) between checks of collections
+            for drift from the configured indexes.
+
+    Attributes:
+        admins: Identifiers of the users (`user_id` of their bearer tokens)
+            allowed to inspect indexes. Ignored if authorization is disabled.
+        build_missing: Whether configured indexes missing from a collection
+            are built in the background; otherwise they are only reported.
+        drop_unexpected: Whether indexes that are not configured are dropped;
+            otherwise they are only reported.
+        check_interval: Interval (in seconds) between checks of collections
+            for drift from the configured indexes.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> IndexesConfig(
+        ...     admins=['admin'],
+        ...     build_missing=True,
+        ...     drop_unexpected=False,
+        ...     check_interval=300.0
+        ... )
+        IndexesConfig(admins=['admin'], build_missing=True, drop_unexpected=Fa\
+lse, check_interval=300.0)
+    """
+
+    admins: List[str] = []
+    build_missing: bool = True
+    drop_unexpected: bool = False
+    check_interval: float = 300.0
+
+
+class ReloadConfig(FOCABaseConfig):
+    """Model for configuring the reload of the custom configuration.
+
+    Args:
+        enabled: Whether the custom configuration is reloaded when the
+            configuration file changes.
+        interval: Interval (in seconds) between checks of the configuration
+            file for changes.
+
+    Attributes:
+        enabled: Whether the custom configuration is reloaded when the
+            configuration file changes.
+        interval: Interval (in seconds) between checks of the configuration
+            file for changes.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type.
+
+    Example:
+        >>> ReloadConfig(
+        ...     enabled=True,
+        ...     interval=10.0
+        ... )
+        ReloadConfig(enabled=True, interval=10.0)
+    """
+
+    enabled: bool = False
+    interval: float = 10.0
+
+
+class WsgiConfig(FOCABaseConfig):
+    """Model for configuring the server the app is served with.
+
+    Args:
+        server: One of `flask` (threaded development server) or `gevent`.
+            Watching or long-polling the change feed requires `gevent`, which
+            keeps clients waiting for changes without blocking a thread each;
+            the app must then be started with `python -m gevent.monkey app.py`
+            and fails to start otherwise.
+
+    Attributes:
+        server: One of `flask` (threaded development server) or `gevent`.
+            Watching or long-polling the change feed requires `gevent`, which
+            keeps clients waiting for changes without blocking a thread each;
+            the app must then be started with `python -m gevent.monkey app.py`
+            and fails to start otherwise.
+
+    Raises:
+        pydantic.ValidationError: The class was instantianted with an illegal
+            data type or an unknown server.
+
+    Example:
+        >>> WsgiConfig(
+        ...     server='flask'
+        ... )
+        WsgiConfig(server='flask')
+    """
+
+    server: str = "gevent"
+
+    @validator("server")
+    def check_server(cls, v):  # pylint: disable=E0213
+        """Check that the server is known."""
+        if v not in WSGI_SERVERS:
+            raise ValueError(f"Unknown server; expected one of: {WSGI_SERVERS}")
+        return v
+
+
 class CustomConfig(FOCABaseConfig):
     """Model for defining the custom configurations for cloud registry.
 
     Args:
         endpoints: Endpoint service configurations for cloud registry.
+        auth_cache: Caching of bearer token validation results.
+        compression: Compression of response bodies.
+        tenancy: Isolation of tenants in the service store.
+        read_preference: Reads of the service store by read endpoints.
+        storage: Storage backend of the service store.
+        startup: Startup tasks run in the background.
+        coalescing: Coalescing of concurrent identical reads.
+        tracing: Tracing of requests with OpenTelemetry.
+        profiling: Capturing of profiles of the running app.
+        timing: Timing of requests and database commands.
+        indexes: Management of service store indexes.
+        reload: Reload of the custom configuration.
+        wsgi: Server the app is served with.
 
     Attributes:
         endpoints: Endpoint service configurations for cloud registry.
+        auth_cache: Caching of bearer token validation results.
+        compression: Compression of response bodies.
+        tenancy: Isolation of tenants in the service store.
+        read_preference: Reads of the service store by read endpoints.
+        storage: Storage backend of the service store.
+        startup: Startup tasks run in the background.
+        coalescing: Coalescing of concurrent identical reads.
+        tracing: Tracing of requests with OpenTelemetry.
+        profiling: Capturing of profiles of the running app.
+        timing: Timing of requests and database commands.
+        indexes: Management of service store indexes.
+        reload: Reload of the custom configuration.
+        wsgi: Server the app is served with.
 
     Raises:
         pydantic.ValidationError: The class was instantianted with an illegal
@@ -430,3 +1522,16 @@ Config(init=1,increment=1))))
     """
 
     endpoints: EndpointsConfig
+    auth_cache: AuthCacheConfig = AuthCacheConfig()
+    compression: CompressionConfig = CompressionConfig()
+    tenancy: TenancyConfig = TenancyConfig()
+    read_preference: ReadPreferenceConfig = ReadPreferenceConfig()
+    storage: StorageConfig = StorageConfig()
+    startup: StartupConfig = StartupConfig()
+    coalescing: CoalescingConfig = CoalescingConfig()
+    tracing: TracingConfig = TracingConfig()
+    profiling: ProfilingConfig = ProfilingConfig()
+    timing: TimingConfig = TimingConfig()
+    indexes: IndexesConfig = IndexesConfig()
+    reload: ReloadConfig = ReloadConfig()
+    wsgi: WsgiConfig = WsgiConfig()
@@ -0,0 +1,165 @@
+"""Timing of startup phases and startup tasks run in the background."""
+
+from contextlib import contextmanager
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+from flask import Flask
+
+logger = logging.getLogger(__name__)
+
+
+class StartupPhases:
+    """Timings of the phases of starting the app.
+
+    Phases run in the foreground are timed with `phase()`; startup tasks run
+    in the background record their timings via `record()` once done.
+    """
+
+    def __init__(self) -> None:
+        """Start timing.
+
+        Attributes:
+            timings: Duration (in seconds) of each completed phase.
+        """
+        self.timings: Dict[str, float] = {}
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a startup phase.
+
+        Args:
+            name: Name of the phase.
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, time.monotonic() - started)
+
+    def record(self, name: str, duration: float) -> None:
+        """Record duration of a startup phase.
+
+        Args:
+            name: Name of the phase.
+            duration: Duration (in seconds) of the phase.
+        """
+        with self._lock:
+            self.timings[name] = duration
+        logger.info(f"Startup phase '{name}' took {duration:.3f}s.")
+
+    def report(self) -> Dict[str, float]:
+        """Log durations of all phases completed so far.
+
+        Returns:
+            Duration (in seconds) of each completed phase and the time since
+            startup began.
+        """
+        with self._lock:
+            timings = {**self.timings, "total": time.monotonic() - self._started}
+        logger.info(
+            "Startup phases: "
+            + ", ".join(f"{name}={duration:.3f}s" for name, duration in timings.items())
+        )
+        return timings
+
+
+class StartupTask:
+    """Startup task retried with exponential backoff in a daemon thread.
+
+    The server becomes ready while the task is pending, e.g., while the
+    database is still starting up. Failed attempts are retried after a delay
+    that doubles with every attempt, up to a maximum, with random jitter so
+    that replicas do not retry in lockstep.
+    """
+
+    def __init__(
+        self,
+        app: Flask,
+        name: str,
+        func: Callable[[], None],
+        phases: Optional[StartupPhases] = None,
+    ) -> None:
+        """Initialize class requirements.
+
+        Args:
+            app: Flask application instance. The task runs in its app context.
+            name: Name of the task.
+            func: Function running the task; raises an exception on failure.
+            phases: Startup phase timings the task's duration is recorded in.
+
+        Attributes:
+            app: Flask application instance.
+            name: Name of the task.
+            func: Function running the task.
+            phases: Startup phase timings the task's duration is recorded in.
+            initial_backoff: Delay (in seconds) before the first retry.
+            max_backoff: Maximum delay (in seconds) between retries.
+            backoff_factor: Factor by which the delay grows with every retry.
+            attempts: Number of attempts made so far.
+            done: Event set once the task succeeded.
+        """
+        foca_conf = app.config.foca  # type: ignore[attr-defined]
+        startup_conf = foca_conf.custom.startup
+        self.app = app
+        self.name = name
+        self.func = func
+        self.phases = phases
+        self.initial_backoff = startup_conf.initial_backoff
+        self.max_backoff = startup_conf.max_backoff
+        self.backoff_factor = startup_conf.backoff_factor
+        self.attempts = 0
+        self.done = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run(self) -> bool:
+        """Run task until it succeeds or is stopped.
+
+        Returns:
+            Whether the task succeeded.
+        """
+        started = time.monotonic()
+        delay = self.initial_backoff
+        with self.app.app_context():
+            while not self._stop.is_set():
+                self.attempts += 1
+                try:
+                    self.func()
+                except Exception as e:
+                    wait = min(delay, self.max_backoff) * random.uniform(0.5, 1.0)
+                    logger.warning(
+                        f"Startup task '{self.name}' failed (attempt "
+                        f"{self.attempts}): {type(e).__name__}: {e}; retrying "
+                        f"in {wait:.1f}s."
+                    )
+                    self._stop.wait(timeout=wait)
+                    delay *= self.backoff_factor
+                    continue
+                self.done.set()
+                if self.phases is not None:
+                    self.phases.record(self.name, time.monotonic() - started)
+                return True
+        return False
+
+    def start(self) -> None:
+        """Run task in a daemon thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run,
+            name=f"startup-{self.name}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop retrying task."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
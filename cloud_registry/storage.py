@@ -0,0 +1,849 @@
+"""Embedded storage backend based on SQLite."""
+
+from copy import deepcopy
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from bson import ObjectId
+from foca.models.config import MongoConfig
+from pymongo import InsertOne, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo.results import (
+    BulkWriteResult,
+    DeleteResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+logger = logging.getLogger(__name__)
+
+# interval (in seconds) between purges of documents expired by TTL indexes
+TTL_INTERVAL = 60
+
+IndexKeys = Union[str, List[Tuple[str, int]], Dict[str, int]]
+
+
+class SQLiteDatabase:
+    """Database stored in a single SQLite file.
+
+    The file is opened in write-ahead logging (WAL) mode, so that readers run
+    concurrently with each other and with a single writer. Every thread uses
+    its own connection.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        name: str,
+        mmap_size: int = 0,
+        busy_timeout: float = 5.0,
+    ) -> None:
+        """Open database.
+
+        Args:
+            path: Path to the database file.
+            name: Name of the database.
+            mmap_size: Maximum number of bytes of the database file mapped
+                into memory.
+            busy_timeout: Maximum time (in seconds) to wait for a lock held
+                by another connection.
+
+        Attributes:
+            path: Path to the database file.
+            name: Name of the database.
+            mmap_size: Maximum number of bytes of the database file mapped
+                into memory.
+            busy_timeout: Maximum time (in seconds) to wait for a lock held
+                by another connection.
+        """
+        self.path = path
+        self.name = name
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._collections: Dict[str, SQLiteCollection] = {}
+        self._lock = threading.Lock()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Connection of the current thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.connection = connection
+        return connection
+
+    def __getitem__(self, name: str) -> "SQLiteCollection":
+        """Get collection, creating its table if it does not exist."""
+        return self.get_collection(name)
+
+    def get_collection(self, name: str) -> "SQLiteCollection":
+        """Get collection, creating its table if it does not exist.
+
+        Args:
+            name: Name of the collection.
+
+        Returns:
+            Collection.
+        """
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = SQLiteCollection(database=self, name=name)
+            return self._collections[name]
+
+    def list_collection_names(self) -> List[str]:
+        """List names of all collections.
+
+        Returns:
+            Collection names.
+        """
+        rows = self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+
+class SQLiteCollection:
+    """Collection of documents stored in a SQLite table.
+
+    Implements the subset of the `pymongo.collection.Collection` interface
+    used by the registry. Documents are stored as JSON; indexes are created on
+    expressions extracting the indexed fields, and filters and sort orders
+    are translated into SQL on the same expressions, so that they are served
+    by the indexes.
+    """
+
+    def __init__(self, database: SQLiteDatabase, name: str) -> None:
+        """Initialize collection, creating its table if it does not exist.
+
+        Args:
+            database: Database holding the collection.
+            name: Name of the collection.
+
+        Attributes:
+            database: Database holding the collection.
+            name: Name of the collection.
+            full_name: Name of the collection, prefixed with the database name.
+        """
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._table = _quote(name)
+        self._ttl: List[Tuple[str, int]] = []
+        self._ttl_purged = 0.0
+        self.database.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._table} "
+            "(_id TEXT PRIMARY KEY, doc TEXT NOT NULL)"
+        )
+
+    def with_options(self, **kwargs) -> "SQLiteCollection":
+        """Return collection; read preferences do not apply to SQLite."""
+        return self
+
+    def create_index(self, keys: IndexKeys, **options) -> str:
+        """Create index if it does not exist.
+
+        Args:
+            keys: Field or list of fields and directions to index.
+            **options: Index options; `unique`, `name` and
+                `expireAfterSeconds` are supported, others are ignored.
+
+        Returns:
+            Name of the index.
+        """
+        key_list = _key_list(keys)
+        name = options.get("name") or "_".join(f"{k}_{d}" for k, d in key_list)
+        columns = ", ".join(
+            f"{_expression(key)} {'DESC' if direction == -1 else 'ASC'}"
+            for key, direction in key_list
+        )
+        unique = "UNIQUE " if options.get("unique") else ""
+        self.database.connection.execute(
+            f"CREATE {unique}INDEX IF NOT EXISTS {_quote(f'{self.name}.{name}')} "
+            f"ON {self._table} ({columns})"
+        )
+        if "expireAfterSeconds" in options:
+            self._ttl.append((key_list[0][0], int(options["expireAfterSeconds"])))
+        return name
+
+    def find(
+        self,
+        filter: Optional[Dict] = None,
+        projection: Optional[Dict] = None,
+        sort: Optional[List[Tuple[str, int]]] = None,
+        limit: int = 0,
+        **kwargs,
+    ) -> "SQLiteCursor":
+        """Find documents.
+
+        Args:
+            filter: Query filter.
+            projection: Fields to include or exclude.
+            sort: Fields and directions to sort by.
+            limit: Maximum number of documents to return; `0` for no limit.
+            **kwargs: Other query options; ignored.
+
+        Returns:
+            Cursor over matching documents.
+        """
+        if isinstance(projection, list):
+            projection = {field: True for field in projection}
+        return SQLiteCursor(
+            collection=self,
+            filter=filter or {},
+            projection=projection,
+            sort=sort,
+            limit=limit,
+        )
+
+    def find_one(
+        self,
+        filter: Optional[Any] = None,
+        *args,
+        **kwargs,
+    ) -> Optional[Dict]:
+        """Find a single document.
+
+        Args:
+            filter: Query filter.
+            *args: Positional arguments passed to `find()`.
+            **kwargs: Keyword arguments passed to `find()`.
+
+        Returns:
+            Matching document, or `None` if no document matches.
+        """
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        for doc in self.find(filter, *args, **kwargs).limit(1):
+            return doc
+        return None
+
+    def count_documents(self, filter: Dict, limit: int = 0, **kwargs) -> int:
+        """Count documents.
+
+        Args:
+            filter: Query filter.
+            limit: Maximum number of documents to count; `0` for no limit.
+            **kwargs: Other query options; ignored.
+
+        Returns:
+            Number of matching documents.
+        """
+        where, params = _where(filter)
+        sql = f"SELECT 1 FROM {self._table} WHERE {where}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        row = self.database.connection.execute(
+            f"SELECT COUNT(*) FROM ({sql})", params
+        ).fetchone()
+        return row[0]
+
+    def insert_one(self, document: Dict, **kwargs) -> InsertOneResult:
+        """Insert document.
+
+        Args:
+            document: Document to insert. An `_id` is added if missing.
+            **kwargs: Other write options; ignored.
+
+        Returns:
+            Result of the insert.
+
+        Raises:
+            pymongo.errors.DuplicateKeyError: Document violates a unique
+                index.
+        """
+        with self._transaction() as connection:
+            self._insert(connection, document)
+        return InsertOneResult(document["_id"], acknowledged=True)
+
+    def replace_one(
+        self,
+        filter: Dict,
+        replacement: Dict,
+        upsert: bool = False,
+        **kwargs,
+    ) -> UpdateResult:
+        """Replace a single document.
+
+        Args:
+            filter: Query filter.
+            replacement: New document.
+            upsert: Whether to insert the document if none matches.
+            **kwargs: Other write options; ignored.
+
+        Returns:
+            Result of the replacement.
+        """
+        with self._transaction() as connection:
+            raw = self._replace(connection, filter, replacement, upsert)
+        return UpdateResult(raw, acknowledged=True)
+
+    def update_one(
+        self,
+        filter: Dict,
+        update: Dict,
+        upsert: bool = False,
+        **kwargs,
+    ) -> UpdateResult:
+        """Update a single document.
+
+        Args:
+            filter: Query filter.
+            update: Update operators `$set`, `$setOnInsert`, `$unset` and
+                `$inc`.
+            upsert: Whether to insert a document if none matches.
+            **kwargs: Other write options; ignored.
+
+        Returns:
+            Result of the update.
+        """
+        with self._transaction() as connection:
+            raw, _, _ = self._update(connection, filter, update, upsert)
+        return UpdateResult(raw, acknowledged=True)
+
+    def find_one_and_update(
+        self,
+        filter: Dict,
+        update: Dict,
+        projection: Optional[Dict] = None,
+        upsert: bool = False,
+        return_document: bool = ReturnDocument.BEFORE,
+        **kwargs,
+    ) -> Optional[Dict]:
+        """Atomically update a single document and return it.
+
+        Args:
+            filter: Query filter.
+            update: Update operators.
+            projection: Fields to include or exclude.
+            upsert: Whether to insert a document if none matches.
+            return_document: Whether to return the document after rather than
+                before the update.
+            **kwargs: Other write options; ignored.
+
+        Returns:
+            Document before or after the update, or `None` if there was none.
+        """
+        with self._transaction() as connection:
+            _, before, after = self._update(connection, filter, update, upsert)
+        doc = after if return_document == ReturnDocument.AFTER else before
+        return None if doc is None else _project(doc, projection)
+
+    def delete_many(self, filter: Dict, **kwargs) -> DeleteResult:
+        """Delete documents.
+
+        Args:
+            filter: Query filter.
+            **kwargs: Other write options; ignored.
+
+        Returns:
+            Result of the deletion.
+        """
+        where, params = _where(filter)
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                f"DELETE FROM {self._table} WHERE {where}", params
+            )
+        return DeleteResult({"n": cursor.rowcount}, acknowledged=True)
+
+    def bulk_write(self, requests: List, ordered: bool = True, **kwargs):
+        """Apply inserts, replacements and updates in a single transaction.
+
+        Args:
+            requests: `InsertOne`, `ReplaceOne` or `UpdateOne` operations.
+            ordered: Whether to stop at the first failing operation; all
+                operations are applied in order either way.
+            **kwargs: Other write options; ignored.
+
+        Returns:
+            Result of the bulk write.
+        """
+        result: Dict = {
+            "nInserted": 0,
+            "nUpserted": 0,
+            "nMatched": 0,
+            "nModified": 0,
+            "nRemoved": 0,
+            "upserted": [],
+            "writeErrors": [],
+            "writeConcernErrors": [],
+        }
+        with self._transaction() as connection:
+            for index, request in enumerate(requests):
+                # pymongo does not expose operation details publicly
+                if isinstance(request, InsertOne):
+                    self._insert(connection, request._doc)
+                    result["nInserted"] += 1
+                    continue
+                if isinstance(request, ReplaceOne):
+                    raw = self._replace(
+                        connection, request._filter, request._doc, request._upsert
+                    )
+                elif isinstance(request, UpdateOne):
+                    raw, _, _ = self._update(
+                        connection, request._filter, request._doc, request._upsert
+                    )
+                else:
+                    raise TypeError(f"Unsupported operation: {request!r}")
+                if "upserted" in raw:
+                    result["nUpserted"] += 1
+                    result["upserted"].append({"index": index, "_id": raw["upserted"]})
+                else:
+                    result["nMatched"] += raw["n"]
+                    result["nModified"] += raw["nModified"]
+        return BulkWriteResult(result, acknowledged=True)
+
+    def _select(
+        self,
+        filter: Dict,
+        sort: Optional[List[Tuple[str, int]]] = None,
+        limit: int = 0,
+        connection: Optional[sqlite3.Connection] = None,
+    ) -> Iterator[Dict]:
+        """Yield matching documents."""
+        where, params = _where(filter)
+        sql = f"SELECT doc FROM {self._table} WHERE {where}"
+        if sort:
+            sql += " ORDER BY " + ", ".join(
+                f"{_expression(key)} {'DESC' if direction == -1 else 'ASC'}"
+                for key, direction in sort
+            )
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        connection = connection or self.database.connection
+        for row in connection.execute(sql, params):
+            yield _loads(row[0])
+
+    def _insert(self, connection: sqlite3.Connection, document: Dict) -> None:
+        """Insert document within a transaction."""
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        try:
+            connection.execute(
+                f"INSERT INTO {self._table} (_id, doc) VALUES (?, ?)",
+                (_dumps(document["_id"]), _dumps(document)),
+            )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error: {e}")
+        self._purge_expired(connection)
+
+    def _write(self, connection: sqlite3.Connection, document: Dict) -> None:
+        """Overwrite existing document within a transaction."""
+        try:
+            connection.execute(
+                f"UPDATE {self._table} SET doc = ? WHERE _id = ?",
+                (_dumps(document), _dumps(document["_id"])),
+            )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error: {e}")
+
+    def _replace(
+        self,
+        connection: sqlite3.Connection,
+        filter: Dict,
+        replacement: Dict,
+        upsert: bool,
+    ) -> Dict:
+        """Replace document within a transaction and return raw result."""
+        existing = next(self._select(filter, limit=1, connection=connection), None)
+        if existing is None:
+            if not upsert:
+                return {"n": 0, "nModified": 0}
+            document = {**_equalities(filter), **replacement}
+            self._insert(connection, document)
+            return {"n": 1, "nModified": 0, "upserted": document["_id"]}
+        document = {**replacement, "_id": existing["_id"]}
+        self._write(connection, document)
+        return {"n": 1, "nModified": int(_dumps(document) != _dumps(existing))}
+
+    def _update(
+        self,
+        connection: sqlite3.Connection,
+        filter: Dict,
+        update: Dict,
+        upsert: bool,
+    ) -> Tuple[Dict, Optional[Dict], Optional[Dict]]:
+        """Update document within a transaction.
+
+        Returns:
+            Raw result and the document before and after the update.
+        """
+        existing = next(self._select(filter, limit=1, connection=connection), None)
+        if existing is None:
+            if not upsert:
+                return {"n": 0, "nModified": 0}, None, None
+            document = _apply(_equalities(filter), update, insert=True)
+            self._insert(connection, document)
+            return {"n": 1, "nModified": 0, "upserted": document["_id"]}, None, document
+        document = _apply(deepcopy(existing), update, insert=False)
+        modified = _dumps(document) != _dumps(existing)
+        if modified:
+            self._write(connection, document)
+        return {"n": 1, "nModified": int(modified)}, existing, document
+
+    def _purge_expired(self, connection: sqlite3.Connection) -> None:
+        """Delete documents expired by TTL indexes, at most once per interval."""
+        if not self._ttl or time.monotonic() - self._ttl_purged < TTL_INTERVAL:
+            return
+        self._ttl_purged = time.monotonic()
+        for field, seconds in self._ttl:
+            cutoff = datetime.utcnow() - timedelta(seconds=seconds)
+            where, params = _where({field: {"$lt": cutoff}})
+            connection.execute(f"DELETE FROM {self._table} WHERE {where}", params)
+
+    def _transaction(self) -> "_Transaction":
+        """Open write transaction."""
+        return _Transaction(self.database.connection)
+
+
+class SQLiteCursor:
+    """Cursor over documents of a `SQLiteCollection`.
+
+    The query runs when the cursor is first iterated.
+    """
+
+    def __init__(
+        self,
+        collection: SQLiteCollection,
+        filter: Dict,
+        projection: Optional[Dict],
+        sort: Optional[List[Tuple[str, int]]],
+        limit: int,
+    ) -> None:
+        """Initialize cursor.
+
+        Args:
+            collection: Collection to query.
+            filter: Query filter.
+            projection: Fields to include or exclude.
+            sort: Fields and directions to sort by.
+            limit: Maximum number of documents to return; `0` for no limit.
+        """
+        self._collection = collection
+        self._filter = filter
+        self._projection = projection
+        self._sort = sort
+        self._limit = limit
+        self._iterator: Optional[Iterator[Dict]] = None
+
+    def sort(
+        self,
+        key_or_list: Union[str, List[Tuple[str, int]]],
+        direction: int = 1,
+    ) -> "SQLiteCursor":
+        """Set sort order."""
+        if isinstance(key_or_list, str):
+            key_or_list = [(key_or_list, direction)]
+        self._sort = key_or_list
+        return self
+
+    def limit(self, limit: int) -> "SQLiteCursor":
+        """Set maximum number of documents to return."""
+        self._limit = limit
+        return self
+
+    def max_time_ms(self, max_time_ms: Optional[int]) -> "SQLiteCursor":
+        """Ignore maximum run time; SQLite queries are not interrupted."""
+        return self
+
+    def __iter__(self) -> "SQLiteCursor":
+        """Return cursor."""
+        return self
+
+    def __next__(self) -> Dict:
+        """Return next document."""
+        if self._iterator is None:
+            self._iterator = self._collection._select(
+                filter=self._filter,
+                sort=self._sort,
+                limit=self._limit,
+            )
+        return _project(next(self._iterator), self._projection)
+
+    def next(self) -> Dict:
+        """Return next document."""
+        return self.__next__()
+
+
+class _Transaction:
+    """Context manager for a write transaction."""
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        """Initialize transaction."""
+        self.connection = connection
+
+    def __enter__(self) -> sqlite3.Connection:
+        """Begin transaction, taking the write lock right away."""
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        """Commit transaction, or roll it back on error."""
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def register_sqlite(
+    conf: MongoConfig,
+    path: str,
+    mmap_size: int = 0,
+    busy_timeout: float = 5.0,
+) -> MongoConfig:
+    """Store databases and collections in SQLite files.
+
+    Sets the clients of all configured databases and collections, like FOCA
+    does for MongoDB, but keeps existing indexes instead of recreating them.
+
+    Args:
+        conf: Database configuration.
+        path: Directory holding one database file per database.
+        mmap_size: Maximum number of bytes of each database file mapped into
+            memory.
+        busy_timeout: Maximum time (in seconds) to wait for a lock held by
+            another connection.
+
+    Returns:
+        Database configuration with clients set.
+    """
+    os.makedirs(path, exist_ok=True)
+    for db_name, db_conf in (conf.dbs or {}).items():
+        database = SQLiteDatabase(
+            path=os.path.join(path, f"{db_name}.sqlite3"),
+            name=db_name,
+            mmap_size=mmap_size,
+            busy_timeout=busy_timeout,
+        )
+        db_conf.client = database
+        for coll_name, coll_conf in (db_conf.collections or {}).items():
+            coll_conf.client = database[coll_name]
+            for index in coll_conf.indexes or []:
+                if index.keys is not None:
+                    coll_conf.client.create_index(index.keys, **index.options)
+            logger.info(f"Added SQLite collection '{coll_name}'.")
+    return conf
+
+
+def _quote(name: str) -> str:
+    """Quote SQL identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _path(key: str) -> str:
+    """Build JSON path from dotted field name."""
+    return "$" + "".join(
+        '."' + part.replace('"', '\\"') + '"' for part in key.split(".")
+    )
+
+
+def _expression(key: str, suffix: Optional[str] = None) -> str:
+    """Build SQL expression extracting a field from documents."""
+    path = _path(key if suffix is None else f"{key}.{suffix}")
+    return f"json_extract(doc, '{path}')"
+
+
+def _key_list(keys: IndexKeys) -> List[Tuple[str, int]]:
+    """Normalize index keys."""
+    if isinstance(keys, str):
+        return [(keys, 1)]
+    if isinstance(keys, dict):
+        return list(keys.items())
+    return [(key, direction) for key, direction in keys]
+
+
+def _operand(key: str, value: Any) -> Tuple[str, Any]:
+    """Return SQL expression and parameter comparing a field with a value."""
+    if key == "_id":
+        return "_id", _dumps(value)
+    if isinstance(value, datetime):
+        return _expression(key, "$date"), _encode(value)["$date"]
+    if isinstance(value, bool):
+        return _expression(key), int(value)
+    if isinstance(value, (dict, list)):
+        return _expression(key), _dumps(value)
+    return _expression(key), value
+
+
+def _where(filter: Dict) -> Tuple[str, List]:
+    """Translate query filter into SQL condition and parameters."""
+    clauses: List[str] = []
+    params: List = []
+    for key, condition in filter.items():
+        if key in ["$and", "$or"]:
+            parts = [_where(sub) for sub in condition]
+            joined = f" {key[1:].upper()} ".join(f"({sql})" for sql, _ in parts)
+            clauses.append(f"({joined or '1'})")
+            for _, sub_params in parts:
+                params.extend(sub_params)
+            continue
+        if key.startswith("$"):
+            raise OperationFailure(f"Unsupported query operator: {key}")
+        operators = (
+            condition
+            if isinstance(condition, dict)
+            and condition
+            and all(k.startswith("$") for k in condition)
+            else {"$eq": condition}
+        )
+        for op, value in operators.items():
+            sql, sql_params = _comparison(key, op, value)
+            clauses.append(sql)
+            params.extend(sql_params)
+    return " AND ".join(clauses) or "1", params
+
+
+def _comparison(key: str, op: str, value: Any) -> Tuple[str, List]:
+    """Translate comparison of a field into SQL condition and parameters."""
+    if op == "$exists":
+        sql = f"json_type(doc, '{_path(key)}') IS {'NOT ' if value else ''}NULL"
+        return sql, []
+    if op in ["$eq", "$ne"] and value is None:
+        return f"{_expression(key)} IS {'NOT ' if op == '$ne' else ''}NULL", []
+    if op in ["$in", "$nin"]:
+        values = list(value)
+        if not values:
+            return ("0" if op == "$in" else "1"), []
+        operands = [_operand(key, v) for v in values]
+        expr = operands[0][0]
+        placeholders = ", ".join("?" for _ in operands)
+        negate = "NOT " if op == "$nin" else ""
+        return f"{expr} {negate}IN ({placeholders})", [p for _, p in operands]
+    sql_ops = {
+        "$eq": "=",
+        "$ne": "IS NOT",
+        "$gt": ">",
+        "$gte": ">=",
+        "$lt": "<",
+        "$lte": "<=",
+    }
+    if op not in sql_ops:
+        raise OperationFailure(f"Unsupported query operator: {op}")
+    expr, param = _operand(key, value)
+    return f"{expr} {sql_ops[op]} ?", [param]
+
+
+def _equalities(filter: Dict) -> Dict:
+    """Build document from the equality conditions of a filter."""
+    document: Dict = {}
+    for key, condition in filter.items():
+        if key.startswith("$"):
+            continue
+        if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+            if "$eq" not in condition:
+                continue
+            condition = condition["$eq"]
+        _set(document, key, deepcopy(condition))
+    return document
+
+
+def _apply(document: Dict, update: Dict, insert: bool) -> Dict:
+    """Apply update operators to document."""
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not insert:
+            continue
+        for key, value in fields.items():
+            if op in ["$set", "$setOnInsert"]:
+                _set(document, key, deepcopy(value))
+            elif op == "$unset":
+                _unset(document, key)
+            elif op == "$inc":
+                _set(document, key, _get(document, key, 0) + value)
+            else:
+                raise OperationFailure(f"Unsupported update operator: {op}")
+    return document
+
+
+def _get(document: Dict, key: str, default: Any = None) -> Any:
+    """Get value of dotted field."""
+    value: Any = document
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return default
+        value = value[part]
+    return value
+
+
+def _set(document: Dict, key: str, value: Any) -> None:
+    """Set value of dotted field, creating parent objects."""
+    *parents, last = key.split(".")
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+
+def _unset(document: Dict, key: str) -> None:
+    """Remove dotted field."""
+    *parents, last = key.split(".")
+    for part in parents:
+        document = document.get(part)  # type: ignore[assignment]
+        if not isinstance(document, dict):
+            return
+    document.pop(last, None)
+
+
+def _project(document: Dict, projection: Optional[Dict]) -> Dict:
+    """Apply projection to document."""
+    if not projection:
+        return document
+    include = [k for k, v in projection.items() if v and k != "_id"]
+    if include:
+        projected: Dict = {}
+        if projection.get("_id", True) and "_id" in document:
+            projected["_id"] = document["_id"]
+        for key in include:
+            value = _get(document, key, _MISSING)
+            if value is not _MISSING:
+                _set(projected, key, value)
+        return projected
+    for key, value in projection.items():
+        if not value:
+            _unset(document, key)
+    return document
+
+
+_MISSING = object()
+
+
+def _encode(value: Any) -> Any:
+    """Encode dates and object identifiers for storage as JSON."""
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat(timespec="microseconds")}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    return value
+
+
+def _decode(obj: Dict) -> Any:
+    """Decode dates and object identifiers stored as JSON."""
+    if len(obj) == 1:
+        if "$date" in obj:
+            return datetime.fromisoformat(obj["$date"])
+        if "$oid" in obj:
+            return ObjectId(obj["$oid"])
+    return obj
+
+
+def _dumps(value: Any) -> str:
+    """Serialize value to JSON."""
+    return json.dumps(_encode(value), separators=(",", ":"))
+
+
+def _loads(text: str) -> Any:
+    """Deserialize value from JSON."""
+    return json.loads(text, object_hook=_decode)
@@ -0,0 +1,442 @@
+"""Timing of requests, slow MongoDB commands and the `Server-Timing` header."""
+
+from contextlib import contextmanager
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from connexion.apis.flask_api import FlaskApi
+from connexion.jsonifier import Jsonifier
+import flask
+from flask import Flask, Response, g, has_request_context, request
+from foca.models.config import Config
+from pymongo import monitoring
+from pymongo.database import Database
+
+logger = logging.getLogger(__name__)
+
+# commands whose query plan is summarized when they are slow
+EXPLAINABLE = [
+    "aggregate",
+    "count",
+    "delete",
+    "distinct",
+    "find",
+    "findAndModify",
+    "update",
+]
+
+# fields of commands that are not accepted by the `explain` command
+_UNEXPLAINABLE_FIELDS = [
+    "$clusterTime",
+    "$db",
+    "$readPreference",
+    "lsid",
+    "readConcern",
+    "txnNumber",
+    "writeConcern",
+]
+
+# order of the metrics in the `Server-Timing` header
+METRICS = ["db", "validation", "auth", "serialization"]
+
+
+class RequestTimings:
+    """Time spent on parts of serving a request.
+
+    Attributes:
+        started: Time (in seconds, monotonic) the request started at.
+        durations: Time (in seconds) spent on each part.
+        counts: Number of times each part was entered.
+    """
+
+    def __init__(self) -> None:
+        """Start timing request."""
+        self.started = time.monotonic()
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, name: str, duration: float) -> None:
+        """Add time spent on a part of serving the request.
+
+        Args:
+            name: Name of the part.
+            duration: Time (in seconds) spent.
+        """
+        self.durations[name] = self.durations.get(name, 0.0) + duration
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def server_timing(self) -> str:
+        """Format timings as `Server-Timing` header value.
+
+        Returns:
+            Durations (in milliseconds) of the timed parts and of the whole
+            request so far.
+        """
+        metrics: List[str] = []
+        for name in METRICS + sorted(set(self.durations) - set(METRICS)):
+            if name not in self.durations:
+                continue
+            desc = f';desc="{self.counts[name]} commands"' if name == "db" else ""
+            metrics.append(f"{name}{desc};dur={self.durations[name] * 1000:.1f}")
+        metrics.append(f"total;dur={(time.monotonic() - self.started) * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+def get_request_timings() -> Optional[RequestTimings]:
+    """Get timings of the current request.
+
+    Returns:
+        Timings, or `None` outside of requests or if timing is not registered.
+    """
+    if not has_request_context():
+        return None
+    return g.get("request_timings")
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Add time spent within the context to the timings of the current request.
+
+    Can be used as decorator, too.
+
+    Args:
+        name: Name of the part of serving the request.
+    """
+    timings = get_request_timings()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+class TimedJsonifier(Jsonifier):
+    """Serializer of response bodies timing serialization."""
+
+    def dumps(self, data: Any, **kwargs) -> str:
+        """Serialize data to JSON.
+
+        Args:
+            data: Data to serialize.
+            **kwargs: Keyword arguments passed to the JSON module.
+
+        Returns:
+            JSON string.
+        """
+        with timed("serialization"):
+            return super().dumps(data, **kwargs)
+
+
+class _Command(NamedTuple):
+    """Command in flight."""
+
+    name: str
+    database: str
+    collection: Optional[str]
+    command: Dict
+    timings: Optional[RequestTimings]
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Listener adding the duration of MongoDB commands to request timings.
+
+    Commands slower than the threshold are logged with the shape of their
+    filter, i.e., the filter with all values replaced, and a summary of their
+    query plan. Plans are obtained with the `explain` command in the
+    background, at most once per interval for each filter shape.
+
+    Attributes:
+        slow_command_ms: Duration (in milliseconds) above which commands are
+            logged, or `None` if commands are not logged.
+        explain: Whether query plans of slow commands are summarized.
+        explain_interval: Time (in seconds) for which the plan summary of a
+            filter shape is reused.
+        databases: Databases by name, used to explain slow commands.
+    """
+
+    def __init__(self) -> None:
+        """Initialize listener."""
+        self.slow_command_ms: Optional[float] = None
+        self.explain = True
+        self.explain_interval = 60.0
+        self.databases: Dict[str, Database] = {}
+        self._commands: Dict[Tuple[Any, int], _Command] = {}
+        self._plans: Dict[Tuple, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        """Remember command in flight.
+
+        Args:
+            event: Command started event.
+        """
+        collection = event.command.get(event.command_name)
+        command = _Command(
+            name=event.command_name,
+            database=event.database_name,
+            collection=collection if isinstance(collection, str) else None,
+            command=event.command,
+            timings=get_request_timings(),
+        )
+        with self._lock:
+            self._commands[(event.connection_id, event.request_id)] = command
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        """Record duration of command.
+
+        Args:
+            event: Command succeeded event.
+        """
+        self._finished(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        """Record duration of command.
+
+        Args:
+            event: Command failed event.
+        """
+        self._finished(event)
+
+    def _finished(self, event: Any) -> None:
+        """Record duration of command and log it if it was slow."""
+        with self._lock:
+            command = self._commands.pop((event.connection_id, event.request_id), None)
+        if command is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if command.timings is not None:
+            command.timings.add("db", duration_ms / 1000)
+        if (
+            self.slow_command_ms is not None
+            and duration_ms > self.slow_command_ms
+            and command.name != "explain"
+        ):
+            self._log_slow(command=command, duration_ms=duration_ms)
+
+    def _log_slow(self, command: _Command, duration_ms: float) -> None:
+        """Log slow command, explaining it in the background if needed."""
+        query = command_filter(command.name, command.command)
+        shape = filter_shape(query) if query is not None else None
+        key = (
+            command.database,
+            command.collection,
+            command.name,
+            json.dumps(shape, sort_keys=True, default=str),
+        )
+        now = time.monotonic()
+        database = self.databases.get(command.database)
+        with self._lock:
+            cached = self._plans.get(key)
+            if cached is not None and cached[0] > now:
+                plan = cached[1]
+            elif (
+                not self.explain or command.name not in EXPLAINABLE or database is None
+            ):
+                plan = "n/a"
+            else:
+                if len(self._plans) >= 1000:
+                    self._plans.clear()
+                self._plans[key] = (now + self.explain_interval, "pending")
+                threading.Thread(
+                    target=self._explain_and_log,
+                    args=(database, key, command, shape, duration_ms),
+                    name="explain-slow-command",
+                    daemon=True,
+                ).start()
+                return
+        _log(command=command, shape=shape, duration_ms=duration_ms, plan=plan)
+
+    def _explain_and_log(
+        self,
+        database: Database,
+        key: Tuple,
+        command: _Command,
+        shape: Any,
+        duration_ms: float,
+    ) -> None:
+        """Explain slow command and log it with its plan summary."""
+        explained = {
+            field: value
+            for field, value in command.command.items()
+            if field not in _UNEXPLAINABLE_FIELDS
+        }
+        try:
+            res = database.command({"explain": explained, "verbosity": "queryPlanner"})
+            plan = summarize_plan(res)
+        except Exception as e:
+            plan = f"explain failed: {type(e).__name__}"
+        with self._lock:
+            self._plans[key] = (time.monotonic() + self.explain_interval, plan)
+        _log(command=command, shape=shape, duration_ms=duration_ms, plan=plan)
+
+
+def _log(command: _Command, shape: Any, duration_ms: float, plan: str) -> None:
+    """Log slow command."""
+    namespace = command.database
+    if command.collection is not None:
+        namespace = f"{namespace}.{command.collection}"
+    logger.warning(
+        f"Slow command '{command.name}' on '{namespace}' took "
+        f"{duration_ms:.1f}ms; filter: {json.dumps(shape, default=str)}; "
+        f"plan: {plan}"
+    )
+
+
+def command_filter(name: str, command: Dict) -> Any:
+    """Get filter of a command.
+
+    Args:
+        name: Name of the command.
+        command: Command document.
+
+    Returns:
+        Filter, or `None` if the command has none.
+    """
+    if name == "find":
+        return command.get("filter")
+    if name in ["count", "distinct", "findAndModify"]:
+        return command.get("query")
+    if name in ["update", "delete"]:
+        statements = command.get(f"{name}s") or [{}]
+        return statements[0].get("q")
+    if name == "aggregate":
+        for stage in command.get("pipeline", []):
+            if "$match" in stage:
+                return stage["$match"]
+    return None
+
+
+def filter_shape(value: Any) -> Any:
+    """Replace values of a filter with placeholders, keeping fields and
+    operators.
+
+    Args:
+        value: Filter or filter value.
+
+    Returns:
+        Shape of the filter.
+    """
+    if isinstance(value, dict):
+        return {key: filter_shape(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], dict):
+        return [filter_shape(val) for val in value]
+    return "?"
+
+
+def summarize_plan(explained: Dict) -> str:
+    """Summarize winning query plan of an explained command.
+
+    Args:
+        explained: Result of the `explain` command.
+
+    Returns:
+        Stages of the winning plan from the outermost to the innermost, with
+        the names of the indexes scanned.
+    """
+    planner = _find_key(explained, "queryPlanner")
+    if not isinstance(planner, dict) or "winningPlan" not in planner:
+        return "unknown"
+    stages: List[str] = []
+    stage: Optional[Dict] = planner["winningPlan"]
+    while stage:
+        name = stage.get("stage", "?")
+        if "indexName" in stage:
+            name = f"{name}({stage['indexName']})"
+        stages.append(name)
+        stage = stage.get("inputStage") or next(
+            iter(stage.get("inputStages", [])), None
+        )
+    return " <- ".join(stages)
+
+
+def _find_key(value: Any, key: str) -> Any:
+    """Find first value of a key in nested documents and lists."""
+    if isinstance(value, dict):
+        if key in value:
+            return value[key]
+        value = list(value.values())
+    if isinstance(value, list):
+        for item in value:
+            found = _find_key(item, key)
+            if found is not None:
+                return found
+    return None
+
+
+# process-wide, as PyMongo listeners apply to all clients created afterwards
+command_timer = CommandTimer()
+_command_timer_registered = False
+
+
+def register_command_timing(conf: Config) -> None:
+    """Listen to commands of MongoDB clients if timing is enabled.
+
+    Needs to be called before the clients are created, i.e., before the app is
+    created.
+
+    Args:
+        conf: App configuration.
+    """
+    global _command_timer_registered
+    if not conf.custom.timing.enabled:
+        return
+    if not _command_timer_registered:
+        monitoring.register(command_timer)
+        _command_timer_registered = True
+
+
+def register_request_timing(app: Flask) -> None:
+    """Time requests and log slow MongoDB commands if enabled.
+
+    Sets the `Server-Timing` header of responses if configured and logs
+    requests whose database commands exceed the configured time budget.
+
+    Args:
+        app: Flask application instance.
+    """
+    foca_conf = app.config.foca  # type: ignore[attr-defined]
+    timing_conf = foca_conf.custom.timing
+    if not timing_conf.enabled:
+        return
+    command_timer.slow_command_ms = timing_conf.slow_command_ms
+    command_timer.explain = timing_conf.explain
+    command_timer.explain_interval = timing_conf.explain_interval
+    if foca_conf.db is not None:
+        for name, db_conf in foca_conf.db.dbs.items():
+            if isinstance(db_conf.client, Database):
+                command_timer.databases[name] = db_conf.client
+    FlaskApi.jsonifier = TimedJsonifier(flask.json, indent=2)
+
+    @app.before_request
+    def start_request_timing() -> None:
+        """Start timing request."""
+        g.request_timings = RequestTimings()
+
+    @app.after_request
+    def report_request_timing(response: Response) -> Response:
+        """Set `Server-Timing` header and check database time budget."""
+        timings = get_request_timings()
+        if timings is None:
+            return response
+        if timing_conf.server_timing:
+            response.headers["Server-Timing"] = timings.server_timing()
+        budget = timing_conf.request_db_budget_ms
+        db_ms = timings.durations.get("db", 0.0) * 1000
+        if budget is not None and db_ms > budget:
+            logger.warning(
+                f"Request '{request.method} {request.path}' spent {db_ms:.1f}ms "
+                f"in {timings.counts['db']} database commands, exceeding the "
+                f"budget of {budget}ms."
+            )
+        return response
+
+    logger.info(
+        f"Timing requests; logging database commands slower than "
+        f"{timing_conf.slow_command_ms}ms."
+    )
@@ -0,0 +1,268 @@
+"""Tracing of requests, controllers and MongoDB commands with OpenTelemetry."""
+
+from contextlib import contextmanager
+from functools import wraps
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from flask import Flask, Response, current_app, g, has_app_context, request
+from foca.models.config import Config
+from pymongo import monitoring
+
+try:
+    from opentelemetry import context, propagate, trace
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+        OTLPSpanExporter,
+    )
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider, sampling
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter
+except ImportError:  # pragma: no cover
+    trace = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+_SAMPLERS: Dict[str, Callable[[float], Any]] = {}
+if trace is not None:
+    _SAMPLERS = {
+        "always_on": lambda ratio: sampling.ALWAYS_ON,
+        "always_off": lambda ratio: sampling.ALWAYS_OFF,
+        "traceidratio": sampling.TraceIdRatioBased,
+        "parentbased_traceidratio": sampling.ParentBasedTraceIdRatio,
+    }
+
+
+class CommandTracer(monitoring.CommandListener):
+    """Listener recording a span for every MongoDB command.
+
+    Spans are children of the span current in the thread issuing the command,
+    e.g., of the span of the controller serving the request. No spans are
+    recorded until a tracer is set.
+
+    Attributes:
+        tracer: Tracer recording spans, or `None` if tracing is disabled.
+    """
+
+    def __init__(self) -> None:
+        """Initialize listener."""
+        self.tracer: Any = None
+        self._spans: Dict[Tuple[Any, int], Any] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        """Start span of command.
+
+        Args:
+            event: Command started event.
+        """
+        if self.tracer is None:
+            return
+        attributes = {
+            "db.system": "mongodb",
+            "db.name": event.database_name,
+            "db.operation": event.command_name,
+        }
+        collection = event.command.get(event.command_name)
+        name = f"{event.command_name} {event.database_name}"
+        if isinstance(collection, str):
+            attributes["db.mongodb.collection"] = collection
+            name = f"{name}.{collection}"
+        if isinstance(event.connection_id, tuple):
+            attributes["net.peer.name"] = str(event.connection_id[0])
+            attributes["net.peer.port"] = event.connection_id[1]
+        span = self.tracer.start_span(
+            name, kind=trace.SpanKind.CLIENT, attributes=attributes
+        )
+        with self._lock:
+            self._spans[(event.connection_id, event.request_id)] = span
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        """End span of command.
+
+        Args:
+            event: Command succeeded event.
+        """
+        span = self._pop(event)
+        if span is not None:
+            span.end()
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        """End span of command with an error status.
+
+        Args:
+            event: Command failed event.
+        """
+        span = self._pop(event)
+        if span is not None:
+            span.set_status(
+                trace.Status(trace.StatusCode.ERROR, description=str(event.failure))
+            )
+            span.end()
+
+    def _pop(self, event: Any) -> Any:
+        """Remove span of command from spans in flight."""
+        with self._lock:
+            return self._spans.pop((event.connection_id, event.request_id), None)
+
+
+# process-wide, as PyMongo listeners apply to all clients created afterwards
+command_tracer = CommandTracer()
+_command_tracer_registered = False
+
+
+def register_command_tracing(conf: Config) -> None:
+    """Listen to commands of MongoDB clients if tracing is enabled.
+
+    Needs to be called before the clients are created, i.e., before the app is
+    created.
+
+    Args:
+        conf: App configuration.
+    """
+    global _command_tracer_registered
+    if not conf.custom.tracing.enabled or trace is None:
+        return
+    if not _command_tracer_registered:
+        monitoring.register(command_tracer)
+        _command_tracer_registered = True
+
+
+def create_tracer_provider(
+    app: Flask,
+    exporter: Optional["SpanExporter"] = None,
+) -> "TracerProvider":
+    """Create tracer provider exporting spans in batches.
+
+    Args:
+        app: Flask application instance.
+        exporter: Exporter of spans; spans are exported to the configured
+            OTLP/HTTP endpoint if not passed.
+
+    Returns:
+        Tracer provider.
+
+    Raises:
+        ValueError: The configured sampler is unknown.
+    """
+    foca_conf = app.config.foca  # type: ignore[attr-defined]
+    tracing_conf = foca_conf.custom.tracing
+    if tracing_conf.sampler not in _SAMPLERS:
+        raise ValueError(f"Unknown sampler: {tracing_conf.sampler}")
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": tracing_conf.service_name}),
+        sampler=_SAMPLERS[tracing_conf.sampler](tracing_conf.sample_ratio),
+    )
+    if exporter is None:
+        exporter = OTLPSpanExporter(
+            endpoint=tracing_conf.exporter_endpoint,
+            timeout=tracing_conf.exporter_timeout,
+        )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    return provider
+
+
+def register_tracing(app: Flask, exporter: Optional["SpanExporter"] = None) -> None:
+    """Record spans for requests if enabled.
+
+    Trace context is propagated from the W3C `traceparent` header of incoming
+    requests. Spans of controllers and database commands are children of the
+    span of the request.
+
+    Args:
+        app: Flask application instance.
+        exporter: Exporter of spans; spans are exported to the configured
+            OTLP/HTTP endpoint if not passed.
+    """
+    foca_conf = app.config.foca  # type: ignore[attr-defined]
+    tracing_conf = foca_conf.custom.tracing
+    if not tracing_conf.enabled:
+        return
+    if trace is None:
+        logger.warning("Package 'opentelemetry-sdk' not installed; tracing disabled.")
+        return
+    provider = create_tracer_provider(app=app, exporter=exporter)
+    tracer = provider.get_tracer(__name__)
+    app.extensions["tracer_provider"] = provider
+    app.extensions["tracer"] = tracer
+    command_tracer.tracer = tracer
+
+    @app.before_request
+    def start_request_span() -> None:
+        """Start span of request as child of the propagated trace context."""
+        route = request.url_rule.rule if request.url_rule else request.path
+        parent = propagate.extract(request.headers)
+        span = tracer.start_span(
+            f"{request.method} {route}",
+            context=parent,
+            kind=trace.SpanKind.SERVER,
+            attributes={
+                "http.method": request.method,
+                "http.route": route,
+                "http.target": request.full_path.rstrip("?"),
+            },
+        )
+        g.trace_span = span
+        g.trace_token = context.attach(trace.set_span_in_context(span, parent))
+
+    @app.after_request
+    def record_status(response: Response) -> Response:
+        """Record status code of the response with the span of the request."""
+        span = g.get("trace_span")
+        if span is not None:
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.set_status(trace.Status(trace.StatusCode.ERROR))
+        return response
+
+    @app.teardown_request
+    def end_request_span(error: Optional[BaseException]) -> None:
+        """End span of request."""
+        span = g.pop("trace_span", None)
+        if span is None:
+            return
+        if error is not None:
+            span.record_exception(error)
+            span.set_status(trace.Status(trace.StatusCode.ERROR, str(error)))
+        span.end()
+        context.detach(g.pop("trace_token"))
+
+    logger.info(
+        f"Tracing requests with sampler '{tracing_conf.sampler}' (ratio "
+        f"{tracing_conf.sample_ratio})."
+    )
+
+
+@contextmanager
+def start_span(name: str) -> Iterator[None]:
+    """Record span as child of the current span if tracing is enabled.
+
+    Exceptions raised within the span are recorded with it.
+
+    Args:
+        name: Name of the span.
+    """
+    tracer = current_app.extensions.get("tracer") if has_app_context() else None
+    if tracer is None:
+        yield
+        return
+    with tracer.start_as_current_span(name):
+        yield
+
+
+def traced(func: Callable) -> Callable:
+    """Record span named after the qualified function name for every call.
+
+    Args:
+        func: Function or method.
+
+    Returns:
+        Wrapped function.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with start_span(func.__qualname__):
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,159 @@
+"""Compiled validation of request bodies."""
+
+from functools import partial
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Set
+
+from connexion.decorators.validation import (
+    RequestBodyValidator,
+    draft4_format_checker,
+)
+from connexion.exceptions import BadRequestProblem
+from connexion.utils import is_null
+from foca.models.config import Config
+
+from cloud_registry.timing import timed
+from cloud_registry.tracing import start_span
+
+try:
+    import fastjsonschema
+except ImportError:  # pragma: no cover
+    fastjsonschema = None
+
+logger = logging.getLogger(__name__)
+
+# connexion validates request bodies against JSON Schema draft 4
+SCHEMA_DRAFT = "http://json-schema.org/draft-04/schema#"
+
+_compiled: Dict[str, Optional[Callable[[Any], Any]]] = {}
+_lock = threading.Lock()
+
+
+def schema_formats(schema: Any) -> Dict[str, Callable[[str], bool]]:
+    """Get checks of the string formats used in a schema.
+
+    Formats are checked like connexion's validator does, i.e., with the
+    format checker of `jsonschema`, which accepts any value of formats it has
+    no checker for (e.g., `uri` and `date-time` unless the optional
+    dependencies of `jsonschema` are installed). This keeps compiled
+    validation from rejecting request bodies that connexion accepts.
+
+    Args:
+        schema: JSON schema.
+
+    Returns:
+        Functions checking whether a string conforms to a format, keyed by
+        the names of all formats used in the schema.
+    """
+    names: Set[str] = set()
+    nodes = [schema]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, dict):
+            if isinstance(node.get("format"), str):
+                names.add(node["format"])
+            nodes.extend(node.values())
+        elif isinstance(node, list):
+            nodes.extend(node)
+    return {
+        name: partial(draft4_format_checker.conforms, format=name) for name in names
+    }
+
+
+def compile_schema(schema: Dict) -> Optional[Callable[[Any], Any]]:
+    """Compile JSON schema into a validation function.
+
+    Validation functions are cached by schema, so that operations sharing a
+    schema (e.g., single and bulk writes of services) share the compiled code
+    and each schema is compiled only once. String formats are checked as by
+    connexion's validator, see `schema_formats()`.
+
+    Args:
+        schema: JSON schema, with all references resolved.
+
+    Returns:
+        Function raising `fastjsonschema.JsonSchemaValueException` if the
+        passed data is invalid, or `None` if `fastjsonschema` is not installed
+        or the schema cannot be compiled.
+    """
+    if fastjsonschema is None:
+        return None
+    key = json.dumps(schema, sort_keys=True, default=str)
+    with _lock:
+        if key not in _compiled:
+            try:
+                _compiled[key] = fastjsonschema.compile(
+                    {"$schema": SCHEMA_DRAFT, **schema},
+                    formats=schema_formats(schema),
+                )
+            except fastjsonschema.JsonSchemaDefinitionException as e:
+                logger.warning(f"Could not compile schema: {e}")
+                _compiled[key] = None
+        return _compiled[key]
+
+
+class CompiledRequestBodyValidator(RequestBodyValidator):
+    """Request body validator running code compiled from the body schema.
+
+    Compilation happens once, when the API specification is registered with
+    the app, instead of walking the schema generically on every request. Falls
+    back to connexion's validator if the schema cannot be compiled.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Initialize validator.
+
+        Attributes:
+            compiled: Compiled validation function, or `None` if connexion's
+                validator is used.
+        """
+        super().__init__(*args, **kwargs)
+        self.compiled = compile_schema(self.schema)
+
+    def validate_schema(self, data: Any, url: str) -> None:
+        """Validate request body.
+
+        Args:
+            data: Request body.
+            url: Request URL.
+
+        Raises:
+            connexion.exceptions.BadRequestProblem: Request body is invalid.
+        """
+        with start_span("validate request body"), timed("validation"):
+            if self.compiled is None:
+                return super().validate_schema(data, url)
+            if self.is_null_value_valid and is_null(data):
+                return None
+            try:
+                self.compiled(data)
+            except fastjsonschema.JsonSchemaValueException as e:
+                logger.error(
+                    f"{url} validation error: {e.message}",
+                    extra={"validator": "body"},
+                )
+                raise BadRequestProblem(detail=e.message)
+        return None
+
+
+def register_compiled_validation(conf: Config) -> None:
+    """Validate request bodies of all API specifications with compiled code.
+
+    Needs to be called before the app is created.
+
+    Args:
+        conf: App configuration.
+    """
+    if fastjsonschema is None:
+        logger.warning(
+            "Package 'fastjsonschema' not installed; request bodies are "
+            "validated by connexion."
+        )
+        return
+    for spec in conf.api.specs:
+        if spec.connexion is None:
+            spec.connexion = {}
+        validator_map = spec.connexion.setdefault("validator_map", {})
+        validator_map["body"] = CompiledRequestBodyValidator
@@ -0,0 +1,81 @@
+"""Fixtures shared by all tests."""
+
+from copy import deepcopy
+from typing import Callable, Dict, Iterable, Optional
+
+from flask import Flask
+from foca.models.config import Config, MongoConfig
+import mongomock
+import pytest
+
+from cloud_registry.service_models.custom_config import CustomConfig
+from tests.mock_data import CUSTOM_CONFIG, DB, MONGO_CONFIG
+
+
+def _merge(base: Dict, overrides: Dict) -> Dict:
+    """Merge overrides into a copy of a configuration, recursing into
+    dictionaries.
+    """
+    merged = deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = deepcopy(value)
+    return merged
+
+
+def _create_app(
+    custom: Optional[Dict] = None,
+    collections: Optional[Dict] = None,
+    clients: Optional[Iterable[str]] = None,
+    db: bool = True,
+    **config,
+) -> Flask:
+    """Create app with the mock configuration.
+
+    Args:
+        custom: Overrides of the mock custom configuration, merged into
+            nested sections.
+        collections: Configurations of service store collections, added to
+            or replacing those of the mock configuration; collections
+            configured as `None` are removed.
+        clients: Names of collections that are given a mongomock client, or
+            `None` for all collections.
+        db: Whether the service store is configured.
+        **config: Other sections of the FOCA configuration, e.g., `api` or
+            `security`.
+
+    Returns:
+        Flask application instance.
+    """
+    app = Flask(__name__)
+    mongo_config = None
+    if db:
+        mongo_config = deepcopy(MONGO_CONFIG)
+        mongo_colls = mongo_config["dbs"][DB]["collections"]
+        for name, coll_config in (collections or {}).items():
+            if coll_config is None:
+                mongo_colls.pop(name, None)
+            else:
+                mongo_colls[name] = deepcopy(coll_config)
+    app.config.foca = Config(
+        db=None if mongo_config is None else MongoConfig(**mongo_config),
+        custom=CustomConfig(**_merge(CUSTOM_CONFIG, custom or {})),
+        **config,
+    )
+    if db:
+        client = mongomock.MongoClient()
+        app.config.foca.db.dbs[DB].client = client.db
+        for name, coll_config in app.config.foca.db.dbs[DB].collections.items():
+            if clients is None or name in clients:
+                coll_config.client = client.db[name]
+    return app
+
+
+@pytest.fixture
+def create_app() -> Callable[..., Flask]:
+    """Factory of apps with the mock configuration, overridden per test; see
+    `_create_app()`.
+    """
+    return _create_app
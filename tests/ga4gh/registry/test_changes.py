@@ -0,0 +1,285 @@
+"""Tests for the log of changes to registered services."""
+
+from datetime import datetime, timedelta
+import threading
+import time
+
+from flask import Flask
+from foca.models.config import Config, MongoConfig
+import pytest
+
+from cloud_registry.exceptions import BadRequest
+from cloud_registry.ga4gh.registry.changes import ChangeLog, ChangeNotifier
+from cloud_registry.service_models.custom_config import CustomConfig
+from tests.mock_data import (
+    CUSTOM_CONFIG,
+    MOCK_ID,
+    MONGO_CONFIG,
+)
+
+coll = "service_changes"
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with a change log collection."""
+
+    def _make_app() -> Flask:
+        return create_app(
+            custom={
+                "endpoints": {
+                    "services": {"changes": {"poll_interval": 0.05, "heartbeat": 1}}
+                }
+            },
+            clients=[coll],
+        )
+
+    return _make_app
+
+
+class TestChangeLog:
+    """Tests for `ChangeLog` class."""
+
+    def test_init_not_configured(self):
+        """Test for constructing class without change log collection."""
+        app = Flask(__name__)
+        app.config.foca = Config(
+            db=MongoConfig(**MONGO_CONFIG),
+            custom=CustomConfig(**CUSTOM_CONFIG),
+        )
+
+        with app.app_context():
+            change_log = ChangeLog()
+            assert change_log.collection is None
+            assert change_log.record(operation="insert", id=MOCK_ID) is None
+            res = change_log.get_changes(since="0")
+            assert res["resync_required"] is True
+
+    def test_record(self, make_app):
+        """Test for recording changes with increasing revisions."""
+        app = make_app()
+
+        with app.app_context():
+            change_log = ChangeLog()
+            assert change_log.record(operation="insert", id=MOCK_ID) == 1
+            assert change_log.record(operation="delete", id=MOCK_ID) == 2
+
+    def test_get_changes(self, make_app):
+        """Test for listing changes since a token."""
+        app = make_app()
+
+        with app.app_context():
+            change_log = ChangeLog()
+            for operation in ["insert", "replace", "delete"]:
+                change_log.record(operation=operation, id=MOCK_ID)
+            res = change_log.get_changes(since="1")
+            assert res["resync_required"] is False
+            assert res["next"] == "3"
+            assert [c["operation"] for c in res["changes"]] == [
+                "replace",
+                "delete",
+            ]
+            assert res["changes"][0]["timestamp"].endswith("Z")
+
+    def test_get_changes_up_to_date(self, make_app):
+        """Test for listing changes when the client is up to date."""
+        app = make_app()
+
+        with app.app_context():
+            change_log = ChangeLog()
+            change_log.record(operation="insert", id=MOCK_ID)
+            res = change_log.get_changes(since="1")
+            assert res == {"changes": [], "next": "1", "resync_required": False}
+
+    def test_get_changes_limit(self, make_app):
+        """Test for paging through changes."""
+        app = make_app()
+
+        with app.app_context():
+            change_log = ChangeLog()
+            for i in range(5):
+                change_log.record(operation="insert", id=str(i))
+            res = change_log.get_changes(since="0", limit=2)
+            assert [c["id"] for c in res["changes"]] == ["0", "1"]
+            res = change_log.get_changes(since=res["next"], limit=2)
+            assert [c["id"] for c in res["changes"]] == ["2", "3"]
+
+    def test_get_changes_no_token(self, make_app):
+        """Test for listing changes without token."""
+        app = make_app()
+
+        with app.app_context():
+            change_log = ChangeLog()
+            change_log.record(operation="insert", id=MOCK_ID)
+            res = change_log.get_changes()
+            assert res == {"changes": [], "next": "1", "resync_required": True}
+
+    def test_get_changes_expired(self, make_app):
+        """Test for listing changes when some have expired already."""
+        app = make_app()
+
+        with app.app_context():
+            change_log = ChangeLog()
+            for i in range(3):
+                change_log.record(operation="insert", id=str(i))
+            change_log.collection.delete_one({"revision": 1})
+            assert change_log.get_changes(since="1")["resync_required"] is False
+            res = change_log.get_changes(since="0")
+            assert res == {"changes": [], "next": "3", "resync_required": True}
+
+    def test_get_changes_gap(self, make_app):
+        """Test that changes are only listed up to a missing revision until
+        the gap times out.
+        """
+        app = make_app()
+
+        with app.app_context():
+            change_log = ChangeLog()
+            for i in range(3):
+                change_log.record(operation="insert", id=str(i))
+            change_log.collection.delete_one({"revision": 2})
+            res = change_log.get_changes(since="0")
+            assert [change["revision"] for change in res["changes"]] == [1]
+            assert res["next"] == "1"
+            past = datetime.utcnow() - timedelta(seconds=60)
+            change_log.collection.update_one(
+                {"revision": 3}, {"$set": {"timestamp": past}}
+            )
+            res = change_log.get_changes(since="1")
+            assert [change["revision"] for change in res["changes"]] == [3]
+
+    def test_get_changes_unknown_token(self, make_app):
+        """Test for listing changes with a token from the future."""
+        app = make_app()
+
+        with app.app_context():
+            res = ChangeLog().get_changes(since="5")
+            assert res["resync_required"] is True
+
+    def test_get_changes_invalid_token(self, make_app):
+        """Test for listing changes with a malformed token."""
+        app = make_app()
+
+        with app.app_context():
+            with pytest.raises(BadRequest):
+                ChangeLog().get_changes(since="abc")
+
+    def test_record_timestamp(self, make_app):
+        """Test that changes are recorded with a timestamp for expiry."""
+        app = make_app()
+
+        with app.app_context():
+            change_log = ChangeLog()
+            change_log.record(operation="insert", id=MOCK_ID)
+            entry = change_log.collection.find_one({"revision": 1})
+            assert isinstance(entry["timestamp"], datetime)
+
+    def test_get_changes_wait(self, make_app):
+        """Test for long-polling changes recorded while waiting."""
+        app = make_app()
+
+        with app.app_context():
+            change_log = ChangeLog()
+            timer = threading.Timer(
+                0.1, change_log.record, kwargs={"operation": "insert", "id": MOCK_ID}
+            )
+            timer.start()
+            res = change_log.get_changes(since="0", wait=5)
+            timer.join()
+            assert [c["id"] for c in res["changes"]] == [MOCK_ID]
+
+    def test_get_changes_wait_timeout(self, make_app):
+        """Test for long-polling when no changes occur."""
+        app = make_app()
+
+        with app.app_context():
+            start = time.monotonic()
+            res = ChangeLog().get_changes(since="0", wait=0.2)
+            assert res["changes"] == []
+            assert time.monotonic() - start >= 0.2
+
+    def test_wait_for_changes_other_process(self, make_app):
+        """Test that changes recorded by other processes are picked up."""
+        app = make_app()
+
+        with app.app_context():
+            change_log = ChangeLog()
+            other = ChangeLog()
+            other.notifier = ChangeNotifier()
+            other.record(operation="insert", id=MOCK_ID)
+            assert change_log.notifier.revision == 0
+            assert change_log.wait_for_changes(revision=0, timeout=5)
+            assert change_log.notifier.revision == 1
+
+    def test_stream(self, make_app):
+        """Test for streaming changes as server-sent events."""
+        app = make_app()
+
+        with app.app_context():
+            change_log = ChangeLog()
+            change_log.record(operation="insert", id=MOCK_ID)
+            events = change_log.stream(since="0")
+            assert next(events).startswith("id: 1\nevent: insert\n")
+            change_log.record(operation="delete", id=MOCK_ID)
+            assert next(events).startswith("id: 2\nevent: delete\n")
+            assert next(events) == ": heartbeat\n\n"
+
+    def test_stream_resync(self, make_app):
+        """Test for streaming changes without a token."""
+        app = make_app()
+
+        with app.app_context():
+            change_log = ChangeLog()
+            change_log.record(operation="insert", id=MOCK_ID)
+            events = change_log.stream()
+            assert next(events).startswith("id: 1\nevent: resync\n")
+            change_log.record(operation="delete", id=MOCK_ID)
+            assert next(events).startswith("id: 2\nevent: delete\n")
+
+    def test_stream_invalid_token(self, make_app):
+        """Test that malformed tokens are rejected before streaming."""
+        app = make_app()
+
+        with app.app_context():
+            with pytest.raises(BadRequest):
+                ChangeLog().stream(since="abc")
+
+
+class TestChangeNotifier:
+    """Tests for `ChangeNotifier` class."""
+
+    def test_wait(self):
+        """Test for waking up waiting threads."""
+        notifier = ChangeNotifier()
+        timer = threading.Timer(0.05, notifier.notify, args=[1])
+        timer.start()
+        assert notifier.wait(revision=0, timeout=5)
+        timer.join()
+
+    def test_wait_timeout(self):
+        """Test for waiting without changes."""
+        notifier = ChangeNotifier()
+        notifier.notify(1)
+        assert not notifier.wait(revision=1, timeout=0.05)
+        assert notifier.wait(revision=0, timeout=0.05)
+
+    def test_wait_poll(self):
+        """Test that a single poller picks up changes while threads wait."""
+        calls = []
+
+        def _poll():
+            calls.append(threading.current_thread().name)
+            return len(calls)
+
+        notifier = ChangeNotifier(poll=_poll, poll_interval=0.01)
+        waiters = [
+            threading.Thread(target=notifier.wait, args=[3, 5]) for _ in range(3)
+        ]
+        for waiter in waiters:
+            waiter.start()
+        for waiter in waiters:
+            waiter.join()
+        assert notifier.revision >= 4
+        assert set(calls) == {"change-poller"}
+        time.sleep(0.05)
+        assert notifier._poller is None
@@ -0,0 +1,146 @@
+"""Tests for detecting and collapsing services registered more than once."""
+
+from copy import deepcopy
+from datetime import datetime
+
+from flask import Flask
+from pydantic import ValidationError
+import pytest
+
+from cloud_registry.ga4gh.registry.dedup import (
+    CONTENT_HASH_FIELD,
+    GENERATED_ID_FIELD,
+    DuplicateCompaction,
+    content_hash,
+    normalize_url,
+)
+from cloud_registry.service_models.custom_config import (
+    DeduplicationConfig,
+)
+from tests.mock_data import DB, MOCK_SERVICE
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with a change log."""
+
+    def _make_app(**deduplication) -> Flask:
+        return create_app(
+            custom={"endpoints": {"services": {"deduplication": deduplication}}}
+        )
+
+    return _make_app
+
+
+def _collection(app: Flask, name: str):
+    """Return collection of the default tenant."""
+    return app.config.foca.db.dbs[DB].collections[name].client
+
+
+def _service(id: str, url: str, **fields) -> dict:
+    """Create service as stored with an auto-generated identifier."""
+    return {
+        **deepcopy(MOCK_SERVICE),
+        "id": id,
+        "url": url,
+        GENERATED_ID_FIELD: True,
+        **fields,
+    }
+
+
+@pytest.mark.parametrize(
+    "url, normalized",
+    [
+        ("https://Example.org/api/", "https://example.org/api"),
+        ("HTTPS://example.org:443/api#top", "https://example.org/api"),
+        ("http://example.org:8080/api", "http://example.org:8080/api"),
+        ("http://example.org/api?b=2&a=1", "http://example.org/api?a=1&b=2"),
+        ("http://[::1]:80/", "http://[::1]"),
+    ],
+)
+def test_normalize_url(url, normalized):
+    """Test that equivalent URLs are normalized to the same URL."""
+    assert normalize_url(url) == normalized
+
+
+def test_content_hash():
+    """Test that content hashes depend on the normalized URL and type only."""
+    service = _service("a", "https://example.org/api")
+    assert content_hash(service) == content_hash(
+        {**service, "id": "b", "name": "other", "url": "https://EXAMPLE.org/api/"}
+    )
+    assert content_hash(service) != content_hash(
+        {**service, "type": {**service["type"], "version": "2.0.0"}}
+    )
+
+
+def test_deduplication_config_policy():
+    """Test that unknown policies are rejected."""
+    with pytest.raises(ValidationError):
+        DeduplicationConfig(policy="merge")
+
+
+class TestDuplicateCompaction:
+    """Tests for `DuplicateCompaction` class."""
+
+    def test_collapse(self, make_app):
+        """Test that duplicates are collapsed into the earliest service."""
+        app = make_app(batch_size=2)
+        services = _collection(app, "services")
+        services.insert_many(
+            [
+                _service("a1", "https://a.org"),
+                _service("b1", "https://b.org"),
+                _service("a2", "https://A.org/"),
+                _service("c1", "https://c.org"),
+                _service("a3", "https://a.org", _deleted_at=datetime.utcnow()),
+                _service("a4", "https://a.org:443"),
+                _service("a5", "https://a.org", **{GENERATED_ID_FIELD: False}),
+            ]
+        )
+        tenant = services.database["services.tenant1"]
+        tenant.insert_many([_service("t1", "https://a.org"), _service("t2", "a.org")])
+        with app.app_context():
+            assert DuplicateCompaction().collapse() == 2
+        remaining = {
+            doc["id"] for doc in services.find({"_deleted_at": None}, {"id": True})
+        }
+        assert remaining == {"a1", "a5", "b1", "c1"}
+        assert services.count_documents({CONTENT_HASH_FIELD: {"$exists": 0}}) == 0
+        assert tenant.count_documents({"_deleted_at": None}) == 2
+        changes = _collection(app, "service_changes")
+        deleted = changes.find({"operation": "delete"})
+        assert sorted(doc["id"] for doc in deleted) == ["a2", "a4"]
+
+    def test_collapse_group_spanning_batches(self, make_app):
+        """Test that groups larger than a batch are collapsed."""
+        app = make_app(batch_size=2)
+        services = _collection(app, "services")
+        services.insert_many(
+            [_service(f"a{i}", "https://a.org") for i in range(5)]
+            + [_service("b1", "https://b.org")]
+        )
+        with app.app_context():
+            assert DuplicateCompaction().collapse() == 4
+        assert (
+            services.find_one({"_deleted_at": None, "url": "https://a.org"})["id"]
+            == "a0"
+        )
+
+    def test_start_disabled(self, make_app):
+        """Test that duplicates are not collapsed periodically if disabled."""
+        app = make_app()
+        with app.app_context():
+            job = DuplicateCompaction()
+        job.start()
+        assert job._thread is None
+
+    def test_start_stop(self, make_app):
+        """Test that duplicates are collapsed in a background thread."""
+        app = make_app(enabled=True, interval=60)
+        with app.app_context():
+            job = DuplicateCompaction()
+        job.start()
+        assert job._thread is not None
+        job.stop()
+        assert job._thread is None
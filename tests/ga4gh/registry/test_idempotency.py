@@ -0,0 +1,189 @@
+"""Tests for idempotency keys of service registrations."""
+
+from copy import deepcopy
+from datetime import datetime, timedelta
+import threading
+
+from flask import Flask
+from foca.models.config import Config, MongoConfig
+import pytest
+
+from cloud_registry.exceptions import Conflict, Forbidden, UnprocessableEntity
+from cloud_registry.ga4gh.registry.idempotency import IdempotencyKeys, fingerprint
+from cloud_registry.ga4gh.registry.server import postService
+from cloud_registry.service_models.custom_config import CustomConfig
+from tests.mock_data import CUSTOM_CONFIG, DB, MOCK_SERVICE, MONGO_CONFIG
+
+KEY = "3f0c7a52-5d1e-4c8e-9a55-0b0e4b1f2d6a"
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps storing idempotency keys."""
+
+    def _make_app(**idempotency) -> Flask:
+        app = create_app(
+            custom={"endpoints": {"services": {"idempotency": idempotency}}},
+            collections={"service_idempotency_keys": {}},
+        )
+        _keys(app).create_index([("key", 1)], unique=True)
+        return app
+
+    return _make_app
+
+
+def _keys(app: Flask):
+    """Return `service_idempotency_keys` collection of the default tenant."""
+    return app.config.foca.db.dbs[DB].collections["service_idempotency_keys"].client
+
+
+def _services(app: Flask):
+    """Return `services` collection of the default tenant."""
+    return app.config.foca.db.dbs[DB].collections["services"].client
+
+
+def _post(app: Flask, data: dict, key: str = KEY):
+    """Register service with an idempotency key."""
+    with app.test_request_context(
+        json=deepcopy(data),
+        headers={"Idempotency-Key": key},
+    ):
+        return postService.__wrapped__()
+
+
+def test_fingerprint():
+    """Test that fingerprints do not depend on the order of keys."""
+    assert fingerprint({"a": 1, "b": [2]}) == fingerprint({"b": [2], "a": 1})
+    assert fingerprint({"a": 1}) != fingerprint({"a": 2})
+
+
+class TestIdempotencyKeys:
+    """Tests for `IdempotencyKeys` class."""
+
+    def test_claim(self, make_app):
+        """Test that the first request claims the key and retries get the
+        stored response.
+        """
+        app = make_app()
+        with app.app_context():
+            keys = IdempotencyKeys()
+            assert keys.claim(key=KEY, payload={"a": 1}) is None
+            keys.store(key=KEY, response={"body": "X", "status": "200"})
+            assert keys.claim(key=KEY, payload={"a": 1}) == {
+                "body": "X",
+                "status": "200",
+            }
+
+    def test_claim_other_payload(self, make_app):
+        """Test that keys cannot be reused for other payloads."""
+        app = make_app()
+        with app.app_context():
+            keys = IdempotencyKeys()
+            keys.claim(key=KEY, payload={"a": 1})
+            with pytest.raises(UnprocessableEntity):
+                keys.claim(key=KEY, payload={"a": 2})
+
+    def test_claim_in_progress(self, make_app):
+        """Test that retries wait for the response of a request in progress."""
+        app = make_app(wait=5, poll_interval=0.01)
+        with app.app_context():
+            keys = IdempotencyKeys()
+            keys.claim(key=KEY, payload={"a": 1})
+
+        def _store():
+            with app.app_context():
+                keys.store(key=KEY, response={"body": "X"})
+
+        timer = threading.Timer(0.1, _store)
+        timer.start()
+        with app.app_context():
+            assert IdempotencyKeys().claim(key=KEY, payload={"a": 1}) == {"body": "X"}
+        timer.join()
+
+    def test_claim_in_progress_timeout(self, make_app):
+        """Test that retries give up waiting for a request in progress."""
+        app = make_app(wait=0, poll_interval=0.01)
+        with app.app_context():
+            keys = IdempotencyKeys()
+            keys.claim(key=KEY, payload={"a": 1})
+            with pytest.raises(Conflict):
+                keys.claim(key=KEY, payload={"a": 1})
+
+    def test_claim_abandoned(self, make_app):
+        """Test that abandoned and expired claims are taken over."""
+        app = make_app(wait=0, lock_timeout=60)
+        with app.app_context():
+            keys = IdempotencyKeys()
+            keys.claim(key=KEY, payload={"a": 1})
+            past = datetime.utcnow() - timedelta(seconds=61)
+            _keys(app).update_one({"key": KEY}, {"$set": {"created_at": past}})
+            assert keys.claim(key=KEY, payload={"a": 1}) is None
+            _keys(app).update_one({"key": KEY}, {"$set": {"expires_at": past}})
+            assert keys.claim(key=KEY, payload={"a": 2}) is None
+        assert _keys(app).count_documents({}) == 1
+        assert _keys(app).find_one()["fingerprint"] == fingerprint({"a": 2})
+
+    def test_claim_taken_over(self, make_app):
+        """Test that a request whose claim was taken over neither stores its
+        response under nor releases the new claim.
+        """
+        app = make_app(wait=0, lock_timeout=60)
+        with app.app_context():
+            slow = IdempotencyKeys()
+            slow.claim(key=KEY, payload={"a": 1})
+            past = datetime.utcnow() - timedelta(seconds=61)
+            _keys(app).update_one({"key": KEY}, {"$set": {"created_at": past}})
+            retry = IdempotencyKeys()
+            assert retry.claim(key=KEY, payload={"a": 1}) is None
+            slow.store(key=KEY, response={"body": "slow"})
+            slow.release(key=KEY)
+            assert _keys(app).find_one()["response"] is None
+            retry.store(key=KEY, response={"body": "retry"})
+        assert _keys(app).find_one()["response"] == {"body": "retry"}
+
+    def test_release(self, make_app):
+        """Test that released keys can be claimed again."""
+        app = make_app()
+        with app.app_context():
+            keys = IdempotencyKeys()
+            keys.claim(key=KEY, payload={"a": 1})
+            keys.release(key=KEY)
+            assert keys.claim(key=KEY, payload={"a": 2}) is None
+
+    def test_not_configured(self):
+        """Test that keys are ignored if no collection is configured."""
+        app = Flask(__name__)
+        app.config.foca = Config(
+            db=MongoConfig(**MONGO_CONFIG),
+            custom=CustomConfig(**CUSTOM_CONFIG),
+        )
+        with app.app_context():
+            keys = IdempotencyKeys()
+            assert keys.claim(key=KEY, payload={"a": 1}) is None
+            keys.store(key=KEY, response={})
+            keys.release(key=KEY)
+
+
+def test_postService_idempotency_key(make_app):
+    """Test that retries with the same key do not register the service again."""
+    app = make_app()
+    id, status, headers = _post(app, MOCK_SERVICE)
+    assert status == "200"
+    assert "Idempotent-Replayed" not in headers
+    res = _post(app, MOCK_SERVICE)
+    assert res == (id, "200", {"Idempotent-Replayed": "true"})
+    assert _services(app).count_documents({}) == 1
+    id_other, _, _ = _post(app, MOCK_SERVICE, key="other")
+    assert id_other != id
+    assert _services(app).count_documents({}) == 2
+
+
+def test_postService_idempotency_key_failed(make_app):
+    """Test that keys are released if the registration fails."""
+    app = make_app()
+    custom_config = deepcopy(CUSTOM_CONFIG)
+    custom_config["tenancy"] = {"max_services": 0}
+    app.config.foca.custom = CustomConfig(**custom_config)
+    with pytest.raises(Forbidden):
+        _post(app, MOCK_SERVICE)
+    assert _keys(app).count_documents({}) == 0
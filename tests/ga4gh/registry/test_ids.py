@@ -0,0 +1,200 @@
+"""Tests for generation of service identifiers."""
+
+from copy import deepcopy
+import string
+
+from flask import Flask
+import mongomock
+from pydantic import ValidationError
+import pytest
+
+from cloud_registry.exceptions import InternalServerError
+from cloud_registry.ga4gh.registry.ids import (
+    IdGenerator,
+    RandomIdGenerator,
+    SequentialBlockIdGenerator,
+    TimeOrderedIdGenerator,
+    create_id_generator,
+    encode,
+    get_id_generator,
+    parse_charset,
+)
+from cloud_registry.ga4gh.registry.service import RegisterService
+from cloud_registry.service_models.custom_config import IdConfig
+from tests.mock_data import (
+    COLLECTION_CONFIG,
+    DB,
+    MOCK_SERVICE,
+)
+
+CHARSET = string.digits + string.ascii_uppercase
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with identifier configuration."""
+
+    def _make_app(**id_config) -> Flask:
+        return create_app(
+            custom={"endpoints": {"services": {"id": id_config}}},
+            collections={"service_ids": COLLECTION_CONFIG},
+        )
+
+    return _make_app
+
+
+class TestParseCharset:
+    """Tests for `parse_charset()`."""
+
+    def test_expression(self):
+        """Test that expressions are resolved."""
+        assert parse_charset("string.ascii_uppercase + string.digits") == CHARSET
+        assert parse_charset("string.digits + '-_'") == "-0123456789_"
+
+    def test_literal(self):
+        """Test that other values are taken literally."""
+        assert parse_charset("CBA") == "ABC"
+        assert parse_charset("0123") == "0123"
+        assert parse_charset("a-b") == "-ab"
+
+    def test_invalid(self):
+        """Test that unknown constants and empty charsets are rejected."""
+        with pytest.raises(ValueError):
+            parse_charset("string.whitespace + string.digits")
+        with pytest.raises(ValueError):
+            parse_charset("''")
+        with pytest.raises(ValidationError):
+            IdConfig(charset="string.printable", length=6)
+
+
+def test_encode():
+    """Test that numbers are encoded with fixed length."""
+    assert encode(35, CHARSET, 3) == "00Z"
+    assert encode(36, CHARSET, 3) == "010"
+    with pytest.raises(ValueError):
+        encode(36**3, CHARSET, 3)
+
+
+def test_id_generator_abstract():
+    """Test that generators must implement `generate()`."""
+    with pytest.raises(TypeError):
+        IdGenerator(charset="AB", length=8)  # type: ignore[abstract]
+
+
+def test_random_id_generator():
+    """Test that random identifiers use the charset."""
+    generator = RandomIdGenerator(charset="AB", length=8)
+    generated = generator.generate()
+    assert len(generated) == 8
+    assert set(generated) <= {"A", "B"}
+
+
+class TestTimeOrderedIdGenerator:
+    """Tests for `TimeOrderedIdGenerator` class."""
+
+    def test_generate(self):
+        """Test that identifiers increase, also within a millisecond."""
+        now = [1700000000.0]
+        generator = TimeOrderedIdGenerator(
+            charset=CHARSET, length=16, clock=lambda: now[0]
+        )
+        assert generator.timestamp_length == 10
+        generated = [generator.generate() for _ in range(100)]
+        now[0] += 0.001
+        generated.append(generator.generate())
+        now[0] -= 1
+        generated.append(generator.generate())
+        assert generated == sorted(generated)
+        assert len(set(generated)) == len(generated)
+        assert generated[0][:10] == encode(1700000000000, CHARSET, 10)
+
+    def test_generate_overflow(self):
+        """Test that the timestamp is advanced if random characters overflow."""
+        generator = TimeOrderedIdGenerator(charset="01", length=52, clock=lambda: 1.0)
+        generator.generate()
+        generator._random = [1] * 4
+        assert generator.generate() == encode(1001, "01", 48) + "0000"
+
+    def test_too_short(self):
+        """Test that lengths leaving too few random characters are rejected."""
+        with pytest.raises(ValueError):
+            TimeOrderedIdGenerator(charset=CHARSET, length=13)
+        with pytest.raises(ValueError):
+            TimeOrderedIdGenerator(charset="A", length=100)
+
+
+class TestSequentialBlockIdGenerator:
+    """Tests for `SequentialBlockIdGenerator` class."""
+
+    def test_generate(self):
+        """Test that generators reserve separate blocks."""
+        collection = mongomock.MongoClient().db.service_ids
+        generators = [
+            SequentialBlockIdGenerator(
+                charset=CHARSET, length=4, collection=collection, block_size=2
+            )
+            for _ in range(2)
+        ]
+        generated = [generator.generate() for _ in range(3) for generator in generators]
+        assert generated == ["0000", "0002", "0001", "0003", "0004", "0006"]
+        assert collection.find_one() == {"_id": "services", "next": 8}
+
+    def test_exhausted(self):
+        """Test that exhausted identifiers are reported."""
+        collection = mongomock.MongoClient().db.service_ids
+        generator = SequentialBlockIdGenerator(
+            charset="AB", length=1, collection=collection, block_size=2
+        )
+        assert [generator.generate(), generator.generate()] == ["A", "B"]
+        with pytest.raises(InternalServerError):
+            generator.generate()
+
+
+class TestCreateIdGenerator:
+    """Tests for `create_id_generator()`."""
+
+    def test_strategies(self, make_app):
+        """Test that generators are created for all strategies."""
+        for strategy, generator_class in [
+            ("random", RandomIdGenerator),
+            ("time_ordered", TimeOrderedIdGenerator),
+            ("sequential_block", SequentialBlockIdGenerator),
+        ]:
+            app = make_app(strategy=strategy, charset=CHARSET, length=16)
+            assert isinstance(create_id_generator(app), generator_class)
+
+    def test_invalid(self, make_app):
+        """Test that invalid configurations are rejected."""
+        with pytest.raises(ValidationError):
+            make_app(strategy="uuid")
+        app = make_app()
+        app.config.foca.custom.endpoints.services.id.strategy = "uuid"
+        with pytest.raises(ValueError):
+            create_id_generator(app)
+        app = make_app(strategy="sequential_block")
+        del app.config.foca.db.dbs[DB].collections["service_ids"]
+        with pytest.raises(ValueError):
+            create_id_generator(app)
+
+
+def test_get_id_generator(make_app):
+    """Test that generators are recreated if reconfigured."""
+    app = make_app()
+    with app.app_context():
+        generator = get_id_generator()
+        assert get_id_generator() is generator
+        app.config.foca.custom.endpoints.services.id = IdConfig(charset="AB", length=4)
+        assert get_id_generator().charset == "AB"
+
+
+def test_register_time_ordered(make_app):
+    """Test that services are registered with time-ordered identifiers."""
+    app = make_app(strategy="time_ordered", charset=CHARSET, length=16)
+    ids = []
+    with app.app_context():
+        for _ in range(3):
+            service = RegisterService(data=deepcopy(MOCK_SERVICE))
+            service.register_metadata()
+            ids.append(service.data["id"])
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 3
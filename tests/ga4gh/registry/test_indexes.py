@@ -0,0 +1,204 @@
+"""Tests for background builds of indexes and detection of index drift."""
+
+
+from flask import Flask
+import pytest
+
+from cloud_registry.exceptions import NotFound
+from cloud_registry.ga4gh.registry.indexes import (
+    IndexManager,
+    build_progress,
+    deferred_index_builds,
+    index_name,
+    register_index_manager,
+)
+from cloud_registry.ga4gh.registry.server import getIndexes
+from tests.mock_data import DB
+
+SERVICES_INDEXES = [
+    {"keys": {"id": 1}, "options": {"unique": True}},
+    {"keys": {"type.group": 1, "type.artifact": 1}},
+]
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with indexes configured for the `services` collection."""
+
+    def _make_app(backend: str = "mongodb", **indexes) -> Flask:
+        return create_app(
+            custom={"indexes": indexes, "storage": {"backend": backend}},
+            collections={
+                "services": {"indexes": SERVICES_INDEXES},
+                "service_changes": None,
+                "service_quotas": None,
+                "service_info": {},
+            },
+            api={"specs": [{"path": "api.yaml", "disable_auth": True}]},
+        )
+
+    return _make_app
+
+
+def _services(app: Flask):
+    """Return `services` collection of the default tenant."""
+    return app.config.foca.db.dbs[DB].collections["services"].client
+
+
+def _status(manager: IndexManager) -> dict:
+    """Return state of each index, keyed by collection and name."""
+    return {
+        (entry["collection"], entry["name"]): entry["status"]
+        for entry in manager.check()
+    }
+
+
+def test_index_name():
+    """Test that index names are derived from keys unless configured."""
+    keys = [("type.group", 1), ("type.artifact", -1)]
+    assert index_name(keys, {}) == "type.group_1_type.artifact_-1"
+    assert index_name(keys, {"name": "by_type"}) == "by_type"
+
+
+def test_build_progress():
+    """Test that progress is read from in-progress index builds."""
+    ops = [
+        {"command": {"find": "services"}},
+        {"command": {"createIndexes": "services", "indexes": [{"name": "a_1"}]}},
+        {
+            "command": {"createIndexes": "services", "indexes": [{"name": "id_1"}]},
+            "progress": {"done": 5, "total": 20},
+        },
+    ]
+    assert build_progress(ops) == {("services", "id_1"): {"done": 5, "total": 20}}
+
+
+def test_deferred_index_builds(make_app):
+    """Test that indexes are hidden from FOCA while the app is created, and
+    unique indexes created afterwards.
+    """
+    app = make_app()
+    conf = app.config.foca.db
+    with deferred_index_builds(conf):
+        assert conf.dbs[DB].collections["services"].indexes is None
+    assert len(conf.dbs[DB].collections["services"].indexes) == 2
+    assert sorted(_services(app).index_information()) == ["_id_", "id_1"]
+    with deferred_index_builds(None):
+        pass
+
+
+class TestIndexManager:
+    """Tests for `IndexManager` class."""
+
+    def test_check(self, make_app):
+        """Test that indexes are compared with the configuration."""
+        app = make_app()
+        _services(app).create_index([("id", 1)])
+        _services(app).create_index([("name", 1)])
+        _services(app).database["services.tenant1"].create_index(
+            [("id", 1)], unique=True
+        )
+        manager = IndexManager(app=app)
+        assert _status(manager) == {
+            ("services", "id_1"): "mismatched",
+            ("services", "type.group_1_type.artifact_1"): "missing",
+            ("services", "name_1"): "unexpected",
+            ("services.tenant1", "id_1"): "ready",
+            ("services.tenant1", "type.group_1_type.artifact_1"): "missing",
+        }
+        assert manager.status()["drift"]
+
+    def test_sync(self, make_app):
+        """Test that missing indexes are built."""
+        app = make_app()
+        _services(app).create_index([("name", 1)])
+        manager = IndexManager(app=app)
+        manager.sync()
+        assert _status(manager) == {
+            ("services", "id_1"): "ready",
+            ("services", "type.group_1_type.artifact_1"): "ready",
+            ("services", "name_1"): "unexpected",
+        }
+        assert _services(app).index_information()["id_1"]["unique"]
+
+    def test_sync_drop_unexpected(self, make_app):
+        """Test that unexpected indexes are dropped and changed ones rebuilt."""
+        app = make_app(drop_unexpected=True)
+        _services(app).create_index([("id", 1)])
+        _services(app).create_index([("name", 1)])
+        manager = IndexManager(app=app)
+        manager.sync()
+        assert set(_status(manager).values()) == {"ready"}
+        assert not manager.status()["drift"]
+        assert _services(app).index_information()["id_1"]["unique"]
+
+    def test_sync_not_build_missing(self, make_app):
+        """Test that missing indexes are only reported if not built."""
+        app = make_app(build_missing=False)
+        manager = IndexManager(app=app)
+        manager.sync()
+        assert set(_status(manager).values()) == {"missing"}
+
+    def test_sync_failed(self, make_app):
+        """Test that failed builds are reported."""
+        app = make_app()
+        _services(app).insert_many([{"id": "a"}, {"id": "a"}])
+        manager = IndexManager(app=app)
+        manager.sync()
+        res = manager.status()
+        failed = [entry for entry in res["indexes"] if entry["status"] == "failed"]
+        assert [entry["name"] for entry in failed] == ["id_1"]
+        assert "DuplicateKeyError" in failed[0]["error"]
+        assert res["drift"]
+
+    def test_status_progress(self, monkeypatch, make_app):
+        """Test that the progress of builds is reported."""
+        app = make_app()
+        manager = IndexManager(app=app)
+        manager._building[("services", "id_1")] = 0
+        manager.check()
+        monkeypatch.setattr(
+            manager,
+            "_progress",
+            lambda: {("services", "id_1"): {"done": 5, "total": 20}},
+        )
+        building = [
+            entry
+            for entry in manager.status()["indexes"]
+            if entry["status"] == "building"
+        ]
+        assert building[0]["progress"] == {"done": 5, "total": 20}
+
+    def test_start_stop(self, make_app):
+        """Test that indexes are built in a background thread."""
+        app = make_app(check_interval=60)
+        manager = IndexManager(app=app)
+        manager.start()
+        manager.stop()
+        assert manager._thread is None
+        assert manager.checked_at is not None
+
+
+def test_register_index_manager(make_app):
+    """Test that indexes are not managed for SQLite storage."""
+    app = make_app(backend="sqlite")
+    register_index_manager(app)
+    assert "index_manager" not in app.extensions
+
+
+def test_getIndexes(make_app):
+    """Test for getting the state of indexes."""
+    app = make_app()
+    app.extensions["index_manager"] = IndexManager(app=app)
+    with app.test_request_context():
+        res = getIndexes.__wrapped__()
+    assert res["checked_at"].endswith("Z")
+    assert len(res["indexes"]) == 2
+
+
+def test_getIndexes_not_managed(make_app):
+    """Test for getting the state of indexes if they are not managed."""
+    app = make_app()
+    with app.test_request_context():
+        with pytest.raises(NotFound):
+            getIndexes.__wrapped__()
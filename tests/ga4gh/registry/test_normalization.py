@@ -0,0 +1,208 @@
+"""Tests for normalized storage of services."""
+
+from copy import deepcopy
+
+from flask import Flask
+from foca.models.config import Config, MongoConfig
+import pytest
+
+from cloud_registry.exceptions import InternalServerError
+from cloud_registry.ga4gh.registry.normalization import (
+    ServiceDictionary,
+    dictionary_key,
+    register_normalization,
+)
+from cloud_registry.ga4gh.registry.selection import ServiceRanking
+from cloud_registry.ga4gh.registry.server import (
+    getServiceById,
+    getServices,
+    getServicesByType,
+    getServiceTypes,
+    lookupServices,
+)
+from cloud_registry.ga4gh.registry.service import RegisterService
+from cloud_registry.ga4gh.registry.tenancy import set_tenant
+from cloud_registry.ga4gh.registry.versions import VERSION_KEY_FIELD, version_key
+from cloud_registry.ga4gh.registry.write_behind import WriteBehindQueue
+from cloud_registry.service_models.custom_config import CustomConfig
+from tests.mock_data import (
+    COLLECTION_CONFIG,
+    CUSTOM_CONFIG,
+    DB,
+    MOCK_ID,
+    MOCK_SERVICE,
+    MONGO_CONFIG,
+)
+
+ORGANIZATION = {"name": "organization", "url": "https://example.org"}
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with dictionary collections configured."""
+
+    def _make_app(enabled: bool = True) -> Flask:
+        app = create_app(
+            custom={"endpoints": {"services": {"normalization": {"enabled": enabled}}}},
+            collections={
+                "service_organizations": COLLECTION_CONFIG,
+                "service_types": COLLECTION_CONFIG,
+            },
+        )
+        register_normalization(app)
+        return app
+
+    return _make_app
+
+
+def _collection(app: Flask, name: str):
+    """Return collection of the default tenant."""
+    return app.config.foca.db.dbs[DB].collections[name].client
+
+
+def _service(id: str, artifact: str = "beacon", version: str = "1.0.0") -> dict:
+    """Return service of a type."""
+    return {
+        **deepcopy(MOCK_SERVICE),
+        "id": id,
+        "type": {"group": "org.ga4gh", "artifact": artifact, "version": version},
+        "organization": deepcopy(ORGANIZATION),
+    }
+
+
+def test_dictionary_key():
+    """Test that keys are compact and independent of field order."""
+    key = dictionary_key({"name": "a", "url": "b"})
+    assert key == dictionary_key({"url": "b", "name": "a"})
+    assert key != dictionary_key({"name": "a", "url": "c"})
+    assert len(key) == 16
+
+
+def test_register_normalization_disabled(make_app):
+    """Test that no dictionary is registered if normalization is disabled."""
+    app = make_app(enabled=False)
+    assert "service_dictionary" not in app.extensions
+
+
+def test_register_normalization_not_configured():
+    """Test that dictionary collections need to be configured."""
+    custom_config = deepcopy(CUSTOM_CONFIG)
+    custom_config["endpoints"]["services"]["normalization"] = {"enabled": True}
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**custom_config),
+    )
+    with pytest.raises(ValueError):
+        register_normalization(app)
+
+
+def test_register_service(make_app):
+    """Test that organizations and types are stored once and referenced."""
+    app = make_app()
+    with app.app_context():
+        for id in ["a", "b"]:
+            RegisterService(data=_service(id), id=id).register_metadata()
+        RegisterService(data=_service("c")).register_metadata()
+    stored = _collection(app, "services").find_one({"id": "a"})
+    assert "organization" not in stored
+    assert "type" not in stored
+    assert stored["_org"] == dictionary_key(ORGANIZATION)
+    assert stored["_type"] == dictionary_key(MOCK_SERVICE["type"])
+    assert _collection(app, "service_organizations").count_documents({}) == 1
+    assert _collection(app, "service_types").find_one() == {
+        "_id": stored["_type"],
+        "value": MOCK_SERVICE["type"],
+    }
+
+
+def test_read_services(make_app):
+    """Test that read endpoints return services as registered."""
+    app = make_app()
+    with app.app_context():
+        RegisterService(data=_service(MOCK_ID), id=MOCK_ID).register_metadata()
+        RegisterService(data=_service("b", version="2.0.0"), id="b").register_metadata()
+        RegisterService(data=_service("c", artifact="tes"), id="c").register_metadata()
+        # stored before normalization was enabled
+        _collection(app, "services").insert_one(
+            {
+                **_service("d", version="1.5.0"),
+                "_deleted_at": None,
+                VERSION_KEY_FIELD: version_key("1.5.0"),
+            }
+        )
+        expected = _service(MOCK_ID)
+        assert getServiceById.__wrapped__(MOCK_ID) == expected
+        assert len(getServices.__wrapped__()) == 4
+        assert len(getServiceTypes.__wrapped__()) == 4
+        by_type = getServicesByType.__wrapped__("org.ga4gh", "beacon", "^1")
+        assert [s["id"] for s in by_type] == [MOCK_ID, "d"]
+        assert by_type[0]["type"] == MOCK_SERVICE["type"]
+    with app.test_request_context(json={"ids": ["c", "x", MOCK_ID]}):
+        res = lookupServices.__wrapped__()
+        assert [s["id"] for s in res["found"]] == ["c", MOCK_ID]
+        assert res["found"][0]["organization"] == ORGANIZATION
+
+
+def test_read_services_cached(make_app):
+    """Test that services are reassembled from cached entries."""
+    app = make_app()
+    with app.app_context():
+        RegisterService(data=_service(MOCK_ID), id=MOCK_ID).register_metadata()
+        _collection(app, "service_types").delete_many({})
+        assert getServiceById.__wrapped__(MOCK_ID)["type"] == MOCK_SERVICE["type"]
+        app.extensions["service_dictionary"] = ServiceDictionary()
+        with pytest.raises(InternalServerError):
+            getServiceById.__wrapped__(MOCK_ID)
+
+
+def test_cache_eviction():
+    """Test that least recently used entries are evicted."""
+    dictionary = ServiceDictionary(cache_size=2)
+    dictionary._set(None, "type", "a", {})
+    dictionary._set(None, "type", "b", {})
+    dictionary._get(None, "type", "a")
+    dictionary._set(None, "type", "c", {})
+    assert dictionary._get(None, "type", "b") is None
+    assert dictionary._get(None, "type", "a") == {}
+    assert dictionary._get("tenant1", "type", "a") is None
+
+
+def test_tenants(make_app):
+    """Test that tenants have separate dictionaries."""
+    app = make_app()
+    with app.app_context():
+        set_tenant("tenant1")
+        RegisterService(data=deepcopy(MOCK_SERVICE), id=MOCK_ID).register_metadata()
+        assert getServiceById.__wrapped__(MOCK_ID)["type"] == MOCK_SERVICE["type"]
+    client = _collection(app, "service_types").database
+    assert client["service_types.tenant1"].count_documents({}) == 1
+    with app.app_context():
+        set_tenant("tenant2")
+        RegisterService(data=deepcopy(MOCK_SERVICE), id=MOCK_ID).register_metadata()
+        assert getServiceById.__wrapped__(MOCK_ID)["type"] == MOCK_SERVICE["type"]
+    assert client["service_types.tenant2"].count_documents({}) == 1
+
+
+def test_selection(make_app):
+    """Test that services are ranked by their reassembled type."""
+    app = make_app()
+    with app.app_context():
+        RegisterService(data=_service(MOCK_ID), id=MOCK_ID).register_metadata()
+    ranking = ServiceRanking(app=app)
+    ranking.build()
+    selected = ranking.select(group="org.ga4gh", artifact="beacon")
+    assert selected[0]["service"]["organization"] == ORGANIZATION
+
+
+def test_write_behind(make_app, tmp_path):
+    """Test that queued services are stored normalized."""
+    app = make_app()
+    app.config.foca.custom.endpoints.services.write_behind.spill_file = str(
+        tmp_path / "spill.jsonl"
+    )
+    queue = WriteBehindQueue(app=app)
+    queue.put(_service("a"))
+    queue.flush()
+    stored = _collection(app, "services").find_one({"id": "a"})
+    assert stored["_type"] == dictionary_key(_service("a")["type"])
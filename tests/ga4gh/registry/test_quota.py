@@ -0,0 +1,113 @@
+"""Tests for the quota on the number of services of each tenant."""
+
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+
+from flask import Flask
+import pytest
+
+from cloud_registry.exceptions import Forbidden, InternalServerError
+from cloud_registry.ga4gh.registry.quota import COUNTER_ID, ServiceQuota
+from cloud_registry.ga4gh.registry.server import deleteService
+from cloud_registry.ga4gh.registry.service import RegisterService
+from tests.mock_data import DB, MOCK_ID, MOCK_SERVICE
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps limiting the number of services per tenant."""
+
+    def _make_app(max_services=None, counter: bool = True) -> Flask:
+        return create_app(
+            custom={"tenancy": {"max_services": max_services}},
+            clients=None if counter else ["services", "service_changes"],
+        )
+
+    return _make_app
+
+
+def _count(app: Flask) -> int:
+    """Return counted services of the default tenant."""
+    coll_conf = app.config.foca.db.dbs[DB].collections["service_quotas"]
+    return coll_conf.client.find_one({"_id": COUNTER_ID})["count"]
+
+
+def _register(app: Flask, id=None) -> None:
+    """Register service."""
+    with app.app_context():
+        RegisterService(data=deepcopy(MOCK_SERVICE), id=id).register_metadata()
+
+
+class TestServiceQuota:
+    """Tests for `ServiceQuota` class."""
+
+    def test_reserve(self, make_app):
+        """Test that slots are reserved up to the quota."""
+        app = make_app(max_services=2)
+        with app.app_context():
+            quota = ServiceQuota()
+            quota.reserve()
+            quota.reserve()
+            with pytest.raises(Forbidden):
+                quota.reserve()
+            quota.release()
+            quota.reserve()
+        assert _count(app) == 2
+
+    def test_reserve_initialized(self, make_app):
+        """Test that the counter is initialized from the stored services."""
+        app = make_app(max_services=2)
+        services = app.config.foca.db.dbs[DB].collections["services"].client
+        services.insert_many([{"id": "a"}, {"id": "b", "_deleted_at": 1}])
+        with app.app_context():
+            ServiceQuota().reserve()
+            with pytest.raises(Forbidden):
+                ServiceQuota().reserve()
+        assert _count(app) == 2
+
+    def test_reserve_unlimited(self, make_app):
+        """Test that slots are counted if the quota is not limited."""
+        app = make_app()
+        with app.app_context():
+            ServiceQuota().reserve()
+        assert _count(app) == 1
+
+    def test_reserve_concurrent(self, make_app):
+        """Test that concurrent registrations cannot exceed the quota."""
+        app = make_app(max_services=5)
+
+        def _reserve(_):
+            with app.app_context():
+                try:
+                    ServiceQuota().reserve()
+                except Forbidden:
+                    return False
+                return True
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            reserved = list(executor.map(_reserve, range(20)))
+        assert sum(reserved) == 5
+        assert _count(app) == 5
+
+    def test_no_counter(self, make_app):
+        """Test that services are counted if no counter is configured."""
+        app = make_app(max_services=1, counter=False)
+        _register(app)
+        with pytest.raises(Forbidden):
+            _register(app)
+
+
+def test_register_release(make_app):
+    """Test that slots are released if registrations fail or services are
+    deleted.
+    """
+    app = make_app(max_services=2)
+    _register(app, id=MOCK_ID)
+    _register(app, id=MOCK_ID)
+    assert _count(app) == 1
+    with app.app_context():
+        with pytest.raises(InternalServerError):
+            RegisterService(data=deepcopy(MOCK_SERVICE)).register_metadata(retries=-1)
+        assert _count(app) == 1
+        deleteService.__wrapped__(MOCK_ID)
+    assert _count(app) == 0
@@ -0,0 +1,105 @@
+"""Tests for the read preference of read endpoints."""
+
+import time
+
+from flask import Flask
+from pydantic import ValidationError
+from pymongo.read_preferences import SecondaryPreferred
+import pytest
+
+from cloud_registry.ga4gh.registry.read_preference import (
+    PIN_COOKIE,
+    for_reads,
+    register_read_preference,
+)
+from tests.mock_data import (
+    DB,
+)
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with services collection."""
+
+    def _make_app(**read_preference) -> Flask:
+        return create_app(
+            custom={"read_preference": read_preference},
+            clients=["services"],
+        )
+
+    return _make_app
+
+
+def _collection(app: Flask):
+    """Return services collection."""
+    return app.config.foca.db.dbs[DB].collections["services"].client
+
+
+class TestForReads:
+    """Tests for `for_reads()` function."""
+
+    def test_primary(self, make_app):
+        """Test that the collection is used as is by default."""
+        app = make_app()
+        with app.app_context():
+            assert for_reads(_collection(app)) is _collection(app)
+
+    def test_secondary(self, make_app):
+        """Test that reads use the configured read preference and concern."""
+        app = make_app(
+            mode="secondaryPreferred",
+            max_staleness_seconds=90,
+            read_concern="majority",
+        )
+        with app.app_context():
+            handle = for_reads(_collection(app))
+            assert handle.read_preference == SecondaryPreferred(max_staleness=90)
+            assert handle.read_concern.level == "majority"
+            assert for_reads(_collection(app)) is handle
+
+    def test_pinned(self, make_app):
+        """Test that reads go to the primary after the client wrote."""
+        app = make_app(mode="secondary")
+        cookie = f"{PIN_COOKIE}={time.time() + 10}"
+        with app.test_request_context(headers={"Cookie": cookie}):
+            assert for_reads(_collection(app)) is _collection(app)
+        cookie = f"{PIN_COOKIE}={time.time() - 10}"
+        with app.test_request_context(headers={"Cookie": cookie}):
+            assert for_reads(_collection(app)) is not _collection(app)
+        with app.test_request_context(headers={"Cookie": f"{PIN_COOKIE}=x"}):
+            assert for_reads(_collection(app)) is not _collection(app)
+
+    def test_pinned_disabled(self, make_app):
+        """Test that reads are not pinned if session consistency is off."""
+        app = make_app(mode="secondary", session_consistency=False)
+        cookie = f"{PIN_COOKIE}={time.time() + 10}"
+        with app.test_request_context(headers={"Cookie": cookie}):
+            assert for_reads(_collection(app)) is not _collection(app)
+
+
+class TestRegisterReadPreference:
+    """Tests for `register_read_preference()` function."""
+
+    def test_cookie(self, make_app):
+        """Test that successful writes pin reads of the client."""
+        app = make_app(mode="secondary", pin_seconds=5)
+        register_read_preference(app)
+        app.add_url_rule("/", "index", lambda: "", methods=["GET", "POST"])
+        client = app.test_client()
+        assert PIN_COOKIE not in client.get("/").headers.get("Set-Cookie", "")
+        assert PIN_COOKIE in client.post("/").headers["Set-Cookie"]
+
+    def test_primary(self, make_app):
+        """Test that no cookie is set if reads go to the primary."""
+        app = make_app()
+        register_read_preference(app)
+        assert app.after_request_funcs == {}
+
+    def test_invalid_mode(self, make_app):
+        """Test that unknown read preference modes are rejected."""
+        with pytest.raises(ValidationError):
+            make_app(mode="unknown")
+        app = make_app()
+        app.config.foca.custom.read_preference.mode = "unknown"
+        with pytest.raises(ValueError):
+            register_read_preference(app)
@@ -0,0 +1,218 @@
+"""Tests for selecting services by precomputed rankings."""
+
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+import threading
+
+from flask import Flask
+import pytest
+
+from cloud_registry.ga4gh.registry.selection import (
+    ServiceRanking,
+    ServiceRankings,
+    TypeRanking,
+    get_service_ranking,
+    register_service_ranking,
+)
+from cloud_registry.ga4gh.registry.service import RegisterService
+from tests.mock_data import (
+    MOCK_SERVICE,
+    MOCK_TYPE,
+)
+
+SERVICES = [
+    ("serv1", "org1", "prod"),
+    ("serv2", "org2", "prod"),
+    ("serv3", "org1", "dev"),
+    ("serv4", "org3", "test"),
+]
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with services, change log and probe collections."""
+
+    def _make_app(probes: bool = True) -> Flask:
+        return create_app(collections={"service_probes": {}} if probes else None)
+
+    return _make_app
+
+
+def _register(app: Flask, id: str, organization: str, environment: str) -> None:
+    """Register service of mock type."""
+    service = deepcopy(MOCK_SERVICE)
+    service["organization"] = {"name": organization, "url": "https://example.org"}
+    service["environment"] = environment
+    with app.app_context():
+        RegisterService(data=service, id=id).register_metadata()
+
+
+def _ids(selected: list) -> list:
+    """Return identifiers of selected services."""
+    return [s["service"]["id"] for s in selected]
+
+
+class TestTypeRanking:
+    """Tests for `TypeRanking` class."""
+
+    def test_top(self):
+        """Test for selecting services by preference and base score."""
+        entries = [
+            {"service": {"id": id}, "organization": org, "environment": env, "base": b}
+            for (id, org, env), b in zip(SERVICES, [2.0, 2.5, 1.0, 3.0])
+        ]
+        ranking = TypeRanking(entries)
+        res = ranking.top(
+            k=4,
+            organization="org1",
+            environment="prod",
+            organization_weight=1.0,
+            environment_weight=0.5,
+        )
+        assert _ids(res) == ["serv1", "serv4", "serv2", "serv3"]
+        assert [s["score"] for s in res] == [3.5, 3.0, 3.0, 2.0]
+
+    def test_top_no_preference(self):
+        """Test for selecting services by base score only."""
+        entries = [
+            {"service": {"id": id}, "organization": org, "environment": env, "base": b}
+            for (id, org, env), b in zip(SERVICES, [2.0, 2.5, 1.0, 3.0])
+        ]
+        res = TypeRanking(entries).top(
+            k=2,
+            organization=None,
+            environment=None,
+            organization_weight=1.0,
+            environment_weight=0.5,
+        )
+        assert _ids(res) == ["serv4", "serv2"]
+
+
+class TestServiceRanking:
+    """Tests for `ServiceRanking` class."""
+
+    def test_select(self, make_app):
+        """Test for selecting services of a type."""
+        app = make_app()
+        for service in SERVICES:
+            _register(app, *service)
+        ranking = ServiceRanking(app=app)
+        ranking.build()
+        res = ranking.select(
+            group=MOCK_TYPE["group"],
+            artifact=MOCK_TYPE["artifact"],
+            organization="org1",
+            environment="prod",
+            k=2,
+        )
+        assert _ids(res) == ["serv1", "serv3"]
+        assert ranking.select(group="org.ga4gh", artifact="tes") == []
+
+    def test_select_max_k(self, make_app):
+        """Test that the number of selected services is capped."""
+        app = make_app()
+        for service in SERVICES:
+            _register(app, *service)
+        ranking = ServiceRanking(app=app)
+        ranking.max_k = 1
+        ranking.build()
+        res = ranking.select(group="org.ga4gh", artifact="beacon", k=10)
+        assert len(res) == 1
+
+    def test_report_probe(self, make_app):
+        """Test that probe results are persisted and change rankings."""
+        app = make_app()
+        for service in SERVICES:
+            _register(app, *service)
+        ranking = ServiceRanking(app=app)
+        ranking.build()
+        ranking.report_probe(id="serv1", latency=0, available=False)
+        ranking.report_probe(id="serv2", latency=0, available=True)
+        res = ranking.select(group="org.ga4gh", artifact="beacon", k=1)
+        assert _ids(res) == ["serv2"]
+        assert res[0]["score"] == pytest.approx(3.0)
+        assert ranking.probes_collection.count_documents({}) == 2
+
+        ranking = ServiceRanking(app=app)
+        ranking.build()
+        res = ranking.select(group="org.ga4gh", artifact="beacon", k=1)
+        assert _ids(res) == ["serv2"]
+
+    def test_report_probe_not_persisted(self, make_app):
+        """Test for reporting probes without probe collection."""
+        app = make_app(probes=False)
+        _register(app, *SERVICES[0])
+        ranking = ServiceRanking(app=app)
+        ranking.build()
+        ranking.report_probe(id="serv1", latency=100, available=True)
+        res = ranking.select(group="org.ga4gh", artifact="beacon")
+        assert res[0]["score"] == pytest.approx(2.5)
+
+    def test_refresh(self, make_app):
+        """Test for incrementally applying changes to services."""
+        app = make_app()
+        _register(app, *SERVICES[0])
+        ranking = ServiceRanking(app=app)
+        ranking.build()
+        _register(app, *SERVICES[1])
+        with app.app_context():
+            ranking.collection.update_one({"id": "serv1"}, {"$set": {"_deleted_at": 1}})
+        ranking.refresh(ids=["serv1", "serv2"])
+        res = ranking.select(group="org.ga4gh", artifact="beacon")
+        assert _ids(res) == ["serv2"]
+
+    def test_start_stop(self, make_app):
+        """Test that changes are picked up from the change log."""
+        app = make_app()
+        ranking = ServiceRanking(app=app)
+        ranking.start()
+        _register(app, *SERVICES[0])
+        for _ in range(100):
+            if ranking.select(group="org.ga4gh", artifact="beacon"):
+                break
+            ranking._stop.wait(0.05)
+        ranking.stop()
+        assert _ids(ranking.select(group="org.ga4gh", artifact="beacon")) == ["serv1"]
+
+
+def test_service_rankings_get_concurrent(monkeypatch, make_app):
+    """Test that rankings of a tenant are built once while requests for other
+    tenants are served.
+    """
+    app = make_app()
+    rankings = ServiceRankings(app=app)
+    started = threading.Event()
+    release = threading.Event()
+    builds = []
+
+    def _build(self):
+        builds.append(self.tenant)
+        if self.tenant == "slow":
+            started.set()
+            release.wait(timeout=5)
+
+    monkeypatch.setattr(ServiceRanking, "build", _build)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        slow = [executor.submit(rankings.get, "slow") for _ in range(2)]
+        assert started.wait(timeout=5)
+        assert rankings.get("fast").tenant == "fast"
+        release.set()
+        assert slow[0].result() is slow[1].result()
+    assert sorted(builds) == ["fast", "slow"]
+
+
+def test_get_service_ranking(make_app):
+    """Test for getting rankings built on demand."""
+    app = make_app()
+    with app.app_context():
+        ranking = get_service_ranking()
+        assert get_service_ranking() is ranking
+
+
+def test_register_service_ranking(make_app):
+    """Test for registering rankings with the app."""
+    app = make_app()
+    register_service_ranking(app)
+    rankings = app.extensions["service_rankings"]
+    assert rankings.get(None)._thread is not None
+    rankings.stop()
@@ -1,23 +1,36 @@
 """Unit tests for endpoint controllers."""
 
 from copy import deepcopy
+import threading
+from unittest.mock import MagicMock
 
 from flask import Flask
 from foca.models.config import Config, MongoConfig
 import mongomock
+from pymongo.errors import ServerSelectionTimeoutError
 import pytest
 
 from cloud_registry.exceptions import BadRequest, NotFound
 from cloud_registry.ga4gh.registry.server import (
     deleteService,
     getServiceById,
+    getServiceChanges,
+    getServiceStatus,
     getServiceInfo,
     getServices,
+    getServicesByType,
     getServiceTypes,
+    lookupServices,
     postService,
+    postServiceProbe,
     postServiceInfo,
     putService,
+    selectServices,
+    watchServices,
 )
+from cloud_registry.ga4gh.registry.service import RegisterService
+from cloud_registry.ga4gh.registry.service_info import RegisterServiceInfo
+from cloud_registry.ga4gh.registry.write_behind import WriteBehindQueue
 from cloud_registry.service_models.custom_config import CustomConfig
 from tests.mock_data import (
     DB,
@@ -34,7 +47,10 @@ from tests.mock_data import (
 def test_getServices():
     """Test for getting a list of all available services."""
     app = Flask(__name__)
-    app.config.foca = Config(db=MongoConfig(**MONGO_CONFIG))
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
 
     data = []
 
@@ -64,7 +80,10 @@ def test_getServices():
 def test_getServiceById():
     """Test for getting a service associated with a given identifier."""
     app = Flask(__name__)
-    app.config.foca = Config(db=MongoConfig(**MONGO_CONFIG))
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
 
     # write a couple of services into DB
     app.config.foca.db.dbs["serviceStore"].collections[
@@ -91,13 +110,120 @@ def test_getServiceById():
             res = getServiceById.__wrapped__("serv4")
 
 
+def test_getServiceInfo_not_reconciled():
+    """Test that configured service info is served without querying the
+    database until it was registered.
+    """
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
+    collection = MagicMock()
+    app.config.foca.db.dbs[DB].collections["service_info"].client = collection
+    reconciled = threading.Event()
+    app.extensions["service_info_reconciled"] = reconciled
+
+    with app.app_context():
+        assert getServiceInfo.__wrapped__() == SERVICE_INFO_CONFIG
+        collection.find.assert_not_called()
+        reconciled.set()
+        getServiceInfo.__wrapped__()
+        collection.find.assert_called()
+
+
+# POST /services/lookup
+def test_lookupServices():
+    """Test for retrieving multiple services by their identifiers."""
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
+    app.config.foca.db.dbs["serviceStore"].collections[
+        "services"
+    ].client = mongomock.MongoClient().db.collection
+
+    for i in ["serv1", "serv2"]:
+        mock_resp = deepcopy(MOCK_SERVICE)
+        mock_resp["id"] = i
+        app.config.foca.db.dbs["serviceStore"].collections[
+            "services"
+        ].client.insert_one(mock_resp)
+
+    ids = ["serv2", "serv3", "serv1", "serv2"]
+    with app.test_request_context(json={"ids": ids}):
+        res = lookupServices.__wrapped__()
+        assert [s["id"] for s in res["found"]] == ["serv2", "serv1"]
+        assert "_id" not in res["found"][0]
+        assert res["missing"] == ["serv3"]
+
+
+def test_lookupServices_too_many_ids():
+    """Test for retrieving more services than allowed per request."""
+    custom_config = deepcopy(CUSTOM_CONFIG)
+    custom_config["endpoints"]["services"]["lookup"] = {"max_ids": 2}
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**custom_config),
+    )
+    app.config.foca.db.dbs["serviceStore"].collections[
+        "services"
+    ].client = mongomock.MongoClient().db.collection
+
+    with pytest.raises(BadRequest):
+        with app.test_request_context(json={"ids": ["a", "b", "c"]}):
+            lookupServices.__wrapped__()
+
+
+def test_lookupServices_invalid_payload():
+    """Test for retrieving services with an invalid payload."""
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
+
+    with pytest.raises(BadRequest):
+        with app.test_request_context(json={"ids": "serv1"}):
+            lookupServices.__wrapped__()
+
+
+# GET /services/{serviceId}/status
+def test_getServiceStatus():
+    """Test for getting the registration status of a persisted service."""
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
+    mock_resp = deepcopy(MOCK_SERVICE)
+    mock_resp["id"] = MOCK_ID
+    app.config.foca.db.dbs["serviceStore"].collections[
+        "services"
+    ].client = mongomock.MongoClient().db.collection
+    app.config.foca.db.dbs["serviceStore"].collections["services"].client.insert_one(
+        mock_resp
+    )
+
+    with app.app_context():
+        res = getServiceStatus.__wrapped__(serviceId=MOCK_ID)
+        assert res == {"id": MOCK_ID, "status": "persisted"}
+        with pytest.raises(NotFound):
+            getServiceStatus.__wrapped__(serviceId="serv2")
+
+
 # GET /services/types
 def test_getServiceTypes_duplicates():
     """Test for getting a list of all available service types when only
     services of the same service type are registered.
     """
     app = Flask(__name__)
-    app.config.foca = Config(db=MongoConfig(**MONGO_CONFIG))
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
 
     # write a couple of services into DB
     app.config.foca.db.dbs["serviceStore"].collections[
@@ -123,7 +249,10 @@ def test_getServiceTypes_distinct():
     registered services are of distinct service types.
     """
     app = Flask(__name__)
-    app.config.foca = Config(db=MongoConfig(**MONGO_CONFIG))
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
 
     # write a couple of services into DB
     app.config.foca.db.dbs["serviceStore"].collections[
@@ -149,6 +278,124 @@ def test_getServiceTypes_distinct():
         assert set([s["artifact"] for s in res]) == set(services)
 
 
+# GET /services/types/{group}/{artifact}
+def test_getServicesByType():
+    """Test for listing services of a type within a version range."""
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
+    app.config.foca.db.dbs["serviceStore"].collections[
+        "services"
+    ].client = mongomock.MongoClient().db.collection
+
+    for version in ["2.0.0", "1.10.0", "1.2.0", "0.9.0"]:
+        mock_resp = deepcopy(MOCK_SERVICE)
+        mock_resp["type"] = {**MOCK_TYPE, "version": version}
+        with app.app_context():
+            RegisterService(data=mock_resp, id=version).register_metadata()
+    other = deepcopy(MOCK_SERVICE)
+    other["type"] = {**MOCK_TYPE, "artifact": "tes"}
+    with app.app_context():
+        RegisterService(data=other, id="tes").register_metadata()
+
+    with app.app_context():
+        res = getServicesByType.__wrapped__(group="org.ga4gh", artifact="beacon")
+        assert [s["id"] for s in res] == ["0.9.0", "1.2.0", "1.10.0", "2.0.0"]
+        assert "_version_key" not in res[0]
+        res = getServicesByType.__wrapped__(
+            group="org.ga4gh", artifact="beacon", version="^1.0"
+        )
+        assert [s["id"] for s in res] == ["1.2.0", "1.10.0"]
+        with pytest.raises(BadRequest):
+            getServicesByType.__wrapped__(
+                group="org.ga4gh", artifact="beacon", version="latest"
+            )
+
+
+# GET /services/types/{group}/{artifact}/select
+def test_selectServices():
+    """Test for selecting services of a type."""
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
+    app.config.foca.db.dbs["serviceStore"].collections[
+        "services"
+    ].client = mongomock.MongoClient().db.collection
+
+    for i, environment in [("serv1", "dev"), ("serv2", "prod")]:
+        mock_resp = deepcopy(MOCK_SERVICE)
+        mock_resp["id"] = i
+        mock_resp["environment"] = environment
+        app.config.foca.db.dbs["serviceStore"].collections[
+            "services"
+        ].client.insert_one(mock_resp)
+
+    with app.app_context():
+        res = selectServices.__wrapped__(
+            group=MOCK_TYPE["group"],
+            artifact=MOCK_TYPE["artifact"],
+            environment="prod",
+            k=1,
+        )
+        assert [s["service"]["id"] for s in res] == ["serv2"]
+
+
+# GET /services/changes
+def test_getServiceChanges():
+    """Test for listing changes to services."""
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
+    app.config.foca.db.dbs["serviceStore"].collections[
+        "services"
+    ].client = mongomock.MongoClient().db.collection
+    app.config.foca.db.dbs["serviceStore"].collections[
+        "service_changes"
+    ].client = mongomock.MongoClient().db.changes
+
+    data = deepcopy(MOCK_SERVICE)
+    with app.test_request_context(json=data):
+        putService.__wrapped__(serviceId=MOCK_ID)
+        putService.__wrapped__(serviceId=MOCK_ID)
+        deleteService.__wrapped__(serviceId=MOCK_ID)
+        res = getServiceChanges.__wrapped__(since="0")
+        assert [c["operation"] for c in res["changes"]] == [
+            "insert",
+            "replace",
+            "delete",
+        ]
+        assert res["next"] == "3"
+
+
+# GET /services/watch
+def test_watchServices():
+    """Test for streaming changes to services."""
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
+    app.config.foca.db.dbs["serviceStore"].collections[
+        "services"
+    ].client = mongomock.MongoClient().db.collection
+    app.config.foca.db.dbs["serviceStore"].collections[
+        "service_changes"
+    ].client = mongomock.MongoClient().db.changes
+
+    data = deepcopy(MOCK_SERVICE)
+    with app.test_request_context(json=data, headers={"Last-Event-ID": "0"}):
+        putService.__wrapped__(serviceId=MOCK_ID)
+        res = watchServices.__wrapped__()
+        assert res.mimetype == "text/event-stream"
+        assert next(res.response).startswith("id: 1\nevent: insert\n")
+
+
 # GET /service-info
 def test_getServiceInfo():
     """Test for getting service info."""
@@ -168,6 +415,30 @@ def test_getServiceInfo():
         assert res == SERVICE_INFO_CONFIG
 
 
+def test_getServiceInfo_fallback():
+    """Test for getting service info before it was registered or while the
+    database is unavailable.
+    """
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
+    collection = mongomock.MongoClient().db.collection
+    app.config.foca.db.dbs[DB].collections["service_info"].client = collection
+
+    with app.app_context():
+        assert getServiceInfo.__wrapped__() == SERVICE_INFO_CONFIG
+        data = {**SERVICE_INFO_CONFIG, "name": "Stored"}
+        collection.insert_one(data)
+        assert getServiceInfo.__wrapped__()["name"] == "Stored"
+        app.config.foca.db.dbs[DB].collections["service_info"].client = MagicMock()
+        app.config.foca.db.dbs[DB].collections[
+            "service_info"
+        ].client.find.side_effect = ServerSelectionTimeoutError()
+        assert getServiceInfo.__wrapped__()["name"] == "Stored"
+
+
 # POST /service
 def test_postService():
     """Test for registering a service; identifier assigned by implementation."""
@@ -187,6 +458,31 @@ def test_postService():
         assert isinstance(res, str)
 
 
+def test_postService_write_behind(tmp_path):
+    """Test for queueing a service in write-behind mode."""
+    custom_config = deepcopy(CUSTOM_CONFIG)
+    custom_config["endpoints"]["services"]["write_behind"] = {
+        "enabled": True,
+        "spill_file": str(tmp_path / "spill.jsonl"),
+    }
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**custom_config),
+    )
+    app.config.foca.db.dbs["serviceStore"].collections[
+        "services"
+    ].client = mongomock.MongoClient().db.collection
+    app.extensions["write_behind"] = WriteBehindQueue(app=app)
+
+    with app.test_request_context(json=deepcopy(MOCK_SERVICE)):
+        id, status, headers = postService.__wrapped__()
+        assert status == "202"
+        assert headers["Location"].endswith(f"/services/{id}/status")
+        res = getServiceStatus.__wrapped__(serviceId=id)
+        assert res == {"id": id, "status": "queued"}
+
+
 def test_postService_invalid_payload():
     """Test for registering a service; identifier assigned by implementation,
     given invalid payload.
@@ -249,6 +545,53 @@ def test_deleteService_NotFound():
             deleteService.__wrapped__(serviceId=MOCK_ID)
 
 
+def test_deleteService_tombstone():
+    """Test that deleted services are hidden but kept as tombstones."""
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
+    mock_resp = deepcopy(MOCK_SERVICE)
+    mock_resp["id"] = MOCK_ID
+    coll = mongomock.MongoClient().db.collection
+    app.config.foca.db.dbs["serviceStore"].collections["services"].client = coll
+    coll.insert_one(mock_resp)
+
+    with app.app_context():
+        deleteService.__wrapped__(serviceId=MOCK_ID)
+        assert getServices.__wrapped__() == []
+        with pytest.raises(NotFound):
+            getServiceById.__wrapped__(MOCK_ID)
+        with pytest.raises(NotFound):
+            deleteService.__wrapped__(serviceId=MOCK_ID)
+    assert coll.find_one({"id": MOCK_ID})["_deleted_at"] is not None
+
+
+# POST /services/{serviceId}/probes
+def test_postServiceProbe():
+    """Test for reporting the result of probing a service."""
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
+    mock_resp = deepcopy(MOCK_SERVICE)
+    mock_resp["id"] = MOCK_ID
+    app.config.foca.db.dbs["serviceStore"].collections[
+        "services"
+    ].client = mongomock.MongoClient().db.collection
+    app.config.foca.db.dbs["serviceStore"].collections["services"].client.insert_one(
+        mock_resp
+    )
+
+    with app.test_request_context(json={"latency": 10, "available": True}):
+        res = postServiceProbe.__wrapped__(serviceId=MOCK_ID)
+        assert res == MOCK_ID
+        with pytest.raises(NotFound):
+            postServiceProbe.__wrapped__(serviceId="serv2")
+
+
 # PUT /service/{serviceId}
 def test_putService():
     """Test for registering a service; identifier provided by client."""
@@ -303,6 +646,30 @@ def test_postServiceInfo():
         assert res == SERVICE_INFO_CONFIG
 
 
+def test_postServiceInfo_not_reconciled():
+    """Test that service info set before the configured service info was
+    registered is served and not overwritten.
+    """
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**CUSTOM_CONFIG),
+    )
+    app.config.foca.db.dbs[DB].collections[
+        "service_info"
+    ].client = mongomock.MongoClient().db.collection
+    reconciled = threading.Event()
+    app.extensions["service_info_reconciled"] = reconciled
+    data = {**deepcopy(SERVICE_INFO_CONFIG), "name": "posted"}
+
+    with app.test_request_context(json=deepcopy(data)):
+        postServiceInfo.__wrapped__()
+        assert reconciled.is_set()
+        assert getServiceInfo.__wrapped__() == data
+        RegisterServiceInfo().set_service_info_from_config()
+        assert getServiceInfo.__wrapped__() == data
+
+
 def test_postServiceInfo_invalid_payload():
     """Test for creating service info, given invalid payload."""
     app = Flask(__name__)
@@ -1,7 +1,7 @@
 """Test cases for service registration."""
 
 from copy import deepcopy
-import string  # noqa: F401
+from datetime import datetime
 from unittest.mock import MagicMock
 
 from flask import Flask
@@ -12,8 +12,10 @@ import pytest
 
 from cloud_registry.exceptions import (
     # BadRequest,
+    Conflict,
     InternalServerError,
 )
+from cloud_registry.ga4gh.registry.dedup import UNIQUE_HASH_FIELD
 from cloud_registry.ga4gh.registry.service import RegisterService
 from cloud_registry.service_models.custom_config import CustomConfig
 from tests.mock_data import (
@@ -46,6 +48,7 @@ class TestRegisterService:
             obj = RegisterService(data=data)
             assert obj.data["name"] == MOCK_SERVICE["name"]
             assert obj.data["id"] is None
+            assert obj.data["_version_key"].startswith("00000001.00000000")
 
     def test_register_metadata(self):
         """Test for registering a service with a randomly assigned identifier."""
@@ -125,6 +128,32 @@ class TestRegisterService:
             obj.register_metadata()
             assert obj.data["id"] == MOCK_ID
 
+    def test_register_metadata_with_id_tombstone(self):
+        """Test for registering a service with the identifier of a deleted
+        service; the tombstone is replaced and an insert is recorded.
+        """
+        app = Flask(__name__)
+        app.config.foca = Config(
+            db=MongoConfig(**MONGO_CONFIG),
+            custom=CustomConfig(**CUSTOM_CONFIG),
+        )
+        client = mongomock.MongoClient()
+        for coll in ["services", "service_changes"]:
+            app.config.foca.db.dbs["serviceStore"].collections[coll].client = client.db[
+                coll
+            ]
+        client.db.services.insert_one(
+            {**deepcopy(MOCK_SERVICE), "id": MOCK_ID, "_deleted_at": datetime.utcnow()}
+        )
+
+        with app.app_context():
+            obj = RegisterService(data=deepcopy(MOCK_SERVICE), id=MOCK_ID)
+            obj.register_metadata()
+            assert not obj.was_replaced
+        assert client.db.services.find_one({"id": MOCK_ID})["_deleted_at"] is None
+        change = client.db.service_changes.find_one({"id": MOCK_ID})
+        assert change["operation"] == "insert"
+
     def test_register_metadata_duplicate_key(self):
         """Test for registering a service; duplicate key error occurs."""
         app = Flask(__name__)
@@ -172,3 +201,102 @@ class TestRegisterService:
                 obj = RegisterService(data=data)
                 obj.register_metadata()
                 print(obj.data["id"])
+
+    def test_register_metadata_duplicate_content(self):
+        """Test for registering a service with the same URL and type as an
+        existing one; the existing identifier is returned.
+        """
+        custom_config = deepcopy(CUSTOM_CONFIG)
+        custom_config["endpoints"]["services"]["deduplication"] = {
+            "policy": "return_existing",
+        }
+        app = Flask(__name__)
+        app.config.foca = Config(
+            db=MongoConfig(**MONGO_CONFIG),
+            custom=CustomConfig(**custom_config),
+        )
+        app.config.foca.db.dbs["serviceStore"].collections[
+            "services"
+        ].client = mongomock.MongoClient().db.collection
+
+        data = {**MOCK_SERVICE, "url": "https://example.org/api/"}
+        with app.app_context():
+            first = RegisterService(data=deepcopy(data))
+            first.register_metadata()
+            data["url"] = "HTTPS://example.org:443/api"
+            obj = RegisterService(data=deepcopy(data))
+            obj.register_metadata()
+            assert obj.data["id"] == first.data["id"]
+            assert obj.duplicate_of == first.data["id"]
+            obj = RegisterService(data=deepcopy(data), id=MOCK_ID)
+            obj.register_metadata()
+            assert obj.duplicate_of is None
+        assert (
+            app.config.foca.db.dbs["serviceStore"]
+            .collections["services"]
+            .client.count_documents({})
+            == 2
+        )
+
+    def test_register_metadata_duplicate_content_concurrent(self):
+        """Test for registering a service while the same content is
+        registered concurrently; the other identifier is returned.
+        """
+        custom_config = deepcopy(CUSTOM_CONFIG)
+        custom_config["endpoints"]["services"]["deduplication"] = {
+            "policy": "return_existing",
+        }
+        app = Flask(__name__)
+        app.config.foca = Config(
+            db=MongoConfig(**MONGO_CONFIG),
+            custom=CustomConfig(**custom_config),
+        )
+        collection = mongomock.MongoClient().db.collection
+        collection.create_index(
+            [(UNIQUE_HASH_FIELD, 1)],
+            unique=True,
+            partialFilterExpression={UNIQUE_HASH_FIELD: {"$exists": True}},
+        )
+        app.config.foca.db.dbs["serviceStore"].collections[
+            "services"
+        ].client = collection
+
+        with app.app_context():
+            obj = RegisterService(data=deepcopy(MOCK_SERVICE))
+            find_duplicate = obj.find_duplicate
+
+            def _register_concurrently():
+                other = RegisterService(data=deepcopy(MOCK_SERVICE), id=MOCK_ID)
+                other.data[UNIQUE_HASH_FIELD] = obj.data[UNIQUE_HASH_FIELD]
+                collection.insert_one(other.data)
+                obj.find_duplicate = find_duplicate
+                return None
+
+            obj.find_duplicate = _register_concurrently
+            obj.register_metadata()
+            assert obj.duplicate_of == MOCK_ID
+            assert obj.data["id"] == MOCK_ID
+        assert collection.count_documents({}) == 1
+
+    def test_register_metadata_duplicate_content_reject(self):
+        """Test for registering a service with the same URL and type as an
+        existing one; the registration is rejected.
+        """
+        custom_config = deepcopy(CUSTOM_CONFIG)
+        custom_config["endpoints"]["services"]["deduplication"] = {
+            "policy": "reject",
+        }
+        app = Flask(__name__)
+        app.config.foca = Config(
+            db=MongoConfig(**MONGO_CONFIG),
+            custom=CustomConfig(**custom_config),
+        )
+        app.config.foca.db.dbs["serviceStore"].collections[
+            "services"
+        ].client = mongomock.MongoClient().db.collection
+
+        data = {**MOCK_SERVICE, "url": "https://example.org/api"}
+        with app.app_context():
+            RegisterService(data=deepcopy(data)).register_metadata()
+            with pytest.raises(Conflict):
+                RegisterService(data=deepcopy(data)).register_metadata()
@@ -0,0 +1,301 @@
+"""Stress tests of listing and retrieving services in large registries.
+
+The registry is seeded with increasing numbers of services, and the latency,
+the peak of memory allocated, the number of memory blocks held by the result
+and the peak RSS of the process are recorded for each endpoint and size. Tests
+fail if memory or latency grow faster with the size of the registry than the
+endpoint's complexity allows, if the peak RSS exceeds a limit, or if latencies
+or the peak RSS regress compared to a baseline. Latency growth is only checked
+against MongoDB, as the cost of iterating mongomock cursors grows
+super-linearly itself.
+
+Deselected by default; run with:
+
+    pytest -m stress [--log-cli-level=INFO]
+
+Environment variables:
+    STRESS_MONGO_URI: URI of a MongoDB server to seed instead of mongomock;
+        the `cloud_registry_stress` database is dropped before and after.
+    STRESS_SIZES: Comma-separated registry sizes (default: 1000,2000,4000,8000).
+    STRESS_REPEATS: Number of timed calls per endpoint and size (default: 5).
+    STRESS_REPORT: Path to write measurements to, as JSON.
+    STRESS_BASELINE: Path to measurements of an earlier run to compare
+        latencies and the peak RSS with.
+    STRESS_LATENCY_TOLERANCE: Allowed relative increase of latencies over the
+        baseline (default: 0.5).
+    STRESS_MAX_RSS: Maximum peak RSS (in MiB) of the process (default: 2048).
+    STRESS_RSS_TOLERANCE: Allowed relative increase of the peak RSS over the
+        baseline (default: 0.2).
+"""
+
+from copy import deepcopy
+import json
+import logging
+import math
+import os
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from flask import Flask
+from foca.models.config import Config, MongoConfig
+import mongomock
+from pymongo import MongoClient
+import pytest
+
+from cloud_registry.ga4gh.registry.server import (
+    getServiceById,
+    getServices,
+    getServiceTypes,
+)
+from cloud_registry.service_models.custom_config import CustomConfig
+from tests.mock_data import CUSTOM_CONFIG, DB, MONGO_CONFIG
+
+try:
+    import resource
+except ImportError:
+    resource = None  # type: ignore[assignment]
+
+pytestmark = pytest.mark.stress
+
+SIZES = [
+    int(size)
+    for size in os.environ.get("STRESS_SIZES", "1000,2000,4000,8000").split(",")
+]
+REPEATS = int(os.environ.get("STRESS_REPEATS", "5"))
+MONGO_URI = os.environ.get("STRESS_MONGO_URI")
+REPORT = os.environ.get("STRESS_REPORT")
+BASELINE = os.environ.get("STRESS_BASELINE")
+LATENCY_TOLERANCE = float(os.environ.get("STRESS_LATENCY_TOLERANCE", "0.5"))
+MAX_RSS = float(os.environ.get("STRESS_MAX_RSS", "2048")) * 2**20
+RSS_TOLERANCE = float(os.environ.get("STRESS_RSS_TOLERANCE", "0.2"))
+
+logger = logging.getLogger(__name__)
+
+# number of distinct service types in the seeded registry
+TYPES = 20
+
+# allowed excess of growth exponents over the endpoint's complexity, absorbing
+# constant overheads and noise
+EXPONENT_TOLERANCE = 0.3
+
+# id of the service retrieved by `getServiceById`
+LOOKUP_ID = "S00000000"
+
+
+def _services(start: int, stop: int) -> List[Dict]:
+    """Create services with a fixed number of distinct types."""
+    return [
+        {
+            "id": f"S{i:08d}",
+            "name": f"Service {i}",
+            "type": {
+                "group": "org.ga4gh",
+                "artifact": f"artifact{i % TYPES}",
+                "version": f"1.{i % 3}.0",
+            },
+            "organization": {"name": "ELIXIR", "url": "https://elixir-europe.org"},
+            "version": "1.0.0",
+            "url": f"https://service{i}.example.org/api",
+        }
+        for i in range(start, stop)
+    ]
+
+
+# endpoints: call and growth exponent of their cost with the registry size
+ENDPOINTS: Dict[str, Dict] = {
+    "getServices": {
+        "call": lambda: getServices.__wrapped__(),
+        "exponent": 1,
+    },
+    "getServiceTypes": {
+        "call": lambda: getServiceTypes.__wrapped__(),
+        "exponent": 1,
+    },
+    "getServiceById": {
+        "call": lambda: getServiceById.__wrapped__(serviceId=LOOKUP_ID),
+        # mongomock scans collections, while MongoDB uses the `id` index
+        "exponent": 1 if MONGO_URI is None else 0,
+    },
+}
+
+
+def _peak_rss() -> Optional[int]:
+    """Get peak resident set size (in bytes) of the process."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _measure(app: Flask, call: Callable) -> Dict:
+    """Measure latency and memory of an endpoint."""
+    with app.test_request_context():
+        call()
+        latencies = []
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            res = call()
+            peak = tracemalloc.get_traced_memory()[1] - base
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+        del res
+    return {
+        "latency": statistics.median(latencies),
+        "peak_bytes": peak,
+        "blocks": blocks,
+        "peak_rss": _peak_rss(),
+    }
+
+
+def growth_exponent(sizes: List[int], values: List[float]) -> float:
+    """Estimate exponent `k` of `value ~ size ** k` by least squares.
+
+    Args:
+        sizes: Registry sizes.
+        values: Measurements at these sizes.
+
+    Returns:
+        Slope of the measurements over the sizes on log-log scales.
+    """
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(value, 1e-9)) for value in values]
+    x_mean = statistics.mean(xs)
+    y_mean = statistics.mean(ys)
+    return sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / sum(
+        (x - x_mean) ** 2 for x in xs
+    )
+
+
+@pytest.fixture(scope="module")
+def measurements():
+    """Seed registries of increasing size and measure all endpoints."""
+    app = Flask(__name__)
+    app.config.foca = Config(
+        db=MongoConfig(**MONGO_CONFIG),
+        custom=CustomConfig(**deepcopy(CUSTOM_CONFIG)),
+    )
+    if MONGO_URI is None:
+        client = mongomock.MongoClient()
+    else:
+        client = MongoClient(MONGO_URI)
+        client.drop_database("cloud_registry_stress")
+    database = client["cloud_registry_stress"]
+    collections = app.config.foca.db.dbs[DB].collections
+    for name in collections:
+        collections[name].client = database[name]
+    services = collections["services"].client
+    if MONGO_URI is not None:
+        # mongomock checks unique indexes by scanning, slowing down seeding
+        services.create_index([("id", 1)], unique=True)
+        services.create_index([("_deleted_at", 1)])
+
+    results: Dict[str, Dict[int, Dict]] = {name: {} for name in ENDPOINTS}
+    seeded = 0
+    try:
+        for size in sorted(SIZES):
+            services.insert_many(_services(seeded, size))
+            seeded = size
+            for name, endpoint in ENDPOINTS.items():
+                results[name][size] = _measure(app, endpoint["call"])
+    finally:
+        if MONGO_URI is not None:
+            client.drop_database("cloud_registry_stress")
+
+    for name, by_size in results.items():
+        for size, res in by_size.items():
+            logger.info(
+                f"{name} n={size}: {res['latency'] * 1000:.2f} ms, "
+                f"peak {res['peak_bytes'] / 2**20:.2f} MiB, "
+                f"{res['blocks']} blocks, RSS {res['peak_rss']}"
+            )
+    if REPORT:
+        with open(REPORT, "w") as report:
+            json.dump(results, report, indent=2)
+    return results
+
+
+@pytest.mark.parametrize("name", list(ENDPOINTS))
+def test_memory_growth(measurements, name):
+    """Test that memory grows at most as fast as the endpoint's complexity."""
+    by_size = measurements[name]
+    sizes = sorted(by_size)
+    max_exponent = ENDPOINTS[name]["exponent"] + EXPONENT_TOLERANCE
+    for metric in ["peak_bytes", "blocks"]:
+        exponent = growth_exponent(sizes, [by_size[size][metric] for size in sizes])
+        assert exponent <= max_exponent, (
+            f"{metric} of {name} grows with size ** {exponent:.2f}; "
+            f"expected at most size ** {max_exponent:.2f}"
+        )
+
+
+@pytest.mark.parametrize("name", list(ENDPOINTS))
+def test_latency_growth(measurements, name):
+    """Test that latency grows at most as fast as the endpoint's complexity."""
+    if MONGO_URI is None:
+        pytest.skip("Cost of mongomock cursors grows super-linearly.")
+    by_size = measurements[name]
+    sizes = sorted(by_size)
+    max_exponent = ENDPOINTS[name]["exponent"] + EXPONENT_TOLERANCE
+    exponent = growth_exponent(sizes, [by_size[size]["latency"] for size in sizes])
+    assert exponent <= max_exponent, (
+        f"Latency of {name} grows with size ** {exponent:.2f}; "
+        f"expected at most size ** {max_exponent:.2f}"
+    )
+
+
+@pytest.mark.parametrize("name", list(ENDPOINTS))
+def test_latency_baseline(measurements, name):
+    """Test that latencies did not regress compared to an earlier run."""
+    if not BASELINE:
+        pytest.skip("No baseline given.")
+    with open(BASELINE) as baseline_file:
+        baseline = json.load(baseline_file)
+    for size, res in measurements[name].items():
+        expected = baseline.get(name, {}).get(str(size))
+        if expected is None:
+            continue
+        limit = expected["latency"] * (1 + LATENCY_TOLERANCE)
+        assert res["latency"] <= limit, (
+            f"Latency of {name} at size {size} regressed: "
+            f"{res['latency'] * 1000:.2f} ms > {limit * 1000:.2f} ms"
+        )
+
+
+def test_peak_rss(measurements):
+    """Test that the peak RSS stays below the limit and did not regress
+    compared to an earlier run.
+    """
+    if resource is None:
+        pytest.skip("Peak RSS cannot be measured on this platform.")
+    peaks = {
+        (name, size): res["peak_rss"]
+        for name, by_size in measurements.items()
+        for size, res in by_size.items()
+    }
+    peak = max(peaks.values())
+    assert (
+        peak <= MAX_RSS
+    ), f"Peak RSS of {peak / 2**20:.0f} MiB exceeds {MAX_RSS / 2**20:.0f} MiB"
+    if not BASELINE:
+        return
+    with open(BASELINE) as baseline_file:
+        baseline = json.load(baseline_file)
+    for (name, size), rss in peaks.items():
+        expected = baseline.get(name, {}).get(str(size), {}).get("peak_rss")
+        if expected is None:
+            continue
+        limit = expected * (1 + RSS_TOLERANCE)
+        assert rss <= limit, (
+            f"Peak RSS after {name} at size {size} regressed: "
+            f"{rss / 2**20:.0f} MiB > {limit / 2**20:.0f} MiB"
+        )
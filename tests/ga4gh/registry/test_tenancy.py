@@ -0,0 +1,226 @@
+"""Tests for resolving tenant-specific database collections."""
+
+from copy import deepcopy
+from datetime import datetime, timedelta
+
+from flask import Flask
+from foca.models.config import SpecConfig
+import pytest
+
+from cloud_registry.exceptions import (
+    BadRequest,
+    Forbidden,
+    InternalServerError,
+    NotFound,
+)
+from cloud_registry.ga4gh.registry.selection import ServiceRankings
+from cloud_registry.ga4gh.registry.server import getServiceById, getServices
+from cloud_registry.ga4gh.registry.service import RegisterService
+from cloud_registry.ga4gh.registry.service_info import RegisterServiceInfo
+from cloud_registry.ga4gh.registry.tenancy import (
+    get_collection,
+    get_tenant,
+    list_tenant_collections,
+    query_options,
+    register_tenancy,
+    require_collection,
+    set_tenant,
+)
+from cloud_registry.ga4gh.registry.tombstones import TombstoneCompaction
+from tests.mock_data import (
+    MOCK_ID,
+    MOCK_SERVICE,
+    SERVICE_INFO_CONFIG,
+)
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with all collections configured."""
+
+    def _make_app(**tenancy) -> Flask:
+        return create_app(custom={"tenancy": {"enabled": True, **tenancy}})
+
+    return _make_app
+
+
+def _register(app: Flask, tenant: str, id: str = MOCK_ID) -> None:
+    """Register service for a tenant."""
+    with app.app_context():
+        set_tenant(tenant)
+        RegisterService(data=deepcopy(MOCK_SERVICE), id=id).register_metadata()
+
+
+def test_get_collection(make_app):
+    """Test that tenants are served from separate, indexed collections."""
+    app = make_app()
+    with app.app_context():
+        default = get_collection("services")
+        assert default.name == "services"
+        tenant = get_collection("services", tenant="tenant1")
+        assert tenant.name == "services.tenant1"
+        assert "id_1" in tenant.index_information()
+        set_tenant("tenant1")
+        assert get_tenant() == "tenant1"
+        assert get_collection("services") is tenant
+
+
+def test_get_collection_not_configured(make_app):
+    """Test that no collection is returned for unconfigured collections."""
+    app = make_app()
+    with app.app_context():
+        assert get_collection("service_probes", tenant="tenant1") is None
+
+
+def test_require_collection(make_app):
+    """Test that required collections must be configured."""
+    app = make_app()
+    with app.app_context():
+        set_tenant("tenant1")
+        assert require_collection("services").name == "services.tenant1"
+        with pytest.raises(InternalServerError):
+            require_collection("service_probes")
+
+
+def test_list_tenant_collections(make_app):
+    """Test for listing the collections of all tenants."""
+    app = make_app()
+    _register(app, "tenant2")
+    _register(app, "tenant1")
+    with app.app_context():
+        names = [c.name for c in list_tenant_collections(get_collection("services"))]
+    assert names == ["services", "services.tenant1", "services.tenant2"]
+
+
+def test_query_options(make_app):
+    """Test that query run time is limited if configured."""
+    app = make_app(max_time_ms=100)
+    with app.app_context():
+        assert query_options() == {"max_time_ms": 100}
+    app = make_app()
+    with app.app_context():
+        assert query_options() == {}
+
+
+def test_isolation(make_app):
+    """Test that tenants only see their own services."""
+    app = make_app()
+    _register(app, "tenant1")
+    with app.app_context():
+        assert getServices.__wrapped__() == []
+        set_tenant("tenant1")
+        assert len(getServices.__wrapped__()) == 1
+        set_tenant("tenant2")
+        with pytest.raises(NotFound):
+            getServiceById.__wrapped__(MOCK_ID)
+
+
+def test_quota(make_app):
+    """Test that tenants cannot register more services than allowed."""
+    app = make_app(max_services=1)
+    _register(app, "tenant1")
+    _register(app, "tenant1")
+    _register(app, "tenant2")
+    with pytest.raises(Forbidden):
+        _register(app, "tenant1", id="other")
+
+
+def test_service_info_fallback(make_app):
+    """Test that tenants without service info get the default one."""
+    app = make_app()
+    with app.app_context():
+        RegisterServiceInfo().set_service_info_from_config()
+        set_tenant("tenant1")
+        assert RegisterServiceInfo().get_service_info() == SERVICE_INFO_CONFIG
+        data = {**SERVICE_INFO_CONFIG, "name": "Tenant"}
+        RegisterServiceInfo().set_service_info_from_app_context(data=data)
+        assert RegisterServiceInfo().get_service_info()["name"] == "Tenant"
+        set_tenant(None)
+        assert RegisterServiceInfo().get_service_info() == SERVICE_INFO_CONFIG
+
+
+def test_rankings_evicted(make_app):
+    """Test that rankings of least recently used tenants are evicted."""
+    app = make_app(max_cached_tenants=2)
+    _register(app, "tenant1")
+    rankings = ServiceRankings(app=app)
+    first = rankings.get("tenant1")
+    assert len(first.select("org.ga4gh", "beacon")) == 1
+    assert rankings.get(None).select("org.ga4gh", "beacon") == []
+    rankings.get("tenant2")
+    assert rankings.get("tenant1") is not first
+
+
+def test_purge_tenants(make_app):
+    """Test that tombstones of all tenants are purged."""
+    app = make_app()
+    _register(app, "tenant1")
+    with app.app_context():
+        collection = get_collection("services", tenant="tenant1")
+        collection.update_one(
+            {"id": MOCK_ID},
+            {"$set": {"_deleted_at": datetime.utcnow() - timedelta(days=30)}},
+        )
+        assert TombstoneCompaction().purge() == 1
+        assert collection.count_documents({}) == 0
+
+
+class TestRegisterTenancy:
+    """Tests for `register_tenancy()` function."""
+
+    def _request(self, app: Flask, headers: dict):
+        """Resolve tenant of request with headers."""
+        with app.test_request_context(headers=headers):
+            app.preprocess_request()
+            return get_tenant()
+
+    def test_header(self, make_app):
+        """Test that the tenant is read from the request header."""
+        app = make_app()
+        register_tenancy(app)
+        assert self._request(app, {"X-Tenant": "tenant1"}) == "tenant1"
+        assert self._request(app, {}) is None
+
+    def test_required(self, make_app):
+        """Test that requests without tenant are rejected if required."""
+        app = make_app(required=True)
+        register_tenancy(app)
+        with pytest.raises(BadRequest):
+            self._request(app, {})
+
+    def test_invalid(self, make_app):
+        """Test that malformed tenants are rejected."""
+        app = make_app()
+        register_tenancy(app)
+        with pytest.raises(BadRequest):
+            self._request(app, {"X-Tenant": "a.b"})
+
+    def test_unknown(self, make_app):
+        """Test that unknown tenants are rejected."""
+        app = make_app(tenants=["tenant1"])
+        register_tenancy(app)
+        with pytest.raises(Forbidden):
+            self._request(app, {"X-Tenant": "tenant2"})
+
+    def test_access(self, make_app):
+        """Test that requesters may only access tenants granted to them by
+        their token claim or the allow-list.
+        """
+        app = make_app(claim="tenants", users={"user2": ["tenant2"]})
+        app.config.foca.api.specs = [
+            SpecConfig(path="api.yaml", disable_auth=False),
+        ]
+        register_tenancy(app)
+        headers = {"X-Tenant": "tenant1", "user_id": "user1", "tenants": "tenant1"}
+        assert self._request(app, headers) == "tenant1"
+        headers = {"X-Tenant": "tenant2", "user_id": "user2"}
+        assert self._request(app, headers) == "tenant2"
+        with pytest.raises(Forbidden):
+            self._request(app, {"X-Tenant": "tenant2", "user_id": "user1"})
+        assert self._request(app, {"user_id": "user1"}) is None
+
+    def test_disabled(self, make_app):
+        """Test that the header is ignored if tenancy is disabled."""
+        app = make_app(enabled=False)
+        register_tenancy(app)
+        assert self._request(app, {"X-Tenant": "tenant1"}) is None
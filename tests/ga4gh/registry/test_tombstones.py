@@ -0,0 +1,89 @@
+"""Tests for purging deleted services."""
+
+from copy import deepcopy
+from datetime import datetime, timedelta
+
+from flask import Flask
+import pytest
+
+from cloud_registry.ga4gh.registry.tombstones import TombstoneCompaction
+from tests.mock_data import (
+    DB,
+    MOCK_SERVICE,
+)
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with services collection."""
+
+    def _make_app(**tombstones) -> Flask:
+        return create_app(
+            custom={"endpoints": {"services": {"tombstones": tombstones}}},
+            clients=["services"],
+        )
+
+    return _make_app
+
+
+def _insert(app: Flask, id: str, deleted_at=None) -> None:
+    """Insert service, optionally marked as deleted."""
+    service = deepcopy(MOCK_SERVICE)
+    service["id"] = id
+    if deleted_at is not None:
+        service["_deleted_at"] = deleted_at
+    app.config.foca.db.dbs[DB].collections["services"].client.insert_one(service)
+
+
+class TestTombstoneCompaction:
+    """Tests for `TombstoneCompaction` class."""
+
+    def test_purge(self, make_app):
+        """Test that only expired tombstones are purged."""
+        app = make_app(retention=60)
+        expired = datetime.utcnow() - timedelta(seconds=120)
+        _insert(app, "active")
+        _insert(app, "recent", deleted_at=datetime.utcnow())
+        _insert(app, "expired", deleted_at=expired)
+
+        with app.app_context():
+            compaction = TombstoneCompaction()
+            assert compaction.purge() == 1
+            ids = {s["id"] for s in compaction.collection.find()}
+            assert ids == {"active", "recent"}
+
+    def test_purge_batches(self, make_app):
+        """Test for purging more tombstones than fit into one batch."""
+        app = make_app(retention=0, batch_size=2)
+        expired = datetime.utcnow() - timedelta(seconds=1)
+        for i in range(5):
+            _insert(app, str(i), deleted_at=expired)
+
+        with app.app_context():
+            compaction = TombstoneCompaction()
+            assert compaction.purge() == 5
+            assert compaction.collection.count_documents({}) == 0
+
+    def test_start_stop(self, make_app):
+        """Test for purging tombstones periodically."""
+        app = make_app(retention=0, interval=0.05)
+        _insert(app, "expired", deleted_at=datetime.utcnow())
+
+        with app.app_context():
+            compaction = TombstoneCompaction()
+            compaction.start()
+            for _ in range(100):
+                if not compaction.collection.count_documents({}):
+                    break
+                compaction._stop.wait(0.05)
+            compaction.stop()
+            assert compaction.collection.count_documents({}) == 0
+
+    def test_start_disabled(self, make_app):
+        """Test that no thread is started if compaction is disabled."""
+        app = make_app(enabled=False)
+
+        with app.app_context():
+            compaction = TombstoneCompaction()
+            compaction.start()
+            assert compaction._thread is None
@@ -0,0 +1,98 @@
+"""Tests for sortable version keys and version range filters."""
+
+import mongomock
+import pytest
+
+from cloud_registry.exceptions import BadRequest
+from cloud_registry.ga4gh.registry.versions import (
+    backfill_version_keys,
+    version_filter,
+    version_key,
+)
+
+VERSIONS = [
+    "0.0.3",
+    "0.2.0",
+    "0.9.1",
+    "1.0.0-beta",
+    "1.0.0",
+    "1.2.3",
+    "1.10.0",
+    "2.0.0-alpha",
+    "2.0.0",
+]
+
+
+def _match(spec: str) -> list:
+    """Return versions matching a version range."""
+    coll = mongomock.MongoClient().db.collection
+    coll.insert_many([{"v": v, "_version_key": version_key(v)} for v in VERSIONS])
+    coll.insert_one({"v": "latest", "_version_key": None})
+    records = coll.find(filter=version_filter(spec) or {}, sort=[("_version_key", 1)])
+    return [r["v"] for r in records]
+
+
+class TestVersionKey:
+    """Tests for `version_key()` function."""
+
+    def test_version_key_order(self):
+        """Test that keys sort in the order of versions."""
+        keys = [version_key(v) for v in VERSIONS]
+        assert keys == sorted(keys)
+
+    @pytest.mark.parametrize("version", ["1", "1.0", "v1.0.0", "1.0.0+build.1"])
+    def test_version_key_equivalent(self, version):
+        """Test for keys of equivalent versions."""
+        assert version_key(version) == version_key("1.0.0")
+
+    @pytest.mark.parametrize("version", [None, "", "latest", "1.x", "1.0-beta"])
+    def test_version_key_invalid(self, version):
+        """Test that non-semantic versions have no key."""
+        assert version_key(version) is None
+
+
+class TestVersionFilter:
+    """Tests for `version_filter()` function."""
+
+    @pytest.mark.parametrize(
+        "spec,expected",
+        [
+            ("^1.0", ["1.0.0", "1.2.3", "1.10.0"]),
+            ("^0.2", ["0.2.0"]),
+            ("^0.0.3", ["0.0.3"]),
+            ("~1.2", ["1.2.3"]),
+            ("~1", ["1.0.0", "1.2.3", "1.10.0"]),
+            ("1.x", ["1.0.0", "1.2.3", "1.10.0"]),
+            ("1.2.3", ["1.2.3"]),
+            ("=1.0.0-beta", ["1.0.0-beta"]),
+            (">=1.2 <2", ["1.2.3", "1.10.0"]),
+            (">1.2", ["1.10.0", "2.0.0-alpha", "2.0.0"]),
+            (">1.2.3", ["1.10.0", "2.0.0-alpha", "2.0.0"]),
+            ("<1", ["0.0.3", "0.2.0", "0.9.1"]),
+            ("<=0.9", ["0.0.3", "0.2.0", "0.9.1"]),
+        ],
+    )
+    def test_version_filter(self, spec, expected):
+        """Test for matching versions against ranges."""
+        assert _match(spec) == expected
+
+    @pytest.mark.parametrize("spec", ["", "*", "x"])
+    def test_version_filter_any(self, spec):
+        """Test for ranges matching any version."""
+        assert version_filter(spec) is None
+
+    @pytest.mark.parametrize("spec", ["latest", ">=", "^1.0-beta", "1.x.0"])
+    def test_version_filter_invalid(self, spec):
+        """Test for malformed ranges."""
+        with pytest.raises(BadRequest):
+            version_filter(spec)
+
+
+def test_backfill_version_keys():
+    """Test for storing missing version keys."""
+    coll = mongomock.MongoClient().db.collection
+    coll.insert_one({"id": "serv1", "type": {"version": "1.0.0"}})
+    coll.insert_one({"id": "serv2", "_version_key": version_key("2.0.0")})
+    assert backfill_version_keys(coll) == 1
+    assert coll.find_one({"id": "serv1"})["_version_key"] == version_key("1.0.0")
+    assert backfill_version_keys(coll) == 0
@@ -0,0 +1,313 @@
+"""Tests for asynchronous registration of services."""
+
+from copy import deepcopy
+import json
+import os
+from typing import List, Optional
+from unittest.mock import MagicMock
+
+from flask import Flask
+from pymongo.collection import Collection
+from pydantic import ValidationError
+from pymongo.errors import AutoReconnect, BulkWriteError, OperationFailure
+import pytest
+
+from cloud_registry.exceptions import ServiceUnavailable
+from cloud_registry.ga4gh.registry.tenancy import get_collection
+from cloud_registry.ga4gh.registry.write_behind import (
+    WriteBehindQueue,
+    register_write_behind,
+)
+from cloud_registry.service_models.custom_config import WriteBehindConfig
+from tests.mock_data import (
+    DB,
+    MOCK_ID,
+    MOCK_SERVICE,
+)
+
+
+@pytest.fixture
+def make_app(create_app, tmp_path):
+    """Factory of apps with services and change log collections."""
+
+    def _make_app(**write_behind) -> Flask:
+        return create_app(
+            custom={
+                "endpoints": {
+                    "services": {
+                        "write_behind": {
+                            "enabled": True,
+                            "flush_interval": 0.01,
+                            "spill_file": str(tmp_path / "spill.jsonl"),
+                            **write_behind,
+                        }
+                    }
+                }
+            },
+            clients=["services", "service_changes"],
+        )
+
+    return _make_app
+
+
+def _services(app: Flask, tenant: Optional[str] = None) -> Collection:
+    """Return services collection of a tenant."""
+    with app.app_context():
+        return get_collection("services", tenant=tenant)
+
+
+def _spilled(app: Flask) -> List[str]:
+    """Return identifiers of services a restarted queue would replay."""
+    return [data["id"] for _, data, _, _ in WriteBehindQueue(app=app)._load_spill()]
+
+
+def _service(id: str = MOCK_ID) -> dict:
+    """Return service with identifier."""
+    service = deepcopy(MOCK_SERVICE)
+    service["id"] = id
+    return service
+
+
+class TestWriteBehindQueue:
+    """Tests for `WriteBehindQueue` class."""
+
+    def test_put(self, make_app):
+        """Test for queueing a service."""
+        app = make_app()
+        queue = WriteBehindQueue(app=app)
+        headers = queue.put(data=_service())
+        assert headers["Location"].endswith(f"/services/{MOCK_ID}/status")
+        assert queue.get_status(MOCK_ID) == "queued"
+        assert _services(app).count_documents({}) == 0
+
+    def test_put_full(self, make_app):
+        """Test that services are rejected while the queue is full."""
+        app = make_app(queue_size=1)
+        queue = WriteBehindQueue(app=app)
+        queue.put(data=_service("serv1"))
+        with pytest.raises(ServiceUnavailable):
+            queue.put(data=_service("serv2"))
+
+    def test_flush(self, make_app):
+        """Test for persisting queued services in batches."""
+        app = make_app(batch_size=2)
+        queue = WriteBehindQueue(app=app)
+        for i in range(3):
+            queue.put(data=_service(str(i)))
+        assert queue.flush() == 2
+        assert queue.flush() == 1
+        assert queue.flush() == 0
+        assert _services(app).count_documents({}) == 3
+        assert _services(app).find_one({"id": "0"})["name"] == "name"
+        assert queue.get_status("2") == "persisted"
+        changes = app.config.foca.db.dbs[DB].collections["service_changes"]
+        assert changes.client.count_documents({"operation": "insert"}) == 3
+
+    def test_flush_duplicate(self, make_app):
+        """Test that services with existing identifiers fail to register."""
+        app = make_app()
+        queue = WriteBehindQueue(app=app)
+        _services(app).insert_one(_service())
+        queue.put(data=_service())
+        queue.flush()
+        assert queue.get_status(MOCK_ID) == "failed"
+
+    def test_flush_retry(self, make_app):
+        """Test that batches are retried if the database is unavailable."""
+        app = make_app()
+        queue = WriteBehindQueue(app=app)
+        coll_conf = app.config.foca.db.dbs[DB].collections["services"]
+        bulk_write = coll_conf.client.bulk_write
+
+        def _bulk_write(*args, **kwargs):
+            if coll_conf.client.bulk_write.call_count == 1:
+                raise AutoReconnect()
+            return bulk_write(*args, **kwargs)
+
+        coll_conf.client = MagicMock(wraps=coll_conf.client)
+        coll_conf.client.bulk_write.side_effect = _bulk_write
+        queue.put(data=_service())
+        assert queue.flush() == 1
+        assert coll_conf.client.bulk_write.call_count == 2
+        assert queue.get_status(MOCK_ID) == "persisted"
+
+    def test_flush_stopped(self, make_app):
+        """Test that batches are not retried once the worker is stopped."""
+        app = make_app()
+        queue = WriteBehindQueue(app=app)
+        coll_conf = app.config.foca.db.dbs[DB].collections["services"]
+        coll_conf.client = MagicMock()
+        coll_conf.client.bulk_write.side_effect = AutoReconnect()
+        queue.put(data=_service())
+        queue._stop.set()
+        assert queue.flush() == 0
+        assert queue.get_status(MOCK_ID) == "queued"
+
+    def test_flush_error(self, make_app):
+        """Test that batches are not retried after non-transient errors."""
+        app = make_app()
+        queue = WriteBehindQueue(app=app)
+        coll_conf = app.config.foca.db.dbs[DB].collections["services"]
+        coll_conf.client = MagicMock()
+        coll_conf.client.bulk_write.side_effect = OperationFailure("invalid")
+        queue.put(data=_service())
+        assert queue.flush() == 1
+        assert coll_conf.client.bulk_write.call_count == 1
+        assert queue.get_status(MOCK_ID) == "failed"
+
+    def test_flush_write_errors(self, make_app):
+        """Test that services rejected by the database fail to register."""
+        app = make_app()
+        queue = WriteBehindQueue(app=app)
+        coll_conf = app.config.foca.db.dbs[DB].collections["services"]
+        coll_conf.client = MagicMock()
+        coll_conf.client.bulk_write.side_effect = BulkWriteError(
+            {
+                "upserted": [{"index": 0, "_id": "x"}],
+                "writeErrors": [{"index": 1, "code": 2, "errmsg": "invalid"}],
+            }
+        )
+        queue.put(data=_service("serv1"))
+        queue.put(data=_service("serv2"))
+        assert queue.flush() == 2
+        assert coll_conf.client.bulk_write.call_count == 1
+        assert queue.get_status("serv1") == "persisted"
+        assert queue.get_status("serv2") == "failed"
+
+    def test_spill_compaction(self, tmp_path, make_app):
+        """Test that persisted services are removed from the spill file."""
+        spill_file = str(tmp_path / "spill.jsonl")
+        app = make_app(spill_file=spill_file, batch_size=1)
+        queue = WriteBehindQueue(app=app)
+        queue.put(data=_service("serv1"))
+        queue.put(data=_service("serv2"))
+        assert queue.flush() == 1
+        assert _spilled(app) == ["serv2"]
+        assert not os.path.exists(f"{spill_file}.rotated")
+        queue.put(data=_service("serv3"))
+        assert _spilled(app) == ["serv2", "serv3"]
+        with open(spill_file) as _file:
+            assert len(_file.readlines()) == 1
+        queue.stop()
+
+    def test_spill_compaction_unlocked(self, tmp_path, make_app):
+        """Test that services can be queued while the compacted file is
+        written.
+        """
+        app = make_app(spill_file=str(tmp_path / "spill.jsonl"), batch_size=1)
+        queue = WriteBehindQueue(app=app)
+        write_compacted = queue._write_compacted
+
+        def _write_compacted(pending):
+            assert not queue._lock.locked()
+            queue.put(data=_service("serv3"))
+            write_compacted(pending)
+
+        queue._write_compacted = _write_compacted
+        queue.put(data=_service("serv1"))
+        queue.put(data=_service("serv2"))
+        assert queue.flush() == 1
+        assert _spilled(app) == ["serv2", "serv3"]
+        queue.stop()
+
+    def test_spill_interrupted_compaction(self, tmp_path, make_app):
+        """Test that services left in a rotated file by an interrupted
+        compaction are compacted before the spill file is rotated again, and
+        are replayed once.
+        """
+        spill_file = str(tmp_path / "spill.jsonl")
+        app = make_app(spill_file=spill_file)
+        queue = WriteBehindQueue(app=app)
+        queue.put(data=_service("serv1"))
+        queue.stop()
+        os.replace(spill_file, f"{spill_file}.rotated")
+
+        queue = WriteBehindQueue(app=app)
+        queue._load_spill()
+        queue.put(data=_service("serv2"))
+        queue._compact_spill()
+        assert os.path.exists(spill_file)
+        assert not os.path.exists(f"{spill_file}.rotated")
+        assert _spilled(app) == ["serv1", "serv2"]
+        queue.stop()
+
+    def test_spill_replay(self, tmp_path, make_app):
+        """Test that acknowledged services are replayed after a restart."""
+        spill_file = str(tmp_path / "spill.jsonl")
+        app = make_app(spill_file=spill_file)
+        queue = WriteBehindQueue(app=app)
+        queue.put(data=_service("serv1"))
+        queue.put(data=_service("serv2"))
+        queue.stop()
+
+        queue = WriteBehindQueue(app=app)
+        _services(app).insert_one(_service("serv1"))
+        assert queue._replay(queue._load_spill()) == 2
+        assert queue.flush() == 0
+        assert queue.get_status("serv1") == "persisted"
+        assert queue.get_status("serv2") == "persisted"
+        assert _spilled(app) == []
+
+    def test_tenants(self, tmp_path, make_app):
+        """Test that services are persisted for the tenant registering them."""
+        spill_file = str(tmp_path / "spill.jsonl")
+        app = make_app(spill_file=spill_file)
+        queue = WriteBehindQueue(app=app)
+        queue.put(data=_service(), tenant="tenant1")
+        queue.stop()
+
+        queue = WriteBehindQueue(app=app)
+        assert queue._replay(queue._load_spill()) == 1
+        assert queue.get_status(MOCK_ID) is None
+        assert queue.get_status(MOCK_ID, tenant="tenant1") == "persisted"
+        assert _services(app).count_documents({}) == 0
+        assert _services(app, tenant="tenant1").count_documents({}) == 1
+
+    def test_start_replay_exceeding_queue(self, tmp_path, make_app):
+        """Test that spill files holding more services than the queue fits are
+        replayed on startup.
+        """
+        spill_file = str(tmp_path / "spill.jsonl")
+        app = make_app(spill_file=spill_file, queue_size=1, batch_size=1)
+        with open(spill_file, "w") as _file:
+            for i in range(3):
+                _file.write(
+                    json.dumps({"tenant": None, "service": _service(str(i))}) + "\n"
+                )
+        queue = WriteBehindQueue(app=app)
+        queue.start()
+        queue.put(data=_service("serv"))
+        queue.stop()
+        assert _services(app).count_documents({}) == 4
+        assert _spilled(app) == []
+
+    def test_start_stop(self, make_app):
+        """Test that queued services are persisted by the worker."""
+        app = make_app()
+        queue = WriteBehindQueue(app=app)
+        queue.start()
+        queue.put(data=_service())
+        queue.stop()
+        assert queue.get_status(MOCK_ID) == "persisted"
+
+
+def test_register_write_behind(make_app):
+    """Test for registering write-behind queue with the app."""
+    app = make_app()
+    register_write_behind(app)
+    assert isinstance(app.extensions["write_behind"], WriteBehindQueue)
+    app.extensions["write_behind"].stop()
+
+
+def test_register_write_behind_disabled(make_app):
+    """Test that no queue is registered if write-behind mode is disabled."""
+    app = make_app(enabled=False)
+    register_write_behind(app)
+    assert "write_behind" not in app.extensions
+
+
+def test_write_behind_config_spill_file():
+    """Test that write-behind mode cannot be enabled without a spill file."""
+    WriteBehindConfig(enabled=False)
+    with pytest.raises(ValidationError):
+        WriteBehindConfig(enabled=True)
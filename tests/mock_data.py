@@ -10,7 +10,9 @@ COLLECTION_CONFIG = {
 }
 DB_CONFIG = {
     "collections": {
+        "service_changes": COLLECTION_CONFIG,
         "service_info": COLLECTION_CONFIG,
+        "service_quotas": {},
         "services": COLLECTION_CONFIG,
     },
 }
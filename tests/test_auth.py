@@ -0,0 +1,221 @@
+"""Tests for cached bearer token validation."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from uuid import uuid4
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask, request
+from foca.models.config import Config
+import jwt
+import pytest
+
+from cloud_registry.auth import (
+    JwksCache,
+    TokenCache,
+    register_auth_cache,
+    validate_token,
+)
+
+KEY_ID = "mock_key"
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+class _OIDCHandler(BaseHTTPRequestHandler):
+    """Request handler of a stub OpenID Connect identity provider."""
+
+    def do_GET(self):
+        issuer = self.server.issuer  # type: ignore[attr-defined]
+        self.server.hits[self.path] += 1  # type: ignore[attr-defined]
+        if self.path == "/.well-known/openid-configuration":
+            body = {
+                "issuer": issuer,
+                "jwks_uri": f"{issuer}/jwks",
+                "userinfo_endpoint": f"{issuer}/userinfo",
+            }
+        elif self.path == "/jwks":
+            jwk = json.loads(
+                jwt.algorithms.RSAAlgorithm.to_jwk(PRIVATE_KEY.public_key())
+            )
+            jwk["kid"] = KEY_ID
+            body = {"keys": [jwk]}
+        elif self.path == "/userinfo":
+            body = {"sub": "user"}
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def oidc_server():
+    """Serve a stub OpenID Connect identity provider on a local port."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OIDCHandler)
+    server.issuer = f"http://127.0.0.1:{server.server_port}"  # type: ignore
+    server.hits = {  # type: ignore[attr-defined]
+        "/.well-known/openid-configuration": 0,
+        "/jwks": 0,
+        "/userinfo": 0,
+    }
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with token validation cache registered."""
+
+    def _make_app(validation_method: str) -> Flask:
+        app = create_app(
+            db=False,
+            security={"auth": {"validation_methods": [validation_method]}},
+        )
+        register_auth_cache(app)
+        return app
+
+    return _make_app
+
+
+def _create_token(issuer: str, exp_in: int = 3600) -> str:
+    """Create token signed by the stub identity provider."""
+    return jwt.encode(
+        {
+            "iss": issuer,
+            "sub": "user",
+            "exp": int(time.time()) + exp_in,
+            "jti": uuid4().hex,
+        },
+        PRIVATE_KEY,
+        algorithm="RS256",
+        headers={"kid": KEY_ID},
+    )
+
+
+def test_validate_token_userinfo_cached(oidc_server, make_app):
+    """Test that repeated tokens do not hit the user info endpoint again."""
+    app = make_app("userinfo")
+    token = _create_token(oidc_server.issuer)
+    for _ in range(3):
+        with app.test_request_context():
+            res = validate_token(token)
+            assert res["user_id"] == "user"
+    assert oidc_server.hits["/userinfo"] == 1
+    assert oidc_server.hits["/.well-known/openid-configuration"] == 1
+
+
+def test_validate_token_public_key_cached(oidc_server, make_app):
+    """Test that distinct tokens share the cached key set."""
+    app = make_app("public_key")
+    for _ in range(3):
+        with app.test_request_context():
+            res = validate_token(_create_token(oidc_server.issuer))
+            assert res["user_id"] == "user"
+    assert oidc_server.hits["/jwks"] == 1
+    assert oidc_server.hits["/.well-known/openid-configuration"] == 3
+
+
+def test_validate_token_cached_claims_in_headers(oidc_server, make_app):
+    """Test that claims are added to request headers for cached tokens."""
+    app = make_app("userinfo")
+    token = _create_token(oidc_server.issuer)
+    with app.test_request_context():
+        validate_token(token)
+    with app.test_request_context():
+        validate_token(token)
+        assert request.headers["user_id"] == "user"
+
+
+def test_validate_token_no_cache(oidc_server):
+    """Test validation without registered cache."""
+    app = Flask(__name__)
+    app.config.foca = Config(
+        security={"auth": {"validation_methods": ["userinfo"]}},
+    )
+    token = _create_token(oidc_server.issuer)
+    for _ in range(2):
+        with app.test_request_context():
+            validate_token(token)
+    assert oidc_server.hits["/userinfo"] == 2
+
+
+class TestTokenCache:
+    """Tests for `TokenCache` class."""
+
+    def test_get_set(self):
+        """Test caching of validation results."""
+        cache = TokenCache()
+        assert cache.get("token") is None
+        cache.set("token", {"claims": {}})
+        assert cache.get("token") == {"claims": {}}
+
+    def test_set_expired(self):
+        """Test that expired tokens are not cached."""
+        cache = TokenCache()
+        cache.set("token", {"claims": {"exp": time.time() - 1}})
+        assert cache.get("token") is None
+
+    def test_ttl_bounded_by_exp(self):
+        """Test that entries expire with the token."""
+        cache = TokenCache(ttl=3600)
+        cache.set("token", {"claims": {"exp": time.time() + 0.05}})
+        assert cache.get("token") is not None
+        time.sleep(0.1)
+        assert cache.get("token") is None
+
+    def test_max_size(self):
+        """Test eviction of least recently used entries."""
+        cache = TokenCache(max_size=2)
+        for token in ["a", "b", "c"]:
+            cache.set(token, {"claims": {}})
+        assert cache.get("a") is None
+        assert cache.get("c") is not None
+
+
+class TestJwksCache:
+    """Tests for `JwksCache` class."""
+
+    def test_get(self):
+        """Test that key sets are fetched once."""
+        calls = []
+        cache = JwksCache(fetch=lambda url: calls.append(url) or {"k": url})
+        assert cache.get("url") == {"k": "url"}
+        assert cache.get("url") == {"k": "url"}
+        assert calls == ["url"]
+
+    def test_get_background_refresh(self):
+        """Test that stale key sets are served while being refreshed."""
+        calls = []
+        refreshed = threading.Event()
+
+        def fetch(url):
+            calls.append(url)
+            if len(calls) > 1:
+                refreshed.set()
+            return {"version": len(calls)}
+
+        cache = JwksCache(fetch=fetch, refresh_interval=0)
+        assert cache.get("url") == {"version": 1}
+        assert cache.get("url") == {"version": 1}
+        assert refreshed.wait(timeout=5)
+
+    def test_get_max_age(self):
+        """Test that expired key sets are refetched synchronously."""
+        calls = []
+        cache = JwksCache(
+            fetch=lambda url: calls.append(url) or {"version": len(calls)},
+            max_age=0,
+        )
+        cache.get("url")
+        assert cache.get("url") == {"version": 2}
@@ -0,0 +1,193 @@
+"""Tests for coalescing of concurrent identical reads."""
+
+import json
+import threading
+import time
+
+from flask import Flask
+import pytest
+
+from cloud_registry.coalescing import SingleFlight, coalesce
+from cloud_registry.exceptions import NotFound
+from cloud_registry.ga4gh.registry.read_preference import PIN_COOKIE
+from cloud_registry.ga4gh.registry.tenancy import set_tenant
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with coalescing configuration."""
+
+    def _make_app(**coalescing) -> Flask:
+        return create_app(custom={"coalescing": coalescing}, db=False)
+
+    return _make_app
+
+
+def _concurrently(func, n: int = 5) -> list:
+    """Call function from several threads at once and collect results."""
+    results: list = []
+    threads = [
+        threading.Thread(target=lambda: results.append(func())) for _ in range(n)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestSingleFlight:
+    """Tests for `SingleFlight` class."""
+
+    def test_shared(self):
+        """Test that concurrent calls with the same key share one call."""
+        single_flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def _func():
+            calls.append(1)
+            release.wait(timeout=5)
+            return ["result"]
+
+        def _call():
+            return single_flight.do("key", _func)
+
+        timer = threading.Timer(0.2, release.set)
+        timer.start()
+        results = _concurrently(_call)
+        assert len(calls) == 1
+        assert all(res is results[0] for res in results)
+
+    def test_encoded(self):
+        """Test that waiting callers decode their own copies of a result
+        encoded once.
+        """
+        encoded: list = []
+
+        def _encode(result):
+            encoded.append(json.dumps(result))
+            return encoded[-1]
+
+        single_flight = SingleFlight(encode=_encode, decode=json.loads)
+        release = threading.Event()
+
+        def _call():
+            return single_flight.do(
+                "key", lambda: release.wait(timeout=5) and {"a": [1]}
+            )
+
+        timer = threading.Timer(0.2, release.set)
+        timer.start()
+        results = _concurrently(_call)
+        assert len(encoded) == 1
+        assert all(json.dumps(res) == encoded[0] for res in results)
+        assert len({id(res) for res in results}) == len(results)
+        results[0]["a"].append(2)
+        assert all(res == {"a": [1]} for res in results[1:])
+
+    def test_not_cached(self):
+        """Test that results are not kept once the call completes."""
+        single_flight = SingleFlight()
+        assert single_flight.do("key", lambda: 1) == 1
+        assert single_flight.do("key", lambda: 2) == 2
+
+    def test_error(self):
+        """Test that waiting callers get the exception of the call."""
+        single_flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def _func():
+            started.set()
+            time.sleep(0.1)
+            raise NotFound
+
+        def _call():
+            try:
+                single_flight.do("key", _func)
+            except NotFound as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=_call)
+        leader.start()
+        started.wait(timeout=5)
+        _call()
+        leader.join()
+        assert len(errors) == 2
+
+    def test_timeout(self):
+        """Test that callers run the call themselves after waiting too long."""
+        single_flight = SingleFlight(timeout=0.01)
+        release = threading.Event()
+        leader = threading.Thread(
+            target=lambda: single_flight.do("key", lambda: release.wait(5))
+        )
+        leader.start()
+        time.sleep(0.05)
+        assert single_flight.do("key", lambda: "own") == "own"
+        release.set()
+        leader.join()
+
+
+class TestCoalesce:
+    """Tests for `coalesce()` decorator."""
+
+    def _controller(self, calls: list, delay: float = 0.1):
+        """Return controller recording its calls."""
+
+        @coalesce
+        def controller(group: str, version=None, **kwargs):
+            calls.append((group, version))
+            time.sleep(delay)
+            return [group, version]
+
+        return controller
+
+    def test_coalesced(self, make_app):
+        """Test that identical concurrent requests share one call."""
+        app = make_app()
+        calls: list = []
+        controller = self._controller(calls)
+
+        def _call():
+            with app.app_context():
+                return controller("g", version="1", user="ignored")
+
+        results = _concurrently(_call)
+        assert results == [["g", "1"]] * 5
+        assert len({id(res) for res in results}) == 5
+        assert len(calls) == 1
+
+    def test_distinct(self, make_app):
+        """Test that requests with other arguments or tenants are separate."""
+        app = make_app()
+        calls: list = []
+        controller = self._controller(calls)
+        args = iter([("g", "1", None), ("g", "2", None), ("g", "1", "t1")])
+        lock = threading.Lock()
+
+        def _call():
+            with lock:
+                group, version, tenant = next(args)
+            with app.app_context():
+                set_tenant(tenant)
+                return controller(group, version=version)
+
+        _concurrently(_call, n=3)
+        assert len(calls) == 3
+
+    @pytest.mark.parametrize("enabled, pinned", [(False, False), (True, True)])
+    def test_bypassed(self, enabled, pinned, make_app):
+        """Test that requests are not coalesced if disabled or pinned."""
+        app = make_app(enabled=enabled)
+        calls: list = []
+        controller = self._controller(calls)
+        headers = {"Cookie": f"{PIN_COOKIE}={time.time() + 10}"} if pinned else {}
+
+        def _call():
+            with app.test_request_context(headers=headers):
+                return controller("g")
+
+        _concurrently(_call, n=3)
+        assert len(calls) == 3
@@ -0,0 +1,111 @@
+"""Tests for response compression."""
+
+from copy import deepcopy
+import gzip
+import json
+
+import brotli
+from flask import Flask, jsonify
+from foca.models.config import Config
+import pytest
+
+from cloud_registry.compression import (
+    CompressionCache,
+    compress,
+    register_compression,
+)
+from cloud_registry.service_models.custom_config import CustomConfig
+from tests.mock_data import CUSTOM_CONFIG, MOCK_SERVICE
+
+SERVICES = [dict(deepcopy(MOCK_SERVICE), id=f"serv{i}") for i in range(100)]
+
+
+@pytest.fixture
+def app():
+    """Create app with response compression registered."""
+    app = Flask(__name__)
+    app.config.foca = Config(custom=CustomConfig(**CUSTOM_CONFIG))
+    register_compression(app)
+
+    @app.route("/services")
+    def services():
+        return jsonify(SERVICES)
+
+    @app.route("/small")
+    def small():
+        return jsonify(SERVICES[0])
+
+    return app
+
+
+def test_compress_response_gzip(app):
+    """Test gzip compression of large responses."""
+    res = app.test_client().get("/services", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(res.data)) == SERVICES
+    assert "Accept-Encoding" in res.headers["Vary"]
+
+
+def test_compress_response_brotli_preferred(app):
+    """Test that brotli is preferred if accepted."""
+    res = app.test_client().get("/services", headers={"Accept-Encoding": "gzip, br"})
+    assert res.headers["Content-Encoding"] == "br"
+    assert json.loads(brotli.decompress(res.data)) == SERVICES
+
+
+def test_compress_response_quality(app):
+    """Test that client-supplied quality values are respected."""
+    res = app.test_client().get(
+        "/services", headers={"Accept-Encoding": "gzip;q=1.0, br;q=0.5"}
+    )
+    assert res.headers["Content-Encoding"] == "gzip"
+
+
+def test_compress_response_not_accepted(app):
+    """Test that responses are not compressed unless accepted."""
+    res = app.test_client().get("/services", headers={"Accept-Encoding": ""})
+    assert "Content-Encoding" not in res.headers
+    assert res.json == SERVICES
+
+
+def test_compress_response_below_min_size(app):
+    """Test that small responses are not compressed."""
+    res = app.test_client().get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in res.headers
+
+
+def test_compress_response_cached(app):
+    """Test that identical bodies are compressed once."""
+    client = app.test_client()
+    for _ in range(3):
+        client.get("/services", headers={"Accept-Encoding": "gzip"})
+    cache = app.extensions["compression_cache"]
+    assert cache.misses == 1
+    assert cache.hits == 2
+
+
+def test_register_compression_disabled():
+    """Test that compression can be disabled."""
+    custom_config = deepcopy(CUSTOM_CONFIG)
+    custom_config["compression"] = {"enabled": False}
+    app = Flask(__name__)
+    app.config.foca = Config(custom=CustomConfig(**custom_config))
+    register_compression(app)
+    assert "compression_cache" not in app.extensions
+
+
+class TestCompressionCache:
+    """Tests for `CompressionCache` class."""
+
+    def test_max_size(self):
+        """Test eviction of least recently used entries."""
+        cache = CompressionCache(max_size=1)
+        cache.compress(b"a", "gzip", 6)
+        cache.compress(b"b", "gzip", 6)
+        cache.compress(b"a", "gzip", 6)
+        assert cache.misses == 3
+
+    def test_unsupported_encoding(self):
+        """Test that unsupported encodings are rejected."""
+        with pytest.raises(ValueError):
+            compress(b"a", "deflate", 6)
@@ -0,0 +1,162 @@
+"""Tests for hot reload of the custom configuration."""
+
+from copy import deepcopy
+import logging
+import threading
+
+from flask import Flask
+import pytest
+import yaml
+
+from cloud_registry.auth import register_auth_cache
+from cloud_registry.config_reload import (
+    ConfigWatcher,
+    changed_paths,
+    register_config_reload,
+)
+from tests.mock_data import CUSTOM_CONFIG, DB
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps configured from a configuration file."""
+
+    def _make_app(tmp_path, **custom) -> Flask:
+        app = create_app(custom=custom)
+        _write(tmp_path, {**deepcopy(CUSTOM_CONFIG), **custom})
+        return app
+
+    return _make_app
+
+
+def _write(tmp_path, custom_config: dict) -> None:
+    """Write configuration file."""
+    (tmp_path / "config.yaml").write_text(yaml.safe_dump({"custom": custom_config}))
+
+
+def _reconcile_threads() -> list:
+    """Get threads reconciling service info."""
+    return [
+        thread
+        for thread in threading.enumerate()
+        if thread.name == "startup-reconcile service info"
+    ]
+
+
+def test_changed_paths():
+    """Test that changed values are found in nested sections."""
+    old = {"a": {"b": 1, "c": [1]}, "d": 1}
+    new = {"a": {"b": 2, "c": [1]}, "d": 1, "e": None}
+    assert changed_paths(old, new) == [("a", "b")]
+    assert changed_paths(old, {"a": 1, "d": 2}) == [("a",), ("d",)]
+
+
+class TestConfigWatcher:
+    """Tests for `ConfigWatcher` class."""
+
+    def test_check_unchanged(self, tmp_path, make_app):
+        """Test that the configuration is not reloaded if unchanged."""
+        app = make_app(tmp_path)
+        custom = app.config.foca.custom
+        watcher = ConfigWatcher(app=app, path=tmp_path / "config.yaml")
+        assert not watcher.check()
+        assert app.config.foca.custom is custom
+
+    def test_check_service_info(self, tmp_path, make_app):
+        """Test that service info is reconciled after it was changed."""
+        app = make_app(tmp_path)
+        app.extensions["service_info_cache"] = {None: {"name": "old"}, "t1": {}}
+        watcher = ConfigWatcher(app=app, path=tmp_path / "config.yaml")
+        custom_config = deepcopy(CUSTOM_CONFIG)
+        custom_config["endpoints"]["service_info"]["name"] = "New name"
+        custom_config["endpoints"]["services"]["id"]["length"] = 8
+        _write(tmp_path, custom_config)
+        assert watcher.check()
+        for thread in _reconcile_threads():
+            thread.join(timeout=5)
+        endpoints_conf = app.config.foca.custom.endpoints
+        assert endpoints_conf.service_info.name == "New name"
+        assert endpoints_conf.services.id.length == 8
+        assert app.extensions["service_info_cache"] == {"t1": {}}
+        stored = app.config.foca.db.dbs[DB].collections["service_info"].client
+        assert stored.find_one()["name"] == "New name"
+        assert watcher.reloads == 1
+
+    def test_check_invalid(self, tmp_path, caplog, make_app):
+        """Test that invalid configurations are not applied."""
+        app = make_app(tmp_path)
+        custom = app.config.foca.custom
+        watcher = ConfigWatcher(app=app, path=tmp_path / "config.yaml")
+        _write(tmp_path, {"endpoints": {"service": {"external_port": "x"}}})
+        with caplog.at_level(logging.ERROR):
+            assert not watcher.check()
+        assert app.config.foca.custom is custom
+        assert "not reloaded" in caplog.records[0].getMessage()
+        _write(
+            tmp_path,
+            {**deepcopy(CUSTOM_CONFIG), "read_preference": {"mode": "unknown"}},
+        )
+        assert not watcher.check()
+        (tmp_path / "config.yaml").write_text("custom: [")
+        assert not watcher.check()
+
+    def test_check_restart_required(self, tmp_path, caplog, make_app):
+        """Test that changes read when the app is created are kept back."""
+        app = make_app(tmp_path)
+        watcher = ConfigWatcher(app=app, path=tmp_path / "config.yaml")
+        _write(
+            tmp_path,
+            {
+                **deepcopy(CUSTOM_CONFIG),
+                "storage": {"backend": "sqlite"},
+                "profiling": {"enabled": True},
+            },
+        )
+        with caplog.at_level(logging.WARNING):
+            assert watcher.check()
+        assert app.config.foca.custom.storage.backend == "mongodb"
+        assert app.config.foca.custom.profiling.enabled
+        assert "custom.storage take effect after restart" in caplog.text
+        _write(
+            tmp_path,
+            {
+                **deepcopy(CUSTOM_CONFIG),
+                "storage": {"path": "db"},
+                "profiling": {"enabled": True},
+            },
+        )
+        assert not watcher.check()
+
+    def test_check_auth_cache(self, tmp_path, make_app):
+        """Test that token validation caches are replaced if reconfigured."""
+        app = make_app(tmp_path)
+        register_auth_cache(app)
+        token_cache = app.extensions["token_cache"]
+        watcher = ConfigWatcher(app=app, path=tmp_path / "config.yaml")
+        _write(tmp_path, {**deepcopy(CUSTOM_CONFIG), "auth_cache": {"ttl": 60}})
+        assert watcher.check()
+        assert app.extensions["token_cache"] is not token_cache
+        assert app.extensions["token_cache"].ttl == 60
+
+    def test_check_missing(self, tmp_path, make_app):
+        """Test that missing configuration files are ignored."""
+        app = make_app(tmp_path)
+        watcher = ConfigWatcher(app=app, path=tmp_path / "config.yaml")
+        (tmp_path / "config.yaml").unlink()
+        assert not watcher.check()
+
+
+def test_register_config_reload(tmp_path, make_app):
+    """Test that the configuration file is watched if enabled."""
+    app = make_app(tmp_path, reload={"enabled": True, "interval": 60})
+    register_config_reload(app, path=tmp_path / "config.yaml")
+    watcher = app.extensions["config_watcher"]
+    assert watcher.interval == 60
+    watcher.stop()
+
+
+def test_register_config_reload_disabled(tmp_path, make_app):
+    """Test that the configuration file is not watched if disabled."""
+    app = make_app(tmp_path)
+    register_config_reload(app, path=tmp_path / "config.yaml")
+    assert "config_watcher" not in app.extensions
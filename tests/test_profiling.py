@@ -0,0 +1,168 @@
+"""Tests for capturing profiles of the running app."""
+
+import os
+import threading
+import time
+import tracemalloc
+
+from flask import Flask
+import pytest
+
+from cloud_registry.exceptions import BadRequest, Forbidden, ServiceUnavailable
+from cloud_registry.ga4gh.registry.server import getAllocationProfile, getCpuProfile
+from cloud_registry.profiling import (
+    _import_prefixes,
+    _location,
+    _lock,
+    check_profiling_access,
+    sample_allocations,
+    sample_cpu,
+    to_folded,
+)
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with profiling configuration."""
+
+    def _make_app(disable_auth: bool = False, **profiling) -> Flask:
+        return create_app(
+            custom={"profiling": profiling},
+            db=False,
+            api={"specs": [{"path": "api.yaml", "disable_auth": disable_auth}]},
+        )
+
+    return _make_app
+
+
+def _spin(stop: threading.Event) -> None:
+    """Keep CPU busy until stopped."""
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def _allocate(stop: threading.Event, allocated: list) -> None:
+    """Allocate memory until stopped."""
+    while not stop.is_set():
+        allocated.append(bytearray(1024))
+        time.sleep(0.001)
+
+
+def test_sample_cpu():
+    """Test that running threads are sampled and idle threads are not."""
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=_spin, args=(stop,)),
+        threading.Thread(target=stop.wait),
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    try:
+        stacks = sample_cpu(seconds=0.3, interval=0.005)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert any(stack.endswith("tests.test_profiling:_spin") for stack in stacks)
+    assert not any("threading:wait" in stack for stack in stacks)
+    assert all(stack.startswith("threading:_bootstrap;") for stack in stacks)
+
+
+def test_location(monkeypatch):
+    """Test that traced frames are located relative to the longest matching
+    directory of the import path.
+    """
+    root = os.path.join(os.sep, "app")
+    monkeypatch.setattr("sys.path", ["", root, os.path.join(root, "lib")])
+    prefixes = _import_prefixes()
+    assert prefixes == [os.path.join(root, "lib", ""), os.path.join(root, "")]
+    filename = os.path.join(root, "lib", "pkg", "mod.py")
+    frame = tracemalloc.Frame((filename, 3))
+    assert _location(frame, prefixes) == f"{os.path.join('pkg', 'mod.py')}:3"
+
+
+def test_sample_allocations():
+    """Test that allocations made while tracing are attributed to stacks."""
+    stop = threading.Event()
+    allocated: list = []
+    thread = threading.Thread(target=_allocate, args=(stop, allocated))
+    thread.start()
+    try:
+        stacks = sample_allocations(seconds=0.2, traceback_limit=5)
+    finally:
+        stop.set()
+        thread.join()
+    own = [size for stack, size in stacks.items() if "test_profiling.py" in stack]
+    assert sum(own) >= 1024
+
+
+def test_sample_concurrent():
+    """Test that only one profile is captured at a time."""
+    with _lock:
+        with pytest.raises(ServiceUnavailable):
+            sample_cpu(seconds=0.1)
+        with pytest.raises(ServiceUnavailable):
+            sample_allocations(seconds=0.1)
+
+
+def test_to_folded():
+    """Test that stacks are formatted heaviest first."""
+    assert to_folded({"a;b": 1, "a;c": 3}) == "a;c 3\na;b 1\n"
+    assert to_folded({}) == ""
+
+
+class TestCheckProfilingAccess:
+    """Tests for `check_profiling_access()`."""
+
+    def test_disabled(self, make_app):
+        """Test that profiles are rejected if profiling is disabled."""
+        app = make_app(admins=["admin"])
+        with app.test_request_context(headers={"user_id": "admin"}):
+            with pytest.raises(Forbidden):
+                check_profiling_access(seconds=1)
+
+    def test_admin(self, make_app):
+        """Test that admins may capture profiles."""
+        app = make_app(enabled=True, admins=["admin"])
+        with app.test_request_context(headers={"user_id": "admin"}):
+            check_profiling_access(seconds=1)
+
+    def test_not_admin(self, make_app):
+        """Test that users who are not admins may not capture profiles."""
+        app = make_app(enabled=True, admins=["admin"])
+        with app.test_request_context(headers={"user_id": "user"}):
+            with pytest.raises(Forbidden):
+                check_profiling_access(seconds=1)
+        with app.test_request_context():
+            with pytest.raises(Forbidden):
+                check_profiling_access(seconds=1)
+
+    def test_auth_disabled(self, make_app):
+        """Test that anyone may capture profiles if authorization is disabled."""
+        app = make_app(disable_auth=True, enabled=True)
+        with app.test_request_context():
+            check_profiling_access(seconds=1)
+
+    def test_too_long(self, make_app):
+        """Test that profiles longer than the maximum are rejected."""
+        app = make_app(enabled=True, admins=["admin"], max_seconds=1)
+        with app.test_request_context(headers={"user_id": "admin"}):
+            with pytest.raises(BadRequest):
+                check_profiling_access(seconds=2)
+
+
+def test_getCpuProfile(make_app):
+    """Test for capturing a CPU profile."""
+    app = make_app(disable_auth=True, enabled=True)
+    with app.test_request_context():
+        res = getCpuProfile.__wrapped__(seconds=0.1)
+    assert res.mimetype == "text/plain"
+
+
+def test_getAllocationProfile(make_app):
+    """Test for capturing an allocation profile."""
+    app = make_app(disable_auth=True, enabled=True)
+    with app.test_request_context():
+        res = getAllocationProfile.__wrapped__(seconds=0.1)
+    assert res.mimetype == "text/plain"
@@ -0,0 +1,70 @@
+"""Tests for startup phases and background startup tasks."""
+
+from flask import Flask, current_app
+from pymongo.errors import ServerSelectionTimeoutError
+import pytest
+
+from cloud_registry.startup import StartupPhases, StartupTask
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps retrying startup tasks without delay."""
+
+    def _make_app() -> Flask:
+        return create_app(
+            custom={"startup": {"initial_backoff": 0.001, "max_backoff": 0.01}},
+            db=False,
+        )
+
+    return _make_app
+
+
+class TestStartupPhases:
+    """Tests for `StartupPhases` class."""
+
+    def test_phase(self):
+        """Test that phases are timed and reported."""
+        phases = StartupPhases()
+        with phases.phase("first"):
+            pass
+        phases.record("second", 1.5)
+        timings = phases.report()
+        assert list(timings) == ["first", "second", "total"]
+        assert timings["second"] == 1.5
+
+
+class TestStartupTask:
+    """Tests for `StartupTask` class."""
+
+    def test_retry(self, make_app):
+        """Test that failing tasks are retried in the app context."""
+        app = make_app()
+        phases = StartupPhases()
+        calls = []
+
+        def _func():
+            calls.append(current_app.name)
+            if len(calls) < 3:
+                raise ServerSelectionTimeoutError()
+
+        task = StartupTask(app=app, name="task", func=_func, phases=phases)
+        task.start()
+        assert task.done.wait(timeout=5)
+        task.stop()
+        assert task.attempts == 3
+        assert calls == [app.name] * 3
+        assert "task" in phases.timings
+
+    def test_stop(self, make_app):
+        """Test that retries end once the task is stopped."""
+        app = make_app()
+
+        def _func():
+            raise ServerSelectionTimeoutError()
+
+        task = StartupTask(app=app, name="task", func=_func)
+        task.start()
+        task.stop()
+        assert not task.done.is_set()
+        assert not task.run()
@@ -0,0 +1,177 @@
+"""Tests for the embedded SQLite storage backend."""
+
+from copy import deepcopy
+from datetime import datetime, timedelta
+import threading
+
+from flask import Flask
+from pydantic import ValidationError
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+import pytest
+
+from cloud_registry.ga4gh.registry.changes import ChangeLog
+from cloud_registry.ga4gh.registry.server import (
+    deleteService,
+    getServiceById,
+    getServices,
+    getServicesByType,
+)
+from cloud_registry.ga4gh.registry.service import RegisterService
+from cloud_registry.ga4gh.registry.tenancy import get_collection, set_tenant
+from cloud_registry.service_models.custom_config import StorageConfig
+from cloud_registry.storage import SQLiteDatabase, register_sqlite
+from tests.mock_data import (
+    MOCK_ID,
+    MOCK_SERVICE,
+)
+
+
+@pytest.fixture
+def collection(tmp_path):
+    """Return collection with unique index on `id`."""
+    database = SQLiteDatabase(path=str(tmp_path / "db.sqlite3"), name="db")
+    collection = database["services"]
+    collection.create_index([("id", 1)], unique=True)
+    return collection
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps storing collections in SQLite."""
+
+    def _make_app(path: str) -> Flask:
+        app = create_app(
+            collections={
+                "services": {
+                    "indexes": [
+                        {"keys": {"id": 1}, "options": {"unique": True}},
+                        {"keys": {"_deleted_at": 1}},
+                    ],
+                },
+            },
+            clients=[],
+        )
+        register_sqlite(conf=app.config.foca.db, path=path)
+        return app
+
+    return _make_app
+
+
+class TestSQLiteCollection:
+    """Tests for `SQLiteCollection` class."""
+
+    def test_insert_find(self, collection):
+        """Test that inserted documents are found by their fields."""
+        res = collection.insert_one({"id": "a", "type": {"group": "g"}, "n": 1})
+        collection.insert_one({"id": "b", "type": {"group": "h"}, "n": 2})
+        assert collection.find_one({"_id": res.inserted_id})["id"] == "a"
+        assert collection.find_one({"type.group": "h"}, {"_id": False}) == {
+            "id": "b",
+            "type": {"group": "h"},
+            "n": 2,
+        }
+        assert [d["id"] for d in collection.find({"n": {"$gte": 1}})] == ["a", "b"]
+        assert [d["id"] for d in collection.find({"id": {"$in": ["b"]}})] == ["b"]
+        assert collection.count_documents({"missing": None}) == 2
+        assert collection.count_documents({"n": {"$exists": True}}, limit=1) == 1
+
+    def test_duplicate(self, collection):
+        """Test that unique indexes are enforced."""
+        collection.insert_one({"id": "a"})
+        with pytest.raises(DuplicateKeyError):
+            collection.insert_one({"id": "a"})
+
+    def test_sort_limit_projection(self, collection):
+        """Test for sorting, limiting and projecting results."""
+        for id, n in [("a", 2), ("b", 3), ("c", 1)]:
+            collection.insert_one({"id": id, "n": n, "type": {"version": "1"}})
+        docs = collection.find(
+            {}, projection={"_id": True, "type.version": True}, sort=[("n", -1)]
+        )
+        assert [sorted(d) for d in docs] == [["_id", "type"]] * 3
+        cursor = collection.find({}, {"_id": False}).sort([("n", 1)]).limit(1)
+        assert cursor.next()["id"] == "c"
+
+    def test_replace_update(self, collection):
+        """Test for replacing and updating documents."""
+        res = collection.replace_one({"id": "a"}, {"id": "a", "n": 1}, upsert=True)
+        assert res.upserted_id is not None
+        res = collection.replace_one({"id": "a"}, {"id": "a", "n": 2}, upsert=True)
+        assert (res.matched_count, res.modified_count) == (1, 1)
+        res = collection.update_one({"id": "a"}, {"$set": {"x.y": 1}})
+        assert collection.find_one({"id": "a"})["x"] == {"y": 1}
+        res = collection.update_one({"id": "z"}, {"$set": {"n": 1}})
+        assert res.matched_count == 0
+
+    def test_dates(self, collection):
+        """Test that dates are stored and compared as dates."""
+        now = datetime.utcnow()
+        collection.insert_one({"id": "old", "at": now - timedelta(days=2)})
+        collection.insert_one({"id": "new", "at": now})
+        expired = {"at": {"$lt": now - timedelta(days=1)}}
+        assert collection.find_one(expired)["id"] == "old"
+        assert collection.find_one({"id": "new"})["at"] == now
+        assert collection.delete_many(expired).deleted_count == 1
+
+    def test_find_one_and_update(self, collection):
+        """Test that counters are incremented atomically across threads."""
+
+        def _increment():
+            for _ in range(20):
+                collection.find_one_and_update(
+                    filter={"_id": "sequence"},
+                    update={"$inc": {"value": 1}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+
+        threads = [threading.Thread(target=_increment) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert collection.find_one({"_id": "sequence"})["value"] == 80
+
+    def test_bulk_write(self, collection):
+        """Test for upserting documents in bulk."""
+        collection.insert_one({"id": "a", "n": 1})
+        res = collection.bulk_write(
+            [
+                UpdateOne({"id": "a"}, {"$setOnInsert": {"n": 2}}, upsert=True),
+                UpdateOne({"id": "b"}, {"$setOnInsert": {"n": 2}}, upsert=True),
+                InsertOne({"id": "c"}),
+            ],
+            ordered=False,
+        )
+        assert list(res.upserted_ids) == [1]
+        assert collection.find_one({"id": "a"})["n"] == 1
+        assert collection.find_one({"id": "b"})["n"] == 2
+        assert collection.count_documents({}) == 3
+
+
+def test_storage_config_backend():
+    """Test that unknown storage backends are rejected."""
+    with pytest.raises(ValidationError):
+        StorageConfig(backend="postgresql")
+
+
+def test_register_sqlite(tmp_path, make_app):
+    """Test that the registry runs on SQLite collections."""
+    app = make_app(path=str(tmp_path))
+    with app.app_context():
+        RegisterService(data=deepcopy(MOCK_SERVICE), id=MOCK_ID).register_metadata()
+        RegisterService(data=deepcopy(MOCK_SERVICE)).register_metadata()
+        assert getServiceById.__wrapped__(MOCK_ID)["id"] == MOCK_ID
+        assert len(getServicesByType.__wrapped__("org.ga4gh", "beacon", "^1")) == 2
+        deleteService.__wrapped__(MOCK_ID)
+        assert len(getServices.__wrapped__()) == 1
+        assert ChangeLog().get_changes(since="0")["next"] == "3"
+        set_tenant("tenant1")
+        assert get_collection("services").name == "services.tenant1"
+        assert getServices.__wrapped__() == []
+
+    # data survives reopening the database
+    app = make_app(path=str(tmp_path))
+    with app.app_context():
+        assert len(getServices.__wrapped__()) == 1
@@ -0,0 +1,219 @@
+"""Tests for timing of requests and slow MongoDB commands."""
+
+import logging
+import threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from flask import Flask, g
+import pytest
+
+from cloud_registry.timing import (
+    CommandTimer,
+    RequestTimings,
+    TimedJsonifier,
+    command_filter,
+    filter_shape,
+    register_request_timing,
+    summarize_plan,
+    timed,
+)
+
+EXPLAINED = {
+    "queryPlanner": {
+        "winningPlan": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "id_1"},
+        },
+    },
+}
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with timing configuration."""
+
+    def _make_app(**timing) -> Flask:
+        return create_app(custom={"timing": timing}, db=False)
+
+    return _make_app
+
+
+def _event(request_id: int, duration_micros: int = 1000, **command) -> SimpleNamespace:
+    """Create command event."""
+    return SimpleNamespace(
+        command_name="find",
+        command={"find": "services", "lsid": {"id": 1}, **command},
+        database_name="serviceStore",
+        connection_id=("localhost", 27017),
+        request_id=request_id,
+        duration_micros=duration_micros,
+    )
+
+
+def _explain_threads() -> list:
+    """Get threads explaining slow commands."""
+    return [
+        thread
+        for thread in threading.enumerate()
+        if thread.name == "explain-slow-command"
+    ]
+
+
+def test_request_timings():
+    """Test that timings are formatted as `Server-Timing` header."""
+    timings = RequestTimings()
+    timings.add("serialization", 0.001)
+    timings.add("db", 0.002)
+    timings.add("db", 0.003)
+    header = timings.server_timing()
+    assert header.startswith(
+        'db;desc="2 commands";dur=5.0, serialization;dur=1.0, total;dur='
+    )
+
+
+def test_timed(make_app):
+    """Test that timed parts are added to the timings of the request."""
+    app = make_app()
+    with app.test_request_context():
+        with timed("auth"):
+            pass
+        g.request_timings = RequestTimings()
+        with timed("auth"):
+            pass
+        timed("auth")(lambda: None)()
+        assert g.request_timings.counts == {"auth": 2}
+
+
+def test_timed_jsonifier(make_app):
+    """Test that serialization is timed."""
+    app = make_app()
+    with app.test_request_context():
+        g.request_timings = RequestTimings()
+        assert TimedJsonifier().dumps({"a": 1}) == '{"a": 1}\n'
+        assert "serialization" in g.request_timings.durations
+
+
+def test_command_filter():
+    """Test that filters are found in commands."""
+    assert command_filter("find", {"filter": {"a": 1}}) == {"a": 1}
+    assert command_filter("count", {"query": {"a": 1}}) == {"a": 1}
+    assert command_filter("update", {"updates": [{"q": {"a": 1}}]}) == {"a": 1}
+    pipeline = [{"$sort": {"a": 1}}, {"$match": {"a": 1}}]
+    assert command_filter("aggregate", {"pipeline": pipeline}) == {"a": 1}
+    assert command_filter("insert", {"documents": []}) is None
+
+
+def test_filter_shape():
+    """Test that values of filters are replaced."""
+    query = {
+        "type.group": "org.ga4gh",
+        "id": {"$in": ["a", "b"]},
+        "$or": [{"a": 1}, {"b": None}],
+    }
+    assert filter_shape(query) == {
+        "type.group": "?",
+        "id": {"$in": "?"},
+        "$or": [{"a": "?"}, {"b": "?"}],
+    }
+
+
+def test_summarize_plan():
+    """Test that winning plans are summarized."""
+    assert summarize_plan(EXPLAINED) == "FETCH <- IXSCAN(id_1)"
+    assert summarize_plan({"stages": [{"$cursor": EXPLAINED}]}) == (
+        "FETCH <- IXSCAN(id_1)"
+    )
+    assert summarize_plan({}) == "unknown"
+
+
+class TestCommandTimer:
+    """Tests for `CommandTimer` class."""
+
+    def test_request_db_time(self, make_app):
+        """Test that command durations are added to the request timings."""
+        app = make_app()
+        timer = CommandTimer()
+        with app.test_request_context():
+            g.request_timings = RequestTimings()
+            timer.started(_event(1))
+            timer.succeeded(_event(1, duration_micros=2500))
+            timer.started(_event(2))
+            timer.failed(_event(2, duration_micros=500))
+            assert g.request_timings.durations["db"] == 0.003
+            assert g.request_timings.counts["db"] == 2
+        assert timer._commands == {}
+
+    def test_slow_command(self, caplog):
+        """Test that slow commands are logged with their plan."""
+        database = MagicMock()
+        database.command.return_value = EXPLAINED
+        timer = CommandTimer()
+        timer.slow_command_ms = 10
+        timer.databases["serviceStore"] = database
+        with caplog.at_level(logging.WARNING):
+            timer.started(_event(1, filter={"id": "a"}))
+            timer.succeeded(_event(1, duration_micros=5000))
+            timer.started(_event(2, filter={"id": "a"}))
+            timer.succeeded(_event(2, duration_micros=50000))
+            for thread in _explain_threads():
+                thread.join()
+            timer.started(_event(3, filter={"id": "b"}))
+            timer.succeeded(_event(3, duration_micros=20000))
+        messages = [record.getMessage() for record in caplog.records]
+        assert len(messages) == 2
+        assert "Slow command 'find' on 'serviceStore.services' took 50.0ms" in (
+            messages[0]
+        )
+        assert 'filter: {"id": "?"}; plan: FETCH <- IXSCAN(id_1)' in messages[0]
+        assert "plan: FETCH <- IXSCAN(id_1)" in messages[1]
+        database.command.assert_called_once_with(
+            {
+                "explain": {"find": "services", "filter": {"id": "a"}},
+                "verbosity": "queryPlanner",
+            }
+        )
+
+    def test_slow_command_not_explained(self, caplog):
+        """Test that slow commands are logged without plan if not explained."""
+        timer = CommandTimer()
+        timer.slow_command_ms = 10
+        timer.explain = False
+        with caplog.at_level(logging.WARNING):
+            timer.started(_event(1, filter={"id": "a"}))
+            timer.succeeded(_event(1, duration_micros=50000))
+        assert caplog.records[0].getMessage().endswith("plan: n/a")
+
+
+def test_register_request_timing(make_app):
+    """Test that responses report timings in the `Server-Timing` header."""
+    app = make_app(request_db_budget_ms=0, server_timing=True)
+
+    @app.route("/items")
+    def items():
+        with timed("validation"):
+            pass
+        g.request_timings.add("db", 0.001)
+        return {"items": []}
+
+    register_request_timing(app)
+    res = app.test_client().get("/items")
+    assert res.headers["Server-Timing"].startswith(
+        'db;desc="1 commands";dur=1.0, validation;dur='
+    )
+
+
+def test_register_request_timing_header_disabled(make_app):
+    """Test that responses report no timings by default."""
+    app = make_app()
+    app.route("/items")(lambda: {"items": []})
+    register_request_timing(app)
+    assert "Server-Timing" not in app.test_client().get("/items").headers
+
+
+def test_register_request_timing_disabled(make_app):
+    """Test that responses report no timings if timing is disabled."""
+    app = make_app(enabled=False)
+    app.route("/items")(lambda: {"items": []})
+    register_request_timing(app)
+    assert "Server-Timing" not in app.test_client().get("/items").headers
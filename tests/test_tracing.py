@@ -0,0 +1,217 @@
+"""Tests for tracing with OpenTelemetry."""
+
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from flask import Flask
+from foca.models.config import Config
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+import pytest
+
+from cloud_registry.ga4gh.registry.service import RegisterService
+from cloud_registry.service_models.custom_config import CustomConfig
+from cloud_registry.tracing import (
+    CommandTracer,
+    register_tracing,
+    start_span,
+    traced,
+)
+from tests.mock_data import CUSTOM_CONFIG, MOCK_SERVICE
+
+TRACE_ID = "0af7651916cd43dd8448eb211c80319c"
+PARENT_ID = "b7ad6b7169203331"
+
+
+@pytest.fixture
+def make_app(create_app):
+    """Factory of apps with tracing configuration and a traced route."""
+
+    def _make_app(exporter=None, **tracing) -> Flask:
+        app = create_app(custom={"tracing": {"enabled": True, **tracing}}, clients=[])
+        register_tracing(app, exporter=exporter)
+
+        @traced
+        def getItem(id: str) -> dict:
+            with start_span("inner"):
+                return {"id": id}
+
+        @app.route("/items/<id>")
+        def item(id: str):
+            return getItem(id)
+
+        return app
+
+    return _make_app
+
+
+def _spans(app: Flask, exporter: InMemorySpanExporter) -> dict:
+    """Export recorded spans and index them by name."""
+    app.extensions["tracer_provider"].force_flush()
+    return {span.name: span for span in exporter.get_finished_spans()}
+
+
+def test_register_tracing_disabled():
+    """Test that no tracer is registered if tracing is disabled."""
+    app = Flask(__name__)
+    app.config.foca = Config(custom=CustomConfig(**CUSTOM_CONFIG))
+    register_tracing(app)
+    assert "tracer" not in app.extensions
+    with app.app_context():
+        assert traced(lambda: 1)() == 1
+
+
+def test_register_tracing_unknown_sampler(make_app):
+    """Test that an unknown sampler is rejected."""
+    with pytest.raises(ValueError):
+        make_app(exporter=InMemorySpanExporter(), sampler="sometimes")
+
+
+def test_request_spans(make_app):
+    """Test that spans of a request form a trace continuing the propagated
+    trace.
+    """
+    exporter = InMemorySpanExporter()
+    app = make_app(exporter=exporter)
+    res = app.test_client().get(
+        "/items/a",
+        headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"},
+    )
+    assert res.status_code == 200
+    spans = _spans(app, exporter)
+    request_span = spans["GET /items/<id>"]
+    assert format(request_span.context.trace_id, "032x") == TRACE_ID
+    assert format(request_span.parent.span_id, "016x") == PARENT_ID
+    assert request_span.attributes["http.status_code"] == 200
+    controller_span = spans["make_app.<locals>._make_app.<locals>.getItem"]
+    assert controller_span.parent.span_id == request_span.context.span_id
+    assert spans["inner"].parent.span_id == controller_span.context.span_id
+
+
+def test_request_span_error(make_app):
+    """Test that failed requests are recorded as errors."""
+    exporter = InMemorySpanExporter()
+    app = make_app(exporter=exporter)
+
+    @app.route("/fail")
+    def fail():
+        raise ValueError("failure")
+
+    app.config["PROPAGATE_EXCEPTIONS"] = False
+    assert app.test_client().get("/fail").status_code == 500
+    request_span = _spans(app, exporter)["GET /fail"]
+    assert not request_span.status.is_ok
+    assert request_span.events[0].name == "exception"
+
+
+def test_sampler_parent_based(make_app):
+    """Test that traces not sampled upstream are not recorded."""
+    exporter = InMemorySpanExporter()
+    app = make_app(exporter=exporter)
+    app.test_client().get(
+        "/items/a",
+        headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"},
+    )
+    assert _spans(app, exporter) == {}
+
+
+def test_sampler_always_off(make_app):
+    """Test that no spans are recorded if sampling is off."""
+    exporter = InMemorySpanExporter()
+    app = make_app(exporter=exporter, sampler="always_off")
+    app.test_client().get("/items/a")
+    assert _spans(app, exporter) == {}
+
+
+def test_register_service_spans(make_app):
+    """Test that service registrations are traced."""
+    exporter = InMemorySpanExporter()
+    app = make_app(exporter=exporter)
+    app.config.foca.db.dbs["serviceStore"].collections["services"].client = MagicMock()
+    with app.app_context():
+        RegisterService(data=deepcopy(MOCK_SERVICE)).register_metadata()
+    spans = _spans(app, exporter)
+    assert "RegisterService.register_metadata" in spans
+    assert "RegisterService.check_quota" in spans
+
+
+class TestCommandTracer:
+    """Tests for `CommandTracer` class."""
+
+    @staticmethod
+    def _event(request_id: int, **kwargs) -> SimpleNamespace:
+        """Create command event."""
+        return SimpleNamespace(
+            command_name="find",
+            command={"find": "services", "filter": {}},
+            database_name="serviceStore",
+            connection_id=("localhost", 27017),
+            request_id=request_id,
+            **kwargs,
+        )
+
+    def test_spans(self, make_app):
+        """Test that commands are recorded as children of the current span."""
+        exporter = InMemorySpanExporter()
+        app = make_app(exporter=exporter)
+        command_tracer = CommandTracer()
+        command_tracer.tracer = app.extensions["tracer"]
+        with app.app_context():
+            with start_span("parent"):
+                command_tracer.started(self._event(1))
+                command_tracer.started(self._event(2))
+                command_tracer.succeeded(self._event(1))
+                command_tracer.failed(self._event(2, failure={"errmsg": "fail"}))
+        app.extensions["tracer_provider"].force_flush()
+        finished = exporter.get_finished_spans()
+        commands = [span for span in finished if span.name != "parent"]
+        parent = next(span for span in finished if span.name == "parent")
+        assert [span.name for span in commands] == ["find serviceStore.services"] * 2
+        assert all(span.parent.span_id == parent.context.span_id for span in commands)
+        assert commands[0].attributes["db.mongodb.collection"] == "services"
+        assert commands[0].status.is_ok
+        assert not commands[1].status.is_ok
+
+    def test_disabled(self):
+        """Test that no spans are recorded without a tracer."""
+        command_tracer = CommandTracer()
+        command_tracer.started(self._event(1))
+        command_tracer.succeeded(self._event(1))
+        assert command_tracer._spans == {}
+
+
+def test_otlp_exporter(make_app):
+    """Test that spans are exported to an OTLP/HTTP collector."""
+    received = []
+
+    class Collector(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append((self.path, self.headers["Content-Type"], body))
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Collector)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        app = make_app(
+            exporter_endpoint=f"http://127.0.0.1:{server.server_port}/v1/traces",
+            service_name="test-registry",
+        )
+        app.test_client().get("/items/a")
+        assert app.extensions["tracer_provider"].force_flush()
+    finally:
+        server.shutdown()
+    path, content_type, body = received[0]
+    assert path == "/v1/traces"
+    assert content_type == "application/x-protobuf"
+    assert b"test-registry" in body
@@ -0,0 +1,135 @@
+"""Tests for compiled validation of request bodies."""
+
+from connexion.exceptions import BadRequestProblem
+from foca.models.config import APIConfig, Config, SpecConfig
+import fastjsonschema
+import pytest
+
+from cloud_registry import validation
+from cloud_registry.validation import (
+    CompiledRequestBodyValidator,
+    compile_schema,
+    register_compiled_validation,
+    schema_formats,
+)
+
+SPEC = "cloud_registry/api/additions.openapi.yaml"
+SCHEMA = {
+    "type": "object",
+    "required": ["name"],
+    "additionalProperties": False,
+    "properties": {"name": {"type": "string"}},
+}
+
+
+def _validator(schema=SCHEMA) -> CompiledRequestBodyValidator:
+    """Create request body validator."""
+    return CompiledRequestBodyValidator(schema, consumes=["application/json"], api=None)
+
+
+def test_schema_formats():
+    """Test that formats are checked as by connexion's validator."""
+    schema = {
+        "type": "object",
+        "properties": {
+            "url": {"type": "string", "format": "uri"},
+            "createdAt": {"type": "string", "format": "date-time"},
+            "items": {"type": "array", "items": [{"format": "ipv4"}]},
+        },
+    }
+    formats = schema_formats(schema)
+    assert sorted(formats) == ["date-time", "ipv4", "uri"]
+    assert formats["ipv4"]("127.0.0.1")
+    assert not formats["ipv4"]("localhost")
+
+
+class TestCompileSchema:
+    """Tests for `compile_schema()` function."""
+
+    def test_compile_schema(self):
+        """Test for compiling a schema."""
+        validate = compile_schema(SCHEMA)
+        validate({"name": "service"})
+        with pytest.raises(fastjsonschema.JsonSchemaValueException):
+            validate({"name": 1})
+
+    def test_compile_schema_formats(self):
+        """Test that formats are checked as by connexion's validator."""
+        schema = {
+            "type": "object",
+            "properties": {
+                "url": {"type": "string", "format": "uri"},
+                "createdAt": {"type": "string", "format": "date-time"},
+                "version": {"type": "string", "format": "semver"},
+                "ip": {"type": "string", "format": "ipv4"},
+            },
+        }
+        validate = compile_schema(schema)
+        for data in [
+            {"url": "foo/bar"},
+            {"url": "https://ex ample.org"},
+            {"createdAt": "yesterday"},
+            {"version": "1.0"},
+            {"ip": "localhost"},
+        ]:
+            try:
+                validate(data)
+            except fastjsonschema.JsonSchemaValueException:
+                valid = False
+            else:
+                valid = True
+            assert valid == _validator(schema).validator.is_valid(data)
+
+    def test_compile_schema_cached(self):
+        """Test that equal schemas are compiled only once."""
+        assert compile_schema(SCHEMA) is compile_schema(dict(SCHEMA))
+
+    def test_compile_schema_invalid(self):
+        """Test for compiling an invalid schema."""
+        assert compile_schema({"type": "unknown"}) is None
+
+    def test_compile_schema_not_installed(self, monkeypatch):
+        """Test for compiling a schema without `fastjsonschema`."""
+        monkeypatch.setattr(validation, "fastjsonschema", None)
+        assert compile_schema(SCHEMA) is None
+
+
+class TestCompiledRequestBodyValidator:
+    """Tests for `CompiledRequestBodyValidator` class."""
+
+    def test_validate_schema(self):
+        """Test for validating a valid request body."""
+        validator = _validator()
+        assert validator.compiled is not None
+        assert validator.validate_schema({"name": "service"}, url="/") is None
+
+    def test_validate_schema_invalid(self):
+        """Test for validating an invalid request body."""
+        with pytest.raises(BadRequestProblem) as e:
+            _validator().validate_schema({"url": "service"}, url="/")
+        assert "name" in e.value.detail
+
+    def test_validate_schema_fallback(self, monkeypatch):
+        """Test for validating with connexion if schemas cannot be compiled."""
+        monkeypatch.setattr(validation, "fastjsonschema", None)
+        validator = _validator()
+        assert validator.compiled is None
+        with pytest.raises(BadRequestProblem):
+            validator.validate_schema({"url": "service"}, url="/")
+
+
+def test_register_compiled_validation():
+    """Test for registering compiled validation with all API specs."""
+    conf = Config(
+        api=APIConfig(
+            specs=[
+                SpecConfig(path=SPEC),
+                SpecConfig(path=SPEC, connexion={"strict_validation": True}),
+            ]
+        )
+    )
+    register_compiled_validation(conf)
+    assert conf.api.specs[1].connexion["strict_validation"] is True
+    for spec in conf.api.specs:
+        validator_map = spec.connexion["validator_map"]
+        assert validator_map["body"] is CompiledRequestBodyValidator
@@ -70,6 +70,13 @@ curl -s \
   -d @/tmp/configmap-patch.json "https://$APISERVER/api/v1/namespaces/${NAMESPACE}/configmaps/${CONFIG_MAP_NAME}" \
   -o /dev/null
 
+if [ "${RESTART_PODS:-true}" != "true" ];
+then
+  echo " * Not restarting $APP_NAME pods; they reload the configuration"
+  echo " All Done"
+  exit 0
+fi
+
 echo " * Deleting current $APP_NAME pod"
 curl -s \
   --cacert /var/run/secrets/kubernetes.io/serviceaccount/ca.crt \